@@ -1,36 +1,58 @@
 #!/usr/bin/env python3
 
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import os
 import sys
 import logging
+import importlib
+import argparse
+import time
 from datetime import datetime
 
-# Import all modules
-from NetworkModule import NetworkModule
-from PackageModule import PackageModule
-from UserManagementModule import UserManagementModule
-from PowerManagementModule import PowerManagementModule
-from KernelManagementModule import KernelManagementModule
-from NvidiaGPUModule import NvidiaGPUModule
-from SystemLogsModule import SystemLogsModule
-from PartitionManagementModule import PartitionManagementModule
-from MountManagementModule import MountManagementModule
-from ShellConfigModule import ShellConfigModule
-from SystemFileCorruptionModule import SystemFileCorruptionModule
-from BackupModule import BackupModule
-from DesktopManagerModule import DesktopManagerModule
-from PermissionManagerModule import PermissionManagerModule
-from ServicesManagementModule import ServicesManagementModule
-from LinuxHeadersModule import LinuxHeadersModule
-from FlashDriveModule import FlashDriveModule
-from DeviceManagementModule import DeviceManagementModule
-from SystemInformationModule import SystemInformationModule
-from TweaksModule import TweaksModule
+# Modules live alongside this script in modules/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+from CommandExecutor import get_executor
+from CommandCache import get_command_cache
+from LogManager import setup_logging
+from Tracing import get_tracer, span
+import Metrics
+from JobRunner import get_job_runner, JobListPanel
+from SystemCheck import SystemCheck, CheckResultsWindow, format_check_summary
+from FixScheduler import FixScheduler, FixTask, format_fix_summary
+
+# Module registry: (module name, tab text, python module/class name).
+# Modules are imported and constructed the first time their tab is selected.
+MODULE_REGISTRY = [
+    ('Network', 'Network', 'NetworkModule'),
+    ('Package Management', 'Package Management', 'PackageModule'),
+    ('User Management', 'User Management', 'UserManagementModule'),
+    ('Power Management', 'Power Management', 'PowerManagementModule'),
+    ('Kernel Management', 'Kernel Management', 'KernelManagementModule'),
+    ('NVIDIA GPU', 'NVIDIA GPU', 'NvidiaGPUModule'),
+    ('System Logs', 'System Logs', 'SystemLogsModule'),
+    ('Partition Management', 'Partitions', 'PartitionManagementModule'),
+    ('Mount Management', 'Mount Manager', 'MountManagementModule'),
+    ('Shell Configuration', 'Shell Config', 'ShellConfigModule'),
+    ('System File Check', 'File Integrity', 'SystemFileCorruptionModule'),
+    ('Backup', 'Backups', 'BackupModule'),
+    ('Desktop Manager', 'Desktop Manager', 'DesktopManagerModule'),
+    ('Permission Manager', 'Permission Manager', 'PermissionManagerModule'),
+    ('Services Management', 'Services Manager', 'ServicesManagementModule'),
+    ('Linux Headers', 'Linux Headers', 'LinuxHeadersModule'),
+    ('Flash Drive', 'Flash Drive Manager', 'FlashDriveModule'),
+    ('Device Management', 'Device Management', 'DeviceManagementModule'),
+    ('System Information', 'System Information', 'SystemInformationModule'),
+    ('Tweaks', 'Tweaks', 'TweaksModule'),
+    ('Diagnostics', 'Diagnostics', 'DiagnosticsModule')
+]
 
 class KaliLinuxFixAll:
     def __init__(self):
+        self.start_time = time.perf_counter()
+        self.startup_timings = []
+
         # Check if running as root
         if os.geteuid() != 0:
             messagebox.showerror("Error", "This program must be run as root (sudo)")
@@ -38,11 +60,20 @@ class KaliLinuxFixAll:
 
         # Setup logging
         self.setup_logging()
+        self.mark_startup("Logging setup")
 
         # Create main window
         self.root = tk.Tk()
         self.root.title("Kali Linux Fix All")
         self.root.geometry("1024x768")
+
+        # Deliver background job updates on the Tk thread
+        self.jobs = get_job_runner()
+        self.jobs.attach(self.root)
+        self.check_job = None
+        self.check_window = None
+        self.fix_job = None
+        self.fix_window = None
         
         # Set icon if available
         try:
@@ -61,8 +92,15 @@ class KaliLinuxFixAll:
         self.notebook = ttk.Notebook(self.main_container)
         self.notebook.pack(fill='both', expand=True, padx=5, pady=5)
 
+        # Create job list for the current module
+        self.job_panel = JobListPanel(self.main_container)
+        self.job_panel.pack(fill='x', padx=5, pady=(0, 5))
+
+        self.mark_startup("Main window")
+
         # Initialize modules
         self.initialize_modules()
+        self.mark_startup("Module placeholders")
 
         # Create status bar
         self.status_bar = ttk.Label(self.root, text="Ready", relief=tk.SUNKEN)
@@ -71,22 +109,28 @@ class KaliLinuxFixAll:
         # Bind events
         self.bind_events()
 
+        # Report startup time once the window is up, then load the first tab
+        self.root.after_idle(self.finish_startup)
+
+    def mark_startup(self, phase):
+        """Record the time elapsed since startup for a phase"""
+        self.startup_timings.append((phase, time.perf_counter() - self.start_time))
+
+    def finish_startup(self):
+        """Log the startup timing report and build the selected module"""
+        self.mark_startup("Window ready")
+        self.logger.info(self.get_startup_report())
+        self.job_panel.set_owner(self.load_module(self.get_module_name(self.notebook.select())))
+
     def setup_logging(self):
-        """Setup logging configuration"""
-        log_dir = "/var/log/kali-fix-all"
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-
-        log_file = f"{log_dir}/kali-fix-all_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_file),
-                logging.StreamHandler()
-            ]
-        )
+        """Setup logging configuration.
+
+        Records go through a queue to a rotating log file, stderr and an
+        in-memory ring, so logging never blocks the UI thread on disk I/O.
+        """
+        self.log_manager = setup_logging()
         self.logger = logging.getLogger("KaliFixAll")
+        self.logger.info(f"Logging to {self.log_manager.log_file}")
 
     def create_menu(self):
         """Create menu bar"""
@@ -109,40 +153,148 @@ class KaliLinuxFixAll:
         # Help menu
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="Documentation", command=self.show_documentation)
+        help_menu.add_command(label="Startup Timing", command=self.show_startup_report)
+        help_menu.add_command(label="Command Cache", command=self.show_cache_stats)
+        help_menu.add_command(label="Export Trace...", command=self.export_trace)
         help_menu.add_command(label="About", command=self.show_about)
         menubar.add_cascade(label="Help", menu=help_menu)
 
         self.root.config(menu=menubar)
 
     def initialize_modules(self):
-        """Initialize all modules"""
+        """Create a lightweight placeholder tab for every module"""
+        self.modules = {}
+        self.module_frames = {}
+        self.module_timings = {}
+        self.loading_module = False
+        self.placeholders = {}
+        for name, tab_text, module_name in MODULE_REGISTRY:
+            placeholder = ttk.Frame(self.notebook)
+            ttk.Label(placeholder, text=f"Loading {name}...").pack(padx=20, pady=20)
+            self.notebook.add(placeholder, text=tab_text)
+            self.placeholders[name] = placeholder
+        self.logger.info(f"Registered {len(MODULE_REGISTRY)} modules for on-demand loading")
+
+    def get_module_name(self, tab_id):
+        """Return the registry name of the module shown in a tab"""
+        for name, placeholder in self.placeholders.items():
+            if str(placeholder) == str(tab_id):
+                return name
+        for name, frame in self.module_frames.items():
+            if str(frame) == str(tab_id):
+                return name
+        return None
+
+    def load_module(self, name):
+        """Import and build a module, replacing its placeholder tab"""
+        if name is None or name in self.modules:
+            return self.modules.get(name)
+
+        placeholder = self.placeholders[name]
+        module_name = next(entry[2] for entry in MODULE_REGISTRY if entry[0] == name)
+        selected = str(self.notebook.select()) == str(placeholder)
+        existing = set(self.notebook.tabs())
+        self.loading_module = True
+        try:
+            start = time.perf_counter()
+            with span(f"Load {name}", 'startup'):
+                module_class = getattr(importlib.import_module(module_name), module_name)
+                module = module_class(self.notebook)
+            elapsed = time.perf_counter() - start
+
+            # The module adds its own tab; move it into the placeholder's slot
+            added = [tab for tab in self.notebook.tabs() if tab not in existing]
+            if not added:
+                raise RuntimeError("the module did not add a tab")
+            frame = added[0]
+            self.notebook.insert(self.notebook.index(placeholder), frame)
+            self.notebook.forget(placeholder)
+            placeholder.destroy()
+            del self.placeholders[name]
+            if selected:
+                self.notebook.select(frame)
+
+            self.modules[name] = module
+            self.module_frames[name] = frame
+            self.module_timings[name] = elapsed
+            self.logger.info(f"Module {name} loaded in {elapsed * 1000:.1f} ms")
+            return module
+        except Exception as e:
+            # Drop any tab the module added before it failed
+            for tab in self.notebook.tabs():
+                if tab not in existing:
+                    self.notebook.forget(tab)
+            self.logger.error(f"Error initializing module {name}: {str(e)}")
+            messagebox.showerror("Error", f"Failed to initialize {name}: {str(e)}")
+            return None
+        finally:
+            self.loading_module = False
+
+    def load_all_modules(self):
+        """Build every module that has not been loaded yet"""
+        for name, _, _ in MODULE_REGISTRY:
+            self.load_module(name)
+        return self.modules
+
+    def get_startup_report(self):
+        """Return a startup timing report"""
+        lines = ["Startup timing report:"]
+        for phase, elapsed in self.startup_timings:
+            lines.append(f"  {phase:<24} {elapsed * 1000:8.1f} ms")
+        if self.module_timings:
+            lines.append("Modules loaded on demand:")
+            for name, elapsed in self.module_timings.items():
+                lines.append(f"  {name:<24} {elapsed * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+    def show_startup_report(self):
+        """Show the startup timing report"""
+        messagebox.showinfo("Startup Timing", self.get_startup_report())
+
+    def show_cache_stats(self):
+        """Show command cache hit/miss counters"""
+        window = tk.Toplevel(self.root)
+        window.title("Command Cache")
+        window.geometry("420x380")
+
+        text = tk.Text(window, font=('Courier', 10), wrap='none')
+        text.pack(fill='both', expand=True, padx=5, pady=5)
+
+        def refresh():
+            text.config(state='normal')
+            text.delete('1.0', tk.END)
+            text.insert(tk.END, get_command_cache().format_stats())
+            text.config(state='disabled')
+
+        def clear():
+            get_command_cache().clear()
+            self.logger.info("Command cache cleared")
+            refresh()
+
+        button_frame = ttk.Frame(window)
+        button_frame.pack(fill='x', padx=5, pady=5)
+        ttk.Button(button_frame, text="Close", command=window.destroy).pack(side='right', padx=5)
+        ttk.Button(button_frame, text="Clear Cache", command=clear).pack(side='right', padx=5)
+        ttk.Button(button_frame, text="Refresh", command=refresh).pack(side='right', padx=5)
+        refresh()
+
+    def export_trace(self):
+        """Save the recorded action and command spans as a Chrome trace"""
+        filename = filedialog.asksaveasfilename(
+            title="Export Trace",
+            defaultextension=".json",
+            initialfile=f"kali-fix-all-trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            filetypes=[("Chrome trace", "*.json"), ("All files", "*.*")])
+        if not filename:
+            return
         try:
-            self.modules = {
-                'Network': NetworkModule(self.notebook),
-                'Package Management': PackageModule(self.notebook),
-                'User Management': UserManagementModule(self.notebook),
-                'Power Management': PowerManagementModule(self.notebook),
-                'Kernel Management': KernelManagementModule(self.notebook),
-                'NVIDIA GPU': NvidiaGPUModule(self.notebook),
-                'System Logs': SystemLogsModule(self.notebook),
-                'Partition Management': PartitionManagementModule(self.notebook),
-                'Mount Management': MountManagementModule(self.notebook),
-                'Shell Configuration': ShellConfigModule(self.notebook),
-                'System File Check': SystemFileCorruptionModule(self.notebook),
-                'Backup': BackupModule(self.notebook),
-                'Desktop Manager': DesktopManagerModule(self.notebook),
-                'Permission Manager': PermissionManagerModule(self.notebook),
-                'Services Management': ServicesManagementModule(self.notebook),
-                'Linux Headers': LinuxHeadersModule(self.notebook),
-                'Flash Drive': FlashDriveModule(self.notebook),
-                'Device Management': DeviceManagementModule(self.notebook),
-                'System Information': SystemInformationModule(self.notebook),
-                'Tweaks': TweaksModule(self.notebook)
-            }
-            self.logger.info("All modules initialized successfully")
+            count = get_tracer().export_chrome_trace(filename)
+            messagebox.showinfo("Export Trace",
+                                f"Saved {count} spans to {filename}\n\n"
+                                "Open it at ui.perfetto.dev or chrome://tracing.")
         except Exception as e:
-            self.logger.error(f"Error initializing modules: {str(e)}")
-            messagebox.showerror("Error", f"Failed to initialize modules: {str(e)}")
+            self.logger.error(f"Error exporting trace: {str(e)}")
+            messagebox.showerror("Error", f"Failed to export trace: {str(e)}")
 
     def bind_events(self):
         """Bind various events"""
@@ -151,78 +303,150 @@ class KaliLinuxFixAll:
 
     def on_tab_changed(self, event):
         """Handle tab change events"""
+        if self.loading_module:
+            return
         current_tab = self.notebook.select()
         tab_text = self.notebook.tab(current_tab, "text")
         self.status_bar.config(text=f"Current module: {tab_text}")
         self.logger.info(f"Switched to module: {tab_text}")
 
+        # Build the module the first time its tab is selected
+        name = self.get_module_name(current_tab)
+        if name in self.placeholders:
+            self.status_bar.config(text=f"Loading module: {tab_text}...")
+            self.root.update_idletasks()
+            self.load_module(name)
+            self.status_bar.config(text=f"Current module: {tab_text}")
+
+        # Show the jobs belonging to this module
+        self.job_panel.set_owner(self.modules.get(name))
+
     def save_log(self):
         """Save current session log"""
         try:
             filename = f"kali-fix-all_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-            with open(filename, 'w') as f:
-                # Get logs from logging handler
-                for handler in self.logger.handlers:
-                    if isinstance(handler, logging.FileHandler):
-                        with open(handler.baseFilename, 'r') as log_file:
-                            f.write(log_file.read())
+            self.log_manager.save(filename)
             messagebox.showinfo("Success", f"Log saved to {filename}")
         except Exception as e:
             self.logger.error(f"Error saving log: {str(e)}")
             messagebox.showerror("Error", f"Failed to save log: {str(e)}")
 
     def check_system(self):
-        """Perform system check across all modules"""
+        """Perform system check across all modules, running the checks in parallel"""
+        if self.check_job and self.check_job.active:
+            self.check_window.lift()
+            return
         try:
             self.logger.info("Starting system check...")
-            issues = []
+            checks = []
             
-            for name, module in self.modules.items():
+            for name, module in self.load_all_modules().items():
                 if hasattr(module, 'check_status'):
-                    module_issues = module.check_status()
-                    if module_issues:
-                        issues.extend([f"[{name}] {issue}" for issue in module_issues])
-
-            if issues:
-                result = "System Check Results:\n\n" + "\n".join(issues)
-                messagebox.showwarning("System Check", result)
-            else:
-                messagebox.showinfo("System Check", "No issues found")
-            
-            self.logger.info("System check completed")
+                    checks.append((name, module.check_status,
+                                   getattr(module, 'CHECK_DEADLINE', None)))
+
+            self.check_window = CheckResultsWindow(self.root, [name for name, _, _ in checks],
+                                                   on_cancel=lambda: self.check_job.cancel())
+            self.check_job = self.jobs.submit("System check", self._run_system_check, checks,
+                                              dedicated=True,
+                                              on_done=self.system_check_done,
+                                              on_error=self.check_window.show_error)
         except Exception as e:
             self.logger.error(f"Error during system check: {str(e)}")
             messagebox.showerror("Error", f"System check failed: {str(e)}")
 
+    def _run_system_check(self, job, checks):
+        """Run module checks concurrently, streaming each result to the window"""
+        window = self.check_window
+        completed = []
+
+        def on_result(result):
+            completed.append(result)
+            job.set_progress(len(completed) / len(checks) * 100, f"{result.name}: {result.status}")
+            job.ui(window.show_result, result)
+
+        return SystemCheck(checks, token=job.token).run(on_result)
+
+    def system_check_done(self, results):
+        """Show the timing summary once every module has reported"""
+        self.check_window.show_summary(results)
+        self.logger.info("System check completed\n" + format_check_summary(results))
+        self.export_metrics()
+
     def system_backup(self):
         """Quick access to backup module"""
-        self.notebook.select(self.notebook.children[list(self.notebook.children.keys())[11]])
+        if self.load_module('Backup'):
+            self.notebook.select(self.module_frames['Backup'])
 
     def fix_common_issues(self):
-        """Attempt to fix common system issues"""
+        """Attempt to fix common system issues.
+
+        Module fixes form a dependency graph (FIX_AFTER) and declare the
+        resources they hold (FIX_RESOURCES); fixes that do not conflict run
+        in parallel, anything sharing a resource such as the dpkg lock runs
+        one at a time.
+        """
+        if self.fix_job and self.fix_job.active:
+            self.fix_window.lift()
+            return
         if messagebox.askyesno("Confirm", "Attempt to fix common system issues?"):
             try:
                 self.logger.info("Starting common issues fix...")
-                fixed = []
+                tasks = []
                 
-                # Run fix methods from relevant modules
-                for name, module in self.modules.items():
+                for name, module in self.load_all_modules().items():
                     if hasattr(module, 'fix_common_issues'):
-                        result = module.fix_common_issues()
-                        if result:
-                            fixed.extend([f"[{name}] {fix}" for fix in result])
-
-                if fixed:
-                    result = "Fixed Issues:\n\n" + "\n".join(fixed)
-                    messagebox.showinfo("Fix Results", result)
-                else:
-                    messagebox.showinfo("Fix Results", "No issues fixed")
-                
-                self.logger.info("Common issues fix completed")
+                        tasks.append(FixTask(name, module.fix_common_issues,
+                                             getattr(module, 'FIX_RESOURCES', ()),
+                                             getattr(module, 'FIX_AFTER', ())))
+
+                # Validates the graph before anything runs
+                order = FixScheduler(tasks).order
+                self.fix_window = CheckResultsWindow(self.root, order,
+                                                     on_cancel=lambda: self.fix_job.cancel(),
+                                                     title="Fix Common Issues",
+                                                     item_label="Fixed",
+                                                     format_summary=format_fix_summary)
+                self.fix_job = self.jobs.submit("Fix common issues", self._run_fixes, tasks,
+                                                dedicated=True,
+                                                on_done=self.fixes_done,
+                                                on_error=self.fix_window.show_error)
             except Exception as e:
                 self.logger.error(f"Error fixing common issues: {str(e)}")
                 messagebox.showerror("Error", f"Failed to fix issues: {str(e)}")
 
+    def _run_fixes(self, job, tasks):
+        """Run the fix graph, streaming each result to the window"""
+        window = self.fix_window
+        scheduler = FixScheduler(tasks, token=job.token)
+        completed = []
+
+        def on_start(result):
+            job.set_progress(message=f"Running {result.name}")
+            job.ui(window.show_running, result.name)
+
+        def on_result(result):
+            completed.append(result)
+            job.set_progress(len(completed) / len(scheduler.order) * 100,
+                             f"{result.name}: {result.status}")
+            job.ui(window.show_result, result)
+
+        return scheduler.run(on_result, on_start)
+
+    def fixes_done(self, results):
+        self.fix_window.show_summary(results)
+        self.logger.info("Common issues fix completed\n" + format_fix_summary(results))
+        self.export_metrics()
+
+    def export_metrics(self):
+        """Update the node_exporter textfile when a textfile collector is set up"""
+        if not os.path.isdir(Metrics.TEXTFILE_DIR):
+            return
+        try:
+            Metrics.write_textfile()
+        except Exception as e:
+            self.logger.error(f"Error writing metrics: {str(e)}")
+
     def show_documentation(self):
         """Show program documentation"""
         doc_text = """
@@ -283,15 +507,52 @@ License: GPL v3
         if messagebox.askyesno("Quit", "Are you sure you want to quit?"):
             self.logger.info("Application shutting down...")
             try:
-                # Cleanup modules
+                # Cleanup loaded modules
                 for module in self.modules.values():
                     if hasattr(module, '__del__'):
                         module.__del__()
             except:
                 pass
+            self.export_metrics()
+            # Stop any jobs and commands still running
+            self.jobs.shutdown()
+            get_executor().shutdown()
+            if get_executor().interceptor is not None:
+                from CommandFixtures import stop_fixtures
+                stop_fixtures()
+            self.log_manager.stop()
             self.root.quit()
 
+def profile_imports():
+    """Print the import cost of every module and its deferred dependencies"""
+    from LazyImport import profile_imports as run_profile, format_import_profile
+    results = run_profile([entry[2] for entry in MODULE_REGISTRY])
+    print(format_import_profile(results))
+
 def main():
+    parser = argparse.ArgumentParser(description="Kali Linux Fix All")
+    parser.add_argument('--profile-imports', action='store_true',
+                        help="print per-module import cost table and exit")
+    fixtures = parser.add_mutually_exclusive_group()
+    fixtures.add_argument('--record', metavar='BUNDLE',
+                          help="record every command and its output to a fixture bundle")
+    fixtures.add_argument('--replay', metavar='BUNDLE',
+                          help="answer commands from a fixture bundle instead of running them")
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds added to every replayed command")
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        profile_imports()
+        return
+
+    if args.record:
+        from CommandFixtures import start_recording
+        start_recording(args.record)
+    elif args.replay:
+        from CommandFixtures import start_replay
+        start_replay(args.replay, latency=args.latency)
+
     try:
         app = KaliLinuxFixAll()
         app.root.mainloop()
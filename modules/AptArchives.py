@@ -0,0 +1,301 @@
+# Part 38: APT Archive Cache Analyzer
+import fcntl
+import functools
+import os
+import re
+import threading
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote
+from DpkgStatus import get_dpkg_status
+
+logger = logging.getLogger("KaliFixAll.AptArchives")
+
+APT_ARCHIVES = "/var/cache/apt/archives"
+
+# Versions of each package kept in the cache (installed versions are kept as well)
+KEEP_LATEST = 2
+KEEP_LATEST_ENV = "KALIFIXALL_APT_KEEP_VERSIONS"
+
+# Optional cap on the cache size in bytes, applied after keep-latest
+MAX_BYTES_ENV = "KALIFIXALL_APT_CACHE_MAX"
+
+# Debs are named <package>_<version>_<arch>.deb, with ':' in versions quoted as %3a
+DEB_NAME = re.compile(r'^([^_]+)_([^_]+)_([^_]+)\.deb$')
+
+
+def default_keep_latest() -> int:
+    try:
+        return max(0, int(os.environ[KEEP_LATEST_ENV]))
+    except (KeyError, ValueError):
+        return KEEP_LATEST
+
+
+def default_max_bytes() -> Optional[int]:
+    try:
+        return int(os.environ[MAX_BYTES_ENV])
+    except (KeyError, ValueError):
+        return None
+
+
+def format_bytes(size: float) -> str:
+    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} PB"
+
+
+def _order(char: str) -> int:
+    """Sort weight of a character in the non-digit part of a Debian version"""
+    if char == '~':
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _compare_part(a: str, b: str) -> int:
+    """Compare an upstream version or Debian revision the way dpkg does"""
+    i = j = 0
+    while i < len(a) or j < len(b):
+        # Non-digit prefix, character by character
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ca = _order(a[i]) if i < len(a) and not a[i].isdigit() else 0
+            cb = _order(b[j]) if j < len(b) and not b[j].isdigit() else 0
+            if ca != cb:
+                return -1 if ca < cb else 1
+            i += 1
+            j += 1
+        # Numeric run
+        start = i
+        while i < len(a) and a[i].isdigit():
+            i += 1
+        na = int(a[start:i] or 0)
+        start = j
+        while j < len(b) and b[j].isdigit():
+            j += 1
+        nb = int(b[start:j] or 0)
+        if na != nb:
+            return -1 if na < nb else 1
+    return 0
+
+
+def split_version(version: str) -> Tuple[int, str, str]:
+    epoch, sep, rest = version.partition(':')
+    if not sep:
+        epoch, rest = '0', version
+    upstream, sep, revision = rest.rpartition('-')
+    if not sep:
+        upstream, revision = rest, ''
+    try:
+        return int(epoch), upstream, revision
+    except ValueError:
+        return 0, rest, revision
+
+
+def version_compare(a: str, b: str) -> int:
+    """-1, 0 or 1 as Debian version a sorts before, equal to or after b"""
+    epoch_a, upstream_a, revision_a = split_version(a)
+    epoch_b, upstream_b, revision_b = split_version(b)
+    if epoch_a != epoch_b:
+        return -1 if epoch_a < epoch_b else 1
+    return _compare_part(upstream_a, upstream_b) or _compare_part(revision_a, revision_b)
+
+
+_VERSION_KEY = functools.cmp_to_key(lambda a, b: version_compare(a.version, b.version))
+
+
+class ArchiveDeb:
+    """One downloaded package file in the apt archive cache"""
+
+    __slots__ = ('name', 'version', 'architecture', 'path', 'size', 'mtime', 'installed')
+
+    def __init__(self, name: str, version: str, architecture: str, path: str,
+                 size: int, mtime: float):
+        self.name = name
+        self.version = version
+        self.architecture = architecture
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.installed = False
+
+    @classmethod
+    def from_entry(cls, entry) -> Optional['ArchiveDeb']:
+        match = DEB_NAME.match(entry.name)
+        if not match:
+            return None
+        st = entry.stat()
+        name, version, architecture = match.groups()
+        return cls(name, unquote(version), architecture, entry.path, st.st_size, st.st_mtime)
+
+    def to_dict(self):
+        return {'name': self.name, 'version': self.version, 'architecture': self.architecture,
+                'path': self.path, 'size': self.size, 'installed': self.installed}
+
+    def __repr__(self):
+        return f"ArchiveDeb({self.name!r}, {self.version!r}, {self.architecture!r})"
+
+
+class AptArchiveAnalyzer:
+    """Indexes /var/cache/apt/archives and prunes it by policy instead of apt-get clean.
+
+    Debs are grouped by package and architecture and sorted newest version
+    first. A policy keeps the latest keep_latest versions of each package
+    and, with keep_installed, the version dpkg has installed; max_bytes then
+    caps what is left, dropping the least recently downloaded files that
+    are not installed first. The cache stays warm for reinstalls and repairs.
+    """
+
+    def __init__(self, archives_dir: str = APT_ARCHIVES):
+        self.archives_dir = archives_dir
+
+    def scan(self) -> Dict[Tuple[str, str], List[ArchiveDeb]]:
+        """(package, architecture) -> cached debs, newest version first"""
+        dpkg = get_dpkg_status()
+        groups: Dict[Tuple[str, str], List[ArchiveDeb]] = {}
+        with os.scandir(self.archives_dir) as entries:
+            for entry in entries:
+                try:
+                    deb = ArchiveDeb.from_entry(entry) if entry.is_file() else None
+                except OSError:
+                    continue
+                if deb is None:
+                    continue
+                installed = dpkg.get(deb.name)
+                deb.installed = (installed is not None and installed.present and
+                                 installed.version == deb.version and
+                                 installed.architecture in (deb.architecture, ''))
+                groups.setdefault((deb.name, deb.architecture), []).append(deb)
+        for debs in groups.values():
+            debs.sort(key=_VERSION_KEY, reverse=True)
+        return groups
+
+    def plan(self, keep_latest: Optional[int] = None, keep_installed: bool = True,
+             max_bytes: Optional[int] = None) -> Dict:
+        """Work out which debs a policy keeps and which it prunes, without deleting.
+
+        keep_latest and max_bytes default to KALIFIXALL_APT_KEEP_VERSIONS
+        (or 2) and KALIFIXALL_APT_CACHE_MAX (or no cap).
+        """
+        keep_latest = default_keep_latest() if keep_latest is None else keep_latest
+        max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        keep: List[ArchiveDeb] = []
+        prune: List[ArchiveDeb] = []
+        for debs in self.scan().values():
+            for position, deb in enumerate(debs):
+                if position < keep_latest or (keep_installed and deb.installed):
+                    keep.append(deb)
+                else:
+                    prune.append(deb)
+
+        kept_bytes = sum(deb.size for deb in keep)
+        if max_bytes is not None and kept_bytes > max_bytes:
+            # Installed versions are what a repair reinstalls, so they go last
+            candidates = sorted(keep, key=lambda deb: (keep_installed and deb.installed, deb.mtime))
+            capped = set()
+            for deb in candidates:
+                if kept_bytes <= max_bytes or (keep_installed and deb.installed):
+                    break
+                capped.add(deb.path)
+                prune.append(deb)
+                kept_bytes -= deb.size
+            keep = [deb for deb in keep if deb.path not in capped]
+
+        packages: Dict[str, int] = {}
+        for deb in prune:
+            packages[deb.name] = packages.get(deb.name, 0) + deb.size
+        return {
+            'archives_dir': self.archives_dir,
+            'policy': {'keep_latest': keep_latest, 'keep_installed': keep_installed,
+                       'max_bytes': max_bytes},
+            'total_files': len(keep) + len(prune),
+            'total_bytes': kept_bytes + sum(deb.size for deb in prune),
+            'keep': keep,
+            'prune': prune,
+            'kept_bytes': kept_bytes,
+            'reclaimable_bytes': sum(deb.size for deb in prune),
+            # Reclaimable bytes per package, largest first
+            'by_package': sorted(packages.items(), key=lambda item: item[1], reverse=True),
+        }
+
+    def prune(self, plan: Dict, token=None) -> Dict:
+        """Delete the debs a plan selected, in one pass under apt's archive lock"""
+        removed, freed, errors = 0, 0, []
+        start = time.perf_counter()
+        with self._archive_lock():
+            for deb in plan['prune']:
+                if token is not None and token.cancelled:
+                    break
+                try:
+                    st = os.stat(deb.path)
+                    # Skip files replaced since the plan was made
+                    if st.st_size != deb.size or st.st_mtime != deb.mtime:
+                        continue
+                    os.unlink(deb.path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    errors.append(f"{deb.path}: {e.strerror}")
+                    continue
+                removed += 1
+                freed += deb.size
+        logger.info(f"Pruned {removed} debs ({format_bytes(freed)}) from {self.archives_dir} in "
+                    f"{(time.perf_counter() - start) * 1000:.1f} ms")
+        return {'removed': removed, 'freed_bytes': freed, 'errors': errors}
+
+    def _archive_lock(self):
+        """Hold the lock apt takes on the archive directory while downloading"""
+        return _ArchiveLock(os.path.join(self.archives_dir, "lock"))
+
+    def summary(self, plan: Dict) -> Dict:
+        """A plan as plain data, for the CLI and the log"""
+        return {
+            'archives_dir': plan['archives_dir'],
+            'policy': plan['policy'],
+            'total_files': plan['total_files'],
+            'total_bytes': plan['total_bytes'],
+            'prune_files': len(plan['prune']),
+            'reclaimable_bytes': plan['reclaimable_bytes'],
+            'by_package': [{'name': name, 'bytes': size} for name, size in plan['by_package']],
+        }
+
+
+class _ArchiveLock:
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o640)
+        except OSError as e:
+            raise RuntimeError(f"Cannot open {self.path}: {e.strerror}")
+        try:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self._fd)
+            self._fd = None
+            raise RuntimeError("Another apt process is using the package archive cache")
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+        return False
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_apt_archive_analyzer() -> AptArchiveAnalyzer:
+    """Return the archive cache analyzer shared by all modules"""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = AptArchiveAnalyzer()
+        return _analyzer
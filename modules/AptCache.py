@@ -0,0 +1,193 @@
+# Part 32: Shared APT Cache
+import glob
+import os
+import threading
+import time
+import logging
+from typing import Dict, Optional, Tuple
+from LazyImport import lazy_import
+apt = lazy_import('apt')
+apt_pkg = lazy_import('apt_pkg')
+
+logger = logging.getLogger("KaliFixAll.AptCache")
+
+DPKG_STATUS = "/var/lib/dpkg/status"
+DPKG_UPDATES = "/var/lib/dpkg/updates"
+APT_LISTS = "/var/lib/apt/lists"
+APT_EXTENDED_STATES = "/var/lib/apt/extended_states"
+
+# dpkg states of packages whose install or removal did not finish
+HALF_INSTALLED_STATES = {
+    'half-installed': 'CURSTATE_HALF_INSTALLED',
+    'unpacked': 'CURSTATE_UNPACKED',
+    'half-configured': 'CURSTATE_HALF_CONFIGURED',
+    'triggers-awaited': 'CURSTATE_TRIGGERS_AWAITED',
+    'triggers-pending': 'CURSTATE_TRIGGERS_PENDING',
+}
+
+
+def path_signature(path: str) -> Tuple[int, int]:
+    """(mtime_ns, size) of a file, or (0, 0) if it does not exist"""
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return 0, 0
+
+
+def apt_state_signature() -> Tuple:
+    """Signature of the files apt.Cache is built from.
+
+    Changes when dpkg updates its status database (including the journal in
+    /var/lib/dpkg/updates), when apt-get update replaces index files, or
+    when auto-installed marks change.
+    """
+    lists = sorted(glob.glob(os.path.join(APT_LISTS, "*_Packages*")) +
+                   glob.glob(os.path.join(APT_LISTS, "*Release")))
+    return (path_signature(DPKG_STATUS),
+            path_signature(DPKG_UPDATES),
+            path_signature(APT_EXTENDED_STATES),
+            path_signature(APT_LISTS),
+            tuple((path,) + path_signature(path) for path in lists))
+
+
+def lists_updated() -> Optional[float]:
+    """Unix time of the newest package index, or None if there are none"""
+    times = [os.path.getmtime(path) for path in glob.glob(os.path.join(APT_LISTS, "*_Packages*"))]
+    return max(times) if times else None
+
+
+class AptCacheManager:
+    """One apt.Cache shared by all modules, reopened only when apt's state files change"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cache = None
+        self._signature = None
+        self.opened_at = None
+        self.open_count = 0
+
+    @property
+    def lock(self):
+        """Hold while reading or marking the cache so no reload happens meanwhile"""
+        return self._lock
+
+    def get(self):
+        """Return an up-to-date apt.Cache, opening or reopening it as needed"""
+        with self._lock:
+            signature = apt_state_signature()
+            if self._cache is not None and signature == self._signature:
+                return self._cache
+            start = time.perf_counter()
+            if self._cache is None:
+                self._cache = apt.Cache()
+            else:
+                self._cache.open()
+            self._signature = signature
+            self.opened_at = time.time()
+            self.open_count += 1
+            logger.info(f"APT cache {'re' if self.open_count > 1 else ''}loaded in "
+                        f"{time.perf_counter() - start:.2f}s")
+            return self._cache
+
+    def invalidate(self):
+        """Force a reload on the next get(), e.g. after changing apt configuration"""
+        with self._lock:
+            self._signature = None
+
+    def health(self) -> dict:
+        """Package system health answered from the cache and depcache.
+
+        Reports broken installed packages, held packages, packages left
+        half-installed or awaiting reinstall, and the changes apt-get -f
+        install would make (computed on the depcache, then undone).
+        """
+        with self._lock:
+            cache = self.get()
+            depcache = cache._depcache
+            half_states = {getattr(apt_pkg, const): name
+                           for name, const in HALF_INSTALLED_STATES.items()}
+            reinstall_states = {apt_pkg.INSTSTATE_REINSTREQ, apt_pkg.INSTSTATE_HOLD_REINSTREQ}
+
+            broken = []
+            held = []
+            half_installed = []
+            reinstall = []
+            for pkg in cache._cache.packages:
+                if pkg.selected_state == apt_pkg.SELSTATE_HOLD:
+                    held.append(pkg.name)
+                if pkg.current_state == apt_pkg.CURSTATE_NOT_INSTALLED:
+                    continue
+                if pkg.current_state in half_states:
+                    half_installed.append((pkg.name, half_states[pkg.current_state]))
+                if pkg.inst_state in reinstall_states:
+                    reinstall.append(pkg.name)
+                if depcache.is_inst_broken(pkg):
+                    broken.append(pkg.name)
+
+            return {
+                'source': 'apt-cache',
+                'broken_count': depcache.broken_count,
+                'broken': sorted(broken),
+                'check_errors': "",
+                'held': sorted(held),
+                'half_installed': sorted(half_installed),
+                'reinstall_required': sorted(reinstall),
+                'fix_plan': self.fix_plan() if depcache.broken_count else None,
+                'lists_updated': lists_updated(),
+            }
+
+    def fix_plan(self) -> Dict[str, object]:
+        """Dry run of apt-get -f install on the depcache; the cache is left unmarked"""
+        with self._lock:
+            cache = self.get()
+            try:
+                with cache.actiongroup():
+                    cache._depcache.fix_broken()
+                plan = {'install': [], 'upgrade': [], 'downgrade': [], 'remove': []}
+                for pkg in cache.get_changes():
+                    if pkg.marked_delete:
+                        plan['remove'].append(pkg.name)
+                    elif pkg.marked_install:
+                        plan['install'].append(pkg.name)
+                    elif pkg.marked_upgrade:
+                        plan['upgrade'].append(pkg.name)
+                    elif pkg.marked_downgrade:
+                        plan['downgrade'].append(pkg.name)
+                plan['download_bytes'] = cache.required_download
+                plan['space_bytes'] = cache.required_space
+                plan['resolved'] = cache._depcache.broken_count == 0
+            except SystemError as e:
+                plan = {'error': str(e), 'resolved': False}
+            finally:
+                cache.clear()
+            return plan
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_apt_cache_manager() -> AptCacheManager:
+    """Return the APT cache manager shared by all modules"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = AptCacheManager()
+        return _manager
+
+
+def format_fix_plan(plan: Optional[dict]) -> str:
+    if not plan:
+        return "Nothing to do."
+    if plan.get('error'):
+        return f"apt cannot resolve the broken packages: {plan['error']}"
+    lines = []
+    for action in ('install', 'upgrade', 'downgrade', 'remove'):
+        if plan[action]:
+            lines.append(f"{action.capitalize()} ({len(plan[action])}): {' '.join(plan[action])}")
+    lines.append(f"Download: {plan['download_bytes'] / 1024 / 1024:.1f} MB, "
+                 f"disk space change: {plan['space_bytes'] / 1024 / 1024:+.1f} MB")
+    if not plan['resolved']:
+        lines.append("Some packages would still be broken afterwards.")
+    return "\n".join(lines)
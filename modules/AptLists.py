@@ -0,0 +1,203 @@
+# Part 37: Package List Freshness
+import glob
+import os
+import shlex
+import threading
+import time
+import logging
+from typing import Callable, Optional
+from CommandExecutor import execute
+from PackageFiles import CACHE_DIR, writable_cache_dir
+from AptProgress import format_duration
+
+logger = logging.getLogger("KaliFixAll.AptLists")
+
+APT_LISTS = "/var/lib/apt/lists"
+SOURCES_LIST = "/etc/apt/sources.list"
+SOURCES_PARTS = "/etc/apt/sources.list.d"
+# Written by apt.systemd.daily after a successful periodic update
+PERIODIC_STAMP = "/var/lib/apt/periodic/update-success-stamp"
+STAMP_NAME = "apt-update-stamp"
+
+# Package lists younger than this are not updated again (seconds);
+# KALIFIXALL_APT_MAX_AGE overrides it
+DEFAULT_MAX_AGE = 6 * 3600
+MAX_AGE_ENV = "KALIFIXALL_APT_MAX_AGE"
+
+# After a failed update, wait this long before trying again unless forced
+FAILURE_BACKOFF = 300
+
+
+def default_max_age() -> float:
+    try:
+        return float(os.environ[MAX_AGE_ENV])
+    except (KeyError, ValueError):
+        return DEFAULT_MAX_AGE
+
+
+def newest_mtime(paths) -> Optional[float]:
+    times = []
+    for path in paths:
+        try:
+            times.append(os.path.getmtime(path))
+        except OSError:
+            continue
+    return max(times) if times else None
+
+
+class AptListUpdater:
+    """Runs apt-get update only when the package lists are out of date.
+
+    The lists count as fresh when the last successful update (ours, the
+    periodic apt job's, or the newest Release file) is younger than
+    max_age and no sources file changed since. Concurrent callers share a
+    single update. The paths can point at a scratch lists directory and a
+    sources file using a file: repository, so the policy can be exercised
+    without touching the system's apt state.
+    """
+
+    def __init__(self, max_age: Optional[float] = None, lists_dir: str = APT_LISTS,
+                 sources: str = SOURCES_LIST, source_parts: str = SOURCES_PARTS,
+                 cache_dir: str = CACHE_DIR):
+        self.max_age = default_max_age() if max_age is None else max_age
+        self.lists_dir = lists_dir
+        self.sources = sources
+        self.source_parts = source_parts
+        # A scratch lists directory keeps its own stamp
+        stamp_dir = writable_cache_dir(cache_dir) if self.system_lists else lists_dir
+        self.stamp = os.path.join(stamp_dir, STAMP_NAME)
+        self._lock = threading.Lock()
+        self._inflight = None
+        self._last_outcome = None
+        self._last_failure = None
+        self.update_count = 0
+
+    @property
+    def system_lists(self) -> bool:
+        return self.lists_dir == APT_LISTS
+
+    def last_update(self) -> Optional[float]:
+        """Unix time the package lists were last known to be refreshed"""
+        paths = glob.glob(os.path.join(self.lists_dir, "*Release")) + [self.stamp]
+        if self.system_lists:
+            paths.append(PERIODIC_STAMP)
+        return newest_mtime(paths)
+
+    def sources_updated(self) -> Optional[float]:
+        """Unix time the apt sources were last changed"""
+        paths = [self.sources, self.source_parts]
+        paths += glob.glob(os.path.join(self.source_parts, "*.list"))
+        paths += glob.glob(os.path.join(self.source_parts, "*.sources"))
+        return newest_mtime(paths)
+
+    def freshness(self) -> dict:
+        """Whether the lists need updating, and why"""
+        now = time.time()
+        updated = self.last_update()
+        sources = self.sources_updated()
+        age = None if updated is None else max(0.0, now - updated)
+        if updated is None:
+            stale, reason = True, "package lists have never been updated"
+        elif sources is not None and sources > updated:
+            stale, reason = True, "apt sources changed since the last update"
+        elif age > self.max_age:
+            stale, reason = True, (f"package lists are {format_duration(age)} old "
+                                   f"(max {format_duration(self.max_age)})")
+        else:
+            stale, reason = False, (f"package lists are {format_duration(age)} old "
+                                    f"(max {format_duration(self.max_age)})")
+        return {'last_update': updated, 'age': age, 'max_age': self.max_age,
+                'stale': stale, 'reason': reason}
+
+    def update_command(self) -> str:
+        """apt-get update, pointed at the configured lists and sources"""
+        command = "apt-get update"
+        if not self.system_lists:
+            options = {
+                'Dir::State::Lists': self.lists_dir,
+                'Dir::Etc::SourceList': self.sources,
+                'Dir::Etc::SourceParts': self.source_parts,
+                'Dir::Cache::pkgcache': '',
+                'Dir::Cache::srcpkgcache': '',
+            }
+            command += "".join(f" -o {shlex.quote(f'{key}={value}')}"
+                               for key, value in options.items())
+        return command
+
+    def ensure_fresh(self, token=None, force: bool = False,
+                     on_output: Optional[Callable[[str], None]] = None) -> dict:
+        """Update the package lists if they are stale (or force is set).
+
+        Returns the freshness check plus 'updated' (True if apt-get update
+        ran and succeeded), 'error' and 'message'. A caller arriving while
+        another update runs waits for it and gets its outcome.
+        """
+        with self._lock:
+            inflight = self._inflight
+            if inflight is None:
+                status = self.freshness()
+                in_backoff = (self._last_failure is not None and
+                              time.time() - self._last_failure < FAILURE_BACKOFF)
+                if not force and (not status['stale'] or in_backoff):
+                    if status['stale']:
+                        status['reason'] += "; the last update failed, not retrying yet"
+                    return dict(status, updated=False, error=None,
+                                message=f"Not updating: {status['reason']}")
+                self._inflight = inflight = threading.Event()
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            while not inflight.wait(0.5):
+                if token is not None and token.cancelled:
+                    break
+            return dict(self._last_outcome or self.freshness(), shared=True)
+
+        outcome = None
+        try:
+            reason = "update requested" if force else status['reason']
+            logger.info(f"Updating package lists: {reason}")
+            result = execute(self.update_command(), token=token, on_output=on_output)
+            if result.ok:
+                try:
+                    with open(self.stamp, 'a'):
+                        os.utime(self.stamp)
+                except OSError as e:
+                    logger.warning(f"Cannot record the update time in {self.stamp}: {str(e)}")
+                self._last_failure = None
+                self.update_count += 1
+                outcome = dict(self.freshness(), updated=True, error=None,
+                               message=f"Package lists updated ({reason})")
+            else:
+                self._last_failure = time.time()
+                error = (result.stderr or result.stdout).strip()
+                outcome = dict(self.freshness(), updated=False, error=error,
+                               message=f"apt-get update failed: {error}")
+            return outcome
+        finally:
+            with self._lock:
+                self._last_outcome = outcome
+                self._inflight = None
+            inflight.set()
+
+
+def refresh_lists(job, write: Callable[[str], None]) -> dict:
+    """Update the package lists from a job if they are stale, reporting through write"""
+    write("Updating package lists...\n")
+    outcome = get_apt_list_updater().ensure_fresh(job.token, on_output=write)
+    write(outcome['message'] + "\n\n")
+    return outcome
+
+
+_updater = None
+_updater_lock = threading.Lock()
+
+
+def get_apt_list_updater() -> AptListUpdater:
+    """Return the package list updater shared by all modules"""
+    global _updater
+    with _updater_lock:
+        if _updater is None:
+            _updater = AptListUpdater()
+        return _updater
@@ -0,0 +1,199 @@
+# Part 35: Streaming APT Progress
+import tkinter as tk
+from tkinter import ttk
+import re
+import time
+from typing import Callable, List, Optional, Tuple
+from CommandExecutor import execute, CommandResult
+
+# apt-get and apt write machine-readable progress to this fd; 1 interleaves
+# it with the normal output, which is split apart again by AptProgress.feed
+APT_STATUS_OPTIONS = "-o APT::Status-Fd=1 -o Dpkg::Use-Pty=0"
+DPKG_STATUS_OPTIONS = "--status-fd 1"
+
+APT_PROGRAM = re.compile(r'(^|\s)(apt-get|apt)(?=\s)')
+DPKG_PROGRAM = re.compile(r'(^|\s)(dpkg)(?=\s)')
+
+PHASES = {'dlstatus': 'Downloading', 'pmstatus': 'Installing'}
+
+# Seconds a phase must have run before its rate is used for an ETA
+MIN_ETA_ELAPSED = 2.0
+
+
+def with_status_fd(command: str) -> str:
+    """Add the options that make apt-get/apt or dpkg report progress on stdout"""
+    if APT_PROGRAM.search(command):
+        return APT_PROGRAM.sub(rf'\1\2 {APT_STATUS_OPTIONS}', command, count=1)
+    if DPKG_PROGRAM.search(command):
+        return DPKG_PROGRAM.sub(rf'\1\2 {DPKG_STATUS_OPTIONS}', command, count=1)
+    return command
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class AptProgress:
+    """Progress parsed from an APT::Status-Fd (or dpkg --status-fd) stream.
+
+    apt reports dlstatus:<n>:<percent>:<text> while downloading and
+    pmstatus:<package>:<percent>:<text> while dpkg runs; each phase counts
+    from 0 to 100. dpkg alone only reports the package it is processing.
+    """
+
+    def __init__(self):
+        self.phase = None
+        self.percent = None
+        self.package = ""
+        self.action = ""
+        self.errors = []
+        self.conffiles = []
+        self._phase_started = None
+
+    def feed(self, line: str) -> bool:
+        """Consume a status line and return True; return False for normal output"""
+        kind, sep, rest = line.partition(':')
+        if not sep:
+            return False
+        if kind in PHASES:
+            package, _, rest = rest.partition(':')
+            percent, _, action = rest.partition(':')
+            try:
+                percent = float(percent)
+            except ValueError:
+                return False
+            if PHASES[kind] != self.phase:
+                self.phase = PHASES[kind]
+                self._phase_started = time.monotonic()
+            self.percent = percent
+            if kind == 'pmstatus':
+                self.package = package
+            self.action = action.strip()
+            return True
+        if kind == 'pmerror':
+            package, _, rest = rest.partition(':')
+            self.errors.append(f"{package}: {rest.partition(':')[2].strip()}")
+            return True
+        if kind == 'pmconffile':
+            self.conffiles.append(rest.partition(':')[0].strip("'"))
+            return True
+        if kind == 'media-change':
+            return True
+        if kind in ('status', 'processing'):
+            # dpkg --status-fd: "processing: configure: pkg" or "status: pkg: state"
+            parts = [part.strip() for part in rest.split(':')]
+            if kind == 'processing' and len(parts) >= 2:
+                if self.phase != 'Configuring':
+                    self.phase = 'Configuring'
+                    self.percent = None
+                self.action, self.package = parts[0], parts[1]
+            elif kind == 'status' and len(parts) >= 2:
+                self.package = parts[0]
+                self.action = parts[-1]
+            return True
+        return False
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds left in the current phase"""
+        if not self.percent or self._phase_started is None or self.percent >= 100:
+            return None
+        elapsed = time.monotonic() - self._phase_started
+        if elapsed < MIN_ETA_ELAPSED:
+            return None
+        return elapsed * (100 - self.percent) / self.percent
+
+    def format(self) -> str:
+        parts = [self.phase or "Working"]
+        if self.percent is not None:
+            parts.append(f"{self.percent:.0f}%")
+        if self.package:
+            parts.append(self.package)
+        if self.action:
+            parts.append(f"- {self.action}")
+        eta = format_duration(self.eta)
+        if eta:
+            parts.append(f"(ETA {eta})")
+        return " ".join(parts)
+
+
+def run_with_progress(command: str, on_line: Optional[Callable[[str], None]] = None,
+                      on_progress: Optional[Callable[[AptProgress], None]] = None,
+                      token=None, timeout: Optional[float] = None,
+                      progress: Optional[AptProgress] = None) -> CommandResult:
+    """Run an apt-get/apt/dpkg command, streaming output lines and progress.
+
+    on_line receives the normal output a line at a time (without the
+    newline), on_progress the AptProgress after every status update. The
+    result's stdout holds everything, status lines included. Pass progress to read the errors and
+    conffile prompts dpkg reported once the command has finished.
+    """
+    progress = progress if progress is not None else AptProgress()
+
+    def on_output(line: str):
+        line = line.rstrip('\n')
+        if progress.feed(line):
+            if on_progress:
+                on_progress(progress)
+        elif on_line:
+            on_line(line)
+
+    return execute(with_status_fd(command), on_output=on_output, token=token, timeout=timeout)
+
+
+def run_steps(job, steps: List[Tuple[str, str]], write: Callable[[str], None],
+              show_progress: Callable[[Optional[float], str], None]) -> List[CommandResult]:
+    """Run (message, command) steps in a job, streaming into a module's tab.
+
+    write(text) appends output and show_progress(percent, text) updates the
+    progress display; both must be safe to call from the job thread (e.g.
+    methods decorated with ui_thread). Stops early if the job is cancelled.
+    """
+    results = []
+    for message, command in steps:
+        job.check_cancelled()
+        write(message + "\n")
+        show_progress(0, message)
+        job.set_progress(message=message)
+
+        def on_progress(current: AptProgress):
+            text = current.format()
+            show_progress(current.percent, text)
+            job.set_progress(current.percent, text)
+
+        progress = AptProgress()
+        result = run_with_progress(command, on_line=lambda line: write(line + "\n"),
+                                   on_progress=on_progress, token=job.token,
+                                   progress=progress)
+        for error in progress.errors:
+            write(f"Error: {error}\n")
+        if result.stderr.strip():
+            write(result.stderr.rstrip() + "\n")
+        write("\n")
+        results.append(result)
+        job.check_cancelled()
+    show_progress(100, "Done")
+    return results
+
+
+class AptProgressBar(ttk.Frame):
+    """Progress bar and status line for a streamed apt or dpkg run"""
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.value = tk.DoubleVar(value=0)
+        self.text = tk.StringVar(value="")
+        ttk.Progressbar(self, variable=self.value, maximum=100).pack(fill='x')
+        ttk.Label(self, textvariable=self.text).pack(anchor='w')
+
+    def show(self, percent: Optional[float], text: str):
+        self.text.set(text)
+        if percent is not None:
+            self.value.set(percent)
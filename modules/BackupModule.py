@@ -5,8 +5,9 @@ import os
 from pathlib import Path
 import shutil
 import datetime
-import threading
 import json
+from CommandExecutor import execute, check_call
+from JobRunner import get_job_runner, ui_thread
 
 class BackupModule:
     def __init__(self, parent_notebook):
@@ -37,7 +38,8 @@ class BackupModule:
         self.create_interface()
         
         # Initialize status variables
-        self.backup_thread = None
+        self.jobs = get_job_runner()
+        self.backup_job = None
         self.stop_backup = False
     
     def create_interface(self):
@@ -233,16 +235,21 @@ class BackupModule:
             'create_subfolder': self.subfolder_var.get()
         })
         
-        # Start backup thread
-        self.stop_backup = False
+        if self.backup_job and self.backup_job.active:
+            messagebox.showinfo("Info", "A backup is already in progress")
+            
+            return
         
-        self.backup_thread = threading.Thread(target=self._perform_backup)
+        # Start backup job
+        self.stop_backup = False
         
-        self.backup_thread.start()
+        self.backup_job = self.jobs.submit("Backup", self._perform_backup, owner=self)
     
-    def _perform_backup(self):
+    def _perform_backup(self, job):
         """Perform the actual backup operation"""
         
+        job.token.add_callback(self._request_stop)
+        
         try:
             # Create destination directory if needed
             dest_base = self.backup_config['destination']
@@ -277,12 +284,12 @@ class BackupModule:
             if not self.stop_backup:
                 self.update_status("Backup completed successfully")
                 
-                messagebox.showinfo("Success", "Backup completed successfully")
+                job.ui(messagebox.showinfo, "Success", "Backup completed successfully")
         
         except Exception as e:
             self.update_status(f"Error: {str(e)}")
             
-            messagebox.showerror("Error", f"Backup failed: {str(e)}")
+            job.ui(messagebox.showerror, "Error", f"Backup failed: {str(e)}")
     
     def _backup_file(self, source: Path, dest_base: str) -> int:
         """Backup a single file"""
@@ -451,19 +458,18 @@ class BackupModule:
         
         try:
             # Check if 7z is installed
-            if subprocess.call(['which', '7z'], stdout=subprocess.PIPE) != 0:
+            if execute(['which', '7z']).returncode != 0:
                 raise Exception("7z is not installed. Please install p7zip-full package.")
             
             # Compress file
-            subprocess.run(['7z', 'a', compressed_path, filepath],
-                           check=True, capture_output=True)
+            check_call(['7z', 'a', compressed_path, filepath])
             
             os.remove(filepath)
             
             return compressed_path
         
         except subprocess.CalledProcessError as e:
-            raise Exception(f"7z compression failed: {e.stderr.decode()}")
+            raise Exception(f"7z compression failed: {e.stderr}")
     
     def _calculate_total_size(self) -> int:
         """Calculate total size of all source files"""
@@ -488,14 +494,19 @@ class BackupModule:
     def stop_current_operation(self):
         """Stop current backup operation"""
         
-        if self.backup_thread and self.backup_thread.is_alive():
-            self.stop_backup = True
-            
-            self.update_status("Stopping backup operation...")
+        if self.backup_job and self.backup_job.active:
+            self.backup_job.cancel()
             
         else:
             messagebox.showinfo("Info", "No backup operation in progress")
     
+    def _request_stop(self):
+        """Stop the backup loop when its job is cancelled"""
+        
+        self.stop_backup = True
+        
+        self.update_status("Stopping backup operation...")
+    
     def clear_all(self):
         """Clear all selections and reset interface"""
         
@@ -517,13 +528,18 @@ class BackupModule:
         
         self.output.delete(1.0, tk.END)
     
+    @ui_thread
     def update_status(self, message: str):
         """Update status label"""
         
         self.status_var.set(message)
         
         self.update_output(f"{message}\n")
+        
+        if self.backup_job and self.backup_job.active:
+            self.backup_job.set_progress(message=message)
     
+    @ui_thread
     def update_output(self, message: str):
         """Update output text"""
         
@@ -531,12 +547,14 @@ class BackupModule:
         
         self.output.see(tk.END)
     
+    @ui_thread
     def update_progress(self, value: float):
         """Update progress bar"""
         
         self.progress_var.set(value)
         
-        self.backup_frame.update_idletasks()
+        if self.backup_job and self.backup_job.active:
+            self.backup_job.set_progress(value)
     
     def save_config(self):
         """Save backup configuration to file"""
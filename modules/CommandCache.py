@@ -0,0 +1,297 @@
+# Part 26: Command Output Cache
+import os
+import re
+import shlex
+import threading
+import time
+import logging
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger("KaliFixAll.CommandCache")
+
+# Cache tags. A cached command carries the tags of the state it reads; a
+# mutating command drops every entry carrying one of the tags it changes.
+PACKAGES = 'packages'
+KERNEL_MODULES = 'kernel-modules'
+DEVICES = 'devices'
+KERNEL_LOG = 'kernel-log'
+SERVICES = 'services'
+
+# Read-only commands worth caching: program -> (ttl seconds, tags).
+# Only the invocations accepted by is_query() are cached.
+CACHE_RULES = {
+    'lsmod': (10, {KERNEL_MODULES}),
+    'lspci': (300, {DEVICES, KERNEL_MODULES}),
+    'lsusb': (30, {DEVICES}),
+    'dmesg': (10, {KERNEL_LOG}),
+    'dpkg': (120, {PACKAGES}),
+    'dpkg-query': (120, {PACKAGES}),
+    'apt-cache': (600, {PACKAGES}),
+    'apt-mark': (120, {PACKAGES}),
+    'systemctl': (5, {SERVICES}),
+}
+
+# Filters that may follow a cached command in a pipeline without changing
+# whether the result can be cached
+PIPE_FILTERS = {'grep', 'egrep', 'wc', 'head', 'tail', 'sort', 'uniq', 'cut', 'awk', 'sed', 'tr'}
+
+# Query forms of programs that can also change the system
+DPKG_QUERIES = {'-l', '--list', '-s', '--status', '-S', '--search', '-L', '--listfiles',
+                '-p', '--print-avail', '--get-selections', '-W', '--show', '-C', '--audit',
+                '--print-architecture', '--print-foreign-architectures', '--compare-versions'}
+SYSTEMCTL_QUERIES = {'status', 'show', 'is-active', 'is-enabled', 'is-failed', 'list-units',
+                     'list-unit-files', 'list-dependencies', 'list-timers', 'cat', '--failed'}
+APT_MARK_QUERIES = {'showhold', 'showauto', 'showmanual'}
+
+# apt subcommands and options that only read state and never lock
+APT_PROGRAMS = {'apt-get', 'apt', 'aptitude'}
+APT_READ_ONLY = {'check', 'source', 'download', 'changelog', 'showsrc', 'search', 'show',
+                 'list', 'policy', 'depends', 'rdepends', 'why', 'why-not'}
+APT_SIMULATE = {'-s', '--simulate', '--just-print', '--dry-run', '--recon', '--no-act',
+                '--print-uris'}
+
+# Commands that change state, by program: the tags they invalidate
+MUTATIONS = {
+    'apt-get': {PACKAGES, KERNEL_MODULES, SERVICES},
+    'apt': {PACKAGES, KERNEL_MODULES, SERVICES},
+    'aptitude': {PACKAGES, KERNEL_MODULES, SERVICES},
+    'dpkg': {PACKAGES, KERNEL_MODULES, SERVICES},
+    'apt-mark': {PACKAGES},
+    'modprobe': {KERNEL_MODULES, DEVICES, KERNEL_LOG},
+    'insmod': {KERNEL_MODULES, DEVICES, KERNEL_LOG},
+    'rmmod': {KERNEL_MODULES, DEVICES, KERNEL_LOG},
+    'dkms': {KERNEL_MODULES},
+    'udevadm': {DEVICES},
+    'systemctl': {SERVICES},
+    'service': {SERVICES},
+}
+
+# Leading VAR=value assignments and wrappers that run another program
+ENV_ASSIGNMENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+COMMAND_WRAPPERS = {'sudo', 'nice', 'ionice', 'env', 'stdbuf'}
+SEGMENT_SEPARATORS = {'|', '||', '&', '&&', ';'}
+REDIRECTIONS = {'>', '>>', '<', '<<', '2>', '&>'}
+
+
+def split_segments(command) -> List[List[str]]:
+    """Split a command into the argument lists of the programs it runs.
+
+    Pipelines and command lists give one list per program; wrappers such as
+    sudo and leading VAR=value assignments are dropped.
+    """
+    if isinstance(command, str):
+        try:
+            lexer = shlex.shlex(command, posix=True, punctuation_chars='|&;<>')
+            lexer.whitespace_split = True
+            tokens = list(lexer)
+        except ValueError:
+            tokens = command.split()
+    else:
+        tokens = list(command)
+
+    segments = [[]]
+    for token in tokens:
+        if token in SEGMENT_SEPARATORS:
+            segments.append([])
+        else:
+            segments[-1].append(token)
+
+    programs = []
+    for segment in segments:
+        while segment and (os.path.basename(segment[0]) in COMMAND_WRAPPERS or
+                           segment[0].startswith('-') or ENV_ASSIGNMENT.match(segment[0])):
+            segment = segment[1:]
+        if segment:
+            programs.append([os.path.basename(segment[0])] + segment[1:])
+    return programs
+
+
+def subcommand(args: List[str]) -> Optional[str]:
+    """Return the first non-option argument after the program name"""
+    for arg in args[1:]:
+        if not arg.startswith('-'):
+            return arg
+    return None
+
+
+def is_query(args: List[str]) -> bool:
+    """Return True if a program invocation only reads state"""
+    program = args[0]
+    if program in ('dpkg', 'dpkg-query'):
+        return program == 'dpkg-query' or any(arg.split('=')[0] in DPKG_QUERIES for arg in args[1:])
+    if program == 'systemctl':
+        return (subcommand(args) or '--failed') in SYSTEMCTL_QUERIES or '--failed' in args
+    if program == 'apt-mark':
+        return subcommand(args) in APT_MARK_QUERIES
+    if program in APT_PROGRAMS:
+        return subcommand(args) in APT_READ_ONLY or any(arg in APT_SIMULATE for arg in args)
+    if program == 'dmesg':
+        return not any(arg in ('-c', '--read-clear', '-C', '--clear') for arg in args)
+    return program in CACHE_RULES
+
+
+def cache_policy(command) -> Optional[Tuple[float, FrozenSet[str]]]:
+    """Return (ttl, tags) if the output of command may be cached, else None"""
+    if isinstance(command, str) and any(op in command for op in REDIRECTIONS if op != '<'):
+        return None
+    ttl = None
+    tags = set()
+    for args in split_segments(command):
+        program = args[0]
+        if program in CACHE_RULES and is_query(args):
+            rule_ttl, rule_tags = CACHE_RULES[program]
+            ttl = rule_ttl if ttl is None else min(ttl, rule_ttl)
+            tags |= rule_tags
+        elif program not in PIPE_FILTERS:
+            return None
+    if ttl is None:
+        return None
+    return ttl, frozenset(tags)
+
+
+def mutation_tags(command) -> FrozenSet[str]:
+    """Return the cache tags a command invalidates (empty for read-only commands)"""
+    tags = set()
+    for args in split_segments(command):
+        program = args[0]
+        if program in MUTATIONS and not is_query(args):
+            tags |= MUTATIONS[program]
+    return frozenset(tags)
+
+
+class CacheEntry:
+    """A cached command result"""
+
+    def __init__(self, result, ttl: float, tags: FrozenSet[str]):
+        self.result = result
+        self.tags = tags
+        self.expires = time.monotonic() + ttl
+
+
+class CommandCache:
+    """Memoizes the output of read-only commands for a short time.
+
+    Concurrent requests for the same command share one execution. Entries
+    are dropped when their TTL expires or when a command changing the state
+    they describe (an apt install, a modprobe, a systemctl restart) runs.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: Dict[str, CacheEntry] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.program_stats: Dict[str, List[int]] = {}
+
+    @staticmethod
+    def key(command) -> str:
+        return command if isinstance(command, str) else ' '.join(command)
+
+    def get_or_run(self, command, ttl: float, tags: FrozenSet[str], run):
+        """Return the cached result of command, calling run() to produce it on a miss"""
+        key = self.key(command)
+        programs = split_segments(command)
+        program = programs[0][0] if programs else key
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires > time.monotonic():
+                    self._count(program, hit=True)
+                    return entry.result
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    self._inflight[key] = threading.Event()
+                    generation = self._generation(tags)
+                    self._count(program, hit=False)
+                    break
+            # Someone else is running the same command; wait and reuse its result
+            waiter.wait()
+
+        try:
+            result = run()
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+        with self._lock:
+            # Don't store output read while a mutation of the same state ran
+            if (not result.timed_out and not result.cancelled and
+                    self._generation(tags) == generation):
+                self._entries[key] = CacheEntry(result, ttl, tags)
+        return result
+
+    def invalidate(self, *tags: str):
+        """Drop every entry carrying one of tags, or everything when no tag is given"""
+        with self._lock:
+            if not tags:
+                dropped = len(self._entries)
+                self._entries.clear()
+                for tag in self._generations:
+                    self._generations[tag] += 1
+            else:
+                stale = [key for key, entry in self._entries.items() if entry.tags & set(tags)]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+                for tag in tags:
+                    self._generations[tag] = self._generations.get(tag, 0) + 1
+            self.invalidations += 1
+        logger.debug(f"Invalidated {dropped} cached command(s) for {', '.join(tags) or 'all'}")
+
+    def clear(self):
+        self.invalidate()
+
+    def _generation(self, tags) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in sorted(tags))
+
+    def _count(self, program: str, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        stats = self.program_stats.setdefault(program, [0, 0])
+        stats[0 if hit else 1] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'entries': sum(1 for entry in self._entries.values() if entry.expires > now),
+                'programs': {program: {'hits': hits, 'misses': misses}
+                             for program, (hits, misses) in sorted(self.program_stats.items())},
+            }
+
+    def format_stats(self) -> str:
+        """Format the hit/miss counters as a table"""
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        rate = 100.0 * stats['hits'] / lookups if lookups else 0.0
+        lines = [f"Command cache: {'enabled' if stats['enabled'] else 'disabled'}, "
+                 f"{stats['entries']} live entries, {stats['invalidations']} invalidations",
+                 f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {rate:.1f}%",
+                 "",
+                 f"{'Program':<16} {'Hits':>8} {'Misses':>8}"]
+        lines.append("-" * 34)
+        for program, counts in stats['programs'].items():
+            lines.append(f"{program:<16} {counts['hits']:>8} {counts['misses']:>8}")
+        return "\n".join(lines)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_command_cache() -> CommandCache:
+    """Return the command cache shared by all modules"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CommandCache()
+        return _cache
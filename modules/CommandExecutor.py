@@ -0,0 +1,481 @@
+# Part 22: Shared Command Executor
+import os
+import re
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, List, Optional, Union
+from CommandCache import CommandCache, get_command_cache, cache_policy, mutation_tags
+from Tracing import span
+from Metrics import record_command
+from PackageQueue import get_package_queue, is_package_mutation
+
+logger = logging.getLogger("KaliFixAll.CommandExecutor")
+
+# Default timeouts (seconds) by program name; 0 means no limit.
+# Anything not listed gets DEFAULT_TIMEOUT.
+DEFAULT_TIMEOUT = 120
+PROGRAM_TIMEOUTS = {
+    'ping': 15,
+    'apt-get': 1800,
+    'apt': 1800,
+    'dpkg': 1800,
+    'dpkg-reconfigure': 1800,
+    'find': 600,
+    'badblocks': 0,
+    'dd': 0,
+    'fsck': 0,
+    'e2fsck': 0,
+    'xfs_repair': 0,
+    'btrfs': 0,
+    'ntfsfix': 0,
+    'mkfs': 0,
+    'mkfs.vfat': 0,
+    'mkfs.ext4': 0,
+    'mkfs.ntfs': 0,
+    'mkfs.exfat': 0,
+    'rsync': 0,
+    'tar': 0,
+    '7z': 0,
+}
+
+# Wrappers that run another program; the timeout is looked up for the wrapped one
+COMMAND_WRAPPERS = {'sudo', 'nice', 'ionice', 'env', 'stdbuf'}
+
+# Leading VAR=value assignments, e.g. DEBIAN_FRONTEND=noninteractive
+ENV_ASSIGNMENT = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*=')
+
+# Time allowed for a process to exit after SIGTERM before it is killed
+TERMINATE_GRACE = 3
+
+
+class CommandResult:
+    """Structured result of a single command execution"""
+
+    def __init__(self, command, stdout="", stderr="", returncode=1, duration=0.0,
+                 timed_out=False, cancelled=False):
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode = returncode
+        self.duration = duration
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+    def as_tuple(self):
+        """Return (output, error, returncode) as the module run_command helpers do"""
+        return self.stdout, self.stderr, self.returncode
+
+    def to_dict(self):
+        return {
+            'command': self.command,
+            'stdout': self.stdout,
+            'stderr': self.stderr,
+            'returncode': self.returncode,
+            'duration': round(self.duration, 4),
+            'timed_out': self.timed_out,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['command'], data.get('stdout', ""), data.get('stderr', ""),
+                   data.get('returncode', 1), data.get('duration', 0.0),
+                   timed_out=data.get('timed_out', False))
+
+    def __repr__(self):
+        return (f"CommandResult(command={self.command!r}, returncode={self.returncode}, "
+                f"duration={self.duration:.3f}, timed_out={self.timed_out}, "
+                f"cancelled={self.cancelled})")
+
+
+class CancellationToken:
+    """Token that can be passed to one or more commands to cancel them"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def cancel(self):
+        """Cancel every command using this token"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug(f"Cancellation callback failed: {str(e)}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def add_callback(self, callback: Callable[[], None]):
+        """Register a callback to run on cancellation (runs now if already cancelled)"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+
+class CommandExecutor:
+    """Runs external commands with bounded concurrency, timeouts and cancellation"""
+
+    def __init__(self, max_workers: Optional[int] = None, cache: Optional[CommandCache] = None):
+        if max_workers is None:
+            max_workers = min(8, (os.cpu_count() or 2) * 2)
+        self.max_workers = max_workers
+        self.cache = cache if cache is not None else get_command_cache()
+        # Optional recorder/replayer (see CommandFixtures) that every command goes through
+        self.interceptor = None
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix="command")
+        self._active_lock = threading.Lock()
+        self._active = set()
+
+    @staticmethod
+    def prepare(command: Union[str, List[str]], shell: bool = False):
+        """Return (args, shell) for Popen.
+
+        String commands are split with shlex so quoted arguments survive.
+        The shell is only used when the caller asks for it with shell=True;
+        without it, pipes and redirections are passed on as plain arguments.
+        """
+        if not isinstance(command, str):
+            return list(command), False
+        if shell:
+            return command, True
+        try:
+            return shlex.split(command), False
+        except ValueError:
+            # Unbalanced quotes; fall back to plain whitespace splitting
+            return command.split(), False
+
+    @staticmethod
+    def default_timeout(args) -> float:
+        """Return the default timeout for a command, 0 meaning unlimited"""
+        if isinstance(args, str):
+            try:
+                args = shlex.split(args)
+            except ValueError:
+                args = args.split()
+        for arg in args:
+            if arg.startswith('-') or ENV_ASSIGNMENT.match(arg):
+                continue
+            program = os.path.basename(arg)
+            if program in COMMAND_WRAPPERS:
+                continue
+            if program.startswith('mkfs.') and program not in PROGRAM_TIMEOUTS:
+                program = 'mkfs'
+            return PROGRAM_TIMEOUTS.get(program, DEFAULT_TIMEOUT)
+        return DEFAULT_TIMEOUT
+
+    def run(self, command: Union[str, List[str]], shell: bool = False,
+            timeout: Optional[float] = None, token: Optional[CancellationToken] = None,
+            on_output: Optional[Callable[[str], None]] = None,
+            input: Optional[str] = None, cwd: Optional[str] = None,
+            env: Optional[dict] = None, cache: bool = True,
+            schedule: bool = True) -> CommandResult:
+        """Run a command and wait for it.
+
+        timeout=None uses the per-program default, timeout=0 disables it.
+        on_output is called with each stdout line as it is produced.
+        Read-only commands listed in CommandCache.CACHE_RULES are answered
+        from the command cache unless cache=False; commands that change
+        state invalidate the cached output they affect. Commands that take
+        the apt/dpkg locks wait their turn in the PackageQueue unless
+        schedule=False.
+        """
+        args, use_shell = self.prepare(command, shell)
+        if timeout is None:
+            timeout = self.default_timeout(args)
+        display = command if isinstance(command, str) else ' '.join(command)
+
+        if token is not None and token.cancelled:
+            return CommandResult(display, stderr="Command cancelled", returncode=130,
+                                 cancelled=True)
+
+        if schedule and is_package_mutation(command):
+            return self._run_queued(command, display, token, on_output,
+                                    coalesce=input is None and cwd is None and env is None,
+                                    shell=shell, timeout=timeout, input=input, cwd=cwd,
+                                    env=env, cache=cache)
+
+        def execute():
+            with self._slots:
+                return self._execute(display, args, use_shell, timeout, token,
+                                     on_output, input, cwd, env)
+
+        interceptor = self.interceptor
+        executed = []
+
+        def run():
+            executed.append(True)
+            if interceptor is not None:
+                return interceptor.handle(display, execute, token, on_output)
+            return execute()
+
+        use_cache = (cache and self.cache.enabled and on_output is None and input is None
+                     and cwd is None and env is None)
+        with span(display, 'command') as trace:
+            result = self._dispatch(command, run, use_cache)
+            trace.set(returncode=result.returncode, cached=not executed,
+                      stdout_bytes=len(result.stdout.encode(errors='replace')),
+                      stderr_bytes=len(result.stderr.encode(errors='replace')))
+            if result.timed_out:
+                trace.set(timed_out=True)
+        record_command(result, cached=not executed)
+        return result
+
+    def _dispatch(self, command, run, use_cache: bool) -> CommandResult:
+        """Answer command from the cache, or run it and invalidate what it changes"""
+        if use_cache:
+            policy = cache_policy(command)
+            if policy is not None:
+                ttl, tags = policy
+                return self.cache.get_or_run(command, ttl, tags, run)
+
+        tags = mutation_tags(command)
+        if not tags:
+            return run()
+        # Invalidate on both sides so output read during the change is not kept
+        self.cache.invalidate(*tags)
+        try:
+            return run()
+        finally:
+            self.cache.invalidate(*tags)
+
+    def _run_queued(self, command, display, token, on_output, coalesce, **kwargs):
+        """Run an apt/dpkg command through the package queue.
+
+        When the queue merges several waiting installs into one transaction,
+        every caller gets its output and the merged result; the transaction
+        is cancelled only once all of them have been cancelled.
+        """
+        def execute(queued_command, operations):
+            tokens = [operation.token for operation in operations]
+            outputs = [operation.on_output for operation in operations if operation.on_output]
+            merged = queued_command is not command
+            combined = token if not merged else CancellationToken()
+
+            def cancel_if_all():
+                if all(t is not None and t.cancelled for t in tokens):
+                    combined.cancel()
+
+            def fan_out(line):
+                for output in outputs:
+                    output(line)
+
+            if merged:
+                for t in tokens:
+                    if t is not None:
+                        t.add_callback(cancel_if_all)
+            try:
+                options = dict(kwargs, shell=False) if merged else kwargs
+                return self.run(queued_command, token=combined,
+                                on_output=fan_out if outputs else None,
+                                schedule=False, **options)
+            finally:
+                for t in tokens:
+                    if t is not None:
+                        t.remove_callback(cancel_if_all)
+
+        try:
+            result = get_package_queue().run(command, execute, token, on_output, coalesce)
+        except Exception as e:
+            return CommandResult(display, stderr=str(e), returncode=1)
+        if result is None:
+            return CommandResult(display, stderr="Command cancelled", returncode=130,
+                                 cancelled=True)
+        return result
+
+    def submit(self, command: Union[str, List[str]], **kwargs) -> Future:
+        """Run a command on the pool and return a Future for its CommandResult"""
+        return self._pool.submit(self.run, command, **kwargs)
+
+    def _execute(self, display, args, use_shell, timeout, token, on_output,
+                 input, cwd, env) -> CommandResult:
+        start = time.perf_counter()
+        try:
+            process = subprocess.Popen(
+                args, shell=use_shell, text=True, cwd=cwd, env=env,
+                stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                start_new_session=True)
+        except FileNotFoundError as e:
+            return CommandResult(display, stderr=str(e), returncode=127,
+                                 duration=time.perf_counter() - start)
+        except Exception as e:
+            return CommandResult(display, stderr=str(e), returncode=1,
+                                 duration=time.perf_counter() - start)
+
+        with self._active_lock:
+            self._active.add(process)
+
+        stdout_lines = []
+        stderr_lines = []
+        readers = [
+            threading.Thread(target=self._read_stream,
+                             args=(process.stdout, stdout_lines, on_output), daemon=True),
+            threading.Thread(target=self._read_stream,
+                             args=(process.stderr, stderr_lines, None), daemon=True),
+        ]
+        for reader in readers:
+            reader.start()
+
+        if input is not None:
+            try:
+                process.stdin.write(input)
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+        cancel = lambda: self._terminate(process)
+        if token is not None:
+            token.add_callback(cancel)
+
+        timed_out = False
+        try:
+            deadline = start + timeout if timeout else None
+            while True:
+                remaining = None if deadline is None else deadline - time.perf_counter()
+                if remaining is not None and remaining <= 0:
+                    timed_out = True
+                    self._terminate(process)
+                    break
+                try:
+                    process.wait(timeout=0.2 if remaining is None else min(0.2, remaining))
+                    break
+                except subprocess.TimeoutExpired:
+                    continue
+        finally:
+            if token is not None:
+                token.remove_callback(cancel)
+            for reader in readers:
+                reader.join(TERMINATE_GRACE)
+            with self._active_lock:
+                self._active.discard(process)
+
+        duration = time.perf_counter() - start
+        stdout = ''.join(stdout_lines)
+        stderr = ''.join(stderr_lines)
+        cancelled = token is not None and token.cancelled and not timed_out
+        returncode = process.returncode if process.returncode is not None else 1
+
+        if timed_out:
+            returncode = 124
+            stderr += f"\nCommand timed out after {timeout}s"
+            logger.warning(f"Command timed out after {timeout}s: {display}")
+        elif cancelled:
+            returncode = 130
+            stderr += "\nCommand cancelled"
+            logger.info(f"Command cancelled: {display}")
+        else:
+            logger.debug(f"Command finished in {duration:.3f}s (rc={returncode}): {display}")
+
+        return CommandResult(display, stdout, stderr, returncode, duration,
+                             timed_out=timed_out, cancelled=cancelled)
+
+    @staticmethod
+    def _read_stream(stream, lines, callback):
+        try:
+            for line in iter(stream.readline, ''):
+                lines.append(line)
+                if callback is not None:
+                    try:
+                        callback(line)
+                    except Exception as e:
+                        logger.debug(f"Output callback failed: {str(e)}")
+        except (ValueError, OSError):
+            pass
+        finally:
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    @staticmethod
+    def _terminate(process):
+        """Terminate a process and everything it spawned"""
+        if process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+        except (ProcessLookupError, PermissionError):
+            return
+        try:
+            process.wait(timeout=TERMINATE_GRACE)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def cancel_all(self):
+        """Terminate every running command"""
+        with self._active_lock:
+            active = list(self._active)
+        for process in active:
+            self._terminate(process)
+
+    def shutdown(self):
+        """Cancel running commands and stop the worker pool"""
+        self.cancel_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> CommandExecutor:
+    """Return the executor shared by all modules"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = CommandExecutor()
+        return _executor
+
+
+def execute(command: Union[str, List[str]], shell: bool = False, **kwargs) -> CommandResult:
+    """Run a command on the shared executor"""
+    return get_executor().run(command, shell=shell, **kwargs)
+
+
+def check_output(command: Union[str, List[str]], shell: bool = False, **kwargs) -> str:
+    """Run a command and return stdout, raising like subprocess.check_output"""
+    result = execute(command, shell=shell, **kwargs)
+    if result.timed_out:
+        raise subprocess.TimeoutExpired(result.command, kwargs.get('timeout'),
+                                        output=result.stdout, stderr=result.stderr)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.command,
+                                            output=result.stdout, stderr=result.stderr)
+    return result.stdout
+
+
+def check_call(command: Union[str, List[str]], shell: bool = False, **kwargs) -> int:
+    """Run a command, raising like subprocess.check_call on failure"""
+    check_output(command, shell=shell, **kwargs)
+    return 0
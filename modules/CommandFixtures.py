@@ -0,0 +1,186 @@
+# Part 27: Command Record/Replay Fixtures
+import gzip
+import json
+import os
+import platform
+import socket
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from CommandExecutor import CommandResult, CancellationToken, get_executor
+
+logger = logging.getLogger("KaliFixAll.CommandFixtures")
+
+FIXTURE_VERSION = 1
+
+
+def open_fixture(path: str, mode: str):
+    """Open a fixture file, gzip-compressed when the name ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class FixtureBundle:
+    """Recorded command results, in the order each command produced them"""
+
+    def __init__(self, commands: Optional[Dict[str, List[dict]]] = None, info: Optional[dict] = None):
+        self.commands: Dict[str, List[dict]] = commands or {}
+        self.info = info or {}
+
+    def add(self, result: CommandResult):
+        self.commands.setdefault(result.command, []).append(result.to_dict())
+
+    def __len__(self):
+        return sum(len(results) for results in self.commands.values())
+
+    def save(self, path: str):
+        info = dict(self.info)
+        info.setdefault('recorded', datetime.now().isoformat(timespec='seconds'))
+        info.setdefault('host', socket.gethostname())
+        info.setdefault('kernel', platform.release())
+        with open_fixture(path, 'w') as f:
+            json.dump({'version': FIXTURE_VERSION, 'info': info, 'commands': self.commands},
+                      f, indent=1, sort_keys=True)
+        logger.info(f"Saved {len(self)} results for {len(self.commands)} commands to {path}")
+
+    @classmethod
+    def load(cls, path: str) -> 'FixtureBundle':
+        with open_fixture(path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != FIXTURE_VERSION:
+            raise ValueError(f"Unsupported fixture version in {path}: {data.get('version')}")
+        return cls(data['commands'], data.get('info'))
+
+
+class CommandRecorder:
+    """Executor interceptor that runs commands for real and records their results"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bundle = FixtureBundle()
+        self._lock = threading.Lock()
+
+    def handle(self, command: str, execute: Callable[[], CommandResult],
+               token: Optional[CancellationToken] = None,
+               on_output: Optional[Callable[[str], None]] = None) -> CommandResult:
+        result = execute()
+        if not result.cancelled:
+            with self._lock:
+                self.bundle.add(result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'mode': 'record', 'path': self.path, 'commands': len(self.bundle.commands),
+                    'results': len(self.bundle)}
+
+    def close(self):
+        with self._lock:
+            self.bundle.save(self.path)
+
+
+class CommandReplayer:
+    """Executor interceptor that answers commands from a fixture bundle.
+
+    Each command gets its recorded results in order and keeps getting the
+    last one once they run out, so replay does not depend on how often a
+    command happened to run while recording. Commands missing from the
+    bundle fail with exit code 127, or raise KeyError when strict.
+
+    Latency can be injected as a fixed delay per command and/or as a
+    multiple of the duration each command took when it was recorded.
+    """
+
+    def __init__(self, bundle: FixtureBundle, latency: float = 0.0,
+                 latency_scale: float = 0.0, strict: bool = False):
+        self.bundle = bundle
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._lock = threading.Lock()
+        self._positions: Dict[str, int] = {}
+        self.replayed = 0
+        self.missing: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'CommandReplayer':
+        return cls(FixtureBundle.load(path), **kwargs)
+
+    def handle(self, command: str, execute: Callable[[], CommandResult],
+               token: Optional[CancellationToken] = None,
+               on_output: Optional[Callable[[str], None]] = None) -> CommandResult:
+        with self._lock:
+            results = self.bundle.commands.get(command)
+            if not results:
+                self.missing[command] = self.missing.get(command, 0) + 1
+            else:
+                position = self._positions.get(command, 0)
+                self._positions[command] = position + 1
+                recorded = results[min(position, len(results) - 1)]
+                self.replayed += 1
+
+        if not results:
+            logger.warning(f"No fixture for command: {command}")
+            if self.strict:
+                raise KeyError(f"No fixture for command: {command}")
+            return CommandResult(command, stderr=f"{command}: not in fixture bundle",
+                                 returncode=127)
+
+        delay = self.latency + self.latency_scale * recorded.get('duration', 0.0)
+        start = time.perf_counter()
+        if delay > 0:
+            if token is not None:
+                if token.wait(delay):
+                    return CommandResult(command, stderr="Command cancelled", returncode=130,
+                                         duration=time.perf_counter() - start, cancelled=True)
+            else:
+                time.sleep(delay)
+
+        result = CommandResult.from_dict(recorded)
+        result.duration = time.perf_counter() - start
+        if on_output is not None:
+            for line in result.stdout.splitlines(keepends=True):
+                on_output(line)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'mode': 'replay', 'replayed': self.replayed,
+                    'missing': dict(sorted(self.missing.items()))}
+
+    def close(self):
+        if self.missing:
+            logger.warning(f"{len(self.missing)} command(s) had no fixture: "
+                           f"{', '.join(sorted(self.missing))}")
+
+
+def start_recording(path: str) -> CommandRecorder:
+    """Record every command run through the shared executor until stop_fixtures()"""
+    recorder = CommandRecorder(path)
+    get_executor().interceptor = recorder
+    logger.info(f"Recording commands to {path}")
+    return recorder
+
+
+def start_replay(path: str, latency: float = 0.0, latency_scale: float = 0.0,
+                 strict: bool = False) -> CommandReplayer:
+    """Serve every command run through the shared executor from a fixture bundle"""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Fixture bundle not found: {path}")
+    replayer = CommandReplayer.from_file(path, latency=latency, latency_scale=latency_scale,
+                                         strict=strict)
+    get_executor().interceptor = replayer
+    logger.info(f"Replaying commands from {path} ({len(replayer.bundle)} results)")
+    return replayer
+
+
+def stop_fixtures():
+    """Detach the recorder or replayer, saving a recording"""
+    executor = get_executor()
+    interceptor, executor.interceptor = executor.interceptor, None
+    if interceptor is not None:
+        interceptor.close()
+    return interceptor
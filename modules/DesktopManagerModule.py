@@ -1,20 +1,19 @@
 # Part 13: Desktop Manager Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import re
 import pwd
 import time
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Tuple, Union
+from CommandExecutor import execute
+from DpkgStatus import get_dpkg_status
 
-class DesktopManagerModule:
-    def __init__(self, parent_notebook):
-        # Create desktop manager tab
-        self.dm_frame = ttk.Frame(parent_notebook)
-        parent_notebook.add(self.dm_frame, text='Desktop Manager')
-        
+class DesktopManagerScanner:
+    """Display manager checks and scans with no widget code (used by the GUI and CLI)"""
+
+    def __init__(self):
         # Initialize variables
         self.display_managers = {
             'lightdm': 'LightDM',
@@ -24,8 +23,72 @@ class DesktopManagerModule:
             'slim': 'Simple Login Manager'
         }
         
-        self.current_dm = None
         self.recommended_dm = 'lightdm'  # Default for Kali
+
+    def run_command(self, command: Union[str, List[str]], shell: bool = False,
+                    timeout: float = None, on_output=None,
+                    token=None) -> Tuple[str, str, int]:
+        """Run command and return output, error, and return code"""
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None) -> List[str]:
+        """Return a list of display manager issues"""
+        issues = []
+        
+        try:
+            with open('/etc/X11/default-display-manager', 'r') as f:
+                default_dm = os.path.basename(f.read().strip())
+        except OSError:
+            return ["No default display manager configured"]
+        
+        output, _, _ = self.run_command(["systemctl", "is-active", default_dm], token=token)
+        if output.strip() != 'active':
+            issues.append(f"Default display manager {default_dm} is {output.strip() or 'not running'}")
+        
+        return issues
+
+    def get_display_managers(self, token=None) -> List[Dict]:
+        """Return installed display managers with their running and default state"""
+        managers = []
+        
+        dpkg = get_dpkg_status()
+        for dm_name, dm_title in self.display_managers.items():
+            # Check if installed
+            if dpkg.is_installed(dm_name):
+                # Check if running
+                status_output, _, _ = self.run_command(["systemctl", "is-active", dm_name],
+                                                       token=token)
+                
+                # Check if default
+                default_output, _, _ = self.run_command("cat /etc/X11/default-display-manager",
+                                                        token=token)
+                
+                managers.append({
+                    'name': dm_name,
+                    'title': dm_title,
+                    'running': status_output.strip() == 'active',
+                    'default': dm_name in default_output
+                })
+        
+        return managers
+
+    def scan(self, token=None) -> Dict:
+        """Display manager state as plain data"""
+        return {
+            'display_managers': self.get_display_managers(token),
+            'recommended': self.recommended_dm
+        }
+
+class DesktopManagerModule(DesktopManagerScanner):
+    def __init__(self, parent_notebook):
+        # Create desktop manager tab
+        self.dm_frame = ttk.Frame(parent_notebook)
+        parent_notebook.add(self.dm_frame, text='Desktop Manager')
+        
+        # Initialize variables
+        super().__init__()
+        self.current_dm = None
         self.last_used_dm = None
         
         # Create interface
@@ -103,20 +166,6 @@ class DesktopManagerModule:
         self.output = scrolledtext.ScrolledText(main_container, height=10)
         self.output.pack(fill='both', expand=True, padx=5, pady=5)
 
-    def run_command(self, command: str, shell: bool = False) -> Tuple[str, str, int]:
-        """Run command and return output, error, and return code"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_display_managers(self):
         """Scan system for installed display managers and their status"""
         self.update_output("Scanning display managers...\n")
@@ -125,23 +174,14 @@ class DesktopManagerModule:
         self.dm_list.delete(*self.dm_list.get_children())
         
         # Check each display manager
-        for dm_name, dm_title in self.display_managers.items():
-            # Check if installed
-            output, _, code = self.run_command(f"dpkg -l {dm_name}")
-            if code == 0 and "ii" in output:
-                # Check if running
-                status_output, _, _ = self.run_command(f"systemctl is-active {dm_name}")
-                status = "Running" if "active" in status_output else "Stopped"
-                
-                # Check if default
-                default_output, _, _ = self.run_command("cat /etc/X11/default-display-manager")
-                is_default = "Yes" if dm_name in default_output else "No"
-                
-                self.dm_list.insert('', 'end', values=(dm_title, status, is_default))
-                
-                if is_default == "Yes":
-                    self.current_dm = dm_name
-                    self.current_dm_var.set(dm_title)
+        for dm in self.get_display_managers():
+            status = "Running" if dm['running'] else "Stopped"
+            is_default = "Yes" if dm['default'] else "No"
+            self.dm_list.insert('', 'end', values=(dm['title'], status, is_default))
+            
+            if dm['default']:
+                self.current_dm = dm['name']
+                self.current_dm_var.set(dm['title'])
         
         # Detect last used DM from logs
         self.detect_last_used_dm()
@@ -190,23 +230,23 @@ class DesktopManagerModule:
         
         try:
             # Stop the service
-            self.run_command(f"sudo systemctl stop {self.current_dm}")
+            self.run_command(["sudo", "systemctl", "stop", self.current_dm])
             
             # Reconfigure package
-            self.run_command(f"sudo dpkg-reconfigure {self.current_dm}")
+            self.run_command(["sudo", "dpkg-reconfigure", self.current_dm])
             
             # Clear any corrupted config
             config_dir = f"/etc/{self.current_dm}"
             if os.path.exists(config_dir):
                 backup_dir = f"{config_dir}_backup_{int(time.time())}"
-                self.run_command(f"sudo cp -r {config_dir} {backup_dir}")
+                self.run_command(["sudo", "cp", "-r", config_dir, backup_dir])
                 self.update_output(f"Backed up configuration to {backup_dir}\n")
             
             # Reinstall package
-            self.run_command(f"sudo apt-get install --reinstall {self.current_dm}")
+            self.run_command(["sudo", "apt-get", "install", "--reinstall", self.current_dm])
             
             # Start service
-            self.run_command(f"sudo systemctl start {self.current_dm}")
+            self.run_command(["sudo", "systemctl", "start", self.current_dm])
             
             # Update scan
             self.scan_display_managers()
@@ -223,19 +263,19 @@ class DesktopManagerModule:
                              f"Switch to {self.display_managers[self.recommended_dm]}?"):
             try:
                 # Install if not present
-                self.run_command(f"sudo apt-get install -y {self.recommended_dm}")
+                self.run_command(["sudo", "apt-get", "install", "-y", self.recommended_dm])
                 
                 # Set as default
                 self.run_command(
-                    f"sudo update-alternatives --set x-display-manager "
-                    f"/usr/sbin/{self.recommended_dm}"
+                    ["sudo", "update-alternatives", "--set", "x-display-manager",
+                     f"/usr/sbin/{self.recommended_dm}"]
                 )
                 
                 # Reconfigure
-                self.run_command(f"sudo dpkg-reconfigure {self.recommended_dm}")
+                self.run_command(["sudo", "dpkg-reconfigure", self.recommended_dm])
                 
                 # Restart service
-                self.run_command(f"sudo systemctl restart {self.recommended_dm}")
+                self.run_command(["sudo", "systemctl", "restart", self.recommended_dm])
                 
                 # Update scan
                 self.scan_display_managers()
@@ -271,7 +311,7 @@ class DesktopManagerModule:
                               f"{', '.join(unnecessary_dms)}"):
             try:
                 for dm in unnecessary_dms:
-                    self.run_command(f"sudo apt-get remove --purge -y {dm}")
+                    self.run_command(["sudo", "apt-get", "remove", "--purge", "-y", dm])
                 
                 # Update scan
                 self.scan_display_managers()
@@ -1,25 +1,153 @@
 # Part 18: Device Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Tuple, Set, Union
 import json
-import pyudev
-import dbus
+from LazyImport import lazy_import
+pyudev = lazy_import('pyudev')
+dbus = lazy_import('dbus')
 import time
 import re
+import shlex
 from pathlib import Path
-import requests
+requests = lazy_import('requests')
 import shutil
+from CommandExecutor import execute
+from JobRunner import get_job_runner, ui_thread, JobCancelled
+from AptLists import refresh_lists
 
-class DeviceManagementModule:
+class DeviceManagementScanner:
+    """Device checks and scans with no widget code (used by the GUI and CLI)"""
+
+    def run_command(self, command: Union[str, List[str]], shell: bool = False, timeout: float = None,
+                    on_output=None, token=None) -> Tuple[str, str, int]:
+        """Run command and return output, error, and return code"""
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None) -> List[str]:
+        """Return a list of device issues"""
+        issues = []
+        
+        # Firmware that failed to load
+        output, _, _ = self.run_command("dmesg | grep -i firmware", shell=True, token=token)
+        for line in output.splitlines():
+            if 'failed to load' in line.lower() or 'failed with error' in line.lower():
+                issues.append(f"Firmware load failure: {line.strip()}")
+        
+        return issues[:20]
+
+    def get_pci_devices(self, token=None) -> List[Dict]:
+        """Parse lspci -v into device dicts"""
+        output, _, _ = self.run_command("lspci -v", token=token)
+        devices = []
+        current_device = None
+        
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            if not line.startswith('\t'):
+                # New device
+                if current_device:
+                    devices.append(current_device)
+                current_device = {
+                    'id': line.split()[0],
+                    'name': ' '.join(line.split()[2:]),
+                    'type': self.categorize_device(' '.join(line.split()[2:])),
+                    'driver': 'Unknown',
+                    'status': 'unknown',
+                    'details': [line]
+                }
+            elif current_device:
+                current_device['details'].append(line)
+                if 'Kernel driver in use:' in line:
+                    current_device['driver'] = line.split('Kernel driver in use:')[1].strip()
+                    current_device['status'] = 'ok'
+                elif 'Kernel modules:' in line:
+                    current_device['modules'] = line.split('Kernel modules:')[1].strip()
+        
+        # Add last device
+        if current_device:
+            devices.append(current_device)
+        
+        return devices
+
+    def get_usb_devices(self, token=None) -> List[Dict]:
+        """Parse lsusb -v into device dicts"""
+        output, _, _ = self.run_command("lsusb -v", token=token)
+        devices = []
+        current_device = None
+        
+        for line in output.splitlines():
+            if line.startswith('Bus'):
+                # New device
+                if current_device:
+                    devices.append(current_device)
+                current_device = {
+                    'id': line.split()[5],
+                    'name': ' '.join(line.split()[6:]),
+                    'type': 'USB',
+                    'driver': 'Unknown',
+                    'status': 'unknown',
+                    'details': [line]
+                }
+            elif current_device and line.strip():
+                current_device['details'].append(line)
+                if 'Driver=' in line:
+                    current_device['driver'] = line.split('Driver=')[1].strip()
+                    current_device['status'] = 'ok'
+        
+        # Add last device
+        if current_device:
+            devices.append(current_device)
+        
+        return devices
+
+    def categorize_device(self, device_name: str) -> str:
+        """Categorize device based on its name"""
+        name_lower = device_name.lower()
+        
+        if any(x in name_lower for x in ['network', 'ethernet', 'wireless', 'wifi']):
+            return 'Network'
+        elif any(x in name_lower for x in ['vga', 'display', '3d', 'graphics']):
+            return 'Graphics'
+        elif any(x in name_lower for x in ['audio', 'sound', 'multimedia']):
+            return 'Audio'
+        elif any(x in name_lower for x in ['usb']):
+            return 'USB'
+        elif any(x in name_lower for x in ['bluetooth']):
+            return 'Bluetooth'
+        elif any(x in name_lower for x in ['storage', 'ahci', 'raid', 'ide']):
+            return 'Storage'
+        elif any(x in name_lower for x in ['input', 'keyboard', 'mouse']):
+            return 'Input'
+        elif any(x in name_lower for x in ['printer']):
+            return 'Printer'
+        elif any(x in name_lower for x in ['camera', 'webcam']):
+            return 'Camera'
+        else:
+            return 'Other'
+
+    def scan(self, token=None) -> Dict:
+        """PCI and USB devices as plain data"""
+        devices = self.get_pci_devices(token) + self.get_usb_devices(token)
+        return {
+            'devices': [{key: value for key, value in device.items() if key != 'details'}
+                        for device in devices],
+            'issues': self.check_status(token)
+        }
+
+class DeviceManagementModule(DeviceManagementScanner):
     def __init__(self, parent_notebook):
         # Create Device Management tab
         self.device_frame = ttk.Frame(parent_notebook)
         parent_notebook.add(self.device_frame, text='Device Management')
         
         # Initialize variables
+        self.jobs = get_job_runner()
+        self.scan_job = None
+        self.driver_job = None
         self.detected_devices = {}  # Dictionary to store device information
         self.problem_devices = {}   # Dictionary to store problematic devices
         self.driver_cache = {}      # Cache for driver information
@@ -142,85 +270,63 @@ class DeviceManagementModule:
         # Bind selection event
         self.devices_tree.bind('<<TreeviewSelect>>', self.show_device_details)
 
-    def run_command(self, command: str, shell: bool = False) -> Tuple[str, str, int]:
-        """Run command and return output, error, and return code"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_devices(self):
-        """Scan system for all devices and their status"""
+        """Scan system for all devices and their status in the background"""
+        if self.scan_job and self.scan_job.active:
+            return
+        self.scan_job = self.jobs.submit("Scan devices", self._scan_devices, owner=self)
+
+    def _scan_devices(self, job):
+        """Run every device scan, streaming rows to the device list"""
         try:
             self.update_details("Scanning devices...\n")
-            self.devices_tree.delete(*self.devices_tree.get_children())
+            self.clear_device_list()
             self.detected_devices.clear()
             self.problem_devices.clear()
             
-            # Get PCI devices
-            self.scan_pci_devices()
-            
-            # Get USB devices
-            self.scan_usb_devices()
-            
-            # Get network devices
-            self.scan_network_devices()
-            
-            # Get audio devices
-            self.scan_audio_devices()
-            
-            # Get input devices
-            self.scan_input_devices()
-            
-            # Check for driver issues
-            self.check_driver_issues()
+            steps = [
+                ("PCI devices", self.scan_pci_devices),
+                ("USB devices", self.scan_usb_devices),
+                ("Network devices", self.scan_network_devices),
+                ("Audio devices", self.scan_audio_devices),
+                ("Input devices", self.scan_input_devices),
+                ("Driver issues", self.check_driver_issues)
+            ]
+            for i, (name, step) in enumerate(steps):
+                job.check_cancelled()
+                job.set_progress(i / len(steps) * 100, name)
+                step()
             
             # Update problems tab
             self.update_problems_tab()
             
             self.update_details("Device scan completed.\n")
             
+        except JobCancelled:
+            self.update_details("Device scan cancelled.\n")
+            raise
         except Exception as e:
             self.update_details(f"Error scanning devices: {str(e)}\n")
-            messagebox.showerror("Error", f"Failed to scan devices: {str(e)}")
+            job.ui(messagebox.showerror, "Error", f"Failed to scan devices: {str(e)}")
+            raise
+
+    @ui_thread
+    def clear_device_list(self):
+        self.devices_tree.delete(*self.devices_tree.get_children())
+
+    @ui_thread
+    def show_device_row(self, device_info: Dict):
+        status_icon = self.status_icons[device_info['status']]
+        self.devices_tree.insert('', 'end',
+                               values=(f"{device_info['name']}",
+                                     f"{status_icon} {device_info['status']}",
+                                     device_info['driver']))
 
     def scan_pci_devices(self):
         """Scan PCI devices"""
         try:
-            output, _, _ = self.run_command("lspci -v")
-            current_device = None
-            
-            for line in output.splitlines():
-                if not line.startswith('\t'):
-                    # New device
-                    if current_device:
-                        self.add_device_to_list(current_device)
-                    current_device = {
-                        'id': line.split()[0],
-                        'name': ' '.join(line.split()[2:]),
-                        'type': self.categorize_device(' '.join(line.split()[2:])),
-                        'driver': 'Unknown',
-                        'status': 'unknown',
-                        'details': [line]
-                    }
-                elif current_device:
-                    current_device['details'].append(line)
-                    if 'Kernel driver in use:' in line:
-                        current_device['driver'] = line.split('Kernel driver in use:')[1].strip()
-                        current_device['status'] = 'ok'
-                    elif 'Kernel modules:' in line:
-                        current_device['modules'] = line.split('Kernel modules:')[1].strip()
-            
-            # Add last device
-            if current_device:
-                self.add_device_to_list(current_device)
+            for device_info in self.get_pci_devices():
+                self.add_device_to_list(device_info)
                 
         except Exception as e:
             self.update_details(f"Error scanning PCI devices: {str(e)}\n")
@@ -228,31 +334,8 @@ class DeviceManagementModule:
     def scan_usb_devices(self):
         """Scan USB devices"""
         try:
-            output, _, _ = self.run_command("lsusb -v")
-            current_device = None
-            
-            for line in output.splitlines():
-                if line.startswith('Bus'):
-                    # New device
-                    if current_device:
-                        self.add_device_to_list(current_device)
-                    current_device = {
-                        'id': line.split()[5],
-                        'name': ' '.join(line.split()[6:]),
-                        'type': 'USB',
-                        'driver': 'Unknown',
-                        'status': 'unknown',
-                        'details': [line]
-                    }
-                elif current_device and line.strip():
-                    current_device['details'].append(line)
-                    if 'Driver=' in line:
-                        current_device['driver'] = line.split('Driver=')[1].strip()
-                        current_device['status'] = 'ok'
-            
-            # Add last device
-            if current_device:
-                self.add_device_to_list(current_device)
+            for device_info in self.get_usb_devices():
+                self.add_device_to_list(device_info)
                 
         except Exception as e:
             self.update_details(f"Error scanning USB devices: {str(e)}\n")
@@ -302,7 +385,7 @@ class DeviceManagementModule:
                     
                     # Get driver information
                     driver_output, _, _ = self.run_command(
-                        f"cat /proc/asound/card{device_info['id']}/id"
+                        ["cat", f"/proc/asound/card{device_info['id']}/id"]
                     )
                     if driver_output:
                         device_info['driver'] = driver_output.strip()
@@ -347,31 +430,6 @@ class DeviceManagementModule:
         except Exception as e:
             self.update_details(f"Error scanning input devices: {str(e)}\n")
 
-    def categorize_device(self, device_name: str) -> str:
-        """Categorize device based on its name"""
-        name_lower = device_name.lower()
-        
-        if any(x in name_lower for x in ['network', 'ethernet', 'wireless', 'wifi']):
-            return 'Network'
-        elif any(x in name_lower for x in ['vga', 'display', '3d', 'graphics']):
-            return 'Graphics'
-        elif any(x in name_lower for x in ['audio', 'sound', 'multimedia']):
-            return 'Audio'
-        elif any(x in name_lower for x in ['usb']):
-            return 'USB'
-        elif any(x in name_lower for x in ['bluetooth']):
-            return 'Bluetooth'
-        elif any(x in name_lower for x in ['storage', 'ahci', 'raid', 'ide']):
-            return 'Storage'
-        elif any(x in name_lower for x in ['input', 'keyboard', 'mouse']):
-            return 'Input'
-        elif any(x in name_lower for x in ['printer']):
-            return 'Printer'
-        elif any(x in name_lower for x in ['camera', 'webcam']):
-            return 'Camera'
-        else:
-            return 'Other'
-
     def add_device_to_list(self, device_info: Dict):
         """Add device to the list and check for problems"""
         device_id = device_info['id']
@@ -392,22 +450,19 @@ class DeviceManagementModule:
             }
         
         # Add to treeview
-        status_icon = self.status_icons[device_info['status']]
-        self.devices_tree.insert('', 'end',
-                               values=(f"{device_info['name']}",
-                                     f"{status_icon} {device_info['status']}",
-                                     device_info['driver']))
+        self.show_device_row(device_info)
 
     def check_driver_problems(self, device_info: Dict) -> bool:
         """Check for common driver problems"""
         try:
             # Check dmesg for errors related to this device
-            output, _, _ = self.run_command(f"dmesg | grep -i {device_info['driver']}")
+            output, _, _ = self.run_command(f"dmesg | grep -i {shlex.quote(device_info['driver'])}",
+                                           shell=True)
             if 'error' in output.lower() or 'fail' in output.lower():
                 return True
             
             # Check if driver is blacklisted
-            output, _, _ = self.run_command("cat /etc/modprobe.d/*.conf")
+            output, _, _ = self.run_command("cat /etc/modprobe.d/*.conf", shell=True)
             if device_info['driver'] in output:
                 return True
             
@@ -425,7 +480,7 @@ class DeviceManagementModule:
         """Check for driver issues across all devices"""
         try:
             # Check kernel logs for device issues
-            output, _, _ = self.run_command("dmesg | grep -i 'fail\|error\|warn'")
+            output, _, _ = self.run_command("dmesg | grep -i 'fail\|error\|warn'", shell=True)
             
             for line in output.splitlines():
                 for device_id, device_info in self.detected_devices.items():
@@ -439,7 +494,7 @@ class DeviceManagementModule:
                             }
             
             # Check for missing firmware
-            output, _, _ = self.run_command("dmesg | grep -i 'firmware'")
+            output, _, _ = self.run_command("dmesg | grep -i 'firmware'", shell=True)
             
             for line in output.splitlines():
                 if 'failed to load' in line.lower():
@@ -456,6 +511,7 @@ class DeviceManagementModule:
         except Exception as e:
             self.update_details(f"Error checking driver issues: {str(e)}\n")
 
+    @ui_thread
     def update_problems_tab(self):
         """Update the problems tab with current issues"""
         self.problems_text.delete('1.0', tk.END)
@@ -521,7 +577,8 @@ class DeviceManagementModule:
             
             # Search in apt cache
             output, _, _ = self.run_command(
-                f"apt-cache search {device_info['name']} | grep -i driver"
+                f"apt-cache search {shlex.quote(device_info['name'])} | grep -i driver",
+                shell=True
             )
             
             potential_drivers = []
@@ -537,7 +594,7 @@ class DeviceManagementModule:
                     for driver in potential_drivers:
                         self.update_details(f"Installing {driver}...\n")
                         output, error, code = self.run_command(
-                            f"sudo apt-get install -y {driver}"
+                            ["sudo", "apt-get", "install", "-y", driver]
                         )
                         
                         if code == 0:
@@ -567,10 +624,10 @@ class DeviceManagementModule:
         try:
             # Unload and reload driver
             self.update_details(f"Reloading {device_info['driver']}...\n")
-            self.run_command(f"sudo modprobe -r {device_info['driver']}")
+            self.run_command(["sudo", "modprobe", "-r", device_info['driver']])
             time.sleep(1)
             output, error, code = self.run_command(
-                f"sudo modprobe {device_info['driver']}"
+                ["sudo", "modprobe", device_info['driver']]
             )
             
             if code != 0:
@@ -578,7 +635,7 @@ class DeviceManagementModule:
             
             # Check for and install missing firmware
             self.update_details("Checking for missing firmware...\n")
-            output, _, _ = self.run_command("dmesg | grep -i firmware")
+            output, _, _ = self.run_command("dmesg | grep -i firmware", shell=True)
             
             if 'failed to load' in output.lower():
                 # Try to install firmware
@@ -620,30 +677,39 @@ class DeviceManagementModule:
         
         if not device_info:
             return
+        if self.driver_job and self.driver_job.active:
+            messagebox.showinfo("Info", "A driver update is already running")
+            return
         
-        try:
-            self.update_details(f"Updating driver for {device_name}...\n")
-            
-            # Check for updates
-            self.run_command("sudo apt-get update")
-            
-            # Try to upgrade the driver package
-            if device_info['driver'] != 'Unknown':
-                output, error, code = self.run_command(
-                    f"sudo apt-get install --only-upgrade {device_info['driver']}-*"
-                )
-                
-                if code == 0:
-                    self.update_details("Driver updated successfully.\n")
-                else:
-                    self.update_details(f"Failed to update driver: {error}\n")
-            
-            # Rescan devices
-            self.scan_devices()
+        self.update_details(f"Updating driver for {device_name}...\n")
+        self.driver_job = self.jobs.submit(f"Update driver for {device_name}",
+                                           self._update_driver, device_info, owner=self,
+                                           on_error=self.update_driver_failed)
+
+    def _update_driver(self, job, device_info: Dict):
+        # Check for updates (skipped while the package lists are fresh)
+        refresh = refresh_lists(job, self.update_details)
+        if refresh['error']:
+            raise Exception(f"Failed to update package lists: {refresh['error']}")
+        
+        # Try to upgrade the driver package
+        if device_info['driver'] != 'Unknown':
+            output, error, code = self.run_command(
+                ["sudo", "apt-get", "install", "--only-upgrade", f"{device_info['driver']}-*"],
+                token=job.token
+            )
             
-        except Exception as e:
-            self.update_details(f"Error updating driver: {str(e)}\n")
-            messagebox.showerror("Error", f"Update failed: {str(e)}")
+            if code == 0:
+                self.update_details("Driver updated successfully.\n")
+            else:
+                self.update_details(f"Failed to update driver: {error}\n")
+        
+        # Rescan devices
+        job.ui(self.scan_devices)
+
+    def update_driver_failed(self, error):
+        self.update_details(f"Error updating driver: {str(error)}\n")
+        messagebox.showerror("Error", f"Update failed: {str(error)}")
 
     def remove_driver(self):
         """Remove driver for selected device"""
@@ -673,11 +739,11 @@ class DeviceManagementModule:
                 
                 if device_info['driver'] != 'Unknown':
                     # Unload driver
-                    self.run_command(f"sudo modprobe -r {device_info['driver']}")
+                    self.run_command(["sudo", "modprobe", "-r", device_info['driver']])
                     
                     # Remove driver package
                     output, error, code = self.run_command(
-                        f"sudo apt-get remove -y {device_info['driver']}-*"
+                        ["sudo", "apt-get", "remove", "-y", f"{device_info['driver']}-*"]
                     )
                     
                     if code == 0:
@@ -742,7 +808,7 @@ class DeviceManagementModule:
                     
                     # Reset device
                     self.run_command(
-                        f"sudo usbreset /dev/bus/usb/{bus}/{device}"
+                        ["sudo", "usbreset", f"/dev/bus/usb/{bus}/{device}"]
                     )
                     break
             
@@ -761,11 +827,11 @@ class DeviceManagementModule:
                     
                     # Reset device
                     self.run_command(
-                        f"sudo setpci -s {slot} COMMAND=0x0"
+                        ["sudo", "setpci", "-s", slot, "COMMAND=0x0"]
                     )
                     time.sleep(1)
                     self.run_command(
-                        f"sudo setpci -s {slot} COMMAND=0x3"
+                        ["sudo", "setpci", "-s", slot, "COMMAND=0x3"]
                     )
                     break
             
@@ -800,9 +866,9 @@ class DeviceManagementModule:
                         # Reload driver and update dependencies
                         if device_info['driver'] != 'Unknown':
                             self.update_details(f"Reloading {device_info['driver']}...\n")
-                            self.run_command(f"sudo modprobe -r {device_info['driver']}")
+                            self.run_command(["sudo", "modprobe", "-r", device_info['driver']])
                             time.sleep(1)
-                            self.run_command(f"sudo modprobe {device_info['driver']}")
+                            self.run_command(["sudo", "modprobe", device_info['driver']])
                 
                 # Update module dependencies
                 self.update_details("\nUpdating module dependencies...\n")
@@ -882,14 +948,16 @@ class DeviceManagementModule:
         
         try:
             # Check kernel messages
-            output, _, _ = self.run_command(f"dmesg | grep -i '{device_info['name']}'")
+            output, _, _ = self.run_command(
+                f"dmesg | grep -i {shlex.quote(device_info['name'])}", shell=True)
             if output:
                 self.details_text.insert(tk.END, "Recent Kernel Messages:\n")
                 self.details_text.insert(tk.END, output + "\n\n")
             
             # Check loaded modules
             if device_info['driver'] != 'Unknown':
-                output, _, _ = self.run_command(f"lsmod | grep {device_info['driver']}")
+                output, _, _ = self.run_command(
+                    f"lsmod | grep {shlex.quote(device_info['driver'])}", shell=True)
                 if output:
                     self.details_text.insert(tk.END, "Module Information:\n")
                     self.details_text.insert(tk.END, output + "\n\n")
@@ -913,13 +981,13 @@ class DeviceManagementModule:
             self.details_text.insert(tk.END, "Network Interface Details:\n")
             
             # Get IP information
-            output, _, _ = self.run_command(f"ip addr show")
+            output, _, _ = self.run_command("ip addr show")
             for line in output.splitlines():
                 if device_info['name'] in line:
                     self.details_text.insert(tk.END, line + "\n")
             
             # Get link status
-            output, _, _ = self.run_command(f"ethtool {device_info['name']}")
+            output, _, _ = self.run_command(["ethtool", device_info['name']])
             self.details_text.insert(tk.END, "\nLink Status:\n" + output + "\n")
             
         except Exception as e:
@@ -931,7 +999,7 @@ class DeviceManagementModule:
             self.details_text.insert(tk.END, "Graphics Card Details:\n")
             
             # Get OpenGL information
-            output, _, _ = self.run_command("glxinfo | grep -i 'renderer\\|version'")
+            output, _, _ = self.run_command("glxinfo | grep -i 'renderer\\|version'", shell=True)
             self.details_text.insert(tk.END, output + "\n")
             
             # Get resolution information
@@ -963,21 +1031,21 @@ class DeviceManagementModule:
             self.details_text.insert(tk.END, "Storage Device Details:\n")
             
             # Get device information
-            output, _, _ = self.run_command(f"sudo hdparm -I {device_info['name']}")
+            output, _, _ = self.run_command(["sudo", "hdparm", "-I", device_info['name']])
             self.details_text.insert(tk.END, output + "\n")
             
             # Get SMART information
-            output, _, _ = self.run_command(f"sudo smartctl -a {device_info['name']}")
+            output, _, _ = self.run_command(["sudo", "smartctl", "-a", device_info['name']])
             self.details_text.insert(tk.END, "\nSMART Information:\n" + output + "\n")
             
         except Exception as e:
             self.details_text.insert(tk.END, f"Error getting storage details: {str(e)}\n")
 
+    @ui_thread
     def update_details(self, message: str):
         """Update details text area"""
         self.details_text.insert(tk.END, message)
         self.details_text.see(tk.END)
-        self.details_text.update()
 
     def device_event(self, action, device):
         """Handle device plug/unplug events"""
@@ -0,0 +1,171 @@
+# Part 31: Diagnostics Module
+import tkinter as tk
+from tkinter import ttk, messagebox, scrolledtext
+import os
+from Metrics import (registry, commands_total, command_seconds, operations_total,
+                     operation_seconds, TEXTFILE_DIR, TEXTFILE_NAME)
+from CommandCache import get_command_cache
+from Tracing import get_tracer
+from PackageQueue import get_package_queue
+
+# How often the tables refresh while auto refresh is on (ms)
+REFRESH_INTERVAL_MS = 2000
+
+# Columns holding text are left aligned, numbers right aligned
+TEXT_COLUMNS = ('program', 'module', 'operation', 'state', 'command', 'thread')
+
+
+class DiagnosticsModule:
+    def __init__(self, parent_notebook):
+        # Create diagnostics tab
+        self.frame = ttk.Frame(parent_notebook)
+        parent_notebook.add(self.frame, text='Diagnostics')
+
+        self.auto_refresh = tk.BooleanVar(value=False)
+        self.textfile_path = tk.StringVar(value=os.path.join(TEXTFILE_DIR, TEXTFILE_NAME))
+        self.refresh_id = None
+
+        self.create_gui()
+        self.refresh()
+
+    def create_gui(self):
+        # Controls
+        control_frame = ttk.Frame(self.frame)
+        control_frame.pack(fill='x', padx=5, pady=5)
+
+        ttk.Button(control_frame, text="Refresh",
+                   command=self.refresh).pack(side='left', padx=5)
+        ttk.Checkbutton(control_frame, text="Auto refresh", variable=self.auto_refresh,
+                        command=self.toggle_auto_refresh).pack(side='left', padx=5)
+        ttk.Button(control_frame, text="Clear Command Cache",
+                   command=self.clear_cache).pack(side='left', padx=5)
+
+        export_frame = ttk.LabelFrame(self.frame, text="Prometheus Textfile")
+        export_frame.pack(fill='x', padx=5, pady=5)
+        ttk.Entry(export_frame, textvariable=self.textfile_path).pack(
+            side='left', fill='x', expand=True, padx=5, pady=5)
+        ttk.Button(export_frame, text="Write Metrics",
+                   command=self.write_metrics).pack(side='left', padx=5)
+
+        notebook = ttk.Notebook(self.frame)
+        notebook.pack(fill='both', expand=True, padx=5, pady=5)
+
+        # Commands: counts, failures and latency per program
+        self.command_tree = self.create_tree(notebook, "Commands", (
+            ('program', 'Program', 160), ('runs', 'Runs', 70), ('cached', 'Cached', 70),
+            ('failed', 'Failed', 70), ('timeouts', 'Timeouts', 70),
+            ('total', 'Total (s)', 90), ('p50', 'p50 (s)', 80), ('p95', 'p95 (s)', 80)))
+
+        # Operations: module scans, checks, fixes and jobs
+        self.operation_tree = self.create_tree(notebook, "Operations", (
+            ('module', 'Module', 200), ('operation', 'Operation', 200), ('count', 'Count', 70),
+            ('failed', 'Failed', 70), ('total', 'Total (s)', 90), ('p95', 'p95 (s)', 80)))
+
+        # apt/dpkg operations: running, waiting and recently finished
+        self.queue_tree = self.create_tree(notebook, "Package Queue", (
+            ('id', '#', 50), ('state', 'State', 140), ('command', 'Command', 360),
+            ('thread', 'Thread', 120), ('waited', 'Waited (s)', 90),
+            ('duration', 'Time (s)', 80), ('merged', 'Merged With', 110)))
+
+        # Raw exporter output plus cache and trace summaries
+        text_frame = ttk.Frame(notebook)
+        self.details = scrolledtext.ScrolledText(text_frame, font=('Courier', 9), wrap='none')
+        self.details.pack(fill='both', expand=True)
+        notebook.add(text_frame, text="Details")
+
+    def create_tree(self, notebook, title, columns):
+        frame = ttk.Frame(notebook)
+        tree = ttk.Treeview(frame, columns=[column[0] for column in columns], show='headings')
+        for column, heading, width in columns:
+            tree.heading(column, text=heading)
+            tree.column(column, width=width, anchor='w' if column in TEXT_COLUMNS else 'e')
+        scrollbar = ttk.Scrollbar(frame, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        tree.pack(fill='both', expand=True)
+        notebook.add(frame, text=title)
+        return tree
+
+    @staticmethod
+    def format_seconds(value):
+        return "" if value is None else (">300" if value == float('inf') else f"{value:g}")
+
+    def refresh(self):
+        """Reload every table from the metrics registry"""
+        self.refresh_commands()
+        self.refresh_operations()
+        self.refresh_queue()
+        self.refresh_details()
+
+    def refresh_commands(self):
+        results = {}
+        for (program, result), count in commands_total.samples():
+            results.setdefault(program, {})[result] = count
+        totals = {key[0]: total for key, _, total, _ in command_seconds.samples()}
+
+        self.command_tree.delete(*self.command_tree.get_children())
+        for program, counts in sorted(results.items(), key=lambda item: -sum(item[1].values())):
+            self.command_tree.insert('', 'end', values=(
+                program,
+                sum(counts.values()),
+                counts.get('cached', 0),
+                counts.get('failed', 0),
+                counts.get('timeout', 0),
+                f"{totals.get(program, 0.0):.2f}",
+                self.format_seconds(command_seconds.quantile(0.5, program=program)),
+                self.format_seconds(command_seconds.quantile(0.95, program=program))))
+
+    def refresh_operations(self):
+        failures = {}
+        for (module, operation, status), count in operations_total.samples():
+            if status in ('failed', 'timeout', 'skipped'):
+                failures[(module, operation)] = failures.get((module, operation), 0) + count
+
+        self.operation_tree.delete(*self.operation_tree.get_children())
+        for (module, operation), count, total, _ in operation_seconds.samples():
+            self.operation_tree.insert('', 'end', values=(
+                module, operation, count, failures.get((module, operation), 0),
+                f"{total:.2f}",
+                self.format_seconds(operation_seconds.quantile(
+                    0.95, module=module, operation=operation))))
+
+    def refresh_queue(self):
+        self.queue_tree.delete(*self.queue_tree.get_children())
+        for operation in get_package_queue().snapshot():
+            self.queue_tree.insert('', 'end', values=(
+                operation['id'], operation['state'], operation['command'], operation['thread'],
+                f"{operation['waited']:.1f}",
+                "" if operation['duration'] is None else f"{operation['duration']:.1f}",
+                ", ".join(f"#{other}" for other in operation['merged_with'])))
+
+    def refresh_details(self):
+        self.details.delete(1.0, tk.END)
+        self.details.insert(tk.END, get_command_cache().format_stats() + "\n\n")
+        self.details.insert(tk.END, "Slowest traced spans:\n")
+        self.details.insert(tk.END, get_tracer().summary() + "\n\n")
+        self.details.insert(tk.END, "Prometheus exposition:\n")
+        self.details.insert(tk.END, registry.render())
+
+    def toggle_auto_refresh(self):
+        if self.auto_refresh.get():
+            self.schedule_refresh()
+        elif self.refresh_id is not None:
+            self.frame.after_cancel(self.refresh_id)
+            self.refresh_id = None
+
+    def schedule_refresh(self):
+        if not self.auto_refresh.get():
+            return
+        self.refresh()
+        self.refresh_id = self.frame.after(REFRESH_INTERVAL_MS, self.schedule_refresh)
+
+    def clear_cache(self):
+        get_command_cache().clear()
+        self.refresh()
+
+    def write_metrics(self):
+        try:
+            path = registry.write_textfile(self.textfile_path.get().strip() or None)
+            messagebox.showinfo("Success", f"Metrics written to {path}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to write metrics: {str(e)}")
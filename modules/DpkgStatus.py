@@ -0,0 +1,226 @@
+# Part 33: Indexed dpkg Status Database
+import bisect
+import mmap
+import os
+import threading
+import time
+import logging
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger("KaliFixAll.DpkgStatus")
+
+DPKG_STATUS = "/var/lib/dpkg/status"
+DPKG_UPDATES = "/var/lib/dpkg/updates"
+
+# Fields kept from each stanza; everything else is skipped while parsing
+FIELDS = {b'Package', b'Status', b'Version', b'Installed-Size', b'Architecture', b'Description'}
+
+# Abbreviations used in the first two columns of dpkg -l
+WANT_CODES = {'unknown': 'u', 'install': 'i', 'hold': 'h', 'deinstall': 'r', 'purge': 'p'}
+STATE_CODES = {'not-installed': 'n', 'config-files': 'c', 'half-installed': 'H',
+               'unpacked': 'U', 'half-configured': 'F', 'triggers-awaited': 'W',
+               'triggers-pending': 't', 'installed': 'i'}
+
+
+class DpkgPackage:
+    """One package stanza from the dpkg status database"""
+
+    __slots__ = ('name', 'architecture', 'version', 'want', 'flag', 'state',
+                 'installed_size', 'description')
+
+    def __init__(self, fields: Dict[bytes, bytes]):
+        self.name = fields[b'Package'].decode()
+        self.architecture = fields.get(b'Architecture', b'').decode()
+        self.version = fields.get(b'Version', b'').decode()
+        status = fields.get(b'Status', b'unknown ok not-installed').decode().split()
+        self.want, self.flag, self.state = (status + ['', '', ''])[:3]
+        try:
+            self.installed_size = int(fields.get(b'Installed-Size', b'0'))
+        except ValueError:
+            self.installed_size = 0
+        self.description = fields.get(b'Description', b'').decode(errors='replace')
+
+    @property
+    def installed(self) -> bool:
+        return self.state == 'installed'
+
+    @property
+    def present(self) -> bool:
+        """True if any files of the package are on disk (installed or partly)"""
+        return self.state not in ('not-installed', 'config-files')
+
+    @property
+    def status(self) -> str:
+        """Status as printed by dpkg-query -W -f='${Status}'"""
+        return f"{self.want} {self.flag} {self.state}"
+
+    @property
+    def abbrev(self) -> str:
+        """Two-letter status as in the first column of dpkg -l, e.g. 'ii' or 'rc'"""
+        code = WANT_CODES.get(self.want, '?') + STATE_CODES.get(self.state, '?')
+        return code if self.flag == 'ok' else code + 'R'
+
+    def to_dict(self):
+        return {'name': self.name, 'architecture': self.architecture, 'version': self.version,
+                'status': self.status, 'installed_size': self.installed_size,
+                'description': self.description}
+
+    def __repr__(self):
+        return f"DpkgPackage({self.name!r}, {self.version!r}, {self.status!r})"
+
+
+def parse_stanzas(data) -> Iterator[Dict[bytes, bytes]]:
+    """Yield the wanted fields of each stanza in a dpkg status buffer"""
+    fields = {}
+    position = 0
+    end = len(data)
+    while position < end:
+        newline = data.find(b'\n', position)
+        if newline == -1:
+            newline = end
+        line = data[position:newline]
+        position = newline + 1
+
+        if not line.strip():
+            if b'Package' in fields:
+                yield fields
+            fields = {}
+        elif line[:1] in (b' ', b'\t'):
+            # Continuation of a multi-line field such as Description or Conffiles
+            continue
+        else:
+            key, _, value = line.partition(b':')
+            if key in FIELDS:
+                fields[key] = value.strip()
+    if b'Package' in fields:
+        yield fields
+
+
+def parse_file(path: str) -> Iterator[DpkgPackage]:
+    """Stream the packages of a status file through a read-only memory map"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for fields in parse_stanzas(data):
+                yield DpkgPackage(fields)
+
+
+class DpkgStatusDB:
+    """Packages from /var/lib/dpkg/status indexed by name and by name prefix.
+
+    The index is rebuilt only when the status file or dpkg's pending update
+    journal changes, so modules can query it freely instead of running
+    dpkg -l, dpkg-query or dpkg --get-selections.
+    """
+
+    def __init__(self, path: str = DPKG_STATUS, updates: str = DPKG_UPDATES):
+        self.path = path
+        self.updates = updates
+        self._lock = threading.Lock()
+        self._signature = None
+        self._packages: Dict[str, List[DpkgPackage]] = {}
+        self._names: List[str] = []
+        self.build_count = 0
+        self.build_time = 0.0
+
+    def _current_signature(self):
+        signature = []
+        for path in (self.path, self.updates):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size, st.st_ino))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _refresh(self):
+        signature = self._current_signature()
+        if signature == self._signature:
+            return
+        start = time.perf_counter()
+        packages: Dict[str, List[DpkgPackage]] = {}
+        for package in self._read_all():
+            entries = packages.setdefault(package.name, [])
+            # Entries from the update journal replace the same name and architecture
+            entries[:] = [entry for entry in entries
+                          if entry.architecture != package.architecture]
+            entries.append(package)
+        self._packages = packages
+        self._names = sorted(packages)
+        self._signature = signature
+        self.build_count += 1
+        self.build_time = time.perf_counter() - start
+        logger.debug(f"Indexed {len(packages)} dpkg packages in {self.build_time * 1000:.1f} ms")
+
+    def _read_all(self) -> Iterator[DpkgPackage]:
+        if os.path.exists(self.path):
+            yield from parse_file(self.path)
+        # Records dpkg has journaled but not yet merged into the status file
+        try:
+            journal = sorted(name for name in os.listdir(self.updates) if name.isdigit())
+        except OSError:
+            journal = []
+        for name in journal:
+            try:
+                yield from parse_file(os.path.join(self.updates, name))
+            except OSError:
+                continue
+
+    def _index(self):
+        with self._lock:
+            self._refresh()
+            return self._packages, self._names
+
+    def get(self, name: str) -> Optional[DpkgPackage]:
+        """Return a package by name (name:arch selects an architecture)"""
+        packages, _ = self._index()
+        name, _, arch = name.partition(':')
+        entries = packages.get(name, [])
+        if arch:
+            entries = [entry for entry in entries if entry.architecture == arch]
+        # Prefer the installed entry when several architectures are known
+        entries = sorted(entries, key=lambda entry: not entry.installed)
+        return entries[0] if entries else None
+
+    def is_installed(self, name: str) -> bool:
+        package = self.get(name)
+        return package is not None and package.installed
+
+    def version(self, name: str) -> Optional[str]:
+        package = self.get(name)
+        return package.version if package is not None and package.present else None
+
+    def with_prefix(self, prefix: str, installed_only: bool = False) -> List[DpkgPackage]:
+        """Packages whose name starts with prefix, e.g. 'linux-headers-', sorted by name"""
+        packages, names = self._index()
+        start = bisect.bisect_left(names, prefix)
+        result = []
+        for name in names[start:]:
+            if not name.startswith(prefix):
+                break
+            for package in packages[name]:
+                if not installed_only or package.installed:
+                    result.append(package)
+        return result
+
+    def packages(self, installed_only: bool = False) -> List[DpkgPackage]:
+        packages, names = self._index()
+        return [package for name in names for package in packages[name]
+                if not installed_only or package.installed]
+
+    def count(self, installed_only: bool = True) -> int:
+        return len(self.packages(installed_only))
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_dpkg_status() -> DpkgStatusDB:
+    """Return the dpkg status database shared by all modules"""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = DpkgStatusDB()
+        return _db
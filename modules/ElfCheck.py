@@ -0,0 +1,196 @@
+# Part 41: ELF Validation
+import mmap
+import struct
+import threading
+from typing import Optional
+
+ELF_MAGIC = b'\x7fELF'
+
+# e_ident[EI_CLASS] -> (ELF header size, program header size, section header size)
+ELF_CLASSES = {1: (52, 32, 40), 2: (64, 56, 64)}
+ELF_DATA = {1: '<', 2: '>'}
+ELF_TYPES = {1, 2, 3, 4}  # ET_REL, ET_EXEC, ET_DYN, ET_CORE
+
+PT_LOAD = 1
+PT_DYNAMIC = 2
+PT_INTERP = 3
+SHT_NOBITS = 8
+SHN_XINDEX = 0xffff
+DT_NULL = 0
+DT_NEEDED = 1
+DT_STRTAB = 5
+DT_STRSZ = 10
+
+
+class ElfError(Exception):
+    """Raised for a structural problem found in an ELF file"""
+
+
+class ElfFile:
+    """Bounds-checked view of an ELF file mapped into memory"""
+
+    def __init__(self, data, size: int):
+        self.data = data
+        self.size = size
+        if data[:4] != ELF_MAGIC:
+            raise ElfError("not an ELF file")
+        if size < 16:
+            raise ElfError(f"truncated in the ELF identification ({size} bytes)")
+        elf_class, elf_data, version = data[4], data[5], data[6]
+        if elf_class not in ELF_CLASSES or elf_data not in ELF_DATA or version != 1:
+            raise ElfError("invalid ELF identification")
+        self.is64 = elf_class == 2
+        self.endian = ELF_DATA[elf_data]
+        self.ehsize, self.phsize, self.shsize = ELF_CLASSES[elf_class]
+        if size < self.ehsize:
+            raise ElfError(f"truncated in the ELF header ({size} bytes)")
+
+        if self.is64:
+            fields = self.unpack('HHIQQQIHHHHHH', 16)
+        else:
+            fields = self.unpack('HHIIIIIHHHHHH', 16)
+        (self.type, self.machine, _, self.entry, self.phoff, self.shoff, _,
+         ehsize, phentsize, self.phnum, shentsize, self.shnum, self.shstrndx) = fields
+        if self.type not in ELF_TYPES:
+            raise ElfError(f"unknown ELF type {self.type}")
+        if ehsize != self.ehsize:
+            raise ElfError(f"bad ELF header size {ehsize}")
+        if self.phnum and phentsize != self.phsize:
+            raise ElfError(f"bad program header size {phentsize}")
+        if self.shoff and shentsize != self.shsize:
+            raise ElfError(f"bad section header size {shentsize}")
+
+    def unpack(self, layout: str, offset: int) -> tuple:
+        fmt = self.endian + layout
+        end = offset + struct.calcsize(fmt)
+        if offset < 0 or end > self.size:
+            raise ElfError(f"truncated: needs {end} bytes, file has {self.size}")
+        return struct.unpack_from(fmt, self.data, offset)
+
+    def check_range(self, what: str, offset: int, length: int):
+        if offset < 0 or length < 0 or offset + length > self.size:
+            raise ElfError(f"truncated: {what} ends at {offset + length}, "
+                           f"file has {self.size} bytes")
+
+    def program_headers(self):
+        """(type, offset, filesz, memsz) of each program header"""
+        self.check_range("program header table", self.phoff, self.phnum * self.phsize)
+        for i in range(self.phnum):
+            offset = self.phoff + i * self.phsize
+            if self.is64:
+                p_type, _, p_offset, _, _, p_filesz, p_memsz, _ = self.unpack('IIQQQQQQ', offset)
+            else:
+                p_type, p_offset, _, _, p_filesz, p_memsz, _, _ = self.unpack('IIIIIIII', offset)
+            yield p_type, p_offset, p_filesz, p_memsz
+
+    def section_headers(self):
+        """(type, offset, size) of each section header"""
+        if not self.shoff:
+            return
+        shnum = self.shnum
+        first = self.shoff
+        if shnum == 0:
+            # Extended numbering: the count is in the first section's sh_size
+            shnum = self._section(first)[2]
+        self.check_range("section header table", self.shoff, shnum * self.shsize)
+        if self.shstrndx != SHN_XINDEX and shnum and self.shstrndx >= shnum:
+            raise ElfError(f"section name table index {self.shstrndx} out of range")
+        for i in range(shnum):
+            yield self._section(first + i * self.shsize)
+
+    def _section(self, offset: int):
+        if self.is64:
+            _, sh_type, _, _, sh_offset, sh_size = self.unpack('IIQQQQ', offset)
+        else:
+            _, sh_type, _, _, sh_offset, sh_size = self.unpack('IIIIII', offset)
+        return sh_type, sh_offset, sh_size
+
+    def check_dynamic(self, offset: int, filesz: int):
+        """The dynamic section must end with DT_NULL and point at its string table"""
+        entry_size = 16 if self.is64 else 8
+        layout = 'qQ' if self.is64 else 'iI'
+        tags = {}
+        for position in range(offset, offset + filesz - entry_size + 1, entry_size):
+            tag, value = self.unpack(layout, position)
+            if tag == DT_NULL:
+                break
+            tags.setdefault(tag, value)
+        else:
+            raise ElfError("dynamic section has no DT_NULL terminator")
+        if DT_NEEDED in tags and DT_STRTAB not in tags:
+            raise ElfError("dynamic section lists libraries without a string table")
+        if tags.get(DT_STRSZ, 0) > self.size:
+            raise ElfError(f"dynamic string table size {tags[DT_STRSZ]} exceeds the file")
+
+    def validate(self):
+        """Raise ElfError for the first structural problem found"""
+        # Separate debug files (objcopy --only-keep-debug) keep the program
+        # headers but turn the sections behind them into SHT_NOBITS
+        nobits = []
+        for sh_type, sh_offset, sh_size in self.section_headers():
+            if sh_type == SHT_NOBITS:
+                if sh_size:
+                    nobits.append((sh_offset, sh_offset + sh_size))
+            else:
+                self.check_range("section", sh_offset, sh_size)
+        for p_type, p_offset, p_filesz, p_memsz in self.program_headers():
+            if p_type == PT_LOAD:
+                self.check_range("loadable segment", p_offset, p_filesz)
+                if p_filesz > p_memsz:
+                    raise ElfError("loadable segment is larger in the file than in memory")
+            elif any(start <= p_offset < end for start, end in nobits):
+                continue
+            elif p_type == PT_INTERP:
+                self.check_range("interpreter path", p_offset, p_filesz)
+                if not p_filesz or self.data[p_offset + p_filesz - 1] != 0:
+                    raise ElfError("interpreter path is not terminated")
+            elif p_type == PT_DYNAMIC:
+                self.check_range("dynamic section", p_offset, p_filesz)
+                self.check_dynamic(p_offset, p_filesz)
+
+
+def is_elf(head: bytes) -> bool:
+    return head[:4] == ELF_MAGIC
+
+
+class ElfValidator:
+    """Checks ELF files in-process instead of running file(1) on each one.
+
+    The header, program headers, section headers and dynamic section are
+    read through one read-only mmap of the file, so only the pages holding
+    them are touched. It counts the files it examined and found corrupt,
+    including those whose earlier result came from the scan cache (also
+    counted in cached); one validator can be shared by the scan worker
+    threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.examined = 0
+        self.corrupt = 0
+        self.cached = 0
+
+    def count_cached(self, corrupt: bool):
+        """Count an ELF file whose result was reused instead of checked again"""
+        with self._lock:
+            self.examined += 1
+            self.cached += 1
+            if corrupt:
+                self.corrupt += 1
+
+    def check(self, f) -> Optional[str]:
+        """Problem with the open ELF file f, or None if it is sound"""
+        try:
+            # Map the whole file as it is now; bounds are checked against this size
+            with mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as data:
+                ElfFile(data, len(data)).validate()
+            problem = None
+        except ElfError as e:
+            problem = str(e)
+        except (OSError, ValueError) as e:
+            problem = f"cannot map file: {str(e)}"
+        with self._lock:
+            self.examined += 1
+            if problem:
+                self.corrupt += 1
+        return problem
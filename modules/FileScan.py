@@ -0,0 +1,128 @@
+# Part 40: Parallel File Scanner
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger("KaliFixAll.FileScan")
+
+# Threads checking files; the work is syscalls and reads, so more than the cores
+SCAN_WORKERS = max(4, min(32, (os.cpu_count() or 1) * 2))
+
+# Files handed to a worker at once, and batches allowed to wait for a worker
+BATCH_SIZE = 64
+MAX_PENDING_BATCHES = 4
+
+
+def walk_files(root: str, skip=frozenset(),
+               on_directory: Optional[Callable[[str, List[str], int], None]] = None,
+               stopped: Optional[Callable[[], bool]] = None) -> Iterator[os.DirEntry]:
+    """Yield a DirEntry for every regular file under root, depth first.
+
+    Each directory is read once with scandir and the entry types come from
+    it, so no file is statted here; entry.stat(follow_symlinks=False) then
+    costs one lstat, cached on the entry. Symlinks are not followed and
+    directories in skip are not entered. on_directory(path, subdirectories,
+    file_count) is called as each directory is listed.
+    """
+    stack = [root]
+    while stack:
+        if stopped is not None and stopped():
+            return
+        directory = stack.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            continue
+        dirs, files = [], []
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in skip:
+                            dirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files.append(entry)
+                except OSError:
+                    continue
+        if on_directory is not None:
+            on_directory(directory, dirs, len(files))
+        yield from files
+        stack.extend(reversed(dirs))
+
+
+def _check_batch(check: Callable, batch: List) -> List[Tuple[str, str]]:
+    results = []
+    for entry in batch:
+        try:
+            reason = check(entry)
+        except Exception as e:
+            reason = f"Check failed: {str(e)}"
+        if reason:
+            results.append((entry.path, reason))
+    return results
+
+
+def scan_files(entries: Iterable, check: Callable[[os.DirEntry], Optional[str]],
+               on_batch: Callable[[List[Tuple[str, str]], int], None],
+               stopped: Optional[Callable[[], bool]] = None,
+               workers: int = SCAN_WORKERS, batch_size: int = BATCH_SIZE) -> int:
+    """Run check(entry) over entries on a bounded pool of threads.
+
+    check returns a problem description or None. on_batch(problems,
+    checked) is called in the calling thread for every finished batch,
+    with the (path, problem) pairs found in it and the number of files it
+    checked, so results reach the UI a batch at a time. The walk is only
+    allowed to run MAX_PENDING_BATCHES per worker ahead of the checks.
+    Returns the number of files checked.
+    """
+    start = time.perf_counter()
+    finished = queue.Queue()
+    slots = threading.BoundedSemaphore(workers * MAX_PENDING_BATCHES)
+    submitted = 0
+    checked = 0
+
+    def drain(block: bool = False):
+        nonlocal checked, submitted
+        while submitted:
+            try:
+                size, future = finished.get(block=block)
+            except queue.Empty:
+                return
+            submitted -= 1
+            checked += size
+            on_batch(future.result(), size)
+            block = False
+
+    def submit(batch):
+        nonlocal submitted
+        while not slots.acquire(timeout=0.1):
+            drain()
+        future = pool.submit(_check_batch, check, batch)
+        future.add_done_callback(lambda f, size=len(batch): (slots.release(),
+                                                             finished.put((size, f))))
+        submitted += 1
+        drain()
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+    try:
+        batch = []
+        for entry in entries:
+            if stopped is not None and stopped():
+                break
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+        if batch and not (stopped is not None and stopped()):
+            submit(batch)
+        while submitted:
+            drain(block=True)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+    logger.debug(f"Checked {checked} files with {workers} workers in "
+                 f"{time.perf_counter() - start:.1f}s")
+    return checked
@@ -0,0 +1,208 @@
+# Part 25: Fix Scheduler
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, List, Optional
+from CommandExecutor import CancellationToken
+from Tracing import span
+from Metrics import record_fix
+
+logger = logging.getLogger("KaliFixAll.FixScheduler")
+
+# Resource tags used by module fixes. Fixes sharing a tag never run at the
+# same time; fixes with disjoint tags run in parallel.
+#   dpkg-lock     anything running apt-get, apt or dpkg
+#   network       restarts or reconfigures networking, or needs the network
+#   block-device  mounts, unmounts or repairs disks and partitions
+#   systemd       starts, stops or resets system services
+DPKG_LOCK = 'dpkg-lock'
+NETWORK = 'network'
+BLOCK_DEVICE = 'block-device'
+SYSTEMD = 'systemd'
+
+# Number of fixes that may run at once when their resources allow it
+FIX_WORKERS = 4
+
+
+class FixTask:
+    """A module fix with the resources it holds and the fixes it must follow"""
+
+    def __init__(self, name: str, func: Callable, resources: Iterable[str] = (),
+                 after: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.resources = frozenset(resources)
+        self.after = tuple(after)
+
+
+class FixResult:
+    """Outcome of one module's fix_common_issues"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = 'pending'
+        self.fixed: List[str] = []
+        self.error = None
+        self.started = None
+        self.duration = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ('pending', 'running')
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status in ('fixed', 'ok')
+
+    @property
+    def items(self) -> List[str]:
+        return self.fixed
+
+    def to_dict(self):
+        return {
+            'module': self.name,
+            'status': self.status,
+            'fixed': list(self.fixed),
+            'error': self.error,
+            'duration': round(self.duration, 3),
+        }
+
+
+class FixScheduler:
+    """Runs fixes as a dependency graph, serializing fixes that share a resource.
+
+    A fix starts once every fix listed in its `after` has succeeded and none
+    of its resources is held by a running fix. If a fix it depends on fails,
+    is skipped or is cancelled, it is skipped. Dependencies on fixes that are
+    not part of the run are ignored.
+    """
+
+    def __init__(self, tasks: List[FixTask], max_workers: int = FIX_WORKERS,
+                 token: Optional[CancellationToken] = None):
+        self.tasks: Dict[str, FixTask] = {task.name: task for task in tasks}
+        self.max_workers = max_workers
+        self.token = token or CancellationToken()
+        self.order = self.topological_order()
+        self.results: Dict[str, FixResult] = {name: FixResult(name) for name in self.order}
+
+    def dependencies(self, task: FixTask) -> List[str]:
+        return [name for name in task.after if name in self.tasks]
+
+    def topological_order(self) -> List[str]:
+        """Return task names with every task after its dependencies.
+
+        Ties keep the order the tasks were given in. Raises ValueError on a cycle.
+        """
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                cycle = path[path.index(name):] + [name]
+                raise ValueError(f"Fix dependency cycle: {' -> '.join(cycle)}")
+            state[name] = 'visiting'
+            for dep in self.dependencies(self.tasks[name]):
+                visit(dep, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.tasks:
+            visit(name, [])
+        return order
+
+    def run(self, on_result: Optional[Callable[[FixResult], None]] = None,
+            on_start: Optional[Callable[[FixResult], None]] = None) -> List[FixResult]:
+        """Run every fix and return the results in dependency order.
+
+        on_start and on_result are called from the calling thread.
+        """
+        pending = list(self.order)
+        running = {}
+        held = set()
+
+        def report(result):
+            record_fix(result)
+            if on_result is not None:
+                on_result(result)
+
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(pending))),
+                                  thread_name_prefix="fix")
+        try:
+            while pending or running:
+                if self.token.cancelled:
+                    for name in pending:
+                        self.results[name].status = 'cancelled'
+                        report(self.results[name])
+                    pending = []
+
+                for name in list(pending):
+                    task = self.tasks[name]
+                    deps = [self.results[dep] for dep in self.dependencies(task)]
+                    if any(dep.finished and not dep.succeeded for dep in deps):
+                        blocked = next(dep.name for dep in deps
+                                       if dep.finished and not dep.succeeded)
+                        result = self.results[name]
+                        result.status = 'skipped'
+                        result.error = f"{blocked} did not succeed"
+                        pending.remove(name)
+                        report(result)
+                        continue
+                    if not all(dep.succeeded for dep in deps):
+                        continue
+                    if task.resources & held or len(running) >= self.max_workers:
+                        continue
+
+                    held |= task.resources
+                    pending.remove(name)
+                    result = self.results[name]
+                    result.status = 'running'
+                    result.started = time.perf_counter()
+                    if on_start is not None:
+                        on_start(result)
+                    running[pool.submit(self._run_fix, task, result)] = task
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    held -= task.resources
+                    report(self.results[task.name])
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return [self.results[name] for name in self.order]
+
+    def _run_fix(self, task: FixTask, result: FixResult):
+        try:
+            with span(f"Fix {task.name}", 'fix', resources=sorted(task.resources)) as trace:
+                fixed = task.func(self.token) or []
+                trace.set(fixed=len(fixed))
+        except Exception as e:
+            logger.exception(f"Fix for {task.name} failed: {str(e)}")
+            result.status = 'failed'
+            result.error = str(e)
+        else:
+            result.fixed = list(fixed)
+            result.status = 'cancelled' if self.token.cancelled else (
+                'fixed' if fixed else 'ok')
+        result.duration = time.perf_counter() - result.started
+        logger.info(f"Fix {task.name}: {result.status} in {result.duration:.2f}s "
+                    f"(resources: {', '.join(sorted(task.resources)) or 'none'})")
+
+
+def format_fix_summary(results: List[FixResult]) -> str:
+    """Format fix results as a timing table in the order they were scheduled"""
+    lines = [f"{'Module':<25} {'Status':<10} {'Fixed':>6} {'Time (s)':>9}"]
+    lines.append("-" * 53)
+    for result in results:
+        lines.append(f"{result.name:<25} {result.status:<10} {len(result.fixed):>6} "
+                     f"{result.duration:9.2f}")
+    lines.append("-" * 53)
+    total_fixed = sum(len(result.fixed) for result in results)
+    lines.append(f"{'Total':<25} {'':<10} {total_fixed:>6}")
+    return "\n".join(lines)
@@ -1,14 +1,16 @@
 # Part 17: Flash Drive Format Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Tuple, Set, Union
 import json
-import pyudev
-import dbus
+from LazyImport import lazy_import
+pyudev = lazy_import('pyudev')
+dbus = lazy_import('dbus')
 import time
 from pathlib import Path
+from CommandExecutor import execute
+from JobRunner import get_job_runner, ui_thread
 
 class FlashDriveModule:
     def __init__(self, parent_notebook):
@@ -25,6 +27,9 @@ class FlashDriveModule:
             'Small Drive (<4GB)': 'FAT32'
         }
         
+        self.jobs = get_job_runner()
+        self.drive_job = None
+        
         # Create interface
         self.create_interface()
         
@@ -137,19 +142,12 @@ class FlashDriveModule:
         # Bind selection event
         self.drives_tree.bind('<<TreeviewSelect>>', self.show_drive_details)
 
-    def run_command(self, command: str, shell: bool = False) -> Tuple[str, str, int]:
+    def run_command(self, command: Union[str, List[str]], shell: bool = False,
+                    timeout: float = None, on_output=None,
+                    token=None) -> Tuple[str, str, int]:
         """Run command and return output, error, and return code"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
 
     def is_flash_drive(self, device) -> bool:
         """Check if the device is a flash drive"""
@@ -176,14 +174,14 @@ class FlashDriveModule:
         info = {}
         try:
             # Get size
-            output, _, _ = self.run_command(f"lsblk -b {device_path}")
+            output, _, _ = self.run_command(["lsblk", "-b", device_path])
             for line in output.splitlines():
                 if device_path.split('/')[-1] in line:
                     size_bytes = int(line.split()[3])
                     info['size'] = self.format_size(size_bytes)
             
             # Get format
-            output, _, _ = self.run_command(f"blkid {device_path}")
+            output, _, _ = self.run_command(["blkid", device_path])
             if output:
                 if 'TYPE=' in output:
                     info['format'] = output.split('TYPE="')[1].split('"')[0]
@@ -193,7 +191,7 @@ class FlashDriveModule:
                 info['format'] = 'Unformatted'
             
             # Get mount point
-            output, _, _ = self.run_command(f"lsblk -o MOUNTPOINT {device_path}")
+            output, _, _ = self.run_command(["lsblk", "-o", "MOUNTPOINT", device_path])
             mount_point = None
             for line in output.splitlines():
                 if line.strip() and not line.strip() == 'MOUNTPOINT':
@@ -237,80 +235,104 @@ class FlashDriveModule:
             messagebox.showerror("Error", f"Failed to scan drives: {str(e)}")
 
     def device_event(self, action, device):
-        """Handle device plug/unplug events"""
+        """Handle device plug/unplug events (called on the udev observer thread)"""
         if self.is_flash_drive(device):
-            if action == 'add':
-                self.update_details(f"Flash drive connected: {device.device_node}\n")
-            elif action == 'remove':
-                self.update_details(f"Flash drive removed: {device.device_node}\n")
-            
-            # Rescan drives
-            self.scan_drives()
+            self.drive_changed(action, device.device_node)
 
-    def format_drive(self):
-        """Format the selected drive"""
+    @ui_thread
+    def drive_changed(self, action: str, device_node: str):
+        if action == 'add':
+            self.update_details(f"Flash drive connected: {device_node}\n")
+        elif action == 'remove':
+            self.update_details(f"Flash drive removed: {device_node}\n")
+        
+        # Rescan drives
+        self.scan_drives()
+
+    def selected_drive(self):
+        """Device path of the selected drive, or None after telling the user"""
         selection = self.drives_tree.selection()
         if not selection:
             messagebox.showinfo("Info", "No drive selected")
+            return None
+        return self.drives_tree.item(selection[0])['values'][0]
+
+    def start_drive_job(self, name: str, target, *args, on_done=None):
+        """Run a long drive operation as a job; one at a time"""
+        if self.drive_job and self.drive_job.active:
+            messagebox.showinfo("Info", "A drive operation is already running")
+            return
+        # badblocks and dd can run for hours, so they get their own thread
+        self.drive_job = self.jobs.submit(name, target, *args, owner=self, dedicated=True,
+                                          on_done=on_done,
+                                          on_error=lambda e: self.drive_job_failed(name, e))
+
+    def drive_job_failed(self, name: str, error):
+        self.update_details(f"Error: {name} failed: {str(error)}\n")
+        messagebox.showerror("Error", f"{name} failed: {str(error)}")
+
+    def unmount_for_job(self, job, device_path: str):
+        """Unmount device_path from a job if it is mounted"""
+        if self.detected_drives[device_path]['mount'] != 'Not Mounted':
+            _, error, code = self.run_command(["sudo", "umount", device_path], token=job.token)
+            if code != 0:
+                raise Exception(f"Unmount failed: {error}")
+
+    def format_drive(self):
+        """Format the selected drive"""
+        device_path = self.selected_drive()
+        if not device_path:
             return
-        
-        device_path = self.drives_tree.item(selection[0])['values'][0]
         format_type = self.format_var.get()
         label = self.label_var.get()
         
         if messagebox.askyesno("Warning",
                               f"This will ERASE ALL DATA on {device_path}!\n"
                               f"Are you sure you want to format to {format_type}?"):
-            try:
-                # Unmount if mounted
-                if self.detected_drives[device_path]['mount'] != 'Not Mounted':
-                    self.unmount_drive()
-                
-                self.update_details(f"Formatting {device_path} as {format_type}...\n")
-                
-                # Format based on selected type
-                if format_type == 'ext4':
-                    cmd = f"sudo mkfs.ext4"
-                    if label:
-                        cmd += f" -L {label}"
-                    cmd += f" {device_path}"
-                elif format_type == 'exFAT':
-                    cmd = f"sudo mkfs.exfat"
-                    if label:
-                        cmd += f" -n {label}"
-                    cmd += f" {device_path}"
-                elif format_type == 'NTFS':
-                    cmd = f"sudo mkfs.ntfs -f"
-                    if label:
-                        cmd += f" -L {label}"
-                    cmd += f" {device_path}"
-                elif format_type == 'FAT32':
-                    cmd = f"sudo mkfs.vfat"
-                    if label:
-                        cmd += f" -n {label}"
-                    cmd += f" {device_path}"
-                
-                output, error, code = self.run_command(cmd)
-                
-                if code == 0:
-                    self.update_details("Format completed successfully.\n")
-                    self.scan_drives()
-                else:
-                    raise Exception(error)
-                
-            except Exception as e:
-                self.update_details(f"Error formatting drive: {str(e)}\n")
-                messagebox.showerror("Error", f"Format failed: {str(e)}")
+            self.start_drive_job(f"Format {device_path}", self._format_drive,
+                                 device_path, format_type, label)
+
+    def _format_drive(self, job, device_path: str, format_type: str, label: str):
+        # Unmount if mounted
+        self.unmount_for_job(job, device_path)
+        
+        self.update_details(f"Formatting {device_path} as {format_type}...\n")
+        
+        # Format based on selected type
+        if format_type == 'ext4':
+            cmd = ["sudo", "mkfs.ext4"]
+            if label:
+                cmd += ["-L", label]
+        elif format_type == 'exFAT':
+            cmd = ["sudo", "mkfs.exfat"]
+            if label:
+                cmd += ["-n", label]
+        elif format_type == 'NTFS':
+            cmd = ["sudo", "mkfs.ntfs", "-f"]
+            if label:
+                cmd += ["-L", label]
+        elif format_type == 'FAT32':
+            cmd = ["sudo", "mkfs.vfat"]
+            if label:
+                cmd += ["-n", label]
+        else:
+            raise Exception(f"Unsupported format: {format_type}")
+        cmd.append(device_path)
+        
+        output, error, code = self.run_command(cmd, token=job.token)
+        job.check_cancelled()
+        if code != 0:
+            raise Exception(error)
+        
+        self.update_details("Format completed successfully.\n")
+        job.ui(self.scan_drives)
 
     def mount_drive(self):
         """Mount the selected drive"""
-        selection = self.drives_tree.selection()
-        if not selection:
-            messagebox.showinfo("Info", "No drive selected")
+        device_path = self.selected_drive()
+        if not device_path:
             return
         
-        device_path = self.drives_tree.item(selection[0])['values'][0]
-        
         try:
             if self.detected_drives[device_path]['mount'] != 'Not Mounted':
                 messagebox.showinfo("Info", "Drive is already mounted")
@@ -321,7 +343,7 @@ class FlashDriveModule:
             os.makedirs(mount_point, exist_ok=True)
             
             # Mount drive
-            cmd = f"sudo mount {device_path} {mount_point}"
+            cmd = ["sudo", "mount", device_path, mount_point]
             output, error, code = self.run_command(cmd)
             
             if code == 0:
@@ -336,20 +358,17 @@ class FlashDriveModule:
 
     def unmount_drive(self):
         """Unmount the selected drive"""
-        selection = self.drives_tree.selection()
-        if not selection:
-            messagebox.showinfo("Info", "No drive selected")
+        device_path = self.selected_drive()
+        if not device_path:
             return
         
-        device_path = self.drives_tree.item(selection[0])['values'][0]
-        
         try:
             if self.detected_drives[device_path]['mount'] == 'Not Mounted':
                 messagebox.showinfo("Info", "Drive is not mounted")
                 return
             
             # Unmount drive
-            cmd = f"sudo umount {device_path}"
+            cmd = ["sudo", "umount", device_path]
             output, error, code = self.run_command(cmd)
             
             if code == 0:
@@ -364,150 +383,144 @@ class FlashDriveModule:
 
     def check_drive_health(self):
         """Check health status of selected drive"""
-        selection = self.drives_tree.selection()
-        if not selection:
-            messagebox.showinfo("Info", "No drive selected")
+        device_path = self.selected_drive()
+        if device_path:
+            self.start_drive_job(f"Check health of {device_path}", self._check_drive_health,
+                                 device_path, self.detected_drives[device_path]['format'])
+
+    def _check_drive_health(self, job, device_path: str, fs_type: str):
+        self.update_details(f"Checking health of {device_path}...\n")
+        
+        # Get SMART data if available
+        output, error, code = self.run_command(["sudo", "smartctl", "-a", device_path],
+                                               token=job.token)
+        if code == 0 and "SMART support is: Available" in output:
+            self.update_details("SMART Data:\n" + output + "\n")
+            
+            # Check for warnings
+            if "SMART overall-health self-assessment test result: PASSED" in output:
+                self.update_details("Drive health status: GOOD\n")
+            else:
+                self.update_details("Drive health status: WARNING - Issues detected\n")
             return
         
-        device_path = self.drives_tree.item(selection[0])['values'][0]
-        
-        try:
-            self.update_details(f"Checking health of {device_path}...\n")
-            
-            # Get SMART data if available
-            output, error, code = self.run_command(f"sudo smartctl -a {device_path}")
-            if code == 0 and "SMART support is: Available" in output:
-                self.update_details("SMART Data:\n" + output + "\n")
-                
-                # Check for warnings
-                if "SMART overall-health self-assessment test result: PASSED" in output:
-                    self.update_details("Drive health status: GOOD\n")
-                else:
-                    self.update_details("Drive health status: WARNING - Issues detected\n")
+        # Fallback to basic checks if SMART not available
+        self.update_details("SMART data not available. Performing basic checks...\n")
+        
+        # Check for bad blocks
+        job.set_progress(message="Checking for bad blocks")
+        output, error, code = self.run_command(["sudo", "badblocks", "-n", device_path],
+                                               token=job.token)
+        job.check_cancelled()
+        if code == 0 and not output.strip():
+            self.update_details("No bad blocks detected.\n")
+        else:
+            self.update_details(f"Warning: Bad blocks found:\n{output}\n")
+        
+        # Check filesystem
+        if fs_type in ['ext2', 'ext3', 'ext4']:
+            job.set_progress(message="Checking filesystem")
+            output, error, code = self.run_command(["sudo", "e2fsck", "-n", device_path],
+                                                   token=job.token)
+            job.check_cancelled()
+            if code == 0:
+                self.update_details("Filesystem check passed.\n")
             else:
-                # Fallback to basic checks if SMART not available
-                self.update_details("SMART data not available. Performing basic checks...\n")
-                
-                # Check for bad blocks
-                output, error, code = self.run_command(f"sudo badblocks -n {device_path}")
-                if code == 0 and not output.strip():
-                    self.update_details("No bad blocks detected.\n")
-                else:
-                    self.update_details(f"Warning: Bad blocks found:\n{output}\n")
-                
-                # Check filesystem
-                if self.detected_drives[device_path]['format'] in ['ext2', 'ext3', 'ext4']:
-                    output, error, code = self.run_command(f"sudo e2fsck -n {device_path}")
-                    if code == 0:
-                        self.update_details("Filesystem check passed.\n")
-                    else:
-                        self.update_details(f"Filesystem issues detected:\n{error}\n")
-            
-        except Exception as e:
-            self.update_details(f"Error checking drive health: {str(e)}\n")
-            messagebox.showerror("Error", f"Health check failed: {str(e)}")
+                self.update_details(f"Filesystem issues detected:\n{error}\n")
 
     def fix_drive_errors(self):
         """Attempt to fix common drive errors"""
-        selection = self.drives_tree.selection()
-        if not selection:
-            messagebox.showinfo("Info", "No drive selected")
+        device_path = self.selected_drive()
+        if not device_path:
             return
         
-        device_path = self.drives_tree.item(selection[0])['values'][0]
-        
         if messagebox.askyesno("Confirm",
                               f"Attempt to fix errors on {device_path}?"):
-            try:
-                # Unmount if mounted
-                if self.detected_drives[device_path]['mount'] != 'Not Mounted':
-                    self.unmount_drive()
-                
-                self.update_details(f"Attempting to fix errors on {device_path}...\n")
-                
-                # Check filesystem type and use appropriate tool
-                fs_type = self.detected_drives[device_path]['format']
-                
-                if fs_type in ['ext2', 'ext3', 'ext4']:
-                    cmd = f"sudo e2fsck -f -y {device_path}"
-                elif fs_type == 'NTFS':
-                    cmd = f"sudo ntfsfix {device_path}"
-                elif fs_type in ['vfat', 'FAT32']:
-                    cmd = f"sudo dosfsck -t -a {device_path}"
-                elif fs_type == 'exFAT':
-                    cmd = f"sudo exfatfsck -a {device_path}"
-                else:
-                    raise Exception(f"Unsupported filesystem: {fs_type}")
-                
-                output, error, code = self.run_command(cmd)
-                
-                if code == 0:
-                    self.update_details("Filesystem repairs completed successfully.\n")
-                else:
-                    self.update_details(f"Warning: Issues found during repair:\n{error}\n")
-                
-                # Attempt to fix bad blocks
-                self.update_details("Checking for bad blocks...\n")
-                output, error, code = self.run_command(
-                    f"sudo badblocks -w {device_path}"
-                )
-                
-                if code == 0:
-                    self.update_details("Bad blocks check/repair completed.\n")
-                else:
-                    self.update_details(f"Warning: Bad blocks found:\n{error}\n")
-                
-                self.scan_drives()
-                
-            except Exception as e:
-                self.update_details(f"Error fixing drive: {str(e)}\n")
-                messagebox.showerror("Error", f"Repair failed: {str(e)}")
+            self.start_drive_job(f"Fix errors on {device_path}", self._fix_drive_errors,
+                                 device_path, self.detected_drives[device_path]['format'])
+
+    def _fix_drive_errors(self, job, device_path: str, fs_type: str):
+        # Check filesystem type and use appropriate tool
+        if fs_type in ['ext2', 'ext3', 'ext4']:
+            cmd = ["sudo", "e2fsck", "-f", "-y", device_path]
+        elif fs_type == 'NTFS':
+            cmd = ["sudo", "ntfsfix", device_path]
+        elif fs_type in ['vfat', 'FAT32']:
+            cmd = ["sudo", "dosfsck", "-t", "-a", device_path]
+        elif fs_type == 'exFAT':
+            cmd = ["sudo", "exfatfsck", "-a", device_path]
+        else:
+            raise Exception(f"Unsupported filesystem: {fs_type}")
+        
+        # Unmount if mounted
+        self.unmount_for_job(job, device_path)
+        
+        self.update_details(f"Attempting to fix errors on {device_path}...\n")
+        job.set_progress(message="Repairing filesystem")
+        output, error, code = self.run_command(cmd, token=job.token)
+        job.check_cancelled()
+        
+        if code == 0:
+            self.update_details("Filesystem repairs completed successfully.\n")
+        else:
+            self.update_details(f"Warning: Issues found during repair:\n{error}\n")
+        
+        # Attempt to fix bad blocks
+        self.update_details("Checking for bad blocks...\n")
+        job.set_progress(message="Checking for bad blocks")
+        output, error, code = self.run_command(
+            ["sudo", "badblocks", "-w", device_path], token=job.token
+        )
+        job.check_cancelled()
+        
+        if code == 0:
+            self.update_details("Bad blocks check/repair completed.\n")
+        else:
+            self.update_details(f"Warning: Bad blocks found:\n{error}\n")
+        
+        job.ui(self.scan_drives)
 
     def secure_erase(self):
         """Perform secure erase of selected drive"""
-        selection = self.drives_tree.selection()
-        if not selection:
-            messagebox.showinfo("Info", "No drive selected")
+        device_path = self.selected_drive()
+        if not device_path:
             return
         
-        device_path = self.drives_tree.item(selection[0])['values'][0]
-        
         if messagebox.askyesno("Warning",
                               f"This will SECURELY ERASE ALL DATA on {device_path}!\n"
                               "This process cannot be undone!\n"
                               "Are you absolutely sure?"):
-            try:
-                # Unmount if mounted
-                if self.detected_drives[device_path]['mount'] != 'Not Mounted':
-                    self.unmount_drive()
-                
-                self.update_details(f"Starting secure erase of {device_path}...\n")
-                
-                # First pass: Write zeros
-                self.update_details("Pass 1: Writing zeros...\n")
-                cmd = f"sudo dd if=/dev/zero of={device_path} bs=4M status=progress"
-                output, error, code = self.run_command(cmd, shell=True)
-                
-                # Second pass: Write random data
-                self.update_details("Pass 2: Writing random data...\n")
-                cmd = f"sudo dd if=/dev/urandom of={device_path} bs=4M status=progress"
-                output, error, code = self.run_command(cmd, shell=True)
-                
-                # Final pass: Write zeros again
-                self.update_details("Pass 3: Final zero pass...\n")
-                cmd = f"sudo dd if=/dev/zero of={device_path} bs=4M status=progress"
-                output, error, code = self.run_command(cmd, shell=True)
-                
-                self.update_details("Secure erase completed.\n")
-                self.update_details("Recommend reformatting the drive now.\n")
-                
-                if messagebox.askyesno("Format Drive",
-                                     "Would you like to format the drive now?"):
-                    self.format_drive()
-                
-            except Exception as e:
-                self.update_details(f"Error during secure erase: {str(e)}\n")
-                messagebox.showerror("Error", f"Secure erase failed: {str(e)}")
+            self.start_drive_job(f"Secure erase {device_path}", self._secure_erase,
+                                 device_path, on_done=self.secure_erase_done)
+
+    def _secure_erase(self, job, device_path: str):
+        # Unmount if mounted
+        self.unmount_for_job(job, device_path)
+        
+        self.update_details(f"Starting secure erase of {device_path}...\n")
+        
+        passes = [
+            # First pass: Write zeros
+            ("Pass 1: Writing zeros...", "/dev/zero"),
+            # Second pass: Write random data
+            ("Pass 2: Writing random data...", "/dev/urandom"),
+            # Final pass: Write zeros again
+            ("Pass 3: Final zero pass...", "/dev/zero"),
+        ]
+        for number, (message, source) in enumerate(passes):
+            self.update_details(message + "\n")
+            job.set_progress(number * 100 / len(passes), message)
+            cmd = ["sudo", "dd", f"if={source}", f"of={device_path}", "bs=4M", "status=progress"]
+            self.run_command(cmd, token=job.token)
+            job.check_cancelled()
+        
+        self.update_details("Secure erase completed.\n"
+                            "Recommend reformatting the drive now.\n")
+
+    def secure_erase_done(self, _):
+        if messagebox.askyesno("Format Drive",
+                             "Would you like to format the drive now?"):
+            self.format_drive()
 
     def show_drive_details(self, event):
         """Show detailed information about the selected drive"""
@@ -517,15 +530,15 @@ class FlashDriveModule:
             
             try:
                 # Get detailed drive information
-                output, _, _ = self.run_command(f"sudo udevadm info --query=all {device_path}")
+                output, _, _ = self.run_command(["sudo", "udevadm", "info", "--query=all", device_path])
                 udev_info = output
                 
                 # Get partition information
-                output, _, _ = self.run_command(f"sudo fdisk -l {device_path}")
+                output, _, _ = self.run_command(["sudo", "fdisk", "-l", device_path])
                 partition_info = output
                 
                 # Get filesystem information
-                output, _, _ = self.run_command(f"sudo blkid {device_path}")
+                output, _, _ = self.run_command(["sudo", "blkid", device_path])
                 fs_info = output
                 
                 details = (f"=== Drive Details: {device_path} ===\n\n"
@@ -541,6 +554,7 @@ class FlashDriveModule:
             except Exception as e:
                 self.update_details(f"Error getting drive details: {str(e)}")
 
+    @ui_thread
     def update_details(self, message: str):
         """Update details text area"""
         self.details_text.delete('1.0', tk.END)
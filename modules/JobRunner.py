@@ -0,0 +1,384 @@
+# Part 23: Background Job Runner
+import tkinter as tk
+from tkinter import ttk
+import functools
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from CommandExecutor import CancellationToken
+from Tracing import span
+from Metrics import record_operation
+
+logger = logging.getLogger("KaliFixAll.JobRunner")
+
+# How often the UI queue is drained and how much work one drain may do
+DRAIN_INTERVAL_MS = 50
+MAX_UI_BATCH = 200
+
+# Number of finished jobs kept for display
+JOB_HISTORY = 50
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been cancelled"""
+
+
+class Job:
+    """A unit of module work running off the UI thread"""
+
+    def __init__(self, runner, job_id: int, name: str, owner=None):
+        self.runner = runner
+        self.id = job_id
+        self.name = name
+        self.owner = owner
+        self.status = 'queued'
+        self.progress = None
+        self.message = ""
+        self.result = None
+        self.error = None
+        self.token = CancellationToken()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.token.cancelled
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    @property
+    def module(self) -> str:
+        """Class name of the module that owns the job"""
+        return type(self.owner).__name__ if self.owner is not None else "KaliLinuxFixAll"
+
+    def cancel(self):
+        """Request cancellation; running commands using job.token are killed"""
+        if self.active:
+            self.token.cancel()
+            self.message = "Cancelling..."
+            self.runner.notify(self)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job has been cancelled"""
+        if self.token.cancelled:
+            raise JobCancelled()
+
+    def set_progress(self, progress: Optional[float] = None, message: Optional[str] = None):
+        """Update progress (0-100) and/or the status message"""
+        if progress is not None:
+            self.progress = max(0.0, min(100.0, progress))
+        if message is not None:
+            self.message = message
+        self.runner.notify(self)
+
+    def ui(self, func: Callable, *args, **kwargs):
+        """Run func on the UI thread"""
+        self.runner.post(func, *args, **kwargs)
+
+
+class JobRunner:
+    """Runs jobs on a worker pool and marshals their UI updates onto the Tk thread"""
+
+    def __init__(self, max_workers: int = 4):
+        self.root = None
+        self._ui_thread = None
+        self._ui_queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._jobs: Dict[int, Job] = {}
+        self._dirty = set()
+        self._listeners: List[Callable[[Job], None]] = []
+        self._drain_id = None
+
+    def attach(self, root):
+        """Start delivering UI updates through root.after on the calling thread"""
+        self.root = root
+        self._ui_thread = threading.current_thread()
+        self._drain_id = self.root.after(DRAIN_INTERVAL_MS, self._drain)
+
+    def detach(self):
+        """Stop the UI drain loop; later updates run inline"""
+        if self.root is not None and self._drain_id is not None:
+            try:
+                self.root.after_cancel(self._drain_id)
+            except tk.TclError:
+                pass
+        self.root = None
+        self._drain_id = None
+
+    def on_ui_thread(self) -> bool:
+        return self.root is None or threading.current_thread() is self._ui_thread
+
+    def post(self, func: Callable, *args, **kwargs):
+        """Run func on the UI thread: inline if already there, otherwise queued.
+
+        Without an attached Tk root (headless use) func runs immediately.
+        """
+        if self.on_ui_thread():
+            func(*args, **kwargs)
+        else:
+            self._ui_queue.put((func, args, kwargs))
+
+    def submit(self, name: str, func: Callable, *args, owner=None,
+               on_done: Optional[Callable] = None, on_error: Optional[Callable] = None,
+               dedicated: bool = False, **kwargs) -> Job:
+        """Run func(job, *args, **kwargs) on the worker pool.
+
+        on_done(result) and on_error(exception) are called on the UI thread.
+        Jobs that run until cancelled (monitors, watchers) should pass
+        dedicated=True so they get their own thread instead of a pool slot.
+        """
+        job = Job(self, next(self._ids), name, owner)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim_history()
+        self.notify(job)
+        run_args = (job, func, args, kwargs, on_done, on_error)
+        if dedicated:
+            threading.Thread(target=self._run, args=run_args, daemon=True,
+                             name=f"job-{job.id}").start()
+        else:
+            self._pool.submit(self._run, *run_args)
+        return job
+
+    def _run(self, job, func, args, kwargs, on_done, on_error):
+        if job.cancelled:
+            self._finish(job, 'cancelled')
+            return
+        job.status = 'running'
+        job.started = time.time()
+        self.notify(job)
+        try:
+            with span(job.name, 'job', job=job.id, module=job.module):
+                job.result = func(job, *args, **kwargs)
+        except JobCancelled:
+            self._finish(job, 'cancelled')
+            return
+        except Exception as e:
+            job.error = e
+            logger.exception(f"Job '{job.name}' failed: {str(e)}")
+            self._finish(job, 'failed', str(e))
+            if on_error is not None:
+                self.post(on_error, e)
+            return
+
+        if job.cancelled:
+            self._finish(job, 'cancelled')
+            return
+        self._finish(job, 'done')
+        if on_done is not None:
+            self.post(on_done, job.result)
+
+    def _finish(self, job, status, message=None):
+        job.status = status
+        job.finished = time.time()
+        if status == 'done':
+            job.progress = 100.0
+        if message is not None:
+            job.message = message
+        elif status == 'cancelled':
+            job.message = "Cancelled"
+        duration = job.finished - (job.started or job.created)
+        logger.info(f"Job '{job.name}' {status} in {duration:.2f}s")
+        record_operation(job.module, job.name, status, duration)
+        self.notify(job)
+
+    def _trim_history(self):
+        finished = [job for job in self._jobs.values() if not job.active]
+        for job in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job.id]
+
+    def notify(self, job: Job):
+        """Mark a job as changed; listeners are told on the next UI drain"""
+        if self.on_ui_thread():
+            self._notify_listeners([job])
+        else:
+            with self._lock:
+                self._dirty.add(job)
+
+    def _notify_listeners(self, jobs):
+        for listener in list(self._listeners):
+            for job in jobs:
+                try:
+                    listener(job)
+                except Exception as e:
+                    logger.debug(f"Job listener failed: {str(e)}")
+
+    def _drain(self):
+        """Deliver queued UI calls and job updates in one batch"""
+        try:
+            if not self._ui_queue.empty():
+                with span("UI updates", 'ui') as trace:
+                    trace.set(calls=self._drain_queue())
+
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            if dirty:
+                self._notify_listeners(sorted(dirty, key=lambda job: job.id))
+        finally:
+            if self.root is not None:
+                self._drain_id = self.root.after(DRAIN_INTERVAL_MS, self._drain)
+
+    def _drain_queue(self) -> int:
+        """Run up to MAX_UI_BATCH queued UI calls and return how many ran"""
+        count = 0
+        while count < MAX_UI_BATCH:
+            try:
+                func, args, kwargs = self._ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"UI update failed: {str(e)}")
+        return count
+
+    def add_listener(self, listener: Callable[[Job], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Job], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def jobs(self, owner=None) -> List[Job]:
+        """Return known jobs, optionally only those of one owner"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if owner is not None:
+            jobs = [job for job in jobs if job.owner is owner]
+        return jobs
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel_all(self, owner=None):
+        for job in self.jobs(owner):
+            job.cancel()
+
+    def shutdown(self):
+        """Cancel all jobs and stop accepting new ones"""
+        self.cancel_all()
+        self.detach()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Return the job runner shared by all modules"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
+
+
+def ui_thread(method):
+    """Decorator for UI update methods so they can be called from job threads"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        get_job_runner().post(method, *args, **kwargs)
+    return wrapper
+
+
+class JobListPanel:
+    """Job list with progress and cancel, filtered to one owner at a time"""
+
+    def __init__(self, parent, runner: Optional[JobRunner] = None, height: int = 4):
+        self.runner = runner or get_job_runner()
+        self.owner = None
+        self.show_all = tk.BooleanVar(value=False)
+
+        self.frame = ttk.LabelFrame(parent, text="Jobs")
+
+        self.tree = ttk.Treeview(self.frame, columns=('job', 'status', 'progress', 'message'),
+                                 show='headings', height=height)
+        self.tree.heading('job', text='Job')
+        self.tree.heading('status', text='Status')
+        self.tree.heading('progress', text='Progress')
+        self.tree.heading('message', text='Message')
+        self.tree.column('job', width=220)
+        self.tree.column('status', width=80)
+        self.tree.column('progress', width=80)
+        self.tree.column('message', width=400)
+
+        scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+
+        button_frame = ttk.Frame(self.frame)
+        ttk.Button(button_frame, text="Cancel",
+                   command=self.cancel_selected).pack(fill='x', pady=2)
+        ttk.Button(button_frame, text="Clear Finished",
+                   command=self.clear_finished).pack(fill='x', pady=2)
+        ttk.Checkbutton(button_frame, text="All modules", variable=self.show_all,
+                        command=self.refresh).pack(fill='x', pady=2)
+
+        button_frame.pack(side='right', fill='y', padx=5, pady=5)
+        scrollbar.pack(side='right', fill='y', pady=5)
+        self.tree.pack(side='left', fill='both', expand=True, padx=5, pady=5)
+
+        self.hidden = set()
+        self.runner.add_listener(self.job_changed)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_owner(self, owner):
+        """Show the jobs of another module"""
+        self.owner = owner
+        self.refresh()
+
+    def visible(self, job: Job) -> bool:
+        if job.id in self.hidden:
+            return False
+        return self.show_all.get() or job.owner is self.owner
+
+    def format_row(self, job: Job):
+        if job.progress is None:
+            progress = "..." if job.status == 'running' else ""
+        else:
+            progress = f"{job.progress:.0f}%"
+        return (job.name, job.status, progress, job.message)
+
+    def job_changed(self, job: Job):
+        iid = str(job.id)
+        if not self.visible(job):
+            if self.tree.exists(iid):
+                self.tree.delete(iid)
+            return
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=self.format_row(job))
+        else:
+            self.tree.insert('', 0, iid=iid, values=self.format_row(job))
+
+    def refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        for job in sorted(self.runner.jobs(), key=lambda job: job.id, reverse=True):
+            if self.visible(job):
+                self.tree.insert('', 'end', iid=str(job.id), values=self.format_row(job))
+
+    def cancel_selected(self):
+        """Cancel the selected jobs, or all visible running jobs if none is selected"""
+        selection = self.tree.selection() or self.tree.get_children()
+        for iid in selection:
+            job = self.runner.get(int(iid))
+            if job is not None:
+                job.cancel()
+
+    def clear_finished(self):
+        for job in self.runner.jobs():
+            if not job.active:
+                self.hidden.add(job.id)
+        self.refresh()
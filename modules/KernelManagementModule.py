@@ -1,16 +1,122 @@
 # Part 5: Kernel Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import re
 import json
 from pathlib import Path
-import psutil
+from LazyImport import lazy_import
+psutil = lazy_import('psutil')
 import shutil
 from datetime import datetime
+from CommandExecutor import execute
+from DpkgStatus import get_dpkg_status
+from AptLists import refresh_lists
+from JobRunner import get_job_runner, ui_thread
 
-class KernelManagementModule:
+class KernelManagementScanner:
+    """Kernel checks and scans with no widget code (used by the GUI and CLI)"""
+
+    def run_command(self, command, shell=False, timeout=None, on_output=None, token=None):
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None):
+        """Return a list of kernel issues"""
+        issues = []
+        
+        try:
+            with open('/proc/sys/kernel/panic', 'r') as f:
+                if f.read().strip() == '0':
+                    issues.append("Kernel panic timeout is disabled (kernel.panic = 0)")
+        except OSError:
+            pass
+        
+        try:
+            with open('/proc/sys/vm/swappiness', 'r') as f:
+                swappiness = int(f.read().strip())
+                if swappiness > 60:
+                    issues.append(f"High swappiness value: {swappiness}")
+        except (OSError, ValueError):
+            pass
+        
+        output, _, code = self.run_command("dmesg --level=emerg,alert,crit,err", token=token)
+        if code == 0 and output.strip():
+            count = len(output.splitlines())
+            issues.append(f"{count} kernel error message(s) in dmesg")
+        
+        return issues
+
+    def get_installed_kernels(self, token=None):
+        """Return installed kernel image versions, or None if the dpkg database is unreadable"""
+        try:
+            packages = get_dpkg_status().with_prefix("linux-image-", installed_only=True)
+        except OSError:
+            return None
+        return [package.name.replace("linux-image-", "") for package in packages]
+
+    def get_available_kernels(self, token=None):
+        """Return kernel image versions known to apt, or None if apt-cache failed"""
+        output, error, code = self.run_command("apt-cache search linux-image", token=token)
+        if code != 0:
+            return None
+        available_kernels = []
+        for line in output.splitlines():
+            if "linux-image" in line and not "unsigned" in line:
+                kernel_version = line.split()[0].replace("linux-image-", "")
+                available_kernels.append(kernel_version)
+        return available_kernels
+
+    def get_loaded_modules(self, token=None):
+        """Return the names of loaded kernel modules, or None if lsmod failed"""
+        output, error, code = self.run_command("lsmod", token=token)
+        if code != 0:
+            return None
+        modules = []
+        for line in output.splitlines()[1:]:  # Skip header
+            module_name = line.split()[0]
+            modules.append(module_name)
+        return modules
+
+    def check_problematic_modules(self, modules):
+        """Check for known problematic modules"""
+        known_issues = {
+            'nouveau': 'NVIDIA open-source driver (might conflict with proprietary)',
+            'iwlwifi': 'Intel wireless (check for firmware issues)',
+            'r8169': 'Realtek ethernet (might need firmware update)'
+        }
+        
+        problematic = []
+        for module in modules:
+            if module in known_issues:
+                problematic.append(f"{module} - {known_issues[module]}")
+        
+        return problematic
+
+    def get_recent_errors(self, token=None):
+        """Return kernel error messages from the last 24 hours, or None if unavailable"""
+        output, error, code = self.run_command(
+            "journalctl -k -p err..emerg --since '24 hours ago'", token=token)
+        if code != 0:
+            return None
+        return output.splitlines()
+
+    def scan(self, token=None):
+        """Kernel status as plain data"""
+        modules = self.get_loaded_modules(token) or []
+        with open('/proc/cmdline', 'r') as f:
+            parameters = f.read().strip()
+        return {
+            'current': os.uname().release,
+            'installed': self.get_installed_kernels(token),
+            'available': self.get_available_kernels(token),
+            'loaded_modules': len(modules),
+            'problematic_modules': self.check_problematic_modules(modules),
+            'parameters': parameters,
+            'recent_errors': self.get_recent_errors(token)
+        }
+
+class KernelManagementModule(KernelManagementScanner):
     def __init__(self, parent_notebook):
         # Create kernel management tab
         self.kernel_frame = ttk.Frame(parent_notebook)
@@ -23,6 +129,8 @@ class KernelManagementModule:
         # Initialize kernel info
         self.kernel_info = {}
         self.available_kernels = []
+        self.jobs = get_job_runner()
+        self.update_job = None
         
         # Create control panel
         self.create_control_panel()
@@ -56,19 +164,6 @@ class KernelManagementModule:
         ttk.Button(kernel_frame, text="Manage Parameters", 
                   command=self.show_kernel_params).pack(side='left', padx=5)
 
-    def run_command(self, command, shell=False):
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, 
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_kernel_status(self):
         """Perform a comprehensive kernel status scan"""
         self.output.delete(1.0, tk.END)
@@ -96,26 +191,14 @@ class KernelManagementModule:
         self.output.insert(tk.END, "\nScanning available kernels...\n")
         
         # Get installed kernels
-        output, error, code = self.run_command("dpkg --list | grep linux-image")
-        if code == 0:
-            installed_kernels = []
-            for line in output.splitlines():
-                if "linux-image" in line:
-                    kernel_version = line.split()[2].replace("linux-image-", "")
-                    installed_kernels.append(kernel_version)
-            
+        installed_kernels = self.get_installed_kernels()
+        if installed_kernels is not None:
             self.kernel_info['installed'] = installed_kernels
             self.output.insert(tk.END, f"Installed kernels: {', '.join(installed_kernels)}\n")
         
         # Check available kernel updates
-        output, error, code = self.run_command("apt-cache search linux-image")
-        if code == 0:
-            available_kernels = []
-            for line in output.splitlines():
-                if "linux-image" in line and not "unsigned" in line:
-                    kernel_version = line.split()[0].replace("linux-image-", "")
-                    available_kernels.append(kernel_version)
-            
+        available_kernels = self.get_available_kernels()
+        if available_kernels is not None:
             self.kernel_info['available'] = available_kernels
             self.output.insert(tk.END, f"Available kernels: {', '.join(available_kernels)}\n")
 
@@ -124,13 +207,8 @@ class KernelManagementModule:
         self.output.insert(tk.END, "\nChecking kernel modules...\n")
         
         # Get loaded modules
-        output, error, code = self.run_command("lsmod")
-        if code == 0:
-            modules = []
-            for line in output.splitlines()[1:]:  # Skip header
-                module_name = line.split()[0]
-                modules.append(module_name)
-            
+        modules = self.get_loaded_modules()
+        if modules is not None:
             self.kernel_info['modules'] = modules
             self.output.insert(tk.END, f"Loaded modules: {len(modules)}\n")
             
@@ -141,21 +219,6 @@ class KernelManagementModule:
                 for mod in problematic:
                     self.output.insert(tk.END, f"- {mod}\n")
 
-    def check_problematic_modules(self, modules):
-        """Check for known problematic modules"""
-        known_issues = {
-            'nouveau': 'NVIDIA open-source driver (might conflict with proprietary)',
-            'iwlwifi': 'Intel wireless (check for firmware issues)',
-            'r8169': 'Realtek ethernet (might need firmware update)'
-        }
-        
-        problematic = []
-        for module in modules:
-            if module in known_issues:
-                problematic.append(f"{module} - {known_issues[module]}")
-        
-        return problematic
-
     def check_kernel_parameters(self):
         """Check current kernel parameters"""
         self.output.insert(tk.END, "\nChecking kernel parameters...\n")
@@ -188,9 +251,8 @@ class KernelManagementModule:
         self.output.insert(tk.END, "\nChecking kernel logs...\n")
         
         # Get recent kernel messages
-        output, error, code = self.run_command("journalctl -k -p err..emerg --since '24 hours ago'")
-        if code == 0:
-            errors = output.splitlines()
+        errors = self.get_recent_errors()
+        if errors is not None:
             self.kernel_info['recent_errors'] = errors
             
             if errors:
@@ -235,7 +297,7 @@ class KernelManagementModule:
     def get_latest_available_kernel(self):
         """Get the latest available kernel version"""
         output, error, code = self.run_command(
-            "apt-cache search linux-image | grep generic")
+            "apt-cache search linux-image | grep generic", shell=True)
         if code == 0:
             versions = []
             for line in output.splitlines():
@@ -264,7 +326,7 @@ class KernelManagementModule:
         """Check for hardware compatibility issues"""
         # Check for hardware errors in dmesg
         output, error, code = self.run_command(
-            "dmesg | grep -i 'error\\|fail\\|incompatible'")
+            "dmesg | grep -i 'error\\|fail\\|incompatible'", shell=True)
         if code == 0 and output:
             self.output.insert(tk.END, "\nPotential hardware issues found:\n")
             for line in output.splitlines()[:5]:  # Show first 5 issues
@@ -308,41 +370,57 @@ class KernelManagementModule:
         if os.geteuid() != 0:
             messagebox.showerror("Error", "Root privileges required")
             return
+        if self.update_job and self.update_job.active:
+            messagebox.showinfo("Info", "A kernel update is already running")
+            return
         
-        try:
-            # Update package list
-            self.output.delete(1.0, tk.END)
-            self.output.insert(tk.END, "Updating package list...\n")
-            output, error, code = self.run_command("apt-get update")
-            if code != 0:
-                raise Exception(f"Failed to update package list: {error}")
-            
-            # Check for kernel updates
-            self.output.insert(tk.END, "Checking for kernel updates...\n")
-            output, error, code = self.run_command(
-                "apt-get --just-print upgrade | grep linux-image")
-            
-            if "linux-image" in output:
-                if messagebox.askyesno("Update Available", 
-                    "Kernel update available. Do you want to proceed?"):
-                    # Backup current kernel
-                    self.backup_current_kernel()
-                    
-                    # Perform update
-                    self.output.insert(tk.END, "Installing kernel update...\n")
-                    output, error, code = self.run_command(
-                        "apt-get install -y linux-image-generic linux-headers-generic")
-                    if code != 0:
-                        raise Exception(f"Failed to install kernel update: {error}")
-                    
-                    self.output.insert(tk.END, "Kernel updated successfully.\n")
-                    self.output.insert(tk.END, 
-                        "Please reboot your system to use the new kernel.\n")
-            else:
-                self.output.insert(tk.END, "No kernel updates available.\n")
+        self.output.delete(1.0, tk.END)
+        self.update_job = self.jobs.submit(
+            "Check for kernel updates", self._check_kernel_update, owner=self,
+            on_done=self.confirm_kernel_update, on_error=self.update_failed)
+
+    def _check_kernel_update(self, job):
+        # Update package list if it is out of date
+        refresh = refresh_lists(job, self.append_output)
+        if refresh['error']:
+            raise Exception(f"Failed to update package list: {refresh['error']}")
+        
+        # Check for kernel updates
+        self.append_output("Checking for kernel updates...\n")
+        output, error, code = self.run_command(
+            "apt-get --just-print upgrade | grep linux-image", shell=True, token=job.token)
+        return "linux-image" in output
+
+    def confirm_kernel_update(self, available):
+        if not available:
+            self.output.insert(tk.END, "No kernel updates available.\n")
+            return
+        if messagebox.askyesno("Update Available", 
+            "Kernel update available. Do you want to proceed?"):
+            # Backup current kernel
+            self.backup_current_kernel()
+            
+            self.update_job = self.jobs.submit(
+                "Install kernel update", self._install_kernel_update, owner=self,
+                on_error=self.update_failed)
+
+    def _install_kernel_update(self, job):
+        self.append_output("Installing kernel update...\n")
+        output, error, code = self.run_command(
+            "apt-get install -y linux-image-generic linux-headers-generic", token=job.token)
+        if code != 0:
+            raise Exception(f"Failed to install kernel update: {error}")
         
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.append_output("Kernel updated successfully.\n")
+        self.append_output("Please reboot your system to use the new kernel.\n")
+
+    def update_failed(self, error):
+        messagebox.showerror("Error", str(error))
+
+    @ui_thread
+    def append_output(self, text):
+        self.output.insert(tk.END, text)
+        self.output.see(tk.END)
 
     def backup_current_kernel(self):
         """Backup current kernel configuration"""
@@ -403,7 +481,7 @@ class KernelManagementModule:
         self.output.insert(tk.END, "Checking and fixing module issues...\n")
         
         # Check for missing firmware
-        output, error, code = self.run_command("dmesg | grep -i 'firmware'")
+        output, error, code = self.run_command("dmesg | grep -i 'firmware'", shell=True)
         if "firmware" in output and "failed" in output.lower():
             self.output.insert(tk.END, "Installing missing firmware packages...\n")
             self.run_command("apt-get install -y linux-firmware firmware-linux-free")
@@ -610,7 +688,7 @@ class KernelManagementModule:
                 f.write("Recent Kernel Messages:\n")
                 f.write("-" * 20 + "\n")
                 output, error, code = self.run_command(
-                    "dmesg | tail -n 50")
+                    "dmesg | tail -n 50", shell=True)
                 if code == 0:
                     f.write(output + "\n")
             
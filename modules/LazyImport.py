@@ -0,0 +1,134 @@
+# Part 21: Lazy Import Layer
+import importlib
+import sys
+import threading
+import time
+import types
+from typing import Dict, List, Set
+
+# Shared registry of deferred imports: dependency name -> LazyModule
+_lazy_modules = {}
+_registry_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that performs the real import on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = None
+        self._lazy_lock = threading.Lock()
+        self._lazy_owners: Set[str] = set()
+        self._lazy_load_time = None
+        self._lazy_error = None
+
+    def _load(self):
+        """Import the real module once and return it"""
+        if self._lazy_module is None:
+            with self._lazy_lock:
+                if self._lazy_module is None:
+                    start = time.perf_counter()
+                    try:
+                        module = importlib.import_module(self.__name__)
+                    except Exception as e:
+                        self._lazy_error = str(e)
+                        raise
+                    finally:
+                        self._lazy_load_time = time.perf_counter() - start
+                    self._lazy_module = module
+        return self._lazy_module
+
+    def __getattr__(self, attr):
+        if attr.startswith('_lazy_'):
+            raise AttributeError(attr)
+        value = getattr(self._load(), attr)
+        # Cache on the proxy so later lookups skip __getattr__
+        setattr(self, attr, value)
+        return value
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._lazy_module is not None else "deferred"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._lazy_module is not None
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Return a proxy for a module that is imported on first use"""
+    owner = sys._getframe(1).f_globals.get('__name__', '__main__')
+    with _registry_lock:
+        module = _lazy_modules.get(name)
+        if module is None:
+            module = LazyModule(name)
+            _lazy_modules[name] = module
+        module._lazy_owners.add(owner)
+    return module
+
+
+def get_dependencies(owner: str) -> List[str]:
+    """Return the deferred dependencies declared by a module"""
+    with _registry_lock:
+        return sorted(name for name, module in _lazy_modules.items()
+                      if owner in module._lazy_owners)
+
+
+def profile_imports(module_names: List[str]) -> List[Dict]:
+    """Import each module and its deferred dependencies, timing both.
+
+    A dependency shared by several modules is charged to the first module
+    that loads it, the same way the import system would pay for it.
+    """
+    results = []
+    for module_name in module_names:
+        entry = {'module': module_name, 'self': 0.0, 'deps': [], 'error': None}
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            entry['error'] = str(e)
+        entry['self'] = time.perf_counter() - start
+
+        for dep in get_dependencies(module_name):
+            lazy = _lazy_modules[dep]
+            if lazy.is_loaded or lazy._lazy_error is not None:
+                continue
+            try:
+                lazy._load()
+                entry['deps'].append((dep, lazy._lazy_load_time, None))
+            except Exception as e:
+                entry['deps'].append((dep, lazy._lazy_load_time or 0.0, str(e)))
+
+        entry['total'] = entry['self'] + sum(t for _, t, _ in entry['deps'])
+        results.append(entry)
+
+    results.sort(key=lambda entry: entry['total'], reverse=True)
+    return results
+
+
+def format_import_profile(results: List[Dict]) -> str:
+    """Format profile_imports() results as a sorted cost table"""
+    lines = [f"{'Module':<30} {'Self (ms)':>10} {'Deps (ms)':>10} {'Total (ms)':>11}  Dependencies"]
+    lines.append("-" * 90)
+    grand_total = 0.0
+    for entry in results:
+        deps_time = entry['total'] - entry['self']
+        deps = []
+        for dep, elapsed, error in entry['deps']:
+            if error:
+                deps.append(f"{dep} (missing)")
+            else:
+                deps.append(f"{dep} {elapsed * 1000:.1f}")
+        if entry['error']:
+            deps.append(f"ERROR: {entry['error']}")
+        lines.append(f"{entry['module']:<30} {entry['self'] * 1000:10.1f} "
+                     f"{deps_time * 1000:10.1f} {entry['total'] * 1000:11.1f}  "
+                     f"{', '.join(deps)}")
+        grand_total += entry['total']
+    lines.append("-" * 90)
+    lines.append(f"{'Total':<30} {'':>10} {'':>10} {grand_total * 1000:11.1f}")
+    return "\n".join(lines)
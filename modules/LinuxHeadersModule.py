@@ -1,19 +1,125 @@
 # Part 16: Linux Headers Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Tuple, Set, Union
 import re
 from datetime import datetime
+from CommandExecutor import execute
+from JobRunner import get_job_runner, ui_thread, JobCancelled
+from DpkgStatus import get_dpkg_status
+from AptProgress import AptProgressBar, run_steps
+from AptLists import refresh_lists
 
-class LinuxHeadersModule:
+class LinuxHeadersScanner:
+    """Kernel header checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+    
+    # Fix scheduling: installs packages, so runs after the package repair
+    FIX_RESOURCES = ('dpkg-lock', 'network')
+    FIX_AFTER = ('Package Management',)
+
+    def run_command(self, command: Union[str, List[str]], shell: bool = False,
+                    timeout: float = None, on_output=None,
+                    token=None) -> Tuple[str, str, int]:
+        """Run command and return output, error, and return code"""
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None) -> List[str]:
+        """Return a list of header issues"""
+        issues = []
+        
+        kernel = os.uname().release
+        dpkg = get_dpkg_status()
+        if not dpkg.is_installed(f"linux-headers-{kernel}"):
+            issues.append(f"Headers for the running kernel ({kernel}) are not installed")
+        
+        broken = [package.name for package in dpkg.with_prefix("linux-headers-")
+                  if package.abbrev in ('iU', 'iF', 'iH')]
+        if broken:
+            issues.append(f"Broken header installations: {', '.join(broken)}")
+        
+        return issues
+
+    def fix_common_issues(self, token=None) -> List[str]:
+        """Install headers for the running kernel if they are missing"""
+        kernel = os.uname().release
+        package = f"linux-headers-{kernel}"
+        if get_dpkg_status().is_installed(package):
+            return []
+        
+        _, error, code = self.run_command(
+            ["env", "DEBIAN_FRONTEND=noninteractive", "apt-get", "install", "-y", package], token=token)
+        if code != 0:
+            raise RuntimeError(f"Failed to install {package}: {error.strip()}")
+        return [f"Installed {package}"]
+
+    def get_installed_headers(self, token=None) -> List[Tuple[str, str, str]]:
+        """Return (version, dpkg status, size) for installed header packages"""
+        installed = []
+        
+        for package in get_dpkg_status().with_prefix("linux-headers-"):
+            # Removed packages are listed by dpkg -l only while config files remain
+            if package.state == 'not-installed':
+                continue
+            version = package.name.replace('linux-headers-', '')
+            size = f"{package.installed_size/1024:.1f} MB"
+            installed.append((version, package.abbrev, size))
+        
+        return installed
+
+    def get_available_headers(self, installed: List[str], token=None) -> List[Tuple[str, str]]:
+        """Return (version, "Available") for header packages that are not installed"""
+        output, _, _ = self.run_command("apt-cache search linux-headers", token=token)
+        available = []
+        
+        for line in output.splitlines():
+            if 'linux-headers-' in line:
+                parts = line.split(' - ')
+                if len(parts) >= 2:
+                    version = parts[0].replace('linux-headers-', '')
+                    
+                    if version not in installed:
+                        available.append((version, "Available"))
+        
+        return available
+
+    def scan(self, token=None) -> Dict:
+        """Header status as plain data"""
+        installed = self.get_installed_headers(token)
+        versions = [version for version, _, _ in installed]
+        return {
+            'kernel': os.uname().release,
+            'installed': [{'version': version, 'status': status, 'size': size}
+                          for version, status, size in installed],
+            'available': [version for version, _ in self.get_available_headers(versions, token)],
+            'issues': self.check_status(token)
+        }
+
+    def version_difference(self, ver1: str, ver2: str) -> float:
+        """Calculate the difference between two version numbers"""
+        try:
+            v1_parts = [int(x) for x in ver1.split('.')]
+            v2_parts = [int(x) for x in ver2.split('.')]
+            
+            v1 = v1_parts[0] + v1_parts[1]/100 + v1_parts[2]/10000
+            v2 = v2_parts[0] + v2_parts[1]/100 + v2_parts[2]/10000
+            
+            return abs(v1 - v2)
+        except:
+            return 0
+
+class LinuxHeadersModule(LinuxHeadersScanner):
     def __init__(self, parent_notebook):
         # Create Linux Headers tab
         self.headers_frame = ttk.Frame(parent_notebook)
         parent_notebook.add(self.headers_frame, text='Linux Headers')
         
         # Initialize variables
+        self.jobs = get_job_runner()
+        self.scan_job = None
+        self.optimize_job = None
+        self.update_job = None
         self.current_kernel = None
         self.installed_headers = []
         self.recommended_headers = []
@@ -139,83 +245,69 @@ class LinuxHeadersModule:
         self.details_text = scrolledtext.ScrolledText(details_frame, height=10)
         self.details_text.pack(fill='both', expand=True, padx=5, pady=5)
         
+        # Live progress of apt and dpkg runs
+        self.apt_progress = AptProgressBar(details_frame)
+        self.apt_progress.pack(fill='x', padx=5, pady=5)
+        
         # Bind selection events
         self.installed_tree.bind('<<TreeviewSelect>>', self.show_header_details)
         self.available_tree.bind('<<TreeviewSelect>>', self.show_header_details)
 
-    def run_command(self, command: str, shell: bool = False) -> Tuple[str, str, int]:
-        """Run command and return output, error, and return code"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_headers(self):
-        """Scan system for installed and available headers"""
+        """Scan system for installed and available headers in the background"""
+        if self.scan_job and self.scan_job.active:
+            return
         self.update_details("Scanning system headers...\n")
-        
+        self.scan_job = self.jobs.submit("Scan kernel headers", self._scan_headers,
+                                         owner=self)
+
+    def _scan_headers(self, job):
+        """Collect header information and update the trees from the UI thread"""
         try:
             # Get current kernel version
-            output, _, _ = self.run_command("uname -r")
+            output, _, _ = self.run_command("uname -r", token=job.token)
             self.current_kernel = output.strip()
-            self.kernel_label.config(text=f"Current Kernel: {self.current_kernel}")
-            
-            # Clear existing items
-            self.installed_tree.delete(*self.installed_tree.get_children())
-            self.available_tree.delete(*self.available_tree.get_children())
+            job.ui(self.kernel_label.config, text=f"Current Kernel: {self.current_kernel}")
             
             # Get installed headers
-            output, _, _ = self.run_command("dpkg -l | grep linux-headers")
-            self.installed_headers = []
-            
-            for line in output.splitlines():
-                if line.strip():
-                    parts = line.split()
-                    if len(parts) >= 3:
-                        version = parts[2].replace('linux-headers-', '')
-                        status = parts[0]
-                        
-                        # Get size information
-                        size_output, _, _ = self.run_command(
-                            f"dpkg-query -W -f='${{Installed-Size}}' {parts[2]}"
-                        )
-                        size = f"{int(size_output.strip())/1024:.1f} MB"
-                        
-                        self.installed_headers.append(version)
-                        self.installed_tree.insert('', 'end',
-                                                 values=(version, status, size))
-            
-            self.headers_label.config(
-                text=f"Installed Headers: {len(self.installed_headers)}"
-            )
+            job.set_progress(10, "Installed headers")
+            installed = self.get_installed_headers(job.token)
+            self.installed_headers = [version for version, _, _ in installed]
             
             # Get available headers
-            output, _, _ = self.run_command("apt-cache search linux-headers")
+            job.check_cancelled()
+            job.set_progress(60, "Available headers")
+            available = self.get_available_headers(self.installed_headers, job.token)
             
-            for line in output.splitlines():
-                if 'linux-headers-' in line:
-                    parts = line.split(' - ')
-                    if len(parts) >= 2:
-                        version = parts[0].replace('linux-headers-', '')
-                        status = "Available"
-                        
-                        if version not in self.installed_headers:
-                            self.available_tree.insert('', 'end',
-                                                     values=(version, status))
+            job.ui(self.show_headers, installed, available)
             
+            job.check_cancelled()
+            job.set_progress(90, "Checking for issues")
             self.check_header_issues()
             self.update_details("Header scan completed.\n")
             
+        except JobCancelled:
+            raise
         except Exception as e:
             self.update_details(f"Error scanning headers: {str(e)}\n")
-            messagebox.showerror("Error", f"Failed to scan headers: {str(e)}")
+            job.ui(messagebox.showerror, "Error", f"Failed to scan headers: {str(e)}")
+
+    def show_headers(self, installed: List[Tuple[str, str, str]],
+                     available: List[Tuple[str, str]]):
+        """Fill the header trees with scan results"""
+        # Clear existing items
+        self.installed_tree.delete(*self.installed_tree.get_children())
+        self.available_tree.delete(*self.available_tree.get_children())
+        
+        for values in installed:
+            self.installed_tree.insert('', 'end', values=values)
+        
+        self.headers_label.config(
+            text=f"Installed Headers: {len(installed)}"
+        )
+        
+        for values in available:
+            self.available_tree.insert('', 'end', values=values)
 
     def check_header_issues(self):
         """Check for potential header issues"""
@@ -249,12 +341,9 @@ class LinuxHeadersModule:
                         self.problematic_headers.append(old_header)
             
             # Check for broken header installations
-            output, _, _ = self.run_command("dpkg -l | grep linux-headers")
-            for line in output.splitlines():
-                if line.startswith('rc') or line.startswith('iU'):
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        self.problematic_headers.append(parts[1])
+            for package in get_dpkg_status().with_prefix("linux-headers-"):
+                if package.abbrev in ('rc', 'iU'):
+                    self.problematic_headers.append(package.name)
             
             if self.problematic_headers:
                 self.update_details(
@@ -271,19 +360,6 @@ class LinuxHeadersModule:
         except Exception as e:
             self.update_details(f"Error checking header issues: {str(e)}\n")
 
-    def version_difference(self, ver1: str, ver2: str) -> float:
-        """Calculate the difference between two version numbers"""
-        try:
-            v1_parts = [int(x) for x in ver1.split('.')]
-            v2_parts = [int(x) for x in ver2.split('.')]
-            
-            v1 = v1_parts[0] + v1_parts[1]/100 + v1_parts[2]/10000
-            v2 = v2_parts[0] + v2_parts[1]/100 + v2_parts[2]/10000
-            
-            return abs(v1 - v2)
-        except:
-            return 0
-
     def install_selected_headers(self):
         """Install selected headers"""
         selection = self.available_tree.selection()
@@ -302,7 +378,7 @@ class LinuxHeadersModule:
             try:
                 for header in headers_to_install:
                     self.update_details(f"Installing {header}...\n")
-                    output, error, code = self.run_command(f"sudo apt-get install -y {header}")
+                    output, error, code = self.run_command(["sudo", "apt-get", "install", "-y", header])
                     
                     if code == 0:
                         self.update_details(f"Successfully installed {header}\n")
@@ -342,7 +418,7 @@ class LinuxHeadersModule:
                 for header in headers_to_remove:
                     self.update_details(f"Removing {header}...\n")
                     output, error, code = self.run_command(
-                        f"sudo apt-get remove -y {header}"
+                        ["sudo", "apt-get", "remove", "-y", header]
                     )
                     
                     if code == 0:
@@ -361,28 +437,34 @@ class LinuxHeadersModule:
                 messagebox.showerror("Error", f"Removal failed: {str(e)}")
 
     def update_headers(self):
-        """Update all installed headers"""
+        """Update all installed headers in the background"""
+        if self.update_job and self.update_job.active:
+            return
         if messagebox.askyesno("Confirm", "Update all installed headers?"):
-            try:
-                self.update_details("Updating package lists...\n")
-                output, error, code = self.run_command("sudo apt-get update")
-                if code != 0:
-                    raise Exception(f"Failed to update package lists: {error}")
-                
-                self.update_details("Upgrading headers...\n")
-                output, error, code = self.run_command(
-                    "sudo apt-get upgrade -y linux-headers-*"
-                )
-                if code == 0:
-                    self.update_details("Headers updated successfully.\n")
-                else:
-                    self.update_details(f"Error updating headers: {error}\n")
-                
-                self.scan_headers()
-                
-            except Exception as e:
-                self.update_details(f"Error during update: {str(e)}\n")
-                messagebox.showerror("Error", f"Update failed: {str(e)}")
+            self.update_details("")
+            self.update_job = self.jobs.submit("Update kernel headers", self._update_headers,
+                                               owner=self, on_error=self.update_failed)
+
+    def _update_headers(self, job):
+        # Update package lists if they are out of date
+        refresh = refresh_lists(job, self.append_details)
+        if refresh['error']:
+            raise Exception(f"Failed to update package lists: {refresh['error']}")
+        
+        self.append_details("Upgrading headers...\n")
+        output, error, code = self.run_command(
+            "sudo apt-get upgrade -y linux-headers-*", token=job.token
+        )
+        if code == 0:
+            self.append_details("Headers updated successfully.\n")
+        else:
+            self.append_details(f"Error updating headers: {error}\n")
+        
+        job.ui(self.scan_headers)
+
+    def update_failed(self, error):
+        self.append_details(f"Error during update: {str(error)}\n")
+        messagebox.showerror("Error", f"Update failed: {str(error)}")
 
     def fix_missing_headers(self):
         """Fix missing or broken header installations"""
@@ -396,7 +478,7 @@ class LinuxHeadersModule:
                                      f"Install headers for current kernel "
                                      f"({self.current_kernel})?"):
                     output, error, code = self.run_command(
-                        f"sudo apt-get install -y {current_headers}"
+                        ["sudo", "apt-get", "install", "-y", current_headers]
                     )
                     if code == 0:
                         self.update_details(
@@ -437,14 +519,10 @@ class LinuxHeadersModule:
             self.update_details("Identifying old headers...\n")
             
             # Get list of installed kernels
-            output, _, _ = self.run_command("dpkg --list | grep linux-image")
-            installed_kernels = []
-            for line in output.splitlines():
-                if line.startswith('ii'):
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        kernel = parts[1].replace('linux-image-', '')
-                        installed_kernels.append(kernel)
+            installed_kernels = [
+                package.name.replace('linux-image-', '')
+                for package in get_dpkg_status().with_prefix("linux-image-", installed_only=True)
+            ]
             
             # Identify headers to remove
             headers_to_remove = []
@@ -460,7 +538,7 @@ class LinuxHeadersModule:
                     for header in headers_to_remove:
                         self.update_details(f"Removing {header}...\n")
                         output, error, code = self.run_command(
-                            f"sudo apt-get remove -y {header}"
+                            ["sudo", "apt-get", "remove", "-y", header]
                         )
                         if code == 0:
                             self.update_details(f"Successfully removed {header}\n")
@@ -480,41 +558,41 @@ class LinuxHeadersModule:
             messagebox.showerror("Error", f"Clean operation failed: {str(e)}")
 
     def optimize_headers(self):
-        """Optimize header installations"""
-        try:
-            self.update_details("Optimizing headers...\n")
-            
-            # Fix any broken installations
-            self.update_details("Fixing broken installations...\n")
-            self.run_command("sudo dpkg --configure -a")
-            
-            # Update package lists
-            self.update_details("Updating package lists...\n")
-            self.run_command("sudo apt-get update")
-            
+        """Optimize header installations in the background, streaming apt's output"""
+        if self.optimize_job and self.optimize_job.active:
+            return
+        self.update_details("Optimizing headers...\n")
+        self.optimize_job = self.jobs.submit("Optimize kernel headers", self._optimize_headers,
+                                             owner=self, on_error=self.optimize_failed)
+
+    def _optimize_headers(self, job):
+        # Fix any broken installations
+        run_steps(job, [("Fixing broken installations...", "sudo dpkg --configure -a")],
+                  self.append_details, self.show_apt_progress)
+        
+        # Update package lists if they are out of date
+        refresh_lists(job, self.append_details)
+        
+        steps = [
             # Fix dependencies
-            self.update_details("Fixing dependencies...\n")
-            self.run_command("sudo apt-get install -f -y")
-            
+            ("Fixing dependencies...", "sudo apt-get install -f -y"),
             # Remove unnecessary headers
-            self.update_details("Removing unnecessary headers...\n")
-            self.run_command("sudo apt-get autoremove -y")
-            
+            ("Removing unnecessary headers...", "sudo apt-get autoremove -y"),
             # Clean package cache
-            self.update_details("Cleaning package cache...\n")
-            self.run_command("sudo apt-get autoclean")
-            
-            # Update DKMS modules if present
-            if os.path.exists("/usr/sbin/dkms"):
-                self.update_details("Updating DKMS modules...\n")
-                self.run_command("sudo dkms autoinstall")
-            
-            self.scan_headers()
-            self.update_details("Header optimization completed.\n")
-            
-        except Exception as e:
-            self.update_details(f"Error optimizing headers: {str(e)}\n")
-            messagebox.showerror("Error", f"Optimization failed: {str(e)}")
+            ("Cleaning package cache...", "sudo apt-get autoclean"),
+        ]
+        # Update DKMS modules if present
+        if os.path.exists("/usr/sbin/dkms"):
+            steps.append(("Updating DKMS modules...", "sudo dkms autoinstall"))
+        
+        run_steps(job, steps, self.append_details, self.show_apt_progress)
+        
+        job.ui(self.scan_headers)
+        self.append_details("Header optimization completed.\n")
+
+    def optimize_failed(self, error):
+        self.append_details(f"Error optimizing headers: {str(error)}\n")
+        messagebox.showerror("Error", f"Optimization failed: {str(error)}")
 
     def show_header_details(self, event):
         """Show detailed information about the selected header"""
@@ -529,12 +607,12 @@ class LinuxHeadersModule:
                 try:
                     # Get package details
                     output, _, _ = self.run_command(
-                        f"dpkg -s {header_package}"
+                        ["dpkg", "-s", header_package]
                     )
                     
                     # Get file list
                     files_output, _, _ = self.run_command(
-                        f"dpkg -L {header_package}"
+                        ["dpkg", "-L", header_package]
                     )
                     
                     details = (f"=== Header Package Details: {header_package} ===\n\n"
@@ -556,7 +634,7 @@ class LinuxHeadersModule:
                 try:
                     # Get package details
                     output, _, _ = self.run_command(
-                        f"apt-cache show {header_package}"
+                        ["apt-cache", "show", header_package]
                     )
                     
                     details = (f"=== Available Header Package Details ===\n\n"
@@ -567,6 +645,17 @@ class LinuxHeadersModule:
                 except Exception as e:
                     self.update_details(f"Error getting header details: {str(e)}")
 
+    @ui_thread
+    def append_details(self, message: str):
+        """Add to the details text area without clearing it"""
+        self.details_text.insert(tk.END, message)
+        self.details_text.see(tk.END)
+
+    @ui_thread
+    def show_apt_progress(self, percent, text):
+        self.apt_progress.show(percent, text)
+
+    @ui_thread
     def update_details(self, message: str):
         """Update details text area"""
         self.details_text.delete('1.0', tk.END)
@@ -0,0 +1,199 @@
+# Part 28: Asynchronous Application Logging
+import atexit
+import collections
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+LOG_DIR = "/var/log/kali-fix-all"
+LOG_NAME = "kali-fix-all.log"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Rotate the log file at this size, keeping this many old files
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+
+# Number of recent records kept in memory for display and saving
+RING_SIZE = 5000
+
+SESSION_MARKER = "=== Kali Linux Fix All session started"
+
+# Copy buffer for streaming log files
+COPY_CHUNK = 64 * 1024
+
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the most recent formatted records in memory"""
+
+    def __init__(self, capacity: int = RING_SIZE):
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+        self.dropped = 0
+        self._ring_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            line = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self._ring_lock:
+            if len(self.records) == self.records.maxlen:
+                self.dropped += 1
+            self.records.append(line)
+
+    def lines(self, limit: Optional[int] = None) -> List[str]:
+        """Return a snapshot of the buffered lines, oldest first"""
+        with self._ring_lock:
+            lines = list(self.records)
+        return lines[-limit:] if limit else lines
+
+
+class LogManager:
+    """Application logging through a queue so callers never wait on disk I/O.
+
+    Records are put on a queue by a QueueHandler on the root logger; a
+    QueueListener thread writes them to a size-rotated log file, stderr and
+    an in-memory ring of recent records.
+    """
+
+    def __init__(self, log_dir: str = LOG_DIR, level: int = logging.INFO,
+                 max_bytes: int = MAX_LOG_BYTES, backups: int = LOG_BACKUPS,
+                 ring_size: int = RING_SIZE, console: bool = True):
+        self.log_dir = self._writable_dir(log_dir)
+        self.log_file = os.path.join(self.log_dir, LOG_NAME)
+        self.backups = backups
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        self.file_handler = logging.handlers.RotatingFileHandler(
+            self.log_file, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        self.ring = RingBufferHandler(ring_size)
+        handlers = [self.file_handler, self.ring]
+        if console:
+            handlers.append(logging.StreamHandler())
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self.queue = queue.SimpleQueue()
+        self.queue_handler = logging.handlers.QueueHandler(self.queue)
+        self.listener = LogListener(self.queue, *handlers, respect_handler_level=True)
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(self.queue_handler)
+        self.listener.start()
+        self.running = True
+        atexit.register(self.stop)
+
+        logging.getLogger("KaliFixAll").info(
+            f"{SESSION_MARKER} {datetime.now().isoformat(timespec='seconds')} ===")
+
+    @staticmethod
+    def _writable_dir(log_dir: str) -> str:
+        """Use log_dir, or a per-user directory when it cannot be written"""
+        for directory in (log_dir, os.path.expanduser("~/.cache/kali-fix-all")):
+            try:
+                os.makedirs(directory, exist_ok=True)
+                if os.access(directory, os.W_OK):
+                    return directory
+            except OSError:
+                continue
+        raise OSError(f"No writable log directory (tried {log_dir})")
+
+    def stop(self):
+        """Flush queued records and stop the listener thread"""
+        if self.running:
+            self.listener.stop()
+            self.running = False
+        logging.getLogger().removeHandler(self.queue_handler)
+        self.file_handler.close()
+
+    def log_files(self) -> List[str]:
+        """Existing log files, oldest first"""
+        names = [f"{self.log_file}.{index}" for index in range(self.backups, 0, -1)]
+        names.append(self.log_file)
+        return [name for name in names if os.path.exists(name)]
+
+    def session_start(self):
+        """Return (path, offset) of the last session marker in the log files"""
+        start = None
+        for path in self.log_files():
+            with open(path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    if SESSION_MARKER.encode() in line:
+                        start = (path, offset)
+                    offset += len(line)
+        return start
+
+    def save(self, path: str):
+        """Write this session's log to path without loading it into memory.
+
+        Uses the in-memory ring when it still holds the whole session and
+        otherwise streams the session from the rotated log files.
+        """
+        # Wait for queued records to be handled before copying them
+        self.flush()
+        if self.ring.dropped == 0:
+            with open(path, 'w', encoding='utf-8') as out:
+                for line in self.ring.lines():
+                    out.write(line + "\n")
+            return
+
+        start = self.session_start()
+        files = self.log_files()
+        if start is not None:
+            files = files[files.index(start[0]):]
+        with open(path, 'wb') as out:
+            for index, name in enumerate(files):
+                with open(name, 'rb') as f:
+                    if index == 0 and start is not None:
+                        f.seek(start[1])
+                    shutil.copyfileobj(f, out, COPY_CHUNK)
+
+    def flush(self, timeout: float = 2.0):
+        """Wait until records queued so far have been handled"""
+        if not self.running:
+            return
+        done = threading.Event()
+        self.queue.put_nowait(FlushMarker(done))
+        done.wait(timeout)
+        self.file_handler.flush()
+
+
+class FlushMarker(logging.LogRecord):
+    """Queue entry that signals an event when the listener reaches it"""
+
+    def __init__(self, event: threading.Event):
+        super().__init__("KaliFixAll.LogManager", logging.NOTSET, __file__, 0, "", None, None)
+        self.event = event
+
+
+class LogListener(logging.handlers.QueueListener):
+    """QueueListener that answers flush requests instead of logging them"""
+
+    def handle(self, record):
+        if isinstance(record, FlushMarker):
+            record.event.set()
+            return
+        super().handle(record)
+
+
+_manager = None
+
+
+def setup_logging(**kwargs) -> LogManager:
+    """Start application logging once and return the shared LogManager"""
+    global _manager
+    if _manager is None:
+        _manager = LogManager(**kwargs)
+    return _manager
+
+
+def get_log_manager() -> Optional[LogManager]:
+    return _manager
@@ -0,0 +1,267 @@
+# Part 30: Metrics and Prometheus Exporter
+import bisect
+import os
+import tempfile
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from CommandCache import get_command_cache, split_segments
+
+logger = logging.getLogger("KaliFixAll.Metrics")
+
+# node_exporter's textfile collector directory on Debian/Kali
+TEXTFILE_DIR = "/var/lib/prometheus/node-exporter"
+TEXTFILE_NAME = "kalifixall.prom"
+
+# Histogram buckets in seconds, from quick probes to long apt runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0, 60.0, 300.0)
+
+PREFIX = "kalifixall_"
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class for a labelled metric family"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[Tuple[Tuple, float]]:
+        with self._lock:
+            return sorted(self._values.items())
+
+    def lines(self) -> List[str]:
+        return [f"{self.name}{format_labels(self.labels, key)} {format_value(value)}"
+                for key, value in self.samples()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        """Return [(labels, count, sum, cumulative bucket counts)]"""
+        with self._lock:
+            items = sorted((key, list(counts), total)
+                           for key, (counts, total) in self._values.items())
+        samples = []
+        for key, counts, total in items:
+            cumulative = []
+            running = 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            samples.append((key, running, total, cumulative))
+        return samples
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Estimate a quantile from the buckets (upper bound of the bucket it falls in)"""
+        key = self._key(labels)
+        for sample_key, count, _, cumulative in self.samples():
+            if sample_key != key or not count:
+                continue
+            for bound, seen in zip(self.buckets + (float('inf'),), cumulative):
+                if seen >= q * count:
+                    return bound
+        return None
+
+    def lines(self) -> List[str]:
+        lines = []
+        bounds = self.buckets + (float('inf'),)
+        for key, count, total, cumulative in self.samples():
+            for bound, seen in zip(bounds, cumulative):
+                le = format_labels(self.labels, key, f'le="{format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {seen}")
+            labels = format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and renders them in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], List[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], List[Metric]]):
+        """Register a function producing metrics at export time"""
+        self.collectors.append(collector)
+
+    def collect(self) -> List[Metric]:
+        metrics = list(self.metrics)
+        for collector in self.collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                logger.debug(f"Metrics collector failed: {str(e)}")
+        return metrics
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.collect():
+            samples = metric.lines()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Optional[str] = None) -> str:
+        """Atomically write the metrics for node_exporter's textfile collector"""
+        path = path or os.path.join(TEXTFILE_DIR, TEXTFILE_NAME)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".kalifixall-", suffix=".prom.tmp", dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.render())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        logger.info(f"Wrote metrics to {path}")
+        return path
+
+
+registry = MetricsRegistry()
+
+commands_total = registry.register(Counter(
+    "commands_total", "External commands run, by program and result",
+    ('program', 'result')))
+command_seconds = registry.register(Histogram(
+    "command_duration_seconds", "Time spent running external commands, cache hits excluded",
+    ('program',)))
+operations_total = registry.register(Counter(
+    "operations_total", "Module scans, checks, fixes and jobs, by result",
+    ('module', 'operation', 'status')))
+operation_seconds = registry.register(Histogram(
+    "operation_duration_seconds", "Duration of module scans, checks, fixes and jobs",
+    ('module', 'operation')))
+check_issues = registry.register(Gauge(
+    "check_issues", "Issues found by the last system check of each module", ('module',)))
+fixes_applied = registry.register(Gauge(
+    "fixes_applied", "Fixes applied by the last fix run of each module", ('module',)))
+last_run = registry.register(Gauge(
+    "last_run_timestamp_seconds", "Unix time an operation last finished", ('operation',)))
+
+
+def command_result(result) -> str:
+    if result.timed_out:
+        return 'timeout'
+    if result.cancelled:
+        return 'cancelled'
+    return 'ok' if result.returncode == 0 else 'failed'
+
+
+def record_command(result, cached: bool):
+    """Count a command run through the shared executor"""
+    programs = split_segments(result.command)
+    program = programs[0][0] if programs else 'unknown'
+    commands_total.inc(program=program, result='cached' if cached else command_result(result))
+    if not cached:
+        command_seconds.observe(result.duration, program=program)
+
+
+def record_operation(module: str, operation: str, status: str, duration: float):
+    """Count a module scan, check, fix or job and its duration"""
+    operations_total.inc(module=module, operation=operation, status=status)
+    operation_seconds.observe(duration, module=module, operation=operation)
+    last_run.set(time.time(), operation=operation)
+
+
+def record_check(result):
+    record_operation(result.name, 'check', result.status, result.duration)
+    check_issues.set(len(result.issues), module=result.name)
+
+
+def record_fix(result):
+    record_operation(result.name, 'fix', result.status, result.duration)
+    fixes_applied.set(len(result.fixed), module=result.name)
+
+
+def cache_metrics() -> List[Metric]:
+    """Command cache counters, read from the cache at export time"""
+    stats = get_command_cache().stats()
+    hits = Counter("command_cache_hits_total", "Commands answered from the command cache",
+                   ('program',))
+    misses = Counter("command_cache_misses_total", "Cacheable commands that had to run",
+                     ('program',))
+    for program, counts in stats['programs'].items():
+        hits.inc(counts['hits'], program=program)
+        misses.inc(counts['misses'], program=program)
+    entries = Gauge("command_cache_entries", "Live entries in the command cache")
+    entries.set(stats['entries'])
+    return [hits, misses, entries]
+
+
+registry.add_collector(cache_metrics)
+
+
+def write_textfile(path: Optional[str] = None) -> str:
+    return registry.write_textfile(path)
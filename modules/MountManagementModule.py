@@ -1,17 +1,78 @@
 # Part 9: Mount Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import re
 from pathlib import Path
 import json
 import threading
 from datetime import datetime
-import psutil
-import yaml
+from LazyImport import lazy_import
+psutil = lazy_import('psutil')
+yaml = lazy_import('yaml')
+from CommandExecutor import execute, check_output, check_call
 
-class MountManagementModule:
+class MountManagementScanner:
+    """Mount checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+    
+    # Fix scheduling: mounts filesystems
+    FIX_RESOURCES = ('block-device',)
+
+    def check_status(self, token=None):
+        """Return a list of mount issues"""
+        issues = []
+        
+        # findmnt reports fstab entries with bad sources, targets or options
+        result = execute(['findmnt', '--verify', '--verbose'], token=token)
+        if result.returncode != 0:
+            errors = [line.strip() for line in result.stdout.splitlines()
+                      if line.strip().startswith('[E]')]
+            issues.append("fstab verification failed" +
+                          (f": {'; '.join(errors[:5])}" if errors else ""))
+        
+        # Nearly full filesystems
+        for partition in psutil.disk_partitions():
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+            except OSError:
+                continue
+            if usage.percent >= 95:
+                issues.append(f"{partition.mountpoint} is {usage.percent:.0f}% full")
+        
+        return issues
+
+    def fix_common_issues(self, token=None):
+        """Mount fstab entries that are not mounted, if fstab verifies cleanly"""
+        result = execute(['findmnt', '--verify'], token=token)
+        if result.returncode != 0:
+            return []
+        
+        before = {partition.mountpoint for partition in psutil.disk_partitions(all=True)}
+        result = execute(['mount', '-a'], token=token)
+        if result.returncode != 0:
+            raise RuntimeError(f"mount -a failed: {result.stderr.strip()}")
+        after = {partition.mountpoint for partition in psutil.disk_partitions(all=True)}
+        
+        return [f"Mounted {mountpoint}" for mountpoint in sorted(after - before)]
+
+    def scan(self, token=None):
+        """Mounted filesystems and fstab state as plain data"""
+        mounts = []
+        for partition in psutil.disk_partitions():
+            entry = {'device': partition.device, 'mountpoint': partition.mountpoint,
+                     'fstype': partition.fstype, 'options': partition.opts}
+            try:
+                usage = psutil.disk_usage(partition.mountpoint)
+                entry.update({'total': usage.total, 'used': usage.used,
+                              'percent': usage.percent})
+            except OSError:
+                pass
+            mounts.append(entry)
+        
+        result = execute(['findmnt', '--verify'], token=token)
+        return {'mounts': mounts, 'fstab_valid': result.returncode == 0}
+
+class MountManagementModule(MountManagementScanner):
     def __init__(self, parent_notebook):
         # Create mount management tab
         self.mount_frame = ttk.Frame(parent_notebook)
@@ -167,7 +228,7 @@ class MountManagementModule:
         """Scan for available devices that can be mounted"""
         try:
             # Get list of all block devices
-            output = subprocess.check_output(
+            output = check_output(
                 ['lsblk', '-Jo', 'NAME,SIZE,TYPE,FSTYPE,LABEL,MOUNTPOINT'])
             devices = json.loads(output)['blockdevices']
             
@@ -234,7 +295,7 @@ class MountManagementModule:
         cmd.extend([f"/dev/{device_name}", mount_info['mountpoint']])
         
         # Execute mount command
-        subprocess.check_call(cmd)
+        check_call(cmd)
         
         # Add to mount history
         self.mount_history.append({
@@ -260,7 +321,7 @@ class MountManagementModule:
             cmd.append(mountpoint)
             
             # Execute unmount command
-            subprocess.check_call(cmd)
+            check_call(cmd)
             
             self.scan_mounts()
             messagebox.showinfo("Success", "Device unmounted successfully")
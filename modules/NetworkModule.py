@@ -1,7 +1,6 @@
 # Part 1: Imports and Base Setup
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import sys
 import pwd
@@ -11,11 +10,134 @@ from pathlib import Path
 import shutil
 import datetime
 import socket
-import netifaces
-import psutil
+from LazyImport import lazy_import
+netifaces = lazy_import('netifaces')
+psutil = lazy_import('psutil')
+from CommandExecutor import execute
+from JobRunner import get_job_runner, ui_thread
 
-class NetworkModule:
+class NetworkScanner:
+    """Network checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+    
+    # Fix scheduling: restarting NetworkManager drops connections
+    FIX_RESOURCES = ('network',)
+
+    def __init__(self):
+        self.services = [
+            'NetworkManager',
+            'wpa_supplicant',
+            'bluetooth',
+            'ssh',
+            'networking'
+        ]
+
+    def run_command(self, command, shell=False, timeout=None, on_output=None, token=None):
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def get_interfaces(self, token=None):
+        """Return IPv4 interfaces as dicts with name, ip and state"""
+        interfaces = []
+        
+        for iface in netifaces.interfaces():
+            try:
+                addrs = netifaces.ifaddresses(iface)
+                if netifaces.AF_INET in addrs:  # Has IPv4
+                    output, _, _ = self.run_command(["ip", "link", "show", iface], token=token)
+                    interfaces.append({
+                        'name': iface,
+                        'ip': addrs[netifaces.AF_INET][0]['addr'],
+                        'state': "UP" if "UP" in output else "DOWN"
+                    })
+            except Exception as e:
+                interfaces.append({'name': iface, 'error': str(e)})
+        
+        return interfaces
+
+    def get_wireless_info(self, token=None):
+        """Return iwconfig output, or the error if it could not run"""
+        output, error, code = self.run_command("iwconfig", token=token)
+        return {'available': code == 0, 'output': output if code == 0 else error}
+
+    def get_service_status(self, token=None):
+        """Return {service: running} for the network services"""
+        status = {}
+        for service in self.services:
+            _, _, code = self.run_command(["systemctl", "status", service], token=token)
+            status[service] = code == 0
+        return status
+
+    def get_connectivity(self, token=None):
+        """Ping the default gateway and a public address"""
+        gateway = netifaces.gateways().get('default', {}).get(netifaces.AF_INET)
+        connectivity = {'gateway': gateway[0] if gateway else None,
+                        'interface': gateway[1] if gateway else None,
+                        'local': None}
+        
+        # Test local network
+        if gateway:
+            _, _, code = self.run_command(["ping", "-c", "1", "-W", "2", gateway[0]], token=token)
+            connectivity['local'] = code == 0
+        
+        # Test internet connectivity
+        _, _, code = self.run_command("ping -c 1 -W 2 8.8.8.8", token=token)
+        connectivity['internet'] = code == 0
+        return connectivity
+
+    def check_dns(self):
+        try:
+            socket.gethostbyname("www.google.com")
+            return True
+        except OSError:
+            return False
+
+    def scan(self, token=None):
+        """Full network scan as plain data"""
+        return {
+            'interfaces': self.get_interfaces(token),
+            'wireless': self.get_wireless_info(token),
+            'services': self.get_service_status(token),
+            'connectivity': self.get_connectivity(token),
+            'dns': self.check_dns()
+        }
+
+    def check_status(self, token=None):
+        """Return a list of network issues"""
+        issues = []
+        
+        connectivity = self.get_connectivity(token)
+        if not connectivity['gateway']:
+            issues.append("No default IPv4 gateway configured")
+        elif not connectivity['local']:
+            issues.append(f"Default gateway {connectivity['gateway']} is not reachable")
+        
+        if not connectivity['internet']:
+            issues.append("No internet connectivity (ping 8.8.8.8 failed)")
+        
+        if not self.check_dns():
+            issues.append("DNS resolution failed")
+        
+        output, _, _ = self.run_command("systemctl is-active NetworkManager", token=token)
+        if output.strip() != 'active':
+            issues.append(f"NetworkManager is {output.strip() or 'not running'}")
+        
+        return issues
+
+    def fix_common_issues(self, token=None):
+        """Restart NetworkManager if it is not running"""
+        output, _, _ = self.run_command("systemctl is-active NetworkManager", token=token)
+        if output.strip() == 'active':
+            return []
+        
+        _, error, code = self.run_command("systemctl restart NetworkManager", token=token)
+        if code != 0:
+            raise RuntimeError(f"Failed to restart NetworkManager: {error.strip()}")
+        return ["Restarted NetworkManager"]
+
+class NetworkModule(NetworkScanner):
     def __init__(self, parent_notebook):
+        super().__init__()
+        
         # Create network tab
         self.network_frame = ttk.Frame(parent_notebook)
         parent_notebook.add(self.network_frame, text='Network')
@@ -28,14 +150,9 @@ class NetworkModule:
         self.create_control_panel()
         
         # Initialize status variables
+        self.jobs = get_job_runner()
+        self.scan_job = None
         self.interfaces = {}
-        self.services = [
-            'NetworkManager',
-            'wpa_supplicant',
-            'bluetooth',
-            'ssh',
-            'networking'
-        ]
 
     def create_control_panel(self):
         # Button panel
@@ -60,153 +177,129 @@ class NetworkModule:
         ttk.Button(service_frame, text="Restart All Services", 
                   command=self.restart_all_services).pack(side='left', padx=5)
 
-    def run_command(self, command, shell=False):
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, 
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
+    @ui_thread
+    def write(self, text):
+        """Append text to the output area (safe to call from jobs)"""
+        self.output.insert(tk.END, text)
+        self.output.see(tk.END)
 
-    def full_network_scan(self):
+    def start_scan(self, name, func):
+        """Run a scan as a background job unless one is already running"""
+        if self.scan_job and self.scan_job.active:
+            messagebox.showinfo("Info", "A network scan is already in progress")
+            return
         self.output.delete(1.0, tk.END)
-        self.output.insert(tk.END, "=== Starting Full Network Scan ===\n\n")
-        
-        # Check physical interfaces
-        self.scan_physical_interfaces()
-        
-        # Check wireless interfaces
-        self.scan_wireless_interfaces()
-        
-        # Check network services
-        self.scan_network_services()
-        
-        # Check connectivity
-        self.check_connectivity()
+        self.scan_job = self.jobs.submit(name, func, owner=self)
+
+    def full_network_scan(self):
+        self.start_scan("Full network scan", self._full_network_scan)
+
+    def _full_network_scan(self, job):
+        self.write("=== Starting Full Network Scan ===\n\n")
         
-        # Check DNS
-        self.check_dns()
+        steps = [
+            ("Physical interfaces", self.scan_physical_interfaces),
+            ("Wireless interfaces", self.scan_wireless_interfaces),
+            ("Network services", self.scan_network_services),
+            ("Connectivity", self.show_connectivity),
+            ("DNS", self.show_dns)
+        ]
+        for i, (name, step) in enumerate(steps):
+            job.check_cancelled()
+            job.set_progress(i / len(steps) * 100, name)
+            step(job.token)
         
-        self.output.insert(tk.END, "\n=== Network Scan Complete ===\n")
+        self.write("\n=== Network Scan Complete ===\n")
 
-    def scan_physical_interfaces(self):
-        self.output.insert(tk.END, "Checking Physical Interfaces:\n")
+    def scan_physical_interfaces(self, token=None):
+        self.write("Checking Physical Interfaces:\n")
         
-        # Get all network interfaces
-        interfaces = netifaces.interfaces()
-        
-        for iface in interfaces:
-            try:
-                addrs = netifaces.ifaddresses(iface)
-                if netifaces.AF_INET in addrs:  # Has IPv4
-                    ip = addrs[netifaces.AF_INET][0]['addr']
-                    self.output.insert(tk.END, f"\n{iface}:\n")
-                    self.output.insert(tk.END, f"  IP: {ip}\n")
-                    
-                    # Get interface status
-                    output, _, _ = self.run_command(f"ip link show {iface}")
-                    if "UP" in output:
-                        self.output.insert(tk.END, "  Status: UP\n")
-                    else:
-                        self.output.insert(tk.END, "  Status: DOWN\n")
-                        
-            except Exception as e:
-                self.output.insert(tk.END, f"  Error checking {iface}: {str(e)}\n")
+        for iface in self.get_interfaces(token):
+            if 'error' in iface:
+                self.write(f"  Error checking {iface['name']}: {iface['error']}\n")
+                continue
+            self.write(f"\n{iface['name']}:\n")
+            self.write(f"  IP: {iface['ip']}\n")
+            self.write(f"  Status: {iface['state']}\n")
 
-    def scan_wireless_interfaces(self):
-        self.output.insert(tk.END, "\nChecking Wireless Interfaces:\n")
+    def scan_wireless_interfaces(self, token=None):
+        self.write("\nChecking Wireless Interfaces:\n")
         
-        output, error, code = self.run_command("iwconfig")
-        if code == 0:
-            self.output.insert(tk.END, output)
+        wireless = self.get_wireless_info(token)
+        if wireless['available']:
+            self.write(wireless['output'])
         else:
-            self.output.insert(tk.END, f"Error checking wireless interfaces: {error}\n")
+            self.write(f"Error checking wireless interfaces: {wireless['output']}\n")
 
-    def scan_network_services(self):
-        self.output.insert(tk.END, "\nChecking Network Services:\n")
+    def scan_network_services(self, token=None):
+        self.write("\nChecking Network Services:\n")
         
-        for service in self.services:
-            output, error, code = self.run_command(f"systemctl status {service}")
-            status = "Running" if code == 0 else "Stopped/Error"
-            self.output.insert(tk.END, f"{service}: {status}\n")
+        for service, running in self.get_service_status(token).items():
+            status = "Running" if running else "Stopped/Error"
+            self.write(f"{service}: {status}\n")
 
-    def check_connectivity(self):
-        self.output.insert(tk.END, "\nChecking Internet Connectivity:\n")
+    def show_connectivity(self, token=None):
+        self.write("\nChecking Internet Connectivity:\n")
         
-        # Test local network
-        gateway = netifaces.gateways()['default'].get(netifaces.AF_INET)
-        if gateway:
-            output, _, code = self.run_command(f"ping -c 1 {gateway[0]}")
-            if code == 0:
-                self.output.insert(tk.END, "Local Network: Connected\n")
-            else:
-                self.output.insert(tk.END, "Local Network: Failed\n")
+        connectivity = self.get_connectivity(token)
+        if connectivity['gateway']:
+            status = "Connected" if connectivity['local'] else "Failed"
+            self.write(f"Local Network: {status}\n")
         
-        # Test internet connectivity
-        output, _, code = self.run_command("ping -c 1 8.8.8.8")
-        if code == 0:
-            self.output.insert(tk.END, "Internet Connectivity: Connected\n")
-        else:
-            self.output.insert(tk.END, "Internet Connectivity: Failed\n")
+        status = "Connected" if connectivity['internet'] else "Failed"
+        self.write(f"Internet Connectivity: {status}\n")
 
-    def check_dns(self):
-        self.output.insert(tk.END, "\nChecking DNS Resolution:\n")
-        
-        try:
-            socket.gethostbyname("www.google.com")
-            self.output.insert(tk.END, "DNS Resolution: Working\n")
-        except:
-            self.output.insert(tk.END, "DNS Resolution: Failed\n")
+    def show_dns(self, token=None):
+        self.write("\nChecking DNS Resolution:\n")
+        status = "Working" if self.check_dns() else "Failed"
+        self.write(f"DNS Resolution: {status}\n")
 
     def restart_service(self, service_name):
         if os.geteuid() != 0:
             messagebox.showerror("Error", "Root privileges required")
             return
             
-        self.output.insert(tk.END, f"\nRestarting {service_name}...\n")
-        output, error, code = self.run_command(f"systemctl restart {service_name}")
+        self.write(f"\nRestarting {service_name}...\n")
+        output, error, code = self.run_command(["systemctl", "restart", service_name])
         
         if code == 0:
-            self.output.insert(tk.END, f"{service_name} restarted successfully\n")
+            self.write(f"{service_name} restarted successfully\n")
         else:
-            self.output.insert(tk.END, f"Error restarting {service_name}: {error}\n")
+            self.write(f"Error restarting {service_name}: {error}\n")
 
     def restart_all_services(self):
         if os.geteuid() != 0:
             messagebox.showerror("Error", "Root privileges required")
             return
             
-        self.output.insert(tk.END, "\nRestarting all network services...\n")
+        self.write("\nRestarting all network services...\n")
         
         for service in self.services:
             self.restart_service(service)
 
     def quick_status_check(self):
-        self.output.delete(1.0, tk.END)
-        self.output.insert(tk.END, "=== Quick Network Status Check ===\n\n")
+        self.start_scan("Quick network status check", self._quick_status_check)
+
+    def _quick_status_check(self, job):
+        self.write("=== Quick Network Status Check ===\n\n")
         
         # Check main interface status
         default_iface = netifaces.gateways()['default'].get(netifaces.AF_INET, [None])[1]
         if default_iface:
-            self.output.insert(tk.END, f"Main Interface: {default_iface}\n")
+            self.write(f"Main Interface: {default_iface}\n")
             
             # Get IP address
             addrs = netifaces.ifaddresses(default_iface)
             if netifaces.AF_INET in addrs:
                 ip = addrs[netifaces.AF_INET][0]['addr']
-                self.output.insert(tk.END, f"IP Address: {ip}\n")
+                self.write(f"IP Address: {ip}\n")
         
         # Quick connectivity test
         output, _, code = self.run_command("ping -c 1 8.8.8.8")
         status = "Connected" if code == 0 else "Disconnected"
-        self.output.insert(tk.END, f"Internet Status: {status}\n")
+        self.write(f"Internet Status: {status}\n")
         
         # NetworkManager status
         output, _, code = self.run_command("systemctl is-active NetworkManager")
         status = "Running" if code == 0 else "Stopped"
-        self.output.insert(tk.END, f"NetworkManager: {status}\n")
\ No newline at end of file
+        self.write(f"NetworkManager: {status}\n")
\ No newline at end of file
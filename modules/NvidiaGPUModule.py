@@ -1,17 +1,93 @@
 # Part 6: NVIDIA GPU Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import re
 import json
 from pathlib import Path
 import shutil
 from datetime import datetime
-import requests
+from LazyImport import lazy_import
+requests = lazy_import('requests')
 import platform
+from CommandExecutor import execute
+from DpkgStatus import get_dpkg_status
+from JobRunner import get_job_runner, ui_thread
+from AptProgress import AptProgressBar, run_steps
+from AptLists import refresh_lists
 
-class NvidiaGPUModule:
+class NvidiaGPUScanner:
+    """NVIDIA GPU checks and scans with no widget code (used by the GUI and CLI)"""
+
+    def run_command(self, command, shell=False, timeout=None, on_output=None, token=None):
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None):
+        """Return a list of NVIDIA GPU issues"""
+        issues = []
+        
+        output, _, code = self.run_command("lspci | grep -i nvidia", shell=True, token=token)
+        if code != 0 or not output.strip():
+            return issues
+        
+        _, _, code = self.run_command("lsmod | grep nvidia", shell=True, token=token)
+        if code != 0:
+            issues.append("NVIDIA GPU detected but driver module is not loaded")
+            return issues
+        
+        output, _, code = self.run_command(
+            "nvidia-smi --query-gpu=temperature.gpu,memory.used,memory.total "
+            "--format=csv,noheader,nounits", token=token)
+        if code != 0:
+            issues.append("nvidia-smi is not working")
+            return issues
+        
+        for line in output.splitlines():
+            try:
+                temp, used, total = [float(value) for value in line.split(',')]
+            except ValueError:
+                continue
+            if temp > 80:
+                issues.append(f"High GPU temperature: {temp:.0f}°C")
+            if total and used / total > 0.9:
+                issues.append(f"High GPU memory usage: {used / total * 100:.1f}%")
+        
+        return issues
+
+    def scan(self, token=None):
+        """GPU, driver and CUDA status as plain data"""
+        result = {'present': False, 'pci_info': None, 'driver_loaded': False,
+                  'gpus': [], 'cuda': None}
+        
+        output, _, code = self.run_command("lspci | grep -i nvidia", shell=True, token=token)
+        if code != 0 or not output.strip():
+            return result
+        result['present'] = True
+        result['pci_info'] = output.strip()
+        
+        _, _, code = self.run_command("lsmod | grep nvidia", shell=True, token=token)
+        result['driver_loaded'] = code == 0
+        
+        output, _, code = self.run_command(
+            "nvidia-smi --query-gpu=name,driver_version,temperature.gpu,memory.used,"
+            "memory.total,power.draw,power.limit --format=csv,noheader,nounits", token=token)
+        if code == 0:
+            fields = ['name', 'driver', 'temperature', 'memory_used', 'memory_total',
+                      'power_draw', 'power_limit']
+            for line in output.splitlines():
+                values = [value.strip() for value in line.split(',')]
+                if len(values) == len(fields):
+                    result['gpus'].append(dict(zip(fields, values)))
+        
+        output, _, code = self.run_command("nvcc --version", token=token)
+        if code == 0:
+            match = re.search(r"release ([\d\.]+)", output)
+            result['cuda'] = match.group(1) if match else output.strip()
+        
+        return result
+
+class NvidiaGPUModule(NvidiaGPUScanner):
     def __init__(self, parent_notebook):
         # Create NVIDIA GPU tab
         self.nvidia_frame = ttk.Frame(parent_notebook)
@@ -21,6 +97,12 @@ class NvidiaGPUModule:
         self.output = scrolledtext.ScrolledText(self.nvidia_frame, height=20)
         self.output.pack(padx=5, pady=5, fill='both', expand=True)
         
+        # Live progress of apt runs
+        self.apt_progress = AptProgressBar(self.nvidia_frame)
+        self.apt_progress.pack(fill='x', padx=5, pady=5)
+        self.jobs = get_job_runner()
+        self.install_job = None
+        
         # Initialize GPU info
         self.gpu_info = {}
         self.driver_info = {}
@@ -58,19 +140,6 @@ class NvidiaGPUModule:
         ttk.Button(driver_frame, text="Optimize Settings", 
                   command=self.optimize_gpu_settings).pack(side='left', padx=5)
 
-    def run_command(self, command, shell=False):
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, 
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_gpu_status(self):
         """Perform comprehensive GPU status scan"""
         self.output.delete(1.0, tk.END)
@@ -93,7 +162,7 @@ class NvidiaGPUModule:
         self.output.insert(tk.END, "Detecting NVIDIA GPU...\n")
         
         # Try lspci first
-        output, error, code = self.run_command("lspci | grep -i nvidia")
+        output, error, code = self.run_command("lspci | grep -i nvidia", shell=True)
         if code == 0 and output:
             self.gpu_info['present'] = True
             self.gpu_info['pci_info'] = output.strip()
@@ -162,7 +231,7 @@ class NvidiaGPUModule:
         self.output.insert(tk.END, "\nChecking driver status...\n")
         
         # Check if nvidia module is loaded
-        output, error, code = self.run_command("lsmod | grep nvidia")
+        output, error, code = self.run_command("lsmod | grep nvidia", shell=True)
         if code == 0:
             self.driver_info['loaded'] = True
             self.output.insert(tk.END, "NVIDIA driver module is loaded\n")
@@ -304,10 +373,18 @@ class NvidiaGPUModule:
             return False
 
     def install_driver(self):
-        """Install or update NVIDIA driver"""
+        """Install or update NVIDIA driver.
+
+        The apt runs happen in background jobs that stream their output into
+        the tab; the driver version is chosen on the UI thread in between,
+        once the package lists have been updated.
+        """
         if os.geteuid() != 0:
             messagebox.showerror("Error", "Root privileges required")
             return
+        if self.install_job and self.install_job.active:
+            messagebox.showinfo("Info", "A driver installation is already running")
+            return
         
         try:
             self.output.delete(1.0, tk.END)
@@ -316,39 +393,64 @@ class NvidiaGPUModule:
             # Backup current configuration
             self.backup_gpu_config()
             
-            # Remove existing NVIDIA drivers
-            self.output.insert(tk.END, "Removing existing NVIDIA drivers...\n")
-            self.run_command("apt-get remove --purge '^nvidia-.*'")
+            self.install_job = self.jobs.submit(
+                "Prepare NVIDIA driver install", self._prepare_driver_install, owner=self,
+                on_done=self.install_recommended_driver, on_error=self.install_failed)
             
+        except Exception as e:
+            self.install_failed(e)
+
+    def _prepare_driver_install(self, job):
+        run_steps(job, [
+            # Remove existing NVIDIA drivers
+            ("Removing existing NVIDIA drivers...", "apt-get remove --purge -y '^nvidia-.*'"),
             # Add graphics-drivers PPA
-            self.output.insert(tk.END, "Adding graphics-drivers PPA...\n")
-            self.run_command("add-apt-repository ppa:graphics-drivers/ppa -y")
-            self.run_command("apt-get update")
-            
+            ("Adding graphics-drivers PPA...", "add-apt-repository ppa:graphics-drivers/ppa -y"),
+        ], self.append_output, self.show_apt_progress)
+        # The new source makes the lists stale, so this updates them
+        refresh_lists(job, self.append_output)
+
+    def install_recommended_driver(self, _):
+        try:
             # Determine best driver version
             recommended_driver = self.get_recommended_driver()
-            
-            if recommended_driver:
-                # Install driver
-                self.output.insert(tk.END, 
-                    f"Installing NVIDIA driver {recommended_driver}...\n")
-                output, error, code = self.run_command(
-                    f"apt-get install -y nvidia-driver-{recommended_driver}")
-                
-                if code != 0:
-                    raise Exception(f"Driver installation failed: {error}")
-                
-                # Update initramfs
-                self.output.insert(tk.END, "Updating initramfs...\n")
-                self.run_command("update-initramfs -u")
-                
-                self.output.insert(tk.END, 
-                    "Driver installation complete. Please reboot your system.\n")
-            else:
+            if not recommended_driver:
                 raise Exception("Could not determine recommended driver version")
             
+            self.install_job = self.jobs.submit(
+                f"Install NVIDIA driver {recommended_driver}", self._install_driver,
+                recommended_driver, owner=self, on_error=self.install_failed)
+            
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to install driver: {str(e)}")
+            self.install_failed(e)
+
+    def _install_driver(self, job, recommended_driver):
+        # Install driver
+        install, = run_steps(job, [
+            (f"Installing NVIDIA driver {recommended_driver}...",
+             f"apt-get install -y nvidia-driver-{recommended_driver}"),
+        ], self.append_output, self.show_apt_progress)
+        
+        if install.returncode != 0:
+            raise Exception(f"Driver installation failed: {install.stderr}")
+        
+        # Update initramfs
+        run_steps(job, [("Updating initramfs...", "update-initramfs -u")],
+                  self.append_output, self.show_apt_progress)
+        
+        self.append_output("Driver installation complete. Please reboot your system.\n")
+
+    def install_failed(self, error):
+        messagebox.showerror("Error", f"Failed to install driver: {str(error)}")
+
+    @ui_thread
+    def append_output(self, text):
+        self.output.insert(tk.END, text)
+        self.output.see(tk.END)
+
+    @ui_thread
+    def show_apt_progress(self, percent, text):
+        self.apt_progress.show(percent, text)
 
     def backup_gpu_config(self):
         """Backup current GPU configuration"""
@@ -438,7 +540,7 @@ class NvidiaGPUModule:
             
             # Install CUDA
             self.output.insert(tk.END, "Installing CUDA...\n")
-            output, error, code = self.run_command(f"sh {installer_path} --silent --toolkit")
+            output, error, code = self.run_command(["sh", installer_path, "--silent", "--toolkit"])
             
             if code != 0:
                 raise Exception(f"CUDA installation failed: {error}")
@@ -470,8 +572,7 @@ class NvidiaGPUModule:
                 raise Exception("GCC not installed")
             
             # Check kernel headers
-            output, error, code = self.run_command("dpkg -l | grep linux-headers")
-            if code != 0:
+            if not get_dpkg_status().with_prefix("linux-headers-", installed_only=True):
                 raise Exception("Kernel headers not installed")
             
             return True
@@ -633,7 +734,7 @@ export LD_LIBRARY_PATH=/usr/local/cuda-{version}/lib64${LD_LIBRARY_PATH:+:${LD_L
             if 'power' in self.gpu_info:
                 max_power = self.gpu_info['power']['max']
                 self.run_command(
-                    f"nvidia-smi -pl {max_power}")
+                    ["nvidia-smi", "-pl", str(max_power)])
             
         except Exception as e:
             raise Exception(f"Failed to configure power management: {str(e)}")
@@ -0,0 +1,210 @@
+# Part 34: Installed File to Package Index
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("KaliFixAll.PackageFiles")
+
+DPKG_INFO = "/var/lib/dpkg/info"
+CACHE_DIR = "/var/cache/kali-fix-all"
+INDEX_NAME = "file-owners.json.gz"
+
+# Bumped when the on-disk format changes; older indexes are rebuilt
+INDEX_VERSION = 1
+
+
+def writable_cache_dir(cache_dir: str = CACHE_DIR) -> str:
+    """Use cache_dir, or a per-user directory when it cannot be written"""
+    for directory in (cache_dir, os.path.expanduser("~/.cache/kali-fix-all")):
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if os.access(directory, os.W_OK):
+                return directory
+        except OSError:
+            continue
+    return cache_dir
+
+
+def list_package(filename: str) -> str:
+    """Package name (with :arch for Multi-Arch: same packages) of a .list file"""
+    return filename[:-len(".list")]
+
+
+class FileOwnerIndex:
+    """Maps installed paths to the packages that ship them, like dpkg -S.
+
+    Built from the .list files in /var/lib/dpkg/info and saved between
+    runs. On refresh only the .list files whose mtime or size changed are
+    read again, and nothing is checked while the info directory itself is
+    unchanged (dpkg replaces .list files by rename, which updates it).
+    """
+
+    def __init__(self, info_dir: str = DPKG_INFO, cache_dir: str = CACHE_DIR):
+        self.info_dir = info_dir
+        self.index_file = os.path.join(writable_cache_dir(cache_dir), INDEX_NAME)
+        self._lock = threading.Lock()
+        self._dir_signature = None
+        # package -> ((mtime_ns, size), [paths]) as read from its .list file
+        self._lists: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+        self._owners: Dict[str, object] = {}
+        self._loaded = False
+        self.refresh_count = 0
+        self.lists_read = 0
+
+    def _load(self):
+        """Read the index saved by an earlier run, if it is usable"""
+        self._loaded = True
+        try:
+            with gzip.open(self.index_file, 'rt') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"Ignoring unreadable file index {self.index_file}: {str(e)}")
+            return
+        if data.get('version') != INDEX_VERSION or data.get('info_dir') != self.info_dir:
+            return
+        self._lists = {package: (tuple(signature), paths)
+                       for package, (signature, paths) in data['lists'].items()}
+        self._dir_signature = tuple(data['dir_signature'])
+        self._build_owners()
+
+    def _save(self):
+        directory = os.path.dirname(self.index_file)
+        try:
+            fd, tmp = tempfile.mkstemp(prefix=".file-owners-", dir=directory)
+        except OSError as e:
+            logger.debug(f"Not saving file index: {str(e)}")
+            return
+        try:
+            with gzip.open(os.fdopen(fd, 'wb'), 'wt', compresslevel=1) as f:
+                json.dump({'version': INDEX_VERSION, 'info_dir': self.info_dir,
+                           'dir_signature': self._dir_signature,
+                           'lists': self._lists}, f)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.index_file)
+        except OSError as e:
+            logger.debug(f"Not saving file index: {str(e)}")
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def _build_owners(self):
+        owners: Dict[str, object] = {}
+        for package, (_, paths) in self._lists.items():
+            for path in paths:
+                current = owners.get(path)
+                if current is None:
+                    owners[path] = package
+                elif isinstance(current, tuple):
+                    owners[path] = current + (package,)
+                else:
+                    # Directories and diverted files belong to several packages
+                    owners[path] = (current, package)
+        self._owners = owners
+
+    def refresh(self, force: bool = False) -> int:
+        """Bring the index up to date; return the number of .list files read"""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            st = os.stat(self.info_dir)
+            dir_signature = (st.st_mtime_ns, st.st_ino)
+            if dir_signature == self._dir_signature and not force:
+                return 0
+
+            start = time.perf_counter()
+            lists = {}
+            read = 0
+            with os.scandir(self.info_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".list"):
+                        continue
+                    package = list_package(entry.name)
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    signature = (st.st_mtime_ns, st.st_size)
+                    known = self._lists.get(package)
+                    if known is not None and known[0] == signature:
+                        lists[package] = known
+                        continue
+                    try:
+                        with open(entry.path, 'r', errors='surrogateescape') as f:
+                            paths = [line.rstrip('\n') for line in f if line.strip()]
+                    except OSError:
+                        continue
+                    lists[package] = (signature, paths)
+                    read += 1
+
+            changed = read or len(lists) != len(self._lists)
+            self._lists = lists
+            self._dir_signature = dir_signature
+            if changed or not self._owners:
+                self._build_owners()
+                self._save()
+            self.refresh_count += 1
+            self.lists_read += read
+            logger.debug(f"File index refreshed: read {read} of {len(lists)} lists in "
+                         f"{(time.perf_counter() - start) * 1000:.1f} ms")
+            return read
+
+    def _lookup(self, path: str) -> Tuple[str, ...]:
+        owner = self._owners.get(path)
+        if owner is None:
+            return ()
+        return owner if isinstance(owner, tuple) else (owner,)
+
+    def owners(self, path: str) -> Tuple[str, ...]:
+        """Packages that ship path, e.g. ('coreutils',), or () if none does"""
+        self.refresh()
+        path = os.path.normpath(path)
+        found = self._lookup(path)
+        if not found:
+            # With merged /usr, /bin/ls may be listed as /usr/bin/ls or vice versa
+            parent, name = os.path.split(path)
+            resolved = os.path.join(os.path.realpath(parent), name)
+            if resolved != path:
+                found = self._lookup(resolved)
+            if not found:
+                for alias, target in (("/usr/", "/"), ("/", "/usr/")):
+                    if path.startswith(alias) and path.count("/") > 1:
+                        found = self._lookup(target + path[len(alias):])
+                        if found:
+                            break
+        return found
+
+    def owner(self, path: str) -> Optional[str]:
+        """The package that ships path, or None; bare names like dpkg -S prints them"""
+        found = self.owners(path)
+        return found[0].split(':')[0] if found else None
+
+    def owners_of(self, paths: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Owning package of each path (None when no package ships it)"""
+        return {path: self.owner(path) for path in paths}
+
+    def files(self, package: str) -> List[str]:
+        """Paths shipped by package, like dpkg -L"""
+        self.refresh()
+        entry = self._lists.get(package)
+        if entry is None:
+            entry = next((value for name, value in self._lists.items()
+                          if name.split(':')[0] == package), None)
+        return list(entry[1]) if entry else []
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_file_owner_index() -> FileOwnerIndex:
+    """Return the file index shared by all modules"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FileOwnerIndex()
+        return _index
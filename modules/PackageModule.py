@@ -1,15 +1,120 @@
 # Part 2: Package Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import sys
-import apt
-import apt_pkg
 from pathlib import Path
 import datetime
+from CommandExecutor import execute
+from AptCache import get_apt_cache_manager, format_fix_plan
+from DpkgStatus import get_dpkg_status
+from JobRunner import get_job_runner, ui_thread
+from AptProgress import AptProgressBar, run_steps
+from AptLists import refresh_lists
+from AptArchives import get_apt_archive_analyzer, format_bytes
 
-class PackageModule:
+class PackageScanner:
+    """Package checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+    
+    # apt-get check has to load the whole package cache
+    CHECK_DEADLINE = 90
+    
+    # Fix scheduling: resources held while fix_common_issues runs
+    FIX_RESOURCES = ('dpkg-lock', 'network')
+
+    def run_command(self, command, shell=False, timeout=None, on_output=None, token=None):
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def package_health(self, token=None):
+        """Package system health from the shared apt cache.
+
+        Falls back to dpkg --audit, apt-get check and apt-mark showhold when
+        python-apt is not installed or the cache cannot be built.
+        """
+        try:
+            return get_apt_cache_manager().health()
+        except (ImportError, SystemError):
+            return self.command_health(token)
+
+    def command_health(self, token=None):
+        """Package system health from dpkg and apt-get, in the package_health format"""
+        audit, _, _ = self.run_command("dpkg --audit", token=token)
+        _, check_error, check_code = self.run_command("apt-get check", token=token)
+        held, _, _ = self.run_command("apt-mark showhold", token=token)
+        # dpkg --audit lists affected packages indented under each explanation
+        half_installed = [(line.split()[0], 'audit') for line in audit.splitlines()
+                          if line.startswith(' ') and line.strip()]
+        return {
+            'source': 'commands',
+            'broken_count': 0 if check_code == 0 else None,
+            'broken': [],
+            'check_errors': check_error.strip(),
+            'held': held.split(),
+            'half_installed': half_installed,
+            'reinstall_required': [],
+            'fix_plan': None,
+            'lists_updated': None
+        }
+
+    def check_status(self, token=None):
+        """Return a list of package system issues"""
+        issues = []
+        health = self.package_health(token)
+        
+        unfinished = [name for name, _ in health['half_installed']] + health['reinstall_required']
+        if unfinished:
+            issues.append(f"{len(unfinished)} partially installed or unconfigured package(s): "
+                          f"{', '.join(unfinished[:10])}")
+        
+        if health['broken_count'] != 0:
+            if health['broken']:
+                issues.append(f"{len(health['broken'])} broken package(s): "
+                              f"{', '.join(health['broken'][:10])}")
+            else:
+                issues.append("Broken package dependencies (apt-get check failed)")
+        
+        if health['held']:
+            issues.append(f"{len(health['held'])} held package(s): {', '.join(health['held'][:10])}")
+        
+        return issues
+
+    def fix_common_issues(self, token=None):
+        """Finish interrupted installs and repair dependencies without prompting"""
+        fixed = []
+        health = self.package_health(token)
+        
+        if health['half_installed'] or health['reinstall_required']:
+            _, error, code = self.run_command(
+                "env DEBIAN_FRONTEND=noninteractive dpkg --configure -a", token=token)
+            if code != 0:
+                raise RuntimeError(f"dpkg --configure -a failed: {error.strip()}")
+            fixed.append("Configured unconfigured packages")
+            # dpkg changed its status file, so this reloads the cache
+            health = self.package_health(token)
+        
+        if health['broken_count'] != 0:
+            _, error, code = self.run_command(
+                "env DEBIAN_FRONTEND=noninteractive apt-get -f install -y", token=token)
+            if code != 0:
+                raise RuntimeError(f"apt-get -f install failed: {error.strip()}")
+            fixed.append("Repaired broken dependencies")
+        
+        return fixed
+
+    def archive_cache(self, token=None):
+        """What pruning /var/cache/apt/archives by the default policy would reclaim"""
+        analyzer = get_apt_archive_analyzer()
+        try:
+            return analyzer.summary(analyzer.plan())
+        except OSError as e:
+            return {'error': str(e)}
+
+    def scan(self, token=None):
+        """Package system status as plain data"""
+        return dict(self.package_health(token), archive_cache=self.archive_cache(token))
+
+class PackageModule(PackageScanner):
     def __init__(self, parent_notebook):
         # Create package management tab
         self.package_frame = ttk.Frame(parent_notebook)
@@ -19,6 +124,12 @@ class PackageModule:
         self.output = scrolledtext.ScrolledText(self.package_frame, height=20)
         self.output.pack(padx=5, pady=5, fill='both', expand=True)
         
+        # Live progress of apt and dpkg runs
+        self.apt_progress = AptProgressBar(self.package_frame)
+        self.apt_progress.pack(fill='x', padx=5, pady=5)
+        self.jobs = get_job_runner()
+        self.apt_job = None
+        
         # Create control panels
         self.create_control_panel()
         
@@ -53,23 +164,13 @@ class PackageModule:
 
     def init_apt_cache(self):
         try:
-            self.cache = apt.Cache()
+            self.cache = get_apt_cache_manager().get()
+        except ImportError:
+            # Without python-apt the checks fall back to dpkg and apt-get
+            self.cache = None
         except Exception as e:
             messagebox.showerror("Error", f"Failed to initialize APT cache: {str(e)}")
 
-    def run_command(self, command, shell=False):
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, 
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_packages(self):
         if os.geteuid() != 0:
             messagebox.showerror("Error", "Root privileges required")
@@ -77,28 +178,38 @@ class PackageModule:
 
         self.output.delete(1.0, tk.END)
         self.output.insert(tk.END, "=== Starting Package Scan ===\n\n")
-        
+        self.jobs.submit("Scan packages", lambda job: self.scan(job.token), owner=self,
+                         on_done=self.show_scan,
+                         on_error=lambda e: messagebox.showerror(
+                             "Error", f"Package scan failed: {str(e)}"))
+
+    def show_scan(self, result):
         # Check dpkg status
         self.output.insert(tk.END, "Checking dpkg status...\n")
-        output, error, code = self.run_command("dpkg --audit")
-        if code == 0 and not output.strip():
+        if not result['half_installed'] and not result['reinstall_required']:
             self.output.insert(tk.END, "No package integrity issues found.\n")
         else:
-            self.output.insert(tk.END, f"Issues found:\n{output}\n{error}\n")
+            self.output.insert(tk.END, "Issues found:\n")
+            for name, state in result['half_installed']:
+                self.output.insert(tk.END, f"  {name}: {state}\n")
+            for name in result['reinstall_required']:
+                self.output.insert(tk.END, f"  {name}: reinstall required\n")
         
         # Check for broken packages
         self.output.insert(tk.END, "\nChecking for broken packages...\n")
-        output, error, code = self.run_command("apt-get check")
-        if code == 0:
+        if result['broken_count'] == 0:
             self.output.insert(tk.END, "No broken packages found.\n")
+        elif result['broken']:
+            self.output.insert(tk.END, "Broken packages found:\n" + "\n".join(result['broken']) + "\n")
+            self.output.insert(tk.END, "\napt-get -f install would:\n")
+            self.output.insert(tk.END, format_fix_plan(result['fix_plan']) + "\n")
         else:
-            self.output.insert(tk.END, f"Broken packages found:\n{error}\n")
+            self.output.insert(tk.END, f"Broken packages found:\n{result['check_errors']}\n")
         
         # Check for held packages
         self.output.insert(tk.END, "\nChecking for held packages...\n")
-        output, error, _ = self.run_command("apt-mark showhold")
-        if output.strip():
-            self.output.insert(tk.END, f"Held packages:\n{output}\n")
+        if result['held']:
+            self.output.insert(tk.END, "Held packages:\n" + "\n".join(result['held']) + "\n")
         else:
             self.output.insert(tk.END, "No held packages found.\n")
 
@@ -109,21 +220,44 @@ class PackageModule:
 
         self.output.delete(1.0, tk.END)
         self.output.insert(tk.END, "=== Checking Package Dependencies ===\n\n")
+        self.jobs.submit("Check package dependencies", self._check_dependencies, owner=self,
+                         on_done=self.show_dependencies,
+                         on_error=lambda e: messagebox.showerror(
+                             "Error", f"Dependency check failed: {str(e)}"))
+
+    def _check_dependencies(self, job):
+        # Refresh the package lists only when they are out of date
+        refresh_lists(job, self.append_output)
         
-        # Update package cache
-        self.output.insert(tk.END, "Updating package cache...\n")
-        output, error, code = self.run_command("apt-get update")
-        if code != 0:
-            self.output.insert(tk.END, f"Error updating cache:\n{error}\n")
+        if self.cache is None:
+            # No python-apt: ask apt-get for a dry run instead
+            output, _, _ = self.run_command("apt-get --dry-run -f install", token=job.token)
+            return {'dry_run': output}
+        return self.package_health(job.token)
+
+    def show_dependencies(self, health):
+        if 'dry_run' in health:
+            self.output.insert(tk.END, "Checking for missing dependencies...\n")
+            if "0 upgraded, 0 newly installed" in health['dry_run']:
+                self.output.insert(tk.END, "No missing dependencies found.\n")
+            else:
+                self.output.insert(tk.END, f"Dependencies need fixing:\n{health['dry_run']}\n")
             return
         
+        # The package lists are only as fresh as the last apt-get update
+        if health['lists_updated']:
+            updated = datetime.datetime.fromtimestamp(health['lists_updated'])
+            self.output.insert(tk.END, f"Package lists last updated: {updated:%Y-%m-%d %H:%M}\n")
+        
         # Check for missing dependencies
         self.output.insert(tk.END, "\nChecking for missing dependencies...\n")
-        output, error, code = self.run_command("apt-get --dry-run -f install")
-        if "0 upgraded, 0 newly installed" in output:
+        if health['broken_count'] == 0:
             self.output.insert(tk.END, "No missing dependencies found.\n")
         else:
-            self.output.insert(tk.END, f"Dependencies need fixing:\n{output}\n")
+            self.output.insert(tk.END, f"{health['broken_count']} package(s) have unmet dependencies: "
+                                       f"{', '.join(health['broken'])}\n\n")
+            self.output.insert(tk.END, "Dependencies need fixing; apt-get -f install would:\n")
+            self.output.insert(tk.END, format_fix_plan(health['fix_plan']) + "\n")
 
     def fix_broken_packages(self):
         if os.geteuid() != 0:
@@ -131,26 +265,24 @@ class PackageModule:
             return
 
         if messagebox.askyesno("Confirm", "This will attempt to fix broken packages. Continue?"):
-            self.output.delete(1.0, tk.END)
-            self.output.insert(tk.END, "=== Fixing Broken Packages ===\n\n")
-            
+            self.start_apt_job("Fix broken packages", "=== Fixing Broken Packages ===",
+                               self._fix_broken_packages)
+
+    def _fix_broken_packages(self, job):
+        run_steps(job, [
             # First, try dpkg configure
-            self.output.insert(tk.END, "Configuring unconfigured packages...\n")
-            output, error, _ = self.run_command("dpkg --configure -a")
-            self.output.insert(tk.END, output + error + "\n")
-            
+            ("Configuring unconfigured packages...", "dpkg --configure -a"),
             # Then, fix missing dependencies
-            self.output.insert(tk.END, "Fixing dependencies...\n")
-            output, error, _ = self.run_command("apt-get -f install")
-            self.output.insert(tk.END, output + error + "\n")
-            
-            # Finally, try to resolve any remaining issues
-            self.output.insert(tk.END, "Running final checks...\n")
-            output, error, code = self.run_command("apt-get check")
-            if code == 0:
-                self.output.insert(tk.END, "All package issues resolved.\n")
-            else:
-                self.output.insert(tk.END, "Some issues remain. Manual intervention may be required.\n")
+            ("Fixing dependencies...", "apt-get -f install -y"),
+        ], self.append_output, self.show_apt_progress)
+        
+        # Finally, try to resolve any remaining issues
+        self.append_output("Running final checks...\n")
+        output, error, code = self.run_command("apt-get check", token=job.token)
+        if code == 0:
+            self.append_output("All package issues resolved.\n")
+        else:
+            self.append_output("Some issues remain. Manual intervention may be required.\n")
 
     def reconfigure_packages(self):
         if os.geteuid() != 0:
@@ -158,15 +290,8 @@ class PackageModule:
             return
 
         # Get list of packages that need reconfiguration
-        output, error, _ = self.run_command("dpkg -l | grep '^rc'")
-        packages_to_reconfigure = []
-        
-        if output:
-            lines = output.splitlines()
-            for line in lines:
-                parts = line.split()
-                if len(parts) >= 2:
-                    packages_to_reconfigure.append(parts[1])
+        packages_to_reconfigure = [package.name for package in get_dpkg_status().packages()
+                                   if package.abbrev == 'rc']
         
         if packages_to_reconfigure:
             if messagebox.askyesno("Confirm", 
@@ -176,7 +301,7 @@ class PackageModule:
                 
                 for package in packages_to_reconfigure:
                     self.output.insert(tk.END, f"Reconfiguring {package}...\n")
-                    output, error, _ = self.run_command(f"dpkg-reconfigure {package}")
+                    output, error, _ = self.run_command(["dpkg-reconfigure", package])
                     self.output.insert(tk.END, output + error + "\n")
         else:
             messagebox.showinfo("Info", "No packages need reconfiguration")
@@ -186,21 +311,57 @@ class PackageModule:
             messagebox.showerror("Error", "Root privileges required")
             return
 
-        if messagebox.askyesno("Confirm", "This will clean the package cache. Continue?"):
-            self.output.delete(1.0, tk.END)
-            self.output.insert(tk.END, "=== Cleaning Package Cache ===\n\n")
-            
-            # Clean apt cache
-            self.output.insert(tk.END, "Cleaning APT cache...\n")
-            output, error, _ = self.run_command("apt-get clean")
-            self.output.insert(tk.END, output + error + "\n")
-            
-            # Remove old downloaded archive files
-            self.output.insert(tk.END, "Removing old archive files...\n")
-            output, error, _ = self.run_command("apt-get autoclean")
-            self.output.insert(tk.END, output + error + "\n")
-            
+        # Work out what the keep-latest policy would prune before asking
+        self.jobs.submit("Analyze package cache", lambda job: get_apt_archive_analyzer().plan(),
+                         owner=self, on_done=self.confirm_clean_package_cache,
+                         on_error=lambda e: messagebox.showerror(
+                             "Error", f"Failed to analyze package cache: {str(e)}"))
+
+    def confirm_clean_package_cache(self, plan):
+        policy = plan['policy']
+        largest = ", ".join(f"{name} ({format_bytes(size)})" for name, size in plan['by_package'][:5])
+        message = (f"The package cache holds {plan['total_files']} files "
+                   f"({format_bytes(plan['total_bytes'])}).\n\n"
+                   f"Keeping the latest {policy['keep_latest']} versions of each package "
+                   f"and the installed versions frees {format_bytes(plan['reclaimable_bytes'])} "
+                   f"({len(plan['prune'])} files).\n")
+        if largest:
+            message += f"Most space: {largest}\n"
+        if messagebox.askyesno("Confirm", message + "\nUnused packages are removed as well. Continue?"):
+            self.start_apt_job("Clean package cache", "=== Cleaning Package Cache ===",
+                               lambda job: self._clean_package_cache(job, plan))
+
+    def _clean_package_cache(self, job, plan):
+        # Prune old debs in one pass, keeping the recent ones for reinstalls
+        self.append_output("Removing old archive files...\n")
+        result = get_apt_archive_analyzer().prune(plan, token=job.token)
+        self.append_output(f"Removed {result['removed']} files, freed "
+                           f"{format_bytes(result['freed_bytes'])}\n")
+        for error in result['errors']:
+            self.append_output(f"Error: {error}\n")
+        self.append_output("\n")
+        run_steps(job, [
             # Remove automatically installed packages that are no longer needed
-            self.output.insert(tk.END, "Removing unused packages...\n")
-            output, error, _ = self.run_command("apt-get autoremove")
-            self.output.insert(tk.END, output + error + "\n")
\ No newline at end of file
+            ("Removing unused packages...", "apt-get autoremove -y"),
+        ], self.append_output, self.show_apt_progress)
+
+    def start_apt_job(self, name, title, target):
+        """Run a package operation in the background, streaming its output into the tab"""
+        if self.apt_job and self.apt_job.active:
+            messagebox.showinfo("Info", "A package operation is already running")
+            return
+        self.output.delete(1.0, tk.END)
+        self.output.insert(tk.END, title + "\n\n")
+        self.apt_progress.show(0, name + "...")
+        self.apt_job = self.jobs.submit(
+            name, target, owner=self,
+            on_error=lambda e: messagebox.showerror("Error", f"{name} failed: {str(e)}"))
+
+    @ui_thread
+    def append_output(self, text):
+        self.output.insert(tk.END, text)
+        self.output.see(tk.END)
+
+    @ui_thread
+    def show_apt_progress(self, percent, text):
+        self.apt_progress.show(percent, text)
\ No newline at end of file
@@ -0,0 +1,374 @@
+# Part 36: Package Operation Queue
+import collections
+import fcntl
+import itertools
+import os
+import re
+import shlex
+import struct
+import threading
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from CommandCache import split_segments, is_query, COMMAND_WRAPPERS, ENV_ASSIGNMENT
+from Tracing import span
+
+logger = logging.getLogger("KaliFixAll.PackageQueue")
+
+# Programs that take the dpkg or apt locks when they change anything
+PACKAGE_PROGRAMS = {'apt-get', 'apt', 'aptitude', 'dpkg', 'dpkg-reconfigure',
+                    'add-apt-repository', 'apt-add-repository'}
+
+# Locks held by apt and dpkg; another process holding one makes us wait
+DPKG_LOCKS = ("/var/lib/dpkg/lock-frontend", "/var/lib/dpkg/lock")
+FLOCK_FORMAT = 'hhqqi'
+LOCK_POLL_INTERVAL = 1.0
+LOCK_WAIT_TIMEOUT = 600
+
+# apt options followed by a separate value
+OPTIONS_WITH_VALUE = {'-o', '--option', '-c', '--config-file', '-t', '--target-release',
+                      '-a', '--host-architecture'}
+PACKAGE_NAME = re.compile(r'^[a-z0-9][a-z0-9+.-]+(:[a-z0-9-]+)?$')
+
+# Finished operations kept for the Diagnostics tab
+HISTORY_SIZE = 50
+
+
+def is_package_mutation(command) -> bool:
+    """True if command runs apt or dpkg in a way that takes their locks"""
+    for args in split_segments(command):
+        if args[0] in PACKAGE_PROGRAMS and not is_query(args):
+            return True
+    return False
+
+
+def lock_holder() -> Optional[Tuple[int, str]]:
+    """(pid, program) of another process holding a dpkg lock, or None"""
+    for path in DPKG_LOCKS:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            probe = struct.pack(FLOCK_FORMAT, fcntl.F_WRLCK, os.SEEK_SET, 0, 0, 0)
+            lock_type, _, _, _, pid = struct.unpack(
+                FLOCK_FORMAT, fcntl.fcntl(fd, fcntl.F_GETLK, probe))
+        except OSError:
+            continue
+        finally:
+            os.close(fd)
+        if lock_type != fcntl.F_UNLCK and pid != os.getpid():
+            try:
+                with open(f"/proc/{pid}/comm") as f:
+                    program = f.read().strip()
+            except OSError:
+                program = "unknown"
+            return pid, program
+    return None
+
+
+class Transaction:
+    """An apt-get/apt install or remove that can be merged with others"""
+
+    def __init__(self, prefix: Tuple[str, ...], program: str, options: Tuple[str, ...],
+                 installs: List[str], removes: List[str]):
+        self.prefix = prefix
+        self.program = program
+        # Options taking a value are kept as one "-o Value" string
+        self.options = options
+        self.installs = installs
+        self.removes = removes
+
+    @property
+    def key(self):
+        """Transactions with equal keys run with the same wrappers and options"""
+        return self.prefix, self.program, tuple(sorted(self.options))
+
+    def compatible(self, other: 'Transaction') -> bool:
+        if self.key != other.key:
+            return False
+        return not (set(self.installs) & set(other.removes) or
+                    set(self.removes) & set(other.installs))
+
+    def merge(self, other: 'Transaction') -> 'Transaction':
+        return Transaction(self.prefix, self.program, self.options,
+                           self.installs + [p for p in other.installs if p not in self.installs],
+                           self.removes + [p for p in other.removes if p not in self.removes])
+
+    def command(self) -> List[str]:
+        """apt-get install marks packages suffixed with - for removal"""
+        head = list(self.prefix) + [self.program]
+        for option in self.options:
+            head.extend(option.split(' ', 1))
+        if not self.installs:
+            return head + ['remove'] + self.removes
+        return head + ['install'] + self.installs + [package + '-' for package in self.removes]
+
+    @classmethod
+    def parse(cls, command) -> Optional['Transaction']:
+        """Parse a plain apt-get/apt install or remove of named packages"""
+        if isinstance(command, str):
+            if any(char in command for char in '|&;<>`$'):
+                return None
+            try:
+                tokens = shlex.split(command)
+            except ValueError:
+                return None
+        else:
+            tokens = list(command)
+
+        index = 0
+        while index < len(tokens) and (os.path.basename(tokens[index]) in COMMAND_WRAPPERS or
+                                       ENV_ASSIGNMENT.match(tokens[index]) or
+                                       (index and tokens[index].startswith('-'))):
+            index += 1
+        if index >= len(tokens) or tokens[index] not in ('apt-get', 'apt'):
+            return None
+        prefix, program = tuple(tokens[:index]), tokens[index]
+
+        options = []
+        action = None
+        packages = []
+        rest = iter(tokens[index + 1:])
+        for token in rest:
+            if token.startswith('-'):
+                options.append(token)
+                if token in OPTIONS_WITH_VALUE:
+                    options[-1] += ' ' + next(rest, '')
+            elif action is None:
+                action = token
+            else:
+                packages.append(token)
+        if action not in ('install', 'remove') or not packages:
+            return None
+        if not all(PACKAGE_NAME.match(package) for package in packages):
+            return None
+        if action == 'install':
+            return cls(prefix, program, tuple(options), packages, [])
+        return cls(prefix, program, tuple(options), [], packages)
+
+
+class PackageOperation:
+    """A queued apt or dpkg command"""
+
+    def __init__(self, op_id: int, command, execute: Callable, token=None, on_output=None,
+                 coalesce: bool = True):
+        self.id = op_id
+        self.command = command
+        self.execute = execute
+        self.display = command if isinstance(command, str) else ' '.join(command)
+        self.token = token
+        self.on_output = on_output
+        self.transaction = Transaction.parse(command) if coalesce else None
+        self.state = 'waiting'
+        self.thread = threading.current_thread().name
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.merged_with: List[int] = []
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        now = time.time()
+        return {
+            'id': self.id,
+            'state': self.state,
+            'command': self.display,
+            'thread': self.thread,
+            'waited': round((self.started or self.finished or now) - self.submitted, 2),
+            'duration': round((self.finished or now) - self.started, 2) if self.started else None,
+            'merged_with': list(self.merged_with),
+            'error': str(self.error) if self.error is not None else None,
+        }
+
+
+class PackageQueue:
+    """Serializes apt and dpkg commands from every module through one queue.
+
+    Commands run one at a time in submission order on a worker thread, after
+    any other process holding the dpkg lock (unattended-upgrades, a terminal
+    apt) has finished. Plain installs and removals waiting in the queue with
+    the same wrappers and options are merged into one apt-get transaction.
+    Read-only apt and dpkg queries never go through the queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._waiting: List[PackageOperation] = []
+        self._running: List[PackageOperation] = []
+        self._history = collections.deque(maxlen=HISTORY_SIZE)
+        self._ids = itertools.count(1)
+        self._worker = None
+        self.merged_count = 0
+
+    def run(self, command, execute: Callable, token=None, on_output=None,
+            coalesce: bool = True):
+        """Queue command and wait for it; return its result or None if cancelled.
+
+        execute(command, operations) runs a (possibly merged) command for the
+        given operations on the worker thread and returns the result. An
+        exception raised by execute is raised again here, in the caller's
+        thread.
+        """
+        with self._lock:
+            operation = PackageOperation(next(self._ids), command, execute, token, on_output,
+                                         coalesce)
+            ahead = len(self._waiting) + len(self._running)
+            self._waiting.append(operation)
+            self._ensure_worker()
+            self._lock.notify_all()
+        if ahead:
+            logger.info(f"Queued package operation #{operation.id} ({operation.display}) "
+                        f"behind {ahead} other(s)")
+
+        with span(f"Queued: {operation.display}", 'queue', operation=operation.id):
+            while not operation.done.wait(0.2):
+                if token is not None and token.cancelled and self._withdraw(operation):
+                    return None
+        if operation.error is not None:
+            raise operation.error
+        return operation.result
+
+    def _withdraw(self, operation: PackageOperation) -> bool:
+        """Remove a cancelled operation that has not started yet"""
+        with self._lock:
+            if operation not in self._waiting:
+                return False
+            self._waiting.remove(operation)
+            operation.state = 'cancelled'
+            operation.finished = time.time()
+            self._history.append(operation)
+        logger.info(f"Package operation #{operation.id} cancelled before it started")
+        return True
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._work, name="package-queue",
+                                            daemon=True)
+            self._worker.start()
+
+    def _take(self) -> List[PackageOperation]:
+        """Pop the next operation plus the waiting operations it can be merged with.
+
+        A merged operation runs ahead of the ones it skips, so it must not
+        touch their packages, and nothing moves past an operation that is not
+        a plain install or removal (an upgrade, dpkg --configure).
+        """
+        first = self._waiting.pop(0)
+        batch = [first]
+        transaction = first.transaction
+        if transaction is None:
+            return batch
+        skipped = set()
+        for operation in list(self._waiting):
+            candidate = operation.transaction
+            if candidate is None:
+                break
+            packages = set(candidate.installs) | set(candidate.removes)
+            if transaction.compatible(candidate) and not packages & skipped:
+                transaction = transaction.merge(candidate)
+                self._waiting.remove(operation)
+                batch.append(operation)
+            else:
+                skipped |= packages
+        return batch
+
+    def _work(self):
+        while True:
+            with self._lock:
+                while not self._waiting:
+                    if not self._lock.wait(30):
+                        if not self._waiting:
+                            self._worker = None
+                            return
+                batch = self._take()
+                for operation in batch:
+                    operation.state = 'running'
+                    operation.started = time.time()
+                    operation.merged_with = [other.id for other in batch if other is not operation]
+                self._running = batch
+            try:
+                self._run_batch(batch)
+            finally:
+                with self._lock:
+                    self._running = []
+                    for operation in batch:
+                        operation.finished = time.time()
+                        if operation.state == 'running':
+                            operation.state = 'done'
+                        self._history.append(operation)
+                for operation in batch:
+                    operation.done.set()
+
+    def _run_batch(self, batch: List[PackageOperation]):
+        if len(batch) > 1:
+            transaction = batch[0].transaction
+            for operation in batch[1:]:
+                transaction = transaction.merge(operation.transaction)
+            command = transaction.command()
+            self.merged_count += len(batch) - 1
+            logger.info(f"Merged package operations {', '.join(f'#{op.id}' for op in batch)} "
+                        f"into: {' '.join(command)}")
+        else:
+            command = batch[0].command
+
+        if not self._wait_for_lock(batch):
+            for operation in batch:
+                operation.state = 'cancelled'
+            return
+        try:
+            result = batch[0].execute(command, batch)
+        except Exception as e:
+            logger.exception(f"Package operation #{batch[0].id} failed: {str(e)}")
+            for operation in batch:
+                operation.state = 'failed'
+                operation.error = e
+            return
+        for operation in batch:
+            operation.result = result
+
+    def _wait_for_lock(self, batch: List[PackageOperation]) -> bool:
+        """Wait while another process holds the dpkg lock; False if everyone cancelled"""
+        deadline = time.monotonic() + LOCK_WAIT_TIMEOUT
+        reported = None
+        while True:
+            holder = lock_holder()
+            if holder is None:
+                return True
+            if all(op.token is not None and op.token.cancelled for op in batch):
+                return False
+            if time.monotonic() > deadline:
+                logger.warning(f"dpkg lock still held by {holder[1]} (pid {holder[0]}) after "
+                               f"{LOCK_WAIT_TIMEOUT}s; running anyway")
+                return True
+            if holder != reported:
+                logger.info(f"Waiting for {holder[1]} (pid {holder[0]}) to release the dpkg lock")
+                reported = holder
+                for operation in batch:
+                    operation.state = f"waiting for {holder[1]}"
+            time.sleep(LOCK_POLL_INTERVAL)
+
+    def snapshot(self) -> List[Dict]:
+        """Running, waiting and recently finished operations, in queue order"""
+        with self._lock:
+            operations = list(self._history) + self._running + self._waiting
+        return [operation.to_dict() for operation in operations]
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._waiting) + len(self._running)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_package_queue() -> PackageQueue:
+    """Return the package queue shared by all modules"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = PackageQueue()
+        return _queue
@@ -0,0 +1,254 @@
+# Part 39: Package File Verification
+import glob
+import hashlib
+import os
+import stat
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from PackageFiles import DPKG_INFO, get_file_owner_index
+
+logger = logging.getLogger("KaliFixAll.PackageVerify")
+
+DPKG_DIVERSIONS = "/var/lib/dpkg/diversions"
+
+# Bytes read per hashing step, so large files never sit in memory whole
+CHUNK_SIZE = 1 << 20
+
+# Work sent to a hashing thread at once: up to this many files or bytes
+BATCH_FILES = 256
+BATCH_BYTES = 64 << 20
+
+MAX_WORKERS = 8
+
+# Problems reported per file, as in debsums
+CHANGED = 'changed'
+MISSING = 'missing'
+UNREADABLE = 'unreadable'
+
+
+def md5_file(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """md5 of a file, read in chunks into one reused buffer"""
+    digest = hashlib.md5()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.hexdigest()
+
+
+def _hash_batch(batch: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str, str]]:
+    """Check (package, path, md5) items; return (package, path, problem, detail) for failures"""
+    problems = []
+    for package, path, expected in batch:
+        try:
+            actual = md5_file(path)
+        except FileNotFoundError:
+            problems.append((package, path, MISSING, "File missing"))
+            continue
+        except OSError as e:
+            problems.append((package, path, UNREADABLE, f"Read error: {e.strerror}"))
+            continue
+        if actual != expected:
+            problems.append((package, path, CHANGED, "Checksum mismatch"))
+    return problems
+
+
+def read_md5sums(path: str) -> List[Tuple[str, str]]:
+    """(absolute path, md5) pairs from a dpkg .md5sums file"""
+    entries = []
+    with open(path, 'r', errors='surrogateescape') as f:
+        for line in f:
+            md5, _, name = line.rstrip('\n').partition('  ')
+            if len(md5) == 32 and name:
+                entries.append(('/' + name.lstrip('/'), md5))
+    return entries
+
+
+def usr_alias(path: str) -> str:
+    """The same path across the merged-/usr symlinks: /bin/ls <-> /usr/bin/ls"""
+    if path.startswith("/usr/"):
+        return path[len("/usr"):]
+    return "/usr" + path
+
+
+def read_diversions(path: str = DPKG_DIVERSIONS) -> Dict[str, Tuple[str, str]]:
+    """original path -> (diverted-to path, diverting package; ':' for local diversions)"""
+    diversions = {}
+    try:
+        with open(path, 'r', errors='surrogateescape') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return diversions
+    for i in range(0, len(lines) - 2, 3):
+        diversions[lines[i]] = (lines[i + 1], lines[i + 2])
+    return diversions
+
+
+class PackageVerifier:
+    """Verifies installed package files against dpkg's md5sums, like debsums.
+
+    Files are statted first: missing ones are reported without hashing, and
+    the rest are ordered by device and inode number, which follows on-disk
+    layout closely enough on ext4 and xfs to cut seeking. The hashing runs
+    on a thread pool, in batches bounded by file count and size, reading
+    each file in fixed chunks; hashlib releases the GIL while it digests a
+    chunk, and nothing is forked from the multi-threaded GUI process.
+    Conffiles are not listed in .md5sums and are left alone, as are
+    entries another package took over with Replaces.
+    """
+
+    def __init__(self, info_dir: str = DPKG_INFO, diversions: str = DPKG_DIVERSIONS,
+                 workers: Optional[int] = None):
+        self.info_dir = info_dir
+        self.diversions = diversions
+        self.workers = workers or min(MAX_WORKERS, os.cpu_count() or 1)
+
+    def md5sums_packages(self) -> List[str]:
+        """Packages (with :arch where dpkg uses it) that have an .md5sums file"""
+        with os.scandir(self.info_dir) as entries:
+            return sorted(entry.name[:-len(".md5sums")] for entry in entries
+                          if entry.name.endswith(".md5sums"))
+
+    def md5sums_file(self, package: str) -> str:
+        """The .md5sums file of package; bare names also match pkg:arch files"""
+        path = os.path.join(self.info_dir, package + ".md5sums")
+        if os.path.exists(path) or ':' in package:
+            return path
+        matches = sorted(glob.glob(os.path.join(glob.escape(self.info_dir),
+                                                glob.escape(package) + ":*.md5sums")))
+        return matches[0] if matches else path
+
+    def expected(self, packages: Optional[Iterable[str]] = None,
+                 paths: Optional[Iterable[str]] = None) -> List[Tuple[str, str, str]]:
+        """(package, path on disk, md5) for the files to verify.
+
+        Only paths the package still owns according to its .list file are
+        kept, and diverted files are checked at the path they were moved to.
+        """
+        index = get_file_owner_index()
+        diversions = read_diversions(self.diversions)
+        wanted = None if paths is None else {os.path.normpath(path) for path in paths}
+        if packages is None:
+            packages = self.md5sums_packages()
+        items = []
+        for package in packages:
+            try:
+                entries = read_md5sums(self.md5sums_file(package))
+            except OSError:
+                continue
+            if wanted is not None:
+                entries = [(path, md5) for path, md5 in entries
+                           if path in wanted or usr_alias(path) in wanted]
+                if not entries:
+                    continue
+            owned = set(index.files(package))
+            if not owned:
+                # Not installed any more (the .md5sums file is left behind)
+                continue
+            for path, md5 in entries:
+                if path not in owned:
+                    continue
+                diversion = diversions.get(path)
+                if diversion and diversion[1] != package.split(':')[0]:
+                    path = diversion[0]
+                items.append((package, path, md5))
+        return items
+
+    def verify(self, packages: Optional[Iterable[str]] = None,
+               paths: Optional[Iterable[str]] = None, token=None,
+               on_progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """Verify package files; return the problems found per package.
+
+        on_progress(done, total) is called as files are checked. The result
+        holds 'issues': {package: {'changed': [...], 'missing': [...],
+        'unreadable': [...]}} and 'files': [(path, reason)] in the form the
+        File Integrity tab's auto repair takes.
+        """
+        start = time.perf_counter()
+        items = self.expected(packages, paths)
+        total = len(items)
+        problems: List[Tuple[str, str, str, str]] = []
+
+        # Stat everything first; this finds missing files and the disk order
+        located = []
+        for package, path, md5 in items:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                problems.append((package, path, MISSING, "File missing"))
+                continue
+            except OSError as e:
+                problems.append((package, path, UNREADABLE, f"Read error: {e.strerror}"))
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                problems.append((package, path, CHANGED, "Not a regular file"))
+                continue
+            located.append(((st.st_dev, st.st_ino), st.st_size, (package, path, md5)))
+        located.sort(key=lambda item: item[0])
+
+        done = total - len(located)
+        if on_progress:
+            on_progress(done, total)
+
+        batches, batch, batch_bytes = [], [], 0
+        for _, size, item in located:
+            batch.append(item)
+            batch_bytes += size
+            if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+        if batch:
+            batches.append(batch)
+
+        cancelled = False
+        if batches:
+            executor = ThreadPoolExecutor(max_workers=min(self.workers, len(batches)),
+                                          thread_name_prefix="verify")
+            try:
+                futures = {executor.submit(_hash_batch, batch): len(batch) for batch in batches}
+                for future in as_completed(futures):
+                    problems.extend(future.result())
+                    done += futures[future]
+                    if on_progress:
+                        on_progress(done, total)
+                    if token is not None and token.cancelled:
+                        cancelled = True
+                        break
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        issues: Dict[str, Dict[str, List[str]]] = {}
+        for package, path, problem, _ in sorted(problems):
+            issues.setdefault(package, {CHANGED: [], MISSING: [], UNREADABLE: []})[problem].append(path)
+        elapsed = time.perf_counter() - start
+        logger.info(f"Verified {done} of {total} package files in {elapsed:.1f}s: "
+                    f"{len(problems)} problem(s) in {len(issues)} package(s)")
+        return {
+            'packages': len({item[0] for item in items}),
+            'checked': done,
+            'total': total,
+            'cancelled': cancelled,
+            'issues': issues,
+            'files': [(path, reason) for _, path, _, reason in sorted(problems)],
+            'duration': elapsed,
+        }
+
+
+_verifier = None
+_verifier_lock = threading.Lock()
+
+
+def get_package_verifier() -> PackageVerifier:
+    """Return the package file verifier shared by all modules"""
+    global _verifier
+    with _verifier_lock:
+        if _verifier is None:
+            _verifier = PackageVerifier()
+        return _verifier
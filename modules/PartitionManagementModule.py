@@ -1,14 +1,16 @@
 # Part 8: Partition Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import re
 from pathlib import Path
 import json
 import threading
 from datetime import datetime
-import humanize
+from LazyImport import lazy_import
+humanize = lazy_import('humanize')
+from CommandExecutor import execute, check_output, check_call
+from JobRunner import get_job_runner
 
 class PartitionManagementModule:
     def __init__(self, parent_notebook):
@@ -20,6 +22,7 @@ class PartitionManagementModule:
         self.disks = {}
         self.partitions = {}
         self.free_spaces = {}
+        self.jobs = get_job_runner()
         
         # Create UI
         self.create_interface()
@@ -87,7 +90,7 @@ class PartitionManagementModule:
             self.disk_tree.delete(*self.disk_tree.get_children())
             
             # Get disk information using lsblk
-            output = subprocess.check_output(
+            output = check_output(
                 ['lsblk', '-Jo', 'NAME,SIZE,TYPE,FSTYPE,MOUNTPOINT,LABEL'])
             disk_data = json.loads(output)
             
@@ -143,12 +146,12 @@ class PartitionManagementModule:
         try:
             for disk in self.disks:
                 # Use parted to get free space information
-                output = subprocess.check_output(
+                output = check_output(
                     ['parted', '-s', f'/dev/{disk}', 'unit', 'B', 'print', 'free'])
                 
                 # Parse output for free spaces
                 free_spaces = []
-                lines = output.decode().split('\n')
+                lines = output.split('\n')
                 for line in lines:
                     if 'Free Space' in line:
                         parts = line.split()
@@ -210,16 +213,16 @@ class PartitionManagementModule:
             self.details_text.insert(tk.END, "=" * 50 + "\n\n")
             
             # Get detailed disk information using hdparm
-            output = subprocess.check_output(
+            output = check_output(
                 ['hdparm', '-I', f'/dev/{disk_name}'])
-            self.details_text.insert(tk.END, output.decode())
+            self.details_text.insert(tk.END, output)
             
             # Add partition table information
-            output = subprocess.check_output(
+            output = check_output(
                 ['parted', '-s', f'/dev/{disk_name}', 'print'])
             self.details_text.insert(tk.END, "\nPartition Table:\n")
             self.details_text.insert(tk.END, "=" * 50 + "\n")
-            self.details_text.insert(tk.END, output.decode())
+            self.details_text.insert(tk.END, output)
             
         except Exception as e:
             self.details_text.insert(tk.END, f"Error getting disk details: {str(e)}")
@@ -239,17 +242,17 @@ class PartitionManagementModule:
             
             # Get filesystem information
             if partition['mountpoint']:
-                output = subprocess.check_output(['df', '-h', partition['mountpoint']])
+                output = check_output(['df', '-h', partition['mountpoint']])
                 self.details_text.insert(tk.END, "Filesystem Usage:\n")
-                self.details_text.insert(tk.END, output.decode())
+                self.details_text.insert(tk.END, output)
             
             # Get filesystem details
             if partition['fstype']:
                 if partition['fstype'] in ['ext2', 'ext3', 'ext4']:
-                    output = subprocess.check_output(
+                    output = check_output(
                         ['tune2fs', '-l', f"/dev/{partition_name}"])
                     self.details_text.insert(tk.END, "\nFilesystem Details:\n")
-                    self.details_text.insert(tk.END, output.decode())
+                    self.details_text.insert(tk.END, output)
                 
         except Exception as e:
             self.details_text.insert(tk.END, f"Error getting partition details: {str(e)}")
@@ -288,16 +291,22 @@ class PartitionManagementModule:
         # Create partition dialog
         dialog = PartitionDialog(self.partition_frame, disk_name)
         if dialog.result:
-            try:
-                # Create partition
-                self.create_partition_on_disk(disk_name, dialog.result)
-                # Refresh display
-                self.scan_disks()
-                messagebox.showinfo("Success", "Partition created successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to create partition: {str(e)}")
+            # parted and mkfs run in a job; the display refreshes when they finish
+            self.jobs.submit(f"Create partition on {disk_name}",
+                             lambda job: self.create_partition_on_disk(
+                                 disk_name, dialog.result, job.token),
+                             owner=self, dedicated=True,
+                             on_done=lambda _: self.partition_changed(
+                                 "Partition created successfully"),
+                             on_error=lambda e: messagebox.showerror(
+                                 "Error", f"Failed to create partition: {str(e)}"))
 
-    def create_partition_on_disk(self, disk_name, settings):
+    def partition_changed(self, message):
+        """Refresh the display after a partition job finished"""
+        self.scan_disks()
+        messagebox.showinfo("Success", message)
+
+    def create_partition_on_disk(self, disk_name, settings, token=None):
         """Create partition with specified settings"""
         commands = [
             # Create partition
@@ -310,7 +319,7 @@ class PartitionManagementModule:
         ]
         
         for cmd in commands:
-            subprocess.check_call(cmd)
+            check_call(cmd, token=token)
 
     def format_partition(self):
         """Format selected partition"""
@@ -329,21 +338,21 @@ class PartitionManagementModule:
         # Format dialog
         dialog = FormatDialog(self.partition_frame, partition_name)
         if dialog.result:
-            try:
-                # Format partition
-                self.format_partition_with_settings(partition_name, dialog.result)
-                # Refresh display
-                self.scan_disks()
-                messagebox.showinfo("Success", "Partition formatted successfully")
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to format partition: {str(e)}")
+            self.jobs.submit(f"Format {partition_name}",
+                             lambda job: self.format_partition_with_settings(
+                                 partition_name, dialog.result, job.token),
+                             owner=self, dedicated=True,
+                             on_done=lambda _: self.partition_changed(
+                                 "Partition formatted successfully"),
+                             on_error=lambda e: messagebox.showerror(
+                                 "Error", f"Failed to format partition: {str(e)}"))
 
-    def format_partition_with_settings(self, partition_name, settings):
+    def format_partition_with_settings(self, partition_name, settings, token=None):
         """Format partition with specified settings"""
         # Unmount if mounted
         partition = self.partitions[partition_name]
         if partition['mountpoint']:
-            subprocess.check_call(['umount', partition['mountpoint']])
+            check_call(['umount', partition['mountpoint']], token=token)
         
         # Format partition
         cmd = ['mkfs', '-t', settings['fs_type']]
@@ -354,7 +363,7 @@ class PartitionManagementModule:
                 cmd.extend(['-L', settings['label']])
         
         cmd.append(f"/dev/{partition_name}")
-        subprocess.check_call(cmd)
+        check_call(cmd, token=token)
 
     def repair_partition(self):
         """Repair selected partition"""
@@ -392,12 +401,37 @@ class PartitionManagementModule:
         output_text = scrolledtext.ScrolledText(repair_window, height=15)
         output_text.pack(fill='both', expand=True, padx=5, pady=5)
         
+        repair_job = None
+        
+        def write(text):
+            if output_text.winfo_exists():
+                output_text.insert(tk.END, text)
+                output_text.see(tk.END)
+        
+        def repair(job, cmd):
+            # Unmount if mounted
+            if partition['mountpoint']:
+                check_call(['umount', partition['mountpoint']])
+            
+            # Stream output in real-time
+            return execute(cmd, on_output=lambda line: job.ui(write, line), token=job.token)
+        
+        def show_result(result):
+            if result.stderr:
+                write(result.stderr)
+            
+            if result.cancelled:
+                write("\nRepair cancelled.")
+            elif result.returncode == 0:
+                write("\nRepair completed successfully!")
+            else:
+                write("\nRepair completed with errors!")
+        
         def run_repair():
+            nonlocal repair_job
+            if repair_job and repair_job.active:
+                return
             try:
-                # Unmount if mounted
-                if partition['mountpoint']:
-                    subprocess.check_call(['umount', partition['mountpoint']])
-                
                 repair_commands = {
                     'ext2': {
                         'check': ['e2fsck', '-n'],
@@ -437,29 +471,20 @@ class PartitionManagementModule:
                 output_text.insert(tk.END, f"Running repair on {partition_name}...\n")
                 output_text.insert(tk.END, f"Command: {' '.join(cmd)}\n\n")
                 
-                process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True
-                )
-                
-                # Read output in real-time
-                for line in process.stdout:
-                    output_text.insert(tk.END, line)
-                    output_text.see(tk.END)
-                    output_text.update()
-                
-                process.wait()
-                
-                if process.returncode == 0:
-                    output_text.insert(tk.END, "\nRepair completed successfully!")
-                else:
-                    output_text.insert(tk.END, "\nRepair completed with errors!")
+                repair_job = self.jobs.submit(
+                    f"Repair {partition_name}", repair, cmd, owner=self,
+                    on_done=show_result,
+                    on_error=lambda e: write(f"\nError during repair: {str(e)}"))
                 
             except Exception as e:
                 output_text.insert(tk.END, f"\nError during repair: {str(e)}")
         
+        def close():
+            # Closing the window stops a repair that is still running
+            if repair_job and repair_job.active:
+                repair_job.cancel()
+            repair_window.destroy()
+        
         # Create control buttons
         button_frame = ttk.Frame(repair_window)
         button_frame.pack(fill='x', padx=5, pady=5)
@@ -467,7 +492,8 @@ class PartitionManagementModule:
         ttk.Button(button_frame, text="Start Repair", 
                   command=run_repair).pack(side='left', padx=5)
         ttk.Button(button_frame, text="Close", 
-                  command=repair_window.destroy).pack(side='right', padx=5)
+                  command=close).pack(side='right', padx=5)
+        repair_window.protocol("WM_DELETE_WINDOW", close)
 
 class PartitionDialog:
     """Dialog for creating new partition"""
@@ -1,21 +1,21 @@
 # Part 14: Permission Manager Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import stat
 import pwd
 import grp
 from pathlib import Path
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Tuple, Set, Union
 import re
+import shlex
+from CommandExecutor import execute
+from JobRunner import get_job_runner
 
-class PermissionManagerModule:
-    def __init__(self, parent_notebook):
-        # Create permission manager tab
-        self.perm_frame = ttk.Frame(parent_notebook)
-        parent_notebook.add(self.perm_frame, text='Permission Manager')
-        
+class PermissionManagerScanner:
+    """Permission checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+
+    def __init__(self):
         # Initialize variables
         self.system_paths = {
             '/bin': {'mode': 0o755, 'user': 'root', 'group': 'root'},
@@ -43,6 +43,100 @@ class PermissionManagerModule:
             r'/usr/local/bin/.*': {'mode': 0o755, 'user': 'root', 'group': 'root'},
             r'/var/log/.*\.log$': {'mode': 0o640, 'user': 'root', 'group': 'adm'}
         }
+
+    def run_command(self, command: Union[str, List[str]], shell: bool = False,
+                    timeout: float = None, on_output=None,
+                    token=None) -> Tuple[str, str, int]:
+        """Run command and return output, error, and return code"""
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_system_path(self, path: str, expected: Dict) -> Tuple[str, str, List[str]]:
+        """Compare a path with its expected permissions.
+        
+        Returns (current, expected, issues); issues is empty when they match.
+        """
+        stat_info = os.stat(path)
+        current_mode = stat.S_IMODE(stat_info.st_mode)
+        current_user = pwd.getpwuid(stat_info.st_uid).pw_name
+        current_group = grp.getgrgid(stat_info.st_gid).gr_name
+        
+        issues = []
+        
+        # Check mode
+        if current_mode != expected['mode']:
+            issues.append("Mode mismatch")
+        
+        # Check owner
+        if current_user != expected['user']:
+            issues.append("Owner mismatch")
+        
+        # Check group
+        if current_group != expected['group']:
+            issues.append("Group mismatch")
+        
+        current = f"{oct(current_mode)} {current_user}:{current_group}"
+        expected_str = f"{oct(expected['mode'])} {expected['user']}:{expected['group']}"
+        return current, expected_str, issues
+
+    def check_status(self, token=None) -> List[str]:
+        """Return a list of system permission issues"""
+        issues = []
+        
+        for path, expected in self.system_paths.items():
+            if os.path.exists(path):
+                try:
+                    current, expected_str, path_issues = self.check_system_path(path, expected)
+                    if path_issues:
+                        issues.append(f"{path}: {current} (expected {expected_str})")
+                except Exception as e:
+                    issues.append(f"{path}: unable to check ({str(e)})")
+        
+        return issues
+
+    def fix_common_issues(self, token=None) -> List[str]:
+        """Restore expected permissions and ownership on core system paths"""
+        fixed = []
+        
+        for path, expected in self.system_paths.items():
+            if token is not None and token.cancelled:
+                break
+            if not os.path.exists(path):
+                continue
+            current, _, issues = self.check_system_path(path, expected)
+            if not issues:
+                continue
+            os.chmod(path, expected['mode'])
+            os.chown(path, pwd.getpwnam(expected['user']).pw_uid,
+                     grp.getgrnam(expected['group']).gr_gid)
+            fixed.append(f"{path}: {current} -> {oct(expected['mode'])} "
+                         f"{expected['user']}:{expected['group']}")
+        
+        return fixed
+
+    def scan(self, token=None) -> Dict:
+        """Permission state of the core system paths as plain data"""
+        paths = []
+        for path, expected in self.system_paths.items():
+            if not os.path.exists(path):
+                continue
+            try:
+                current, expected_str, issues = self.check_system_path(path, expected)
+                paths.append({'path': path, 'current': current,
+                              'expected': expected_str, 'issues': issues})
+            except Exception as e:
+                paths.append({'path': path, 'error': str(e)})
+        return {'system_paths': paths}
+
+class PermissionManagerModule(PermissionManagerScanner):
+    def __init__(self, parent_notebook):
+        # Create permission manager tab
+        self.perm_frame = ttk.Frame(parent_notebook)
+        parent_notebook.add(self.perm_frame, text='Permission Manager')
+        
+        # Initialize variables
+        super().__init__()
+        self.jobs = get_job_runner()
         
         # Create interface
         self.create_interface()
@@ -113,20 +207,6 @@ class PermissionManagerModule:
         self.output = scrolledtext.ScrolledText(main_container, height=10)
         self.output.pack(fill='both', expand=True, padx=5, pady=5)
 
-    def run_command(self, command: str, shell: bool = False) -> Tuple[str, str, int]:
-        """Run command and return output, error, and return code"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_system_permissions(self):
         """Scan system paths for permission issues"""
         self.clear_results()
@@ -135,28 +215,8 @@ class PermissionManagerModule:
         for path, expected in self.system_paths.items():
             if os.path.exists(path):
                 try:
-                    stat_info = os.stat(path)
-                    current_mode = stat.S_IMODE(stat_info.st_mode)
-                    current_user = pwd.getpwuid(stat_info.st_uid).pw_name
-                    current_group = grp.getgrgid(stat_info.st_gid).gr_name
-                    
-                    issues = []
-                    
-                    # Check mode
-                    if current_mode != expected['mode']:
-                        issues.append("Mode mismatch")
-                    
-                    # Check owner
-                    if current_user != expected['user']:
-                        issues.append("Owner mismatch")
-                    
-                    # Check group
-                    if current_group != expected['group']:
-                        issues.append("Group mismatch")
-                    
+                    current, expected_str, issues = self.check_system_path(path, expected)
                     if issues:
-                        current = f"{oct(current_mode)} {current_user}:{current_group}"
-                        expected_str = f"{oct(expected['mode'])} {expected['user']}:{expected['group']}"
                         self.add_result(path, current, expected_str, ", ".join(issues))
                 
                 except Exception as e:
@@ -265,7 +325,7 @@ class PermissionManagerModule:
                     
                     # Fix permissions
                     os.chmod(path, mode)
-                    self.run_command(f"sudo chown {user}:{group} {path}")
+                    self.run_command(["sudo", "chown", f"{user}:{group}", path])
                     
                     self.update_output(f"Fixed permissions for {path}\n")
                     
@@ -296,7 +356,7 @@ class PermissionManagerModule:
                     
                     # Fix permissions
                     os.chmod(path, mode)
-                    self.run_command(f"sudo chown {user}:{group} {path}")
+                    self.run_command(["sudo", "chown", f"{user}:{group}", path])
                     
                     self.update_output(f"Fixed permissions for {path}\n")
                     
@@ -310,6 +370,13 @@ class PermissionManagerModule:
         """Fix SUID/SGID permissions"""
         self.update_output("Scanning for inappropriate SUID/SGID bits...\n")
         
+        # Walking the whole filesystem takes minutes, so find runs in a job
+        self.jobs.submit("Scan SUID/SGID", self.find_suid_sgid, owner=self, dedicated=True,
+                         on_done=self.show_suid_sgid,
+                         on_error=self.suid_sgid_failed)
+
+    def find_suid_sgid(self, job):
+        """Return the SUID/SGID files that are not known to need the bits"""
         # Known legitimate SUID/SGID files
         legitimate_suid = {
             '/usr/bin/sudo',
@@ -324,71 +391,81 @@ class PermissionManagerModule:
             '/usr/bin/pkexec'
         }
         
-        try:
-            # Find all SUID/SGID files
-            output, _, _ = self.run_command(
-                "find / -type f \( -perm -4000 -o -perm -2000 \) 2>/dev/null"
-            )
-            
-            suspicious_files = []
-            for file_path in output.splitlines():
-                if file_path not in legitimate_suid:
-                    suspicious_files.append(file_path)
-            
-            if suspicious_files:
-                # Add to results tree
-                for file_path in suspicious_files:
-                    try:
-                        stat_info = os.stat(file_path)
-                        current_mode = stat.S_IMODE(stat_info.st_mode)
-                        current_user = pwd.getpwuid(stat_info.st_uid).pw_name
-                        current_group = grp.getgrgid(stat_info.st_gid).gr_name
-                        
-                        # Remove SUID/SGID bits for expected mode
-                        expected_mode = current_mode & ~(stat.S_ISUID | stat.S_ISGID)
-                        
-                        current = f"{oct(current_mode)} {current_user}:{current_group}"
-                        expected = f"{oct(expected_mode)} {current_user}:{current_group}"
-                        
-                        self.add_result(file_path, current, expected,
-                                      "Suspicious SUID/SGID bit")
-                        
-                    except Exception as e:
-                        self.update_output(f"Error checking {file_path}: {str(e)}\n")
+        # Find all SUID/SGID files
+        output, _, _ = self.run_command(
+            "find / -type f \( -perm -4000 -o -perm -2000 \) 2>/dev/null",
+            shell=True, token=job.token
+        )
+        job.check_cancelled()
+        
+        suspicious_files = []
+        for file_path in output.splitlines():
+            if file_path not in legitimate_suid:
+                suspicious_files.append(file_path)
+        
+        # Add to results tree
+        for file_path in suspicious_files:
+            try:
+                stat_info = os.stat(file_path)
+                current_mode = stat.S_IMODE(stat_info.st_mode)
+                current_user = pwd.getpwuid(stat_info.st_uid).pw_name
+                current_group = grp.getgrgid(stat_info.st_gid).gr_name
                 
-                if messagebox.askyesno("Suspicious SUID/SGID",
-                                     f"Found {len(suspicious_files)} files with "
-                                     f"suspicious SUID/SGID bits. Remove these bits?"):
-                    for file_path in suspicious_files:
-                        try:
-                            # Remove SUID/SGID bits
-                            current_mode = os.stat(file_path).st_mode
-                            new_mode = current_mode & ~(stat.S_ISUID | stat.S_ISGID)
-                            os.chmod(file_path, new_mode)
-                            
-                            self.update_output(f"Removed SUID/SGID bits from {file_path}\n")
-                            
-                        except Exception as e:
-                            self.update_output(
-                                f"Error removing SUID/SGID bits from {file_path}: {str(e)}\n"
-                            )
-            else:
-                self.update_output("No suspicious SUID/SGID files found.\n")
-                messagebox.showinfo("Info", "No suspicious SUID/SGID files found")
+                # Remove SUID/SGID bits for expected mode
+                expected_mode = current_mode & ~(stat.S_ISUID | stat.S_ISGID)
+                
+                current = f"{oct(current_mode)} {current_user}:{current_group}"
+                expected = f"{oct(expected_mode)} {current_user}:{current_group}"
+                
+                job.ui(self.add_result, file_path, current, expected,
+                       "Suspicious SUID/SGID bit")
+                
+            except Exception as e:
+                job.ui(self.update_output, f"Error checking {file_path}: {str(e)}\n")
         
-        except Exception as e:
-            self.update_output(f"Error scanning SUID/SGID: {str(e)}\n")
-            messagebox.showerror("Error", f"SUID/SGID scan failed: {str(e)}")
+        return suspicious_files
+
+    def suid_sgid_failed(self, error):
+        self.update_output(f"Error scanning SUID/SGID: {str(error)}\n")
+        messagebox.showerror("Error", f"SUID/SGID scan failed: {str(error)}")
+
+    def show_suid_sgid(self, suspicious_files):
+        """Offer to remove the bits found by find_suid_sgid"""
+        if not suspicious_files:
+            self.update_output("No suspicious SUID/SGID files found.\n")
+            messagebox.showinfo("Info", "No suspicious SUID/SGID files found")
+            return
+        
+        if messagebox.askyesno("Suspicious SUID/SGID",
+                             f"Found {len(suspicious_files)} files with "
+                             f"suspicious SUID/SGID bits. Remove these bits?"):
+            for file_path in suspicious_files:
+                try:
+                    # Remove SUID/SGID bits
+                    current_mode = os.stat(file_path).st_mode
+                    new_mode = current_mode & ~(stat.S_ISUID | stat.S_ISGID)
+                    os.chmod(file_path, new_mode)
+                    
+                    self.update_output(f"Removed SUID/SGID bits from {file_path}\n")
+                    
+                except Exception as e:
+                    self.update_output(
+                        f"Error removing SUID/SGID bits from {file_path}: {str(e)}\n"
+                    )
 
     def check_special_patterns(self):
         """Check files matching special patterns"""
         self.update_output("Checking special file patterns...\n")
-        
+        self.jobs.submit("Check special patterns", self._check_special_patterns,
+                         owner=self, dedicated=True)
+
+    def _check_special_patterns(self, job):
         for pattern, expected in self.special_patterns.items():
+            job.check_cancelled()
             try:
                 # Find files matching pattern
-                command = f"find / -type f -regex '{pattern}' 2>/dev/null"
-                output, _, _ = self.run_command(command, shell=True)
+                command = f"find / -type f -regex {shlex.quote(pattern)} 2>/dev/null"
+                output, _, _ = self.run_command(command, shell=True, token=job.token)
                 
                 for file_path in output.splitlines():
                     try:
@@ -404,14 +481,14 @@ class PermissionManagerModule:
                             current = f"{oct(current_mode)} {current_user}:{current_group}"
                             expected_str = f"{oct(expected['mode'])} {expected['user']}:{expected['group']}"
                             
-                            self.add_result(file_path, current, expected_str,
-                                          "Pattern-specific permission mismatch")
+                            job.ui(self.add_result, file_path, current, expected_str,
+                                   "Pattern-specific permission mismatch")
                     
                     except Exception as e:
-                        self.update_output(f"Error checking {file_path}: {str(e)}\n")
+                        job.ui(self.update_output, f"Error checking {file_path}: {str(e)}\n")
             
             except Exception as e:
-                self.update_output(f"Error processing pattern {pattern}: {str(e)}\n")
+                job.ui(self.update_output, f"Error processing pattern {pattern}: {str(e)}\n")
 
     def clear_results(self):
         """Clear results tree"""
@@ -448,7 +525,7 @@ class PermissionManagerModule:
                             if messagebox.askyesno("Fix Home Permissions",
                                                  f"Fix permissions for {home_dir}?"):
                                 os.chmod(home_dir, 0o700)
-                                self.run_command(f"sudo chown {username}:{username} {home_dir}")
+                                self.run_command(["sudo", "chown", f"{username}:{username}", home_dir])
                                 self.update_output(f"Fixed permissions for {home_dir}\n")
                     
                     except Exception as e:
@@ -460,12 +537,17 @@ class PermissionManagerModule:
     def check_world_writable(self):
         """Check for world-writable files and directories"""
         self.update_output("Checking for world-writable files...\n")
-        
+        self.jobs.submit("Check world-writable files", self._check_world_writable,
+                         owner=self, dedicated=True)
+
+    def _check_world_writable(self, job):
         try:
             # Find world-writable files
             output, _, _ = self.run_command(
-                "find / -type f -perm -002 ! -path '/proc/*' ! -path '/sys/*' 2>/dev/null"
+                "find / -type f -perm -002 ! -path '/proc/*' ! -path '/sys/*' 2>/dev/null",
+                shell=True, token=job.token
             )
+            job.check_cancelled()
             
             for file_path in output.splitlines():
                 try:
@@ -480,14 +562,14 @@ class PermissionManagerModule:
                     current = f"{oct(current_mode)} {current_user}:{current_group}"
                     expected = f"{oct(expected_mode)} {current_user}:{current_group}"
                     
-                    self.add_result(file_path, current, expected,
-                                  "World-writable file")
+                    job.ui(self.add_result, file_path, current, expected,
+                           "World-writable file")
                 
                 except Exception as e:
-                    self.update_output(f"Error checking {file_path}: {str(e)}\n")
+                    job.ui(self.update_output, f"Error checking {file_path}: {str(e)}\n")
         
         except Exception as e:
-            self.update_output(f"Error checking world-writable files: {str(e)}\n")
+            job.ui(self.update_output, f"Error checking world-writable files: {str(e)}\n")
 
     def fix_all_permissions(self):
         """Fix all detected permission issues"""
@@ -509,7 +591,7 @@ class PermissionManagerModule:
                     
                     # Fix permissions
                     os.chmod(path, mode)
-                    self.run_command(f"sudo chown {user}:{group} {path}")
+                    self.run_command(["sudo", "chown", f"{user}:{group}", path])
                     
                     self.update_output(f"Fixed permissions for {path}\n")
                     
@@ -1,14 +1,111 @@
 # Part 4: Power Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
-import psutil
-import dbus
+from LazyImport import lazy_import
+psutil = lazy_import('psutil')
+dbus = lazy_import('dbus')
 from pathlib import Path
 import json
+from CommandExecutor import execute
+from JobRunner import get_job_runner
 
-class PowerManagementModule:
+class PowerManagementScanner:
+    """Power checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+    
+    # Fix scheduling: starts services only
+    FIX_RESOURCES = ('systemd',)
+
+    def __init__(self):
+        # Desktop environment type and its power manager
+        self.de_type = None
+        self.power_manager = None
+        self.detect_desktop()
+
+    def run_command(self, command, shell=False, timeout=None, on_output=None, token=None):
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None):
+        """Return a list of power management issues"""
+        issues = []
+        
+        if self.power_manager:
+            _, _, code = self.run_command(["which", self.power_manager], token=token)
+            if code != 0:
+                issues.append(f"Power manager {self.power_manager} is not installed")
+            else:
+                _, _, code = self.run_command(["pgrep", self.power_manager], token=token)
+                if code != 0:
+                    issues.append(f"Power manager {self.power_manager} is not running")
+        
+        battery = psutil.sensors_battery()
+        if battery and battery.percent < 10 and not battery.power_plugged:
+            issues.append(f"Battery low ({battery.percent:.0f}%) and not charging")
+        
+        return issues
+
+    def fix_common_issues(self, token=None):
+        """Start acpid if it is installed but not running"""
+        _, _, code = self.run_command("which acpid", token=token)
+        if code != 0:
+            return []
+        
+        output, _, _ = self.run_command("systemctl is-active acpid", token=token)
+        if output.strip() == 'active':
+            return []
+        
+        self.run_command("systemctl enable acpid", token=token)
+        _, error, code = self.run_command("systemctl start acpid", token=token)
+        if code != 0:
+            raise RuntimeError(f"Failed to start acpid: {error.strip()}")
+        return ["Started acpid"]
+
+    def detect_desktop(self):
+        """Set de_type and power_manager from the session environment"""
+        # Check common desktop environment variables
+        desktop = os.environ.get('XDG_CURRENT_DESKTOP', '').lower()
+        session = os.environ.get('DESKTOP_SESSION', '').lower()
+        
+        if 'xfce' in desktop or 'xfce' in session:
+            self.de_type = 'xfce'
+            self.power_manager = 'xfce4-power-manager'
+        elif 'gnome' in desktop or 'gnome' in session:
+            self.de_type = 'gnome'
+            self.power_manager = 'gnome-power-manager'
+        elif 'kde' in desktop or 'kde' in session:
+            self.de_type = 'kde'
+            self.power_manager = 'powerdevil'
+        else:
+            self.de_type = 'unknown'
+            self.power_manager = None
+
+    def get_battery_info(self, token=None):
+        """Return battery state and ACPI output, or None on machines without a battery"""
+        battery = psutil.sensors_battery()
+        if not battery:
+            return None
+        output, _, code = self.run_command("acpi -V", token=token)
+        return {
+            'percent': battery.percent,
+            'plugged': battery.power_plugged,
+            'acpi': output if code == 0 else None
+        }
+
+    def scan(self, token=None):
+        """Power status as plain data"""
+        running = None
+        if self.power_manager:
+            _, _, code = self.run_command(["pgrep", self.power_manager], token=token)
+            running = code == 0
+        return {
+            'desktop': self.de_type,
+            'power_manager': self.power_manager,
+            'power_manager_running': running,
+            'battery': self.get_battery_info(token)
+        }
+
+class PowerManagementModule(PowerManagementScanner):
     def __init__(self, parent_notebook):
         # Create power management tab
         self.power_frame = ttk.Frame(parent_notebook)
@@ -19,8 +116,8 @@ class PowerManagementModule:
         self.output.pack(padx=5, pady=5, fill='both', expand=True)
         
         # Initialize variables
-        self.de_type = None  # Desktop Environment type
-        self.power_manager = None
+        super().__init__()
+        self.jobs = get_job_runner()
         
         # Create control panel
         self.create_control_panel()
@@ -50,39 +147,11 @@ class PowerManagementModule:
         ttk.Button(power_frame, text="Fix Configuration", 
                   command=self.fix_power_config).pack(side='left', padx=5)
 
-    def run_command(self, command, shell=False):
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, 
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def detect_environment(self):
         self.output.delete(1.0, tk.END)
         self.output.insert(tk.END, "Detecting desktop environment...\n")
         
-        # Check common desktop environment variables
-        desktop = os.environ.get('XDG_CURRENT_DESKTOP', '').lower()
-        session = os.environ.get('DESKTOP_SESSION', '').lower()
-        
-        if 'xfce' in desktop or 'xfce' in session:
-            self.de_type = 'xfce'
-            self.power_manager = 'xfce4-power-manager'
-        elif 'gnome' in desktop or 'gnome' in session:
-            self.de_type = 'gnome'
-            self.power_manager = 'gnome-power-manager'
-        elif 'kde' in desktop or 'kde' in session:
-            self.de_type = 'kde'
-            self.power_manager = 'powerdevil'
-        else:
-            self.de_type = 'unknown'
-            self.power_manager = None
+        self.detect_desktop()
         
         self.output.insert(tk.END, f"Detected environment: {self.de_type}\n")
         self.output.insert(tk.END, f"Power manager: {self.power_manager}\n")
@@ -103,17 +172,16 @@ class PowerManagementModule:
     def check_battery(self):
         self.output.insert(tk.END, "Checking battery status...\n")
         
-        battery = psutil.sensors_battery()
+        battery = self.get_battery_info()
         if battery:
             self.output.insert(tk.END, f"Battery present: Yes\n")
-            self.output.insert(tk.END, f"Battery percentage: {battery.percent}%\n")
+            self.output.insert(tk.END, f"Battery percentage: {battery['percent']}%\n")
             self.output.insert(tk.END, 
-                f"Power plugged in: {'Yes' if battery.power_plugged else 'No'}\n")
+                f"Power plugged in: {'Yes' if battery['plugged'] else 'No'}\n")
             
             # Check ACPI
-            output, error, code = self.run_command("acpi -V")
-            if code == 0:
-                self.output.insert(tk.END, f"\nACPI Information:\n{output}\n")
+            if battery['acpi'] is not None:
+                self.output.insert(tk.END, f"\nACPI Information:\n{battery['acpi']}\n")
         else:
             self.output.insert(tk.END, "No battery detected (desktop system)\n")
 
@@ -125,7 +193,7 @@ class PowerManagementModule:
             return
         
         # Check if power manager is running
-        output, error, code = self.run_command(f"pgrep {self.power_manager}")
+        output, error, code = self.run_command(["pgrep", self.power_manager])
         if code == 0:
             self.output.insert(tk.END, f"{self.power_manager} is running\n")
             
@@ -148,7 +216,7 @@ class PowerManagementModule:
                 for line in output.splitlines():
                     if any(key in line.lower() for key in ['battery', 'critical', 'sleep']):
                         value, _, _ = self.run_command(
-                            f"xfconf-query -c xfce4-power-manager -p {line}")
+                            ["xfconf-query", "-c", "xfce4-power-manager", "-p", line])
                         self.output.insert(tk.END, f"{line}: {value.strip()}\n")
         except Exception as e:
             self.output.insert(tk.END, f"Error checking XFCE power settings: {str(e)}\n")
@@ -199,7 +267,7 @@ class PowerManagementModule:
         
         # Check if power manager is installed
         if self.power_manager:
-            output, error, code = self.run_command(f"which {self.power_manager}")
+            output, error, code = self.run_command(["which", self.power_manager])
             if code != 0:
                 self.output.insert(tk.END, 
                     f"Issue: Power manager {self.power_manager} is not installed\n")
@@ -207,7 +275,7 @@ class PowerManagementModule:
         
         # Check if power manager is running
         if self.power_manager:
-            output, error, code = self.run_command(f"pgrep {self.power_manager}")
+            output, error, code = self.run_command(["pgrep", self.power_manager])
             if code != 0:
                 self.output.insert(tk.END, 
                     f"Issue: Power manager {self.power_manager} is not running\n")
@@ -247,7 +315,7 @@ class PowerManagementModule:
         
         try:
             # Stop the power manager
-            output, error, code = self.run_command(f"systemctl stop {self.power_manager}")
+            output, error, code = self.run_command(["systemctl", "stop", self.power_manager])
             if code != 0:
                 raise Exception(error)
             
@@ -267,7 +335,7 @@ class PowerManagementModule:
                     config_path.unlink()
             
             # Start the power manager
-            output, error, code = self.run_command(f"systemctl start {self.power_manager}")
+            output, error, code = self.run_command(["systemctl", "start", self.power_manager])
             if code != 0:
                 raise Exception(error)
             
@@ -282,41 +350,49 @@ class PowerManagementModule:
             messagebox.showerror("Error", "Root privileges required")
             return
         
-        try:
-            # Install missing components
-            if not self.power_manager:
-                if self.de_type == 'xfce':
-                    self.run_command("apt-get install -y xfce4-power-manager")
-                elif self.de_type == 'gnome':
-                    self.run_command("apt-get install -y gnome-power-manager")
-                elif self.de_type == 'kde':
-                    self.run_command("apt-get install -y powerdevil")
-            
-            # Install ACPI tools
-            self.run_command("apt-get install -y acpi acpid")
-            
-            # Enable and start services
-            services = ['acpid']
-            if self.power_manager:
-                services.append(self.power_manager)
-            
-            for service in services:
-                self.run_command(f"systemctl enable {service}")
-                self.run_command(f"systemctl start {service}")
-            
-            # Apply default power settings based on DE
+        # apt-get waits its turn in the package queue, so this runs in a job
+        self.jobs.submit("Fix power configuration", self._fix_power_config, owner=self,
+                         on_done=lambda _: self.power_changed(
+                             "Power configuration fixed successfully"),
+                         on_error=lambda e: messagebox.showerror(
+                             "Error", f"Failed to fix power configuration: {str(e)}"))
+
+    def _fix_power_config(self, job):
+        # Install missing components
+        if not self.power_manager:
             if self.de_type == 'xfce':
-                self.apply_xfce_defaults()
+                self.run_command("apt-get install -y xfce4-power-manager", token=job.token)
             elif self.de_type == 'gnome':
-                self.apply_gnome_defaults()
+                self.run_command("apt-get install -y gnome-power-manager", token=job.token)
             elif self.de_type == 'kde':
-                self.apply_kde_defaults()
-            
-            messagebox.showinfo("Success", "Power configuration fixed successfully")
-            self.check_power_status()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to fix power configuration: {str(e)}")
+                self.run_command("apt-get install -y powerdevil", token=job.token)
+        
+        # Install ACPI tools
+        self.run_command("apt-get install -y acpi acpid", token=job.token)
+        job.check_cancelled()
+        
+        # Enable and start services
+        services = ['acpid']
+        if self.power_manager:
+            services.append(self.power_manager)
+        
+        for service in services:
+            self.run_command(["systemctl", "enable", service], token=job.token)
+            self.run_command(["systemctl", "start", service], token=job.token)
+        job.check_cancelled()
+        
+        # Apply default power settings based on DE
+        if self.de_type == 'xfce':
+            self.apply_xfce_defaults()
+        elif self.de_type == 'gnome':
+            self.apply_gnome_defaults()
+        elif self.de_type == 'kde':
+            self.apply_kde_defaults()
+
+    def power_changed(self, message):
+        """Report a finished power job and show the new status"""
+        messagebox.showinfo("Success", message)
+        self.check_power_status()
 
     def apply_xfce_defaults(self):
         defaults = {
@@ -327,7 +403,7 @@ class PowerManagementModule:
         }
         
         for key, value in defaults.items():
-            self.run_command(f"xfconf-query -c xfce4-power-manager -p {key} -s {value}")
+            self.run_command(["xfconf-query", "-c", "xfce4-power-manager", "-p", key, "-s", value])
 
     def apply_gnome_defaults(self):
         defaults = {
@@ -337,7 +413,7 @@ class PowerManagementModule:
         }
         
         for key, value in defaults.items():
-            self.run_command(f"gsettings set {key} {value}")
+            self.run_command(["gsettings", "set", *key.split(), value])
 
     def apply_kde_defaults(self):
         # KDE power management profiles are stored in powermanagementprofilesrc
@@ -433,7 +509,7 @@ suspendType=1
         
         for service in services:
             if service:
-                output, error, code = self.run_command(f"systemctl is-active {service}")
+                output, error, code = self.run_command(["systemctl", "is-active", service])
                 status = output.strip() if code == 0 else "inactive"
                 self.output.insert(tk.END, f"{service}: {status}\n")
 
@@ -443,30 +519,32 @@ suspendType=1
             messagebox.showerror("Error", "Root privileges required")
             return
             
-        try:
-            # Install power management tools if not present
-            self.run_command("apt-get install -y tlp powertop")
-            
-            # Enable and start TLP
-            self.run_command("systemctl enable tlp")
-            self.run_command("systemctl start tlp")
-            
-            # Run PowerTOP autotune
-            self.run_command("powertop --auto-tune")
-            
-            # Apply specific optimizations based on DE
-            if self.de_type == 'xfce':
-                self.optimize_xfce_power()
-            elif self.de_type == 'gnome':
-                self.optimize_gnome_power()
-            elif self.de_type == 'kde':
-                self.optimize_kde_power()
-            
-            messagebox.showinfo("Success", "Power settings optimized successfully")
-            self.check_power_status()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to optimize power settings: {str(e)}")
+        self.jobs.submit("Optimize power settings", self._optimize_power_settings, owner=self,
+                         on_done=lambda _: self.power_changed(
+                             "Power settings optimized successfully"),
+                         on_error=lambda e: messagebox.showerror(
+                             "Error", f"Failed to optimize power settings: {str(e)}"))
+
+    def _optimize_power_settings(self, job):
+        # Install power management tools if not present
+        self.run_command("apt-get install -y tlp powertop", token=job.token)
+        job.check_cancelled()
+        
+        # Enable and start TLP
+        self.run_command("systemctl enable tlp", token=job.token)
+        self.run_command("systemctl start tlp", token=job.token)
+        
+        # Run PowerTOP autotune
+        self.run_command("powertop --auto-tune", token=job.token)
+        job.check_cancelled()
+        
+        # Apply specific optimizations based on DE
+        if self.de_type == 'xfce':
+            self.optimize_xfce_power()
+        elif self.de_type == 'gnome':
+            self.optimize_gnome_power()
+        elif self.de_type == 'kde':
+            self.optimize_kde_power()
 
     def optimize_xfce_power(self):
         """Apply optimized power settings for XFCE"""
@@ -479,7 +557,7 @@ suspendType=1
         }
         
         for key, value in optimized_settings.items():
-            self.run_command(f"xfconf-query -c xfce4-power-manager -p {key} -s {value}")
+            self.run_command(["xfconf-query", "-c", "xfce4-power-manager", "-p", key, "-s", value])
 
     def optimize_gnome_power(self):
         """Apply optimized power settings for GNOME"""
@@ -491,7 +569,7 @@ suspendType=1
         }
         
         for key, value in optimized_settings.items():
-            self.run_command(f"gsettings set {key} {value}")
+            self.run_command(["gsettings", "set", *key.split(), value])
 
     def optimize_kde_power(self):
         """Apply optimized power settings for KDE"""
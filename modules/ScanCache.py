@@ -0,0 +1,177 @@
+# Part 42: Persistent File Scan Cache
+import os
+import sqlite3
+import threading
+import time
+import logging
+from typing import List, Optional, Tuple
+from PackageFiles import CACHE_DIR, writable_cache_dir
+
+logger = logging.getLogger("KaliFixAll.ScanCache")
+
+CACHE_NAME = "scan-cache.sqlite3"
+
+# Bumped when check_file changes what it finds or the table changes; older
+# results are dropped
+CHECK_VERSION = 3
+
+# Results older than this are verified again even if the file looks unchanged,
+# since disk corruption does not touch the metadata (seconds)
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Results written to the database at once
+FLUSH_ROWS = 2000
+
+# Results that depend on the moment (I/O errors) are always checked again
+UNCACHED_PREFIXES = ("Read error", "Check failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    result TEXT,
+    elf INTEGER NOT NULL,
+    checked REAL NOT NULL,
+    PRIMARY KEY (dev, ino)
+) WITHOUT ROWID
+"""
+
+
+class ScanCache:
+    """Last integrity check result of each file, kept between runs in SQLite.
+
+    A result is reused while the file's (st_dev, st_ino, size, mtime_ns,
+    ctime_ns) are unchanged; ctime cannot be set back from user space, so
+    a rewritten file is always checked again. Each worker thread looks
+    results up through its own connection, which WAL lets read alongside
+    the writer; new results are buffered and written in batches through
+    the one writer connection.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: float = CACHE_MAX_AGE):
+        self.path = path or os.path.join(writable_cache_dir(CACHE_DIR), CACHE_NAME)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._pending: List[Tuple] = []
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self):
+        """The writer connection; call with _write_lock held"""
+        if self._db is not None:
+            return self._db
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(SCHEMA)
+            if db.execute("PRAGMA user_version").fetchone()[0] != CHECK_VERSION:
+                db.execute("DROP TABLE files")
+                db.execute(SCHEMA)
+                db.execute(f"PRAGMA user_version={CHECK_VERSION}")
+            db.execute("DELETE FROM files WHERE checked < ?", (time.time() - self.max_age,))
+            db.commit()
+        except sqlite3.Error as e:
+            # A broken cache only costs speed; start a new one
+            logger.warning(f"Recreating scan cache {self.path}: {str(e)}")
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.unlink(self.path + suffix)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SCHEMA)
+            db.execute(f"PRAGMA user_version={CHECK_VERSION}")
+            db.commit()
+        self._db = db
+        return db
+
+    def _reader(self):
+        """This thread's read connection, opened once the database is set up"""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            with self._write_lock:
+                self._connect()
+            db = self._local.db = sqlite3.connect(self.path)
+        return db
+
+    def lookup(self, st: os.stat_result) -> Tuple[bool, Optional[str], bool]:
+        """(True, result, is ELF) if st matches a cached check, else (False, None, False)"""
+        try:
+            row = self._reader().execute(
+                "SELECT size, mtime_ns, ctime_ns, result, elf FROM files "
+                "WHERE dev = ? AND ino = ?", (st.st_dev, st.st_ino)).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"Cannot read scan cache {self.path}: {str(e)}")
+            row = None
+        hit = row is not None and row[:3] == (st.st_size, st.st_mtime_ns, st.st_ctime_ns)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            return True, row[3], bool(row[4])
+        return False, None, False
+
+    def store(self, st: os.stat_result, result: Optional[str], elf: bool = False):
+        """Remember the result of checking the file st describes"""
+        if result and result.startswith(UNCACHED_PREFIXES):
+            return
+        with self._lock:
+            self._pending.append((st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+                                  st.st_ctime_ns, result, int(elf), time.time()))
+            if len(self._pending) < FLUSH_ROWS:
+                return
+            rows, self._pending = self._pending, []
+        self._write(rows)
+
+    def flush(self):
+        """Write the results stored since the last flush"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        self._write(rows)
+
+    def _write(self, rows: List[Tuple]):
+        if not rows:
+            return
+        with self._write_lock:
+            try:
+                db = self._connect()
+                db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               rows)
+                db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Cannot write scan cache {self.path}: {str(e)}")
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def clear(self):
+        """Forget every cached result"""
+        with self._lock:
+            self._pending = []
+        with self._write_lock:
+            db = self._connect()
+            db.execute("DELETE FROM files")
+            db.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_scan_cache() -> ScanCache:
+    """Return the scan cache shared by all scans"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ScanCache()
+        return _cache
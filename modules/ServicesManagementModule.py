@@ -1,19 +1,22 @@
 # Part 15: Services Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
-from typing import Dict, List, Tuple, Set
+from typing import Dict, List, Tuple, Set, Union
 import json
 from pathlib import Path
 import time
+from CommandExecutor import execute
+from JobRunner import get_job_runner
 
-class ServicesManagementModule:
-    def __init__(self, parent_notebook):
-        # Create services management tab
-        self.services_frame = ttk.Frame(parent_notebook)
-        parent_notebook.add(self.services_frame, text='Services Manager')
-        
+class ServicesManagementScanner:
+    """Service checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+    
+    # Fix scheduling: failed network units are left to the network fix first
+    FIX_RESOURCES = ('systemd',)
+    FIX_AFTER = ('Network',)
+
+    def __init__(self):
         # Initialize variables
         self.essential_services = {
             'networking': 'Network connectivity',
@@ -43,6 +46,79 @@ class ServicesManagementModule:
             'nfs-server': 'Network file system'
         }
         
+
+    def run_command(self, command: Union[str, List[str]], shell: bool = False,
+                    timeout: float = None, on_output=None,
+                    token=None) -> Tuple[str, str, int]:
+        """Run command and return output, error, and return code"""
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None) -> List[str]:
+        """Return a list of service issues"""
+        issues = []
+        
+        output, _, _ = self.run_command("systemctl --failed --no-legend --plain", token=token)
+        failed = [line.split()[0] for line in output.splitlines() if line.strip()]
+        if failed:
+            issues.append(f"{len(failed)} failed unit(s): {', '.join(failed[:10])}")
+        
+        return issues
+
+    def fix_common_issues(self, token=None) -> List[str]:
+        """Reset and restart failed essential services"""
+        fixed = []
+        
+        output, _, _ = self.run_command("systemctl --failed --no-legend --plain", token=token)
+        failed = [line.split()[0] for line in output.splitlines() if line.strip()]
+        
+        for unit in failed:
+            service = unit[:-len('.service')] if unit.endswith('.service') else unit
+            if service not in self.essential_services:
+                continue
+            self.run_command(["systemctl", "reset-failed", unit], token=token)
+            _, _, code = self.run_command(["systemctl", "restart", unit], token=token)
+            if code == 0:
+                fixed.append(f"Restarted {service}")
+        
+        return fixed
+
+    def get_services(self, token=None) -> List[Tuple[str, str, str]]:
+        """Collect (name, status, description) for every service"""
+        output, _, _ = self.run_command("systemctl list-units --type=service --all",
+                                        token=token)
+        
+        services = []
+        for line in output.splitlines():
+            if '.service' in line:
+                parts = line.split()
+                if len(parts) >= 4:
+                    service_name = parts[0].replace('.service', '')
+                    status = parts[2]
+                    description = ' '.join(parts[4:])
+                    services.append((service_name, status, description))
+        return services
+
+    def scan(self, token=None) -> Dict:
+        """Service states as plain data"""
+        services = self.get_services(token)
+        states = {name: status for name, status, _ in services}
+        return {
+            'services': [{'name': name, 'status': status, 'description': description}
+                         for name, status, description in services],
+            'essential': {name: states.get(name, 'not-found') for name in self.essential_services},
+            'failed': [name for name, status, _ in services if status == 'failed']
+        }
+
+class ServicesManagementModule(ServicesManagementScanner):
+    def __init__(self, parent_notebook):
+        super().__init__()
+        self.jobs = get_job_runner()
+        
+        # Create services management tab
+        self.services_frame = ttk.Frame(parent_notebook)
+        parent_notebook.add(self.services_frame, text='Services Manager')
+        
         # Create interface
         self.create_interface()
         
@@ -163,53 +239,38 @@ class ServicesManagementModule:
         self.all_tree.bind('<<TreeviewSelect>>', self.show_service_details)
         self.essential_tree.bind('<<TreeviewSelect>>', self.show_service_details)
 
-    def run_command(self, command: str, shell: bool = False) -> Tuple[str, str, int]:
-        """Run command and return output, error, and return code"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_services(self):
-        """Scan all services and update the interface"""
+        """Scan all services in the background and update the interface"""
+        self.update_details("Scanning services...")
+        self.jobs.submit("Scan services", self._scan_services, owner=self,
+                         on_done=self.show_services,
+                         on_error=self.scan_services_failed)
+
+    def _scan_services(self, job) -> List[Tuple[str, str, str]]:
+        return self.get_services(job.token)
+
+    def show_services(self, services: List[Tuple[str, str, str]]):
+        """Fill the service trees with scan results"""
         # Clear existing items
         self.all_tree.delete(*self.all_tree.get_children())
         self.essential_tree.delete(*self.essential_tree.get_children())
         
-        try:
-            # Get all services
-            output, _, _ = self.run_command("systemctl list-units --type=service --all")
-            
-            for line in output.splitlines():
-                if '.service' in line:
-                    parts = line.split()
-                    if len(parts) >= 4:
-                        service_name = parts[0].replace('.service', '')
-                        status = parts[2]
-                        description = ' '.join(parts[4:])
-                        
-                        # Add to all services tree
-                        self.all_tree.insert('', 'end',
-                                           values=(service_name, status, description))
-                        
-                        # Add to essential services tree if applicable
-                        if service_name in self.essential_services:
-                            self.essential_tree.insert('', 'end',
-                                                     values=(service_name, status,
-                                                            self.essential_services[service_name]))
-            
-            self.update_details("Service scan completed successfully.")
+        for service_name, status, description in services:
+            # Add to all services tree
+            self.all_tree.insert('', 'end',
+                               values=(service_name, status, description))
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to scan services: {str(e)}")
-            self.update_details(f"Error scanning services: {str(e)}")
+            # Add to essential services tree if applicable
+            if service_name in self.essential_services:
+                self.essential_tree.insert('', 'end',
+                                         values=(service_name, status,
+                                                self.essential_services[service_name]))
+        
+        self.update_details("Service scan completed successfully.")
+
+    def scan_services_failed(self, error: Exception):
+        messagebox.showerror("Error", f"Failed to scan services: {str(error)}")
+        self.update_details(f"Error scanning services: {str(error)}")
 
     def get_selected_service(self) -> str:
         """Get the currently selected service name"""
@@ -231,7 +292,7 @@ class ServicesManagementModule:
         service = self.get_selected_service()
         if service:
             try:
-                output, error, code = self.run_command(f"sudo systemctl start {service}")
+                output, error, code = self.run_command(["sudo", "systemctl", "start", service])
                 if code == 0:
                     self.update_details(f"Successfully started {service}")
                     self.scan_services()
@@ -253,7 +314,7 @@ class ServicesManagementModule:
                     return
             
             try:
-                output, error, code = self.run_command(f"sudo systemctl stop {service}")
+                output, error, code = self.run_command(["sudo", "systemctl", "stop", service])
                 if code == 0:
                     self.update_details(f"Successfully stopped {service}")
                     self.scan_services()
@@ -269,7 +330,7 @@ class ServicesManagementModule:
         service = self.get_selected_service()
         if service:
             try:
-                output, error, code = self.run_command(f"sudo systemctl restart {service}")
+                output, error, code = self.run_command(["sudo", "systemctl", "restart", service])
                 if code == 0:
                     self.update_details(f"Successfully restarted {service}")
                     self.scan_services()
@@ -285,7 +346,7 @@ class ServicesManagementModule:
         service = self.get_selected_service()
         if service:
             try:
-                output, error, code = self.run_command(f"sudo systemctl enable {service}")
+                output, error, code = self.run_command(["sudo", "systemctl", "enable", service])
                 if code == 0:
                     self.update_details(f"Successfully enabled {service}")
                     self.scan_services()
@@ -307,7 +368,7 @@ class ServicesManagementModule:
                     return
             
             try:
-                output, error, code = self.run_command(f"sudo systemctl disable {service}")
+                output, error, code = self.run_command(["sudo", "systemctl", "disable", service])
                 if code == 0:
                     self.update_details(f"Successfully disabled {service}")
                     self.scan_services()
@@ -327,13 +388,13 @@ class ServicesManagementModule:
             for service, description in self.essential_services.items():
                 try:
                     # Check service status
-                    output, _, code = self.run_command(f"systemctl is-active {service}")
+                    output, _, code = self.run_command(["systemctl", "is-active", service])
                     
                     if "inactive" in output or "failed" in output:
                         self.update_details(f"Fixing {service}...\n")
                         
                         # Try to start the service
-                        _, error, code = self.run_command(f"sudo systemctl start {service}")
+                        _, error, code = self.run_command(["sudo", "systemctl", "start", service])
                         if code == 0:
                             self.update_details(f"Successfully started {service}\n")
                         else:
@@ -350,27 +411,27 @@ class ServicesManagementModule:
         """Attempt to fix common service issues"""
         try:
             # Get service status for debugging
-            output, _, _ = self.run_command(f"systemctl status {service}")
+            output, _, _ = self.run_command(["systemctl", "status", service])
             self.update_details(f"Service status:\n{output}\n")
             
              # Reset failed state
-            self.run_command(f"sudo systemctl reset-failed {service}")
+            self.run_command(["sudo", "systemctl", "reset-failed", service])
             
             # Reload daemon
             self.run_command("sudo systemctl daemon-reload")
             
             # Check configuration
-            _, error, code = self.run_command(f"sudo systemctl show {service}")
+            _, error, code = self.run_command(["sudo", "systemctl", "show", service])
             if code != 0:
                 self.update_details(f"Configuration error in {service}: {error}\n")
                 
                 # Try to reinstall the service package
                 if messagebox.askyesno("Fix Service",
                                      f"Attempt to reinstall {service} package?"):
-                    self.run_command(f"sudo apt-get install --reinstall {service}")
+                    self.run_command(["sudo", "apt-get", "install", "--reinstall", service])
             
             # Check dependencies
-            output, _, _ = self.run_command(f"systemctl list-dependencies {service}")
+            output, _, _ = self.run_command(["systemctl", "list-dependencies", service])
             for line in output.splitlines():
                 if "failed" in line:
                     dep_service = line.split()[-1].replace('.service', '')
@@ -378,7 +439,7 @@ class ServicesManagementModule:
                     self.fix_service_issues(dep_service)
             
             # Final restart attempt
-            _, error, code = self.run_command(f"sudo systemctl restart {service}")
+            _, error, code = self.run_command(["sudo", "systemctl", "restart", service])
             if code == 0:
                 self.update_details(f"Successfully restarted {service}\n")
             else:
@@ -396,12 +457,12 @@ class ServicesManagementModule:
             try:
                 # Disable unnecessary services
                 for service in self.optional_services:
-                    output, _, _ = self.run_command(f"systemctl is-active {service}")
+                    output, _, _ = self.run_command(["systemctl", "is-active", service])
                     if "active" in output:
                         if messagebox.askyesno("Optimize",
                                              f"Stop optional service {service}?"):
-                            self.run_command(f"sudo systemctl stop {service}")
-                            self.run_command(f"sudo systemctl disable {service}")
+                            self.run_command(["sudo", "systemctl", "stop", service])
+                            self.run_command(["sudo", "systemctl", "disable", service])
                             self.update_details(f"Disabled {service}\n")
                 
                 # Clean up service files
@@ -414,7 +475,7 @@ class ServicesManagementModule:
                         service = line.split()[0]
                         if messagebox.askyesno("Optimize",
                                              f"Unmask service {service}?"):
-                            self.run_command(f"sudo systemctl unmask {service}")
+                            self.run_command(["sudo", "systemctl", "unmask", service])
                             self.update_details(f"Unmasked {service}\n")
                 
                 self.scan_services()
@@ -454,13 +515,13 @@ class ServicesManagementModule:
         if service:
             try:
                 # Get service details
-                output, _, _ = self.run_command(f"systemctl status {service}")
+                output, _, _ = self.run_command(["systemctl", "status", service])
                 
                 # Get service configuration
-                config_output, _, _ = self.run_command(f"systemctl show {service}")
+                config_output, _, _ = self.run_command(["systemctl", "show", service])
                 
                 # Get service dependencies
-                dep_output, _, _ = self.run_command(f"systemctl list-dependencies {service}")
+                dep_output, _, _ = self.run_command(["systemctl", "list-dependencies", service])
                 
                 details = (f"=== Service Details: {service} ===\n\n"
                           f"{output}\n\n"
@@ -487,7 +548,7 @@ class ServicesManagementModule:
         try:
             # Check essential services
             for service, description in self.essential_services.items():
-                output, _, _ = self.run_command(f"systemctl is-active {service}")
+                output, _, _ = self.run_command(["systemctl", "is-active", service])
                 if "inactive" in output or "failed" in output:
                     recommendations[service] = f"Essential service {service} is not running"
             
@@ -504,7 +565,7 @@ class ServicesManagementModule:
             
             # Check for resource-intensive services
             for service in running_services:
-                output, _, _ = self.run_command(f"systemctl status {service}")
+                output, _, _ = self.run_command(["systemctl", "status", service])
                 if "high-memory" in output.lower() or "high-cpu" in output.lower():
                     recommendations[service] = f"Service {service} is using high resources"
             
@@ -547,7 +608,7 @@ class ServicesManagementModule:
                         self.run_command("sudo systemctl disable apache2")
                 else:
                     self.update_details(f"Optimizing service {service}...\n")
-                    self.run_command(f"sudo systemctl restart {service}")
+                    self.run_command(["sudo", "systemctl", "restart", service])
             
             except Exception as e:
                 self.update_details(f"Error applying fix for {service}: {str(e)}\n")
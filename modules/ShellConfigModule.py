@@ -1,21 +1,20 @@
 # Part 10: Shell Configuration Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import shutil
+import shlex
 from pathlib import Path
 import datetime
 import difflib
 from typing import Dict, List
 import re
+from CommandExecutor import execute, check_call
 
-class ShellConfigModule:
-    def __init__(self, parent_notebook):
-        # Create shell config management tab
-        self.shell_frame = ttk.Frame(parent_notebook)
-        parent_notebook.add(self.shell_frame, text='Shell Config')
-        
+class ShellConfigScanner:
+    """Shell configuration checks, scans and fixes with no widget code (used by the GUI and CLI)"""
+
+    def __init__(self):
         # Initialize paths and data structures
         self.config_files = {
             'bash': {
@@ -29,6 +28,57 @@ class ShellConfigModule:
                 'aliases': Path.home() / '.zsh_aliases'
             }
         }
+
+    def check_status(self, token=None) -> List[str]:
+        """Return shell startup files that fail a syntax check"""
+        issues = []
+        
+        for shell, paths in self.config_files.items():
+            if not shutil.which(shell):
+                continue
+            for config_type, path in paths.items():
+                if path.exists():
+                    result = execute([shell, '-n', str(path)], token=token)
+                    if result.returncode != 0:
+                        issues.append(f"Syntax error in {path}: {result.stderr.strip()}")
+        
+        return issues
+
+    def fix_common_issues(self, token=None) -> List[str]:
+        """Restore missing shell startup files from /etc/skel"""
+        fixed = []
+        
+        for shell, paths in self.config_files.items():
+            rc_path = paths['rc']
+            skel = Path('/etc/skel') / rc_path.name
+            if shutil.which(shell) and not rc_path.exists() and skel.exists():
+                shutil.copy2(skel, rc_path)
+                fixed.append(f"Restored {rc_path} from {skel}")
+        
+        return fixed
+
+    def scan(self, token=None) -> Dict:
+        """Shell configuration files and their contents summary"""
+        result = {}
+        for shell, paths in self.config_files.items():
+            result[shell] = {}
+            for config_type, path in paths.items():
+                entry = {'path': str(path), 'exists': path.exists()}
+                if entry['exists']:
+                    analyzer = ShellConfigAnalyzer(path)
+                    entry.update(analyzer.get_summary())
+                    entry['suggestions'] = analyzer.suggest_optimizations()
+                result[shell][config_type] = entry
+        return result
+
+class ShellConfigModule(ShellConfigScanner):
+    def __init__(self, parent_notebook):
+        # Create shell config management tab
+        self.shell_frame = ttk.Frame(parent_notebook)
+        parent_notebook.add(self.shell_frame, text='Shell Config')
+        
+        # Initialize paths and data structures
+        super().__init__()
         
         # Backup directory
         self.backup_dir = Path.home() / '.config' / 'shell_backups'
@@ -312,12 +362,12 @@ class ShellConfigModule:
         try:
             # Source the configuration
             if shell_type == 'bash':
-                cmd = f"source {file_path}"
+                cmd = f"source {shlex.quote(str(file_path))}"
             else:  # zsh
-                cmd = f"source {file_path}"
+                cmd = f"source {shlex.quote(str(file_path))}"
             
             # Execute in current shell
-            subprocess.run(['bash', '-c', cmd], check=True)
+            check_call(['bash', '-c', cmd])
             
             self.status_var.set("Configuration sourced successfully")
             messagebox.showinfo("Success", "Configuration sourced")
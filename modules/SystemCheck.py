@@ -0,0 +1,272 @@
+# Part 24: Parallel System Check
+import tkinter as tk
+from tkinter import ttk, scrolledtext
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Optional, Tuple
+from CommandExecutor import CancellationToken
+from Tracing import span
+from Metrics import record_check
+
+logger = logging.getLogger("KaliFixAll.SystemCheck")
+
+# Time (seconds) one module's check may run before it is abandoned.
+# Modules can override it with a CHECK_DEADLINE class attribute.
+CHECK_DEADLINE = 30
+
+# Number of module checks run at the same time
+CHECK_WORKERS = 8
+
+# How often running checks are tested against their deadline
+POLL_INTERVAL = 0.1
+
+
+class CheckResult:
+    """Outcome of one module's check_status"""
+
+    def __init__(self, name: str, deadline: float = CHECK_DEADLINE):
+        self.name = name
+        self.deadline = deadline
+        self.status = 'pending'
+        self.issues: List[str] = []
+        self.error = None
+        self.started = None
+        self.duration = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ('pending', 'running')
+
+    @property
+    def items(self) -> List[str]:
+        return self.issues
+
+    def to_dict(self):
+        return {
+            'module': self.name,
+            'status': self.status,
+            'issues': list(self.issues),
+            'error': self.error,
+            'duration': round(self.duration, 3),
+        }
+
+
+class SystemCheck:
+    """Runs module checks concurrently, each bounded by its own deadline.
+
+    A check is a callable taking a CancellationToken and returning a list of
+    issue strings. When a check overruns its deadline its token is cancelled,
+    which kills any command it is waiting on, and it is reported as timed out.
+    """
+
+    def __init__(self, checks: List[Tuple[str, Callable, Optional[float]]],
+                 max_workers: int = CHECK_WORKERS,
+                 token: Optional[CancellationToken] = None):
+        self.checks = checks
+        self.max_workers = max_workers
+        self.token = token or CancellationToken()
+        self.results = [CheckResult(name, deadline or CHECK_DEADLINE)
+                        for name, _, deadline in checks]
+        self._lock = threading.Lock()
+
+    def run(self, on_result: Optional[Callable[[CheckResult], None]] = None) -> List[CheckResult]:
+        """Run every check and return the results once all have finished.
+
+        on_result is called from the calling thread as each check completes.
+        """
+        pool = ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(self.checks))),
+                                  thread_name_prefix="check")
+        futures = {}
+        tokens = {}
+        try:
+            for result, (_, func, _) in zip(self.results, self.checks):
+                token = CancellationToken()
+                self.token.add_callback(token.cancel)
+                tokens[result.name] = token
+                futures[pool.submit(self._run_check, result, func, token)] = result
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=POLL_INTERVAL,
+                                     return_when=FIRST_COMPLETED)
+                finished = [futures[future] for future in done]
+
+                now = time.perf_counter()
+                for future in list(pending):
+                    result = futures[future]
+                    if self.token.cancelled:
+                        self._finish(result, 'cancelled')
+                    elif result.started is not None and now - result.started > result.deadline:
+                        if self._finish(result, 'timeout',
+                                        error=f"No result after {result.deadline}s"):
+                            tokens[result.name].cancel()
+                    if result.finished:
+                        pending.discard(future)
+                        future.cancel()
+                        finished.append(result)
+
+                if on_result is not None:
+                    for result in finished:
+                        on_result(result)
+        finally:
+            # Abandoned checks keep their thread until their current call returns
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        return self.results
+
+    def _run_check(self, result: CheckResult, func: Callable, token: CancellationToken):
+        with self._lock:
+            if result.finished:
+                return
+            result.status = 'running'
+            result.started = time.perf_counter()
+        try:
+            with span(f"Check {result.name}", 'check') as trace:
+                issues = func(token) or []
+                trace.set(issues=len(issues))
+        except Exception as e:
+            logger.exception(f"Check for {result.name} failed: {str(e)}")
+            self._finish(result, 'failed', error=str(e))
+            return
+        self._finish(result, 'issues' if issues else 'ok', issues=list(issues))
+
+    def _finish(self, result: CheckResult, status: str, issues=None, error=None) -> bool:
+        """Record a final status unless one has already been recorded"""
+        with self._lock:
+            if result.finished:
+                return False
+            result.status = status
+            if issues is not None:
+                result.issues = issues
+            result.error = error
+            if result.started is not None:
+                result.duration = time.perf_counter() - result.started
+        logger.info(f"Check {result.name}: {status} in {result.duration:.2f}s")
+        record_check(result)
+        return True
+
+
+def format_check_summary(results: List[CheckResult]) -> str:
+    """Format check results as a timing table, slowest module first"""
+    lines = [f"{'Module':<25} {'Status':<10} {'Issues':>6} {'Time (s)':>9}"]
+    lines.append("-" * 53)
+    for result in sorted(results, key=lambda result: result.duration, reverse=True):
+        lines.append(f"{result.name:<25} {result.status:<10} {len(result.issues):>6} "
+                     f"{result.duration:9.2f}")
+    lines.append("-" * 53)
+    total_issues = sum(len(result.issues) for result in results)
+    slowest = max((result.duration for result in results), default=0.0)
+    lines.append(f"{'Total':<25} {'':<10} {total_issues:>6} {slowest:9.2f}")
+    return "\n".join(lines)
+
+
+class CheckResultsWindow:
+    """Window showing per-module results as they arrive.
+
+    Used for both system checks and fix passes; results need name, status,
+    items, error and duration attributes.
+    """
+
+    def __init__(self, parent, names: List[str], on_cancel: Optional[Callable] = None,
+                 title: str = "System Check", item_label: str = "Issues",
+                 format_summary: Callable = format_check_summary):
+        self.on_cancel = on_cancel
+        self.item_label = item_label
+        self.format_summary = format_summary
+        self.window = tk.Toplevel(parent)
+        self.window.title(title)
+        self.window.geometry("750x550")
+
+        self.status_label = ttk.Label(self.window, text=f"Running {len(names)} modules...")
+        self.status_label.pack(fill='x', padx=5, pady=5)
+
+        self.progress = ttk.Progressbar(self.window, mode='determinate', maximum=max(1, len(names)))
+        self.progress.pack(fill='x', padx=5)
+
+        self.tree = ttk.Treeview(self.window, columns=('module', 'status', 'issues', 'time'),
+                                 show='headings', height=10)
+        self.tree.heading('module', text='Module')
+        self.tree.heading('status', text='Status')
+        self.tree.heading('issues', text=item_label)
+        self.tree.heading('time', text='Time (s)')
+        self.tree.column('module', width=250)
+        self.tree.column('status', width=100)
+        self.tree.column('issues', width=80)
+        self.tree.column('time', width=100)
+        self.tree.pack(fill='x', padx=5, pady=5)
+
+        for name in names:
+            self.tree.insert('', 'end', iid=name, values=(name, 'pending', '', ''))
+
+        self.output = scrolledtext.ScrolledText(self.window, height=12)
+        self.output.pack(fill='both', expand=True, padx=5, pady=5)
+
+        button_frame = ttk.Frame(self.window)
+        button_frame.pack(fill='x', padx=5, pady=5)
+        self.cancel_button = ttk.Button(button_frame, text="Cancel", command=self.cancel)
+        self.cancel_button.pack(side='right', padx=5)
+        ttk.Button(button_frame, text="Close", command=self.close).pack(side='right', padx=5)
+
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+    def exists(self) -> bool:
+        try:
+            return bool(self.window.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def show_running(self, name: str):
+        if self.exists():
+            self.tree.set(name, 'status', 'running')
+
+    def show_result(self, result: CheckResult):
+        """Update the row of a finished module and append its issues"""
+        if not self.exists():
+            return
+        self.tree.item(result.name, values=(result.name, result.status, len(result.items),
+                                            f"{result.duration:.2f}"))
+        self.progress['value'] += 1
+
+        if result.items:
+            self.output.insert(tk.END, f"[{result.name}]\n")
+            for item in result.items:
+                self.output.insert(tk.END, f"  - {item}\n")
+        elif result.error:
+            self.output.insert(tk.END, f"[{result.name}] {result.status}: {result.error}\n")
+        self.output.see(tk.END)
+
+    def show_summary(self, results: List[CheckResult]):
+        if not self.exists():
+            return
+        total = sum(len(result.items) for result in results)
+        problems = [result for result in results if result.status in ('failed', 'timeout')]
+        text = f"Complete: {total} {self.item_label.lower()}"
+        if problems:
+            text += f", {len(problems)} module(s) failed or timed out"
+        self.status_label.config(text=text)
+        self.cancel_button.config(state='disabled')
+
+        self.output.insert(tk.END, "\n=== Timing Summary ===\n")
+        self.output.insert(tk.END, self.format_summary(results) + "\n")
+        self.output.see(tk.END)
+
+    def show_error(self, error: Exception):
+        if self.exists():
+            self.status_label.config(text=f"Failed: {str(error)}")
+            self.cancel_button.config(state='disabled')
+
+    def cancel(self):
+        if self.on_cancel is not None:
+            self.on_cancel()
+        self.cancel_button.config(state='disabled')
+        self.status_label.config(text="Cancelling...")
+
+    def close(self):
+        self.cancel()
+        self.window.destroy()
+
+    def lift(self):
+        self.window.deiconify()
+        self.window.lift()
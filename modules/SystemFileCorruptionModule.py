@@ -1,13 +1,153 @@
 # Part 11: System/File Corruption Scanner Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
+import stat
 from pathlib import Path
 import hashlib
 import time
-import threading
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+from CommandExecutor import execute, get_executor
+from JobRunner import get_job_runner, ui_thread
+from PackageFiles import get_file_owner_index
+from PackageVerify import get_package_verifier
+from FileScan import walk_files, scan_files
+from ElfCheck import ElfValidator, is_elf
+from ScanCache import ScanCache, get_scan_cache
+
+# Problems that reinstalling the owning package repairs
+PACKAGE_REPAIRS = ("Corrupt binary", "Checksum mismatch", "File missing")
+
+
+def used_inodes(path: str) -> int:
+    """Inodes in use on the filesystem holding path, or 0 if it does not say"""
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return 0
+    return max(0, st.f_files - st.f_ffree)
+
+
+def check_file(filepath: str, st: os.stat_result,
+               elf: Optional[ElfValidator] = None) -> Optional[str]:
+    """Problem with a regular file, or None; st is its lstat result.
+
+    Called from the scan worker threads.
+    """
+    return inspect_file(filepath, st, elf)[0]
+
+
+def inspect_file(filepath: str, st: os.stat_result,
+                 elf: Optional[ElfValidator] = None) -> Tuple[Optional[str], bool]:
+    """check_file's result, and whether the file is an ELF object"""
+    if st.st_size == 0:
+        return "Empty file", False
+    
+    # Try to read the file
+    problem = None
+    binary = False
+    try:
+        with open(filepath, 'rb') as f:
+            # Read first and last block to check accessibility
+            head = f.read(4096)
+            if st.st_size > 4096:
+                f.seek(max(4096, st.st_size - 4096))
+                f.read()
+            
+            # For binaries and libraries, check the ELF structure
+            if is_elf(head):
+                binary = True
+                problem = (elf or ElfValidator()).check(f)
+    except OSError as e:
+        return f"Read error: {str(e)}", binary
+    
+    if problem:
+        return f"Corrupt binary ({problem})", binary
+    
+    # For text files, check for encoding issues
+    if filepath.endswith(('.txt', '.conf', '.log', '.py', '.sh')):
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                f.read()
+        except UnicodeDecodeError:
+            return "Invalid encoding", binary
+    
+    return None, binary
+
+
+def check_entry(entry: os.DirEntry, elf: Optional[ElfValidator] = None,
+                cache: Optional[ScanCache] = None) -> Optional[str]:
+    """check_file for a directory entry from walk_files, reusing its lstat.
+
+    With a cache, files whose metadata is unchanged since their last check
+    get the cached result without being read; cached ELF results are still
+    counted by elf.
+    """
+    try:
+        st = entry.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        # Removed since the directory was listed
+        return None
+    if cache is not None:
+        cached, result, binary = cache.lookup(st)
+        if cached:
+            if binary and elf is not None:
+                elf.count_cached(result is not None and result.startswith("Corrupt binary"))
+            return result
+    result, binary = inspect_file(entry.path, st, elf)
+    if cache is not None:
+        cache.store(st, result, binary)
+    return result
+
+
+class ScanProgress:
+    """Progress of a single-pass walk, estimated without counting files first.
+
+    A root that is a mount point is measured against the used inodes of its
+    filesystem (statvfs), since every file and directory takes one. Other
+    roots, and filesystems that report no inode counts, are refined as the
+    walk goes: a directory's share of its root is split evenly between its
+    own files and each subdirectory, and shares count as done once listed.
+    """
+
+    def __init__(self, roots: List[str]):
+        self.roots = list(roots)
+        self.inodes = {root: used_inodes(root) if os.path.ismount(root) else 0
+                       for root in self.roots}
+        if self.roots and all(self.inodes.values()):
+            # Whole filesystems: weight each by its size in inodes
+            total = sum(self.inodes.values())
+            self.weights = {root: count / total for root, count in self.inodes.items()}
+        else:
+            self.weights = {root: 1 / len(self.roots) for root in self.roots}
+        self.completed = 0.0
+        self.root = None
+
+    def start_root(self, root: str):
+        self.root = root
+        self.seen = 1
+        self.shares = {root: 1.0}
+        self.done_share = 0.0
+
+    def enter(self, directory: str, dirs: List[str], file_count: int):
+        """Record a listed directory, its subdirectory paths and number of files"""
+        self.seen += len(dirs) + file_count
+        share = self.shares.pop(directory, 0.0) / (len(dirs) + 1)
+        for path in dirs:
+            self.shares[path] = share
+        self.done_share += share
+
+    def finish_root(self):
+        self.completed += self.weights.get(self.root, 0.0)
+        self.root = None
+
+    def percent(self) -> float:
+        fraction = self.completed
+        if self.root is not None:
+            inodes = self.inodes.get(self.root)
+            current = self.seen / inodes if inodes else self.done_share
+            fraction += self.weights.get(self.root, 0.0) * min(current, 0.99)
+        return min(fraction, 1.0) * 100
 
 class SystemFileCorruptionModule:
     def __init__(self, parent_notebook):
@@ -36,8 +176,10 @@ class SystemFileCorruptionModule:
         self.create_control_panel()
         
         # Initialize variables
-        self.scan_thread = None
+        self.jobs = get_job_runner()
+        self.scan_job = None
         self.stop_scan = False
+        self.last_progress = -1
         self.corrupted_files = []
         
     def create_control_panel(self):
@@ -61,6 +203,15 @@ class SystemFileCorruptionModule:
         ttk.Button(scan_frame, text="Custom Directory Scan",
                   command=self.custom_directory_scan).pack(side='left', padx=5)
         
+        # Package checksum scan button
+        ttk.Button(scan_frame, text="Package Integrity",
+                  command=self.package_integrity_scan).pack(side='left', padx=5)
+        
+        # Reuse the results of files that have not changed since the last scan
+        self.skip_unchanged_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(scan_frame, text="Skip unchanged files",
+                        variable=self.skip_unchanged_var).pack(side='left', padx=5)
+        
         # Repair options
         repair_frame = ttk.LabelFrame(control_frame, text="Repair Options")
         repair_frame.pack(fill='x', padx=5, pady=5)
@@ -93,27 +244,7 @@ class SystemFileCorruptionModule:
             '/lib64'
         ]
         
-        total_files = self.count_files(critical_paths)
-        scanned_files = 0
-        
-        for path in critical_paths:
-            if self.stop_scan:
-                break
-                
-            self.update_output(f"\nScanning {path}...\n")
-            
-            for root, _, files in os.walk(path):
-                for file in files:
-                    if self.stop_scan:
-                        break
-                        
-                    full_path = os.path.join(root, file)
-                    self.check_file_integrity(full_path)
-                    
-                    scanned_files += 1
-                    progress = (scanned_files / total_files) * 100
-                    self.update_progress(progress)
-        
+        self.scan_paths(critical_paths)
         self.scan_complete()
 
     def deep_system_scan(self):
@@ -125,30 +256,11 @@ class SystemFileCorruptionModule:
         self.update_status("Starting deep system scan...")
         
         # Get list of mounted filesystems
-        output = subprocess.getoutput("df --type=ext4 --type=xfs --type=btrfs -h")
+        output = execute("df --type=ext4 --type=xfs --type=btrfs -h").stdout
         mount_points = [line.split()[-1] for line in output.splitlines()[1:]]
         
-        total_files = self.count_files(mount_points)
-        scanned_files = 0
-        
-        for mount_point in mount_points:
-            if self.stop_scan:
-                break
-                
-            self.update_output(f"\nScanning {mount_point}...\n")
-            
-            for root, _, files in os.walk(mount_point):
-                for file in files:
-                    if self.stop_scan:
-                        break
-                        
-                    full_path = os.path.join(root, file)
-                    self.check_file_integrity(full_path)
-                    
-                    scanned_files += 1
-                    progress = (scanned_files / total_files) * 100
-                    self.update_progress(progress)
-        
+        # Each mount point is walked on its own, so the walks skip the others
+        self.scan_paths(mount_points, skip=set(mount_points))
         self.scan_complete()
 
     def custom_directory_scan(self):
@@ -163,71 +275,107 @@ class SystemFileCorruptionModule:
         """Implementation of custom directory scan"""
         self.update_status(f"Scanning directory: {directory}")
         
-        total_files = self.count_files([directory])
-        scanned_files = 0
+        self.scan_paths([directory])
+        self.scan_complete()
+
+    def scan_paths(self, paths: List[str], skip=frozenset()):
+        """Check every file under paths in one walk, not descending into skip.
+
+        A scandir walk feeds the files to a pool of worker threads; the
+        problems and progress come back a batch at a time.
+        """
+        progress = ScanProgress(paths)
+        elf = ElfValidator()
+        cache = get_scan_cache() if self.skip_unchanged else None
+        if cache is not None:
+            cache.reset_stats()
+        stopped = lambda: self.stop_scan
+        
+        def on_batch(problems: List[Tuple[str, str]], checked: int):
+            self.report_corruptions(problems)
+            self.update_progress(progress.percent())
         
-        for root, _, files in os.walk(directory):
+        for path in paths:
             if self.stop_scan:
                 break
                 
-            for file in files:
-                if self.stop_scan:
-                    break
-                    
-                full_path = os.path.join(root, file)
-                self.check_file_integrity(full_path)
-                
-                scanned_files += 1
-                progress = (scanned_files / total_files) * 100
-                self.update_progress(progress)
-        
+            self.update_output(f"\nScanning {path}...\n")
+            progress.start_root(path)
+            try:
+                checked = scan_files(walk_files(path, skip, progress.enter, stopped),
+                                     lambda entry: check_entry(entry, elf, cache),
+                                     on_batch, stopped)
+            finally:
+                if cache is not None:
+                    cache.flush()
+            progress.finish_root()
+            self.update_progress(progress.percent())
+            self.update_output(f"Checked {checked} files in {path}\n")
+        
+        summary = f"\nValidated {elf.examined} ELF files, {elf.corrupt} corrupt"
+        if elf.cached:
+            summary += f" ({elf.cached} unchanged since the last scan)"
+        self.update_output(summary + "\n")
+        if cache is not None:
+            self.update_output(f"Skipped {cache.hits} unchanged files, "
+                               f"read {cache.misses} new or changed files\n")
+
+    def package_integrity_scan(self):
+        """Verify installed package files against dpkg's md5sums"""
+        self.start_scan_thread(self._package_integrity_scan, "Package integrity scan")
+
+    def _package_integrity_scan(self):
+        """Implementation of the package integrity scan"""
+        self.update_status("Verifying package files...")
+        
+        def on_progress(done: int, total: int):
+            self.update_progress(done / total * 100 if total else 100)
+        
+        result = get_package_verifier().verify(
+            token=self.scan_job.token if self.scan_job else None, on_progress=on_progress)
+        
+        for package, problems in sorted(result['issues'].items()):
+            counts = ", ".join(f"{len(paths)} {problem}" for problem, paths in problems.items() if paths)
+            self.update_output(f"\n{package}: {counts}\n")
+            for problem, paths in problems.items():
+                for path in paths:
+                    self.update_output(f"  {problem}: {path}\n")
+        for filepath, reason in result['files']:
+            self.corrupted_files.append((filepath, reason))
+        
+        self.update_output(f"\nVerified {result['checked']} files from {result['packages']} "
+                           f"packages in {result['duration']:.1f}s\n")
         self.scan_complete()
 
     def check_file_integrity(self, filepath: str):
         """Check integrity of a single file"""
         try:
-            # Skip symbolic links
-            if os.path.islink(filepath):
-                return
-            
-            # Basic file checks
-            if not os.path.exists(filepath):
-                self.report_corruption(filepath, "File missing")
-                return
-            
-            if os.path.getsize(filepath) == 0:
-                self.report_corruption(filepath, "Empty file")
-                return
-            
-            # Try to read the file
-            try:
-                with open(filepath, 'rb') as f:
-                    # Read first and last block to check accessibility
-                    f.read(4096)
-                    f.seek(-4096, 2)
-                    f.read()
-            except IOError as e:
-                self.report_corruption(filepath, f"Read error: {str(e)}")
-                return
-            
-            # For binary files, check for executable corruption
-            if os.access(filepath, os.X_OK):
-                output = subprocess.getoutput(f"file {filepath}")
-                if "corrupt" in output.lower():
-                    self.report_corruption(filepath, "Corrupt binary")
-                    return
-            
-            # For text files, check for encoding issues
-            if filepath.endswith(('.txt', '.conf', '.log', '.py', '.sh')):
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        f.read()
-                except UnicodeDecodeError:
-                    self.report_corruption(filepath, "Invalid encoding")
-                    return
-                
-        except Exception as e:
+            st = os.lstat(filepath)
+        except FileNotFoundError:
+            self.report_corruption(filepath, "File missing")
+            return
+        except OSError as e:
             self.report_corruption(filepath, f"Check failed: {str(e)}")
+            return
+        
+        # Skip symbolic links and special files
+        if not stat.S_ISREG(st.st_mode):
+            return
+        
+        try:
+            reason = check_file(filepath, st)
+        except Exception as e:
+            reason = f"Check failed: {str(e)}"
+        if reason:
+            self.report_corruption(filepath, reason)
+
+    def report_corruptions(self, problems: List[Tuple[str, str]]):
+        """Report a batch of corrupted files with one output update"""
+        if not problems:
+            return
+        self.corrupted_files.extend(problems)
+        self.update_output("".join(f"Corruption detected: {filepath}\nReason: {reason}\n\n"
+                                   for filepath, reason in problems))
 
     def report_corruption(self, filepath: str, reason: str):
         """Report corrupted file"""
@@ -240,12 +388,17 @@ class SystemFileCorruptionModule:
             messagebox.showinfo("Info", "No corrupted files found to repair")
             return
         
-        self.start_scan_thread(self._auto_repair)
+        self.start_scan_thread(self._auto_repair, "Auto repair", reset=False)
 
     def _auto_repair(self):
-        """Implementation of auto repair"""
+        """Implementation of auto repair.
+
+        Files that need their package reinstalled are collected first, so
+        every owning package is reinstalled once in a single apt-get run.
+        """
         self.update_status("Starting auto repair...")
         total = len(self.corrupted_files)
+        from_packages = []
         
         for i, (filepath, reason) in enumerate(self.corrupted_files):
             if self.stop_scan:
@@ -255,16 +408,20 @@ class SystemFileCorruptionModule:
             
             # Try different repair strategies based on the type of corruption
             if reason == "Empty file":
-                self.remove_empty_file(filepath)
-            elif reason == "Corrupt binary":
-                self.reinstall_package_for_file(filepath)
+                if self.remove_empty_file(filepath):
+                    from_packages.append(filepath)
+            elif reason.split(" (")[0] in PACKAGE_REPAIRS:
+                from_packages.append(filepath)
             elif reason == "Invalid encoding":
                 self.fix_encoding(filepath)
             else:
                 self.update_output(f"No automatic repair available for: {filepath}\n")
             
-            progress = ((i + 1) / total) * 100
-            self.update_progress(progress)
+            # Local repairs take the first half of the progress bar
+            self.update_progress(((i + 1) / total) * (50 if from_packages else 100))
+        
+        if from_packages and not self.stop_scan:
+            self.reinstall_packages_for_files(from_packages)
         
         self.scan_complete()
 
@@ -276,37 +433,76 @@ class SystemFileCorruptionModule:
         
         ManualRepairDialog(self.corruption_frame, self.corrupted_files)
 
-    def remove_empty_file(self, filepath: str):
-        """Remove empty file and recreate if necessary"""
+    def remove_empty_file(self, filepath: str) -> bool:
+        """Remove empty file; return True if it should be restored from its package"""
         try:
             os.remove(filepath)
             self.update_output(f"Removed empty file: {filepath}\n")
             
             # If it's a critical system file, try to restore from package
-            if any(filepath.startswith(p) for p in ['/bin', '/sbin', '/lib']):
-                self.reinstall_package_for_file(filepath)
+            return any(filepath.startswith(p) for p in ['/bin', '/sbin', '/lib'])
                 
         except Exception as e:
             self.update_output(f"Failed to remove file: {str(e)}\n")
+            return False
 
-    def reinstall_package_for_file(self, filepath: str):
-        """Attempt to reinstall package containing the file"""
-        try:
-            # Find package owning the file
-            output = subprocess.getoutput(f"dpkg -S {filepath}")
-            if ":" in output:
-                package = output.split(":")[0]
-                
-                # Reinstall package
-                cmd = f"apt-get install --reinstall {package}"
-                subprocess.run(['sudo', 'bash', '-c', cmd], check=True)
-                
-                self.update_output(f"Reinstalled package {package} for {filepath}\n")
+    def reinstall_packages_for_files(self, filepaths: List[str]):
+        """Reinstall the packages owning filepaths in one apt-get run, then recheck the files"""
+        self.update_status("Resolving owning packages...")
+        files_by_package: Dict[str, List[str]] = {}
+        for filepath, package in get_file_owner_index().owners_of(filepaths).items():
+            if package:
+                files_by_package.setdefault(package, []).append(filepath)
             else:
                 self.update_output(f"No package found for {filepath}\n")
-                
-        except Exception as e:
-            self.update_output(f"Failed to reinstall package: {str(e)}\n")
+        
+        if not files_by_package:
+            return
+        
+        packages = sorted(files_by_package)
+        self.update_output(f"\nReinstalling {len(packages)} package(s) for "
+                           f"{sum(len(files) for files in files_by_package.values())} file(s): "
+                           f"{' '.join(packages)}\n")
+        
+        # apt prints "Unpacking <pkg>" and "Setting up <pkg>" once per package
+        steps = {'Unpacking': set(), 'Setting up': set()}
+        
+        def on_output(line: str):
+            for step, done in steps.items():
+                if not line.startswith(step + " "):
+                    continue
+                package = line[len(step) + 1:].split()[0].split(':')[0]
+                if package in files_by_package and package not in done:
+                    done.add(package)
+                    self.update_output(f"{step} {package}\n")
+                    completed = len(steps['Unpacking']) + len(steps['Setting up'])
+                    self.update_status(f"{step} {package} ({len(done)}/{len(packages)})")
+                    self.update_progress(50 + 45 * completed / (2 * len(packages)))
+        
+        result = execute(['sudo', 'env', 'DEBIAN_FRONTEND=noninteractive', 'apt-get',
+                          'install', '--reinstall', '-y'] + packages,
+                         on_output=on_output,
+                         token=self.scan_job.token if self.scan_job else None)
+        if result.returncode != 0:
+            self.update_output(f"Failed to reinstall packages: {result.stderr.strip()}\n")
+            return
+        self.update_output(f"Reinstalled {' '.join(packages)}\n")
+        
+        # Re-verify only the files that were restored, against their checksums
+        # where the package ships them
+        self.update_status("Verifying repaired files...")
+        affected = {filepath for files in files_by_package.values() for filepath in files}
+        self.corrupted_files = [(filepath, reason) for filepath, reason in self.corrupted_files
+                                if filepath not in affected]
+        checksums = get_package_verifier().verify(packages=packages, paths=affected)
+        self.corrupted_files.extend(checksums['files'])
+        failed = {filepath for filepath, _ in checksums['files']}
+        for filepath in sorted(affected - failed):
+            before = len(self.corrupted_files)
+            self.check_file_integrity(filepath)
+            if len(self.corrupted_files) == before:
+                self.update_output(f"Verified: {filepath}\n")
+        self.update_progress(100)
 
     def fix_encoding(self, filepath: str):
         """Attempt to fix file encoding"""
@@ -339,33 +535,35 @@ class SystemFileCorruptionModule:
         except Exception as e:
             self.update_output(f"Failed to fix encoding: {str(e)}\n")
 
-    def count_files(self, paths: List[str]) -> int:
-        """Count total files in given paths"""
-        total = 0
-        for path in paths:
-            for root, _, files in os.walk(path):
-                total += len(files)
-        return total
-
-    def start_scan_thread(self, target):
-        """Start a new scan thread"""
-        if self.scan_thread and self.scan_thread.is_alive():
+    def start_scan_thread(self, target, name: str = "File integrity scan", reset: bool = True):
+        """Start a scan or repair as a background job"""
+        if self.scan_job and self.scan_job.active:
             messagebox.showinfo("Info", "A scan is already in progress")
             return
         
         self.stop_scan = False
-        self.corrupted_files = []
+        self.last_progress = -1
+        self.skip_unchanged = self.skip_unchanged_var.get()
+        if reset:
+            self.corrupted_files = []
         self.output.delete(1.0, tk.END)
         self.progress_var.set(0)
         
-        self.scan_thread = threading.Thread(target=target)
-        self.scan_thread.start()
+        self.scan_job = self.jobs.submit(name, self._run_scan_job, target, owner=self)
+
+    def _run_scan_job(self, job, target):
+        """Run a scan target, stopping it when the job is cancelled"""
+        job.token.add_callback(self.stop_current_operation)
+        target()
 
     def stop_current_operation(self):
         """Stop current scan or repair operation"""
         self.stop_scan = True
+        if self.scan_job:
+            self.scan_job.cancel()
         self.update_status("Stopping operation...")
 
+    @ui_thread
     def scan_complete(self):
         """Handle scan completion"""
         if self.stop_scan:
@@ -383,18 +581,30 @@ class SystemFileCorruptionModule:
         else:
             messagebox.showinfo("Scan Complete", "No corruptions found")
 
+    @ui_thread
     def update_status(self, message: str):
         """Update status label"""
         self.status_var.set(message)
+        if self.scan_job and self.scan_job.active:
+            self.scan_job.set_progress(message=message)
 
+    @ui_thread
     def update_output(self, message: str):
         """Update output text"""
         self.output.insert(tk.END, message)
         self.output.see(tk.END)
 
     def update_progress(self, value: float):
-        """Update progress bar"""
+        """Update progress bar, only when the whole percentage changes"""
+        if int(value) != self.last_progress:
+            self.last_progress = int(value)
+            self._set_progress(value)
+
+    @ui_thread
+    def _set_progress(self, value: float):
         self.progress_var.set(value)
+        if self.scan_job and self.scan_job.active:
+            self.scan_job.set_progress(value)
 
 class ManualRepairDialog:
     """Dialog for manual repair options"""
@@ -527,21 +737,31 @@ class ManualRepairDialog:
         
         try:
             # Find package owning the file
-            output = subprocess.getoutput(f"dpkg -S {filepath}")
-            if ":" in output:
-                package = output.split(":")[0]
-                
-                if messagebox.askyesno("Confirm", 
-                                     f"Reinstall package {package}?"):
-                    # Reinstall package
-                    cmd = f"apt-get install --reinstall {package}"
-                    subprocess.run(['sudo', 'bash', '-c', cmd], check=True)
-                    messagebox.showinfo("Success", "Package reinstalled")
-            else:
-                messagebox.showerror("Error", "No package found for this file")
-                
+            package = get_file_owner_index().owner(filepath)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to reinstall: {str(e)}")
+            return
+        
+        if not package:
+            messagebox.showerror("Error", "No package found for this file")
+        elif messagebox.askyesno("Confirm", f"Reinstall package {package}?"):
+            # Reinstall package in the background; apt must not stop to ask
+            get_job_runner().submit(
+                f"Reinstall {package}", self._reinstall_package, package, owner=self,
+                on_error=lambda e: messagebox.showerror("Error", f"Failed to reinstall: {str(e)}"))
+
+    def _reinstall_package(self, job, package: str):
+        result = execute(['sudo', 'env', 'DEBIAN_FRONTEND=noninteractive', 'apt-get',
+                          'install', '--reinstall', '-y', package], token=job.token)
+        self.show_reinstall_result(package, result)
+
+    @ui_thread
+    def show_reinstall_result(self, package: str, result):
+        if result.ok:
+            messagebox.showinfo("Success", f"Package {package} reinstalled")
+        elif not result.cancelled:
+            messagebox.showerror("Error", f"Failed to reinstall {package}: "
+                                          f"{result.stderr.strip()}")
 
     def view_edit_file(self):
         """Open file in text editor"""
@@ -554,7 +774,7 @@ class ManualRepairDialog:
         
         try:
             # Try to open with default text editor
-            subprocess.Popen(['xdg-open', filepath])
+            get_executor().submit(['xdg-open', filepath])
         except Exception as e:
             messagebox.showerror("Error", f"Failed to open file: {str(e)}")
 
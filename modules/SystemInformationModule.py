@@ -1,76 +1,46 @@
 # Part 19: System Information Module
 import tkinter as tk
-from tkinter import ttk, scrolledtext
-import subprocess
+from tkinter import ttk, messagebox, scrolledtext
 import os
 import platform
-import psutil
-import distro
+from LazyImport import lazy_import
+psutil = lazy_import('psutil')
+distro = lazy_import('distro')
 import json
 from datetime import datetime
 import shutil
 from typing import Dict, List
+from CommandExecutor import execute
+from JobRunner import get_job_runner
+from DpkgStatus import get_dpkg_status
 
-class SystemInformationModule:
-    def __init__(self, parent_notebook):
-        # Create System Information tab
-        self.sysinfo_frame = ttk.Frame(parent_notebook)
-        parent_notebook.add(self.sysinfo_frame, text='System Information')
-        
-        # Create interface
-        self.create_interface()
-        
-        # Initial info gathering
-        self.refresh_info()
+class SystemInformationScanner:
+    """System information collection with no widget code (used by the GUI and CLI)"""
 
-    def create_interface(self):
-        # Create main container
-        main_container = ttk.Frame(self.sysinfo_frame)
-        main_container.pack(fill='both', expand=True, padx=5, pady=5)
-        
-        # Create top button panel
-        button_panel = ttk.Frame(main_container)
-        button_panel.pack(fill='x', padx=5, pady=5)
-        
-        # Add refresh button
-        ttk.Button(button_panel, text="Refresh Information",
-                  command=self.refresh_info).pack(side='left', padx=5)
+    def run_command(self, command: str, shell: bool = False, timeout: float = None,
+                    on_output=None, token=None) -> str:
+        """Run system command and return output"""
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).stdout.strip()
+
+    def check_status(self, token=None) -> List[str]:
+        """Return a list of resource issues"""
+        issues = []
         
-        # Add export button
-        ttk.Button(button_panel, text="Export Information",
-                  command=self.export_info).pack(side='left', padx=5)
+        memory = psutil.virtual_memory()
+        if memory.percent > 90:
+            issues.append(f"High memory usage: {memory.percent:.0f}%")
         
-        # Create notebook for categorized information
-        self.notebook = ttk.Notebook(main_container)
-        self.notebook.pack(fill='both', expand=True, padx=5, pady=5)
+        swap = psutil.swap_memory()
+        if swap.total and swap.percent > 80:
+            issues.append(f"High swap usage: {swap.percent:.0f}%")
         
-        # Create tabs for different categories
-        self.tabs = {
-            'Overview': scrolledtext.ScrolledText(self.notebook),
-            'Hardware': scrolledtext.ScrolledText(self.notebook),
-            'Operating System': scrolledtext.ScrolledText(self.notebook),
-            'Network': scrolledtext.ScrolledText(self.notebook),
-            'Storage': scrolledtext.ScrolledText(self.notebook),
-            'Performance': scrolledtext.ScrolledText(self.notebook)
-        }
+        load_1, _, _ = os.getloadavg()
+        cpus = psutil.cpu_count() or 1
+        if load_1 > cpus * 2:
+            issues.append(f"High load average: {load_1:.2f} on {cpus} CPUs")
         
-        # Add tabs to notebook
-        for name, text_widget in self.tabs.items():
-            self.notebook.add(text_widget, text=name)
-
-    def run_command(self, command: str, shell: bool = False) -> str:
-        """Run system command and return output"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, _ = process.communicate()
-            return output.strip()
-        except Exception as e:
-            return f"Error: {str(e)}"
+        return issues
 
     def get_system_overview(self) -> str:
         """Get general system overview"""
@@ -121,11 +91,11 @@ class SystemInformationModule:
         
         # GPU Information
         info.append("\n=== Graphics ===")
-        gpu_info = self.run_command("lspci | grep -i vga")
+        gpu_info = self.run_command("lspci | grep -i vga", shell=True)
         info.append(gpu_info)
         
         # Additional GPU details from glxinfo if available
-        glx_info = self.run_command("glxinfo | grep -i 'renderer\\|vendor'")
+        glx_info = self.run_command("glxinfo | grep -i 'renderer\\|vendor'", shell=True)
         if glx_info and 'Error' not in glx_info:
             info.append(glx_info)
         
@@ -154,12 +124,12 @@ class SystemInformationModule:
         
         # System language and locale
         info.append("\n=== Language & Locale ===")
-        locale_info = self.run_command("locale | grep LANG")
+        locale_info = self.run_command("locale | grep LANG", shell=True)
         info.append(locale_info)
         
         # Installed packages
         info.append("\n=== Package Information ===")
-        pkg_count = self.run_command("dpkg --get-selections | wc -l")
+        pkg_count = get_dpkg_status().count()
         info.append(f"Installed Packages: {pkg_count}")
         
         # Desktop environment
@@ -169,7 +139,7 @@ class SystemInformationModule:
         
         # System services
         info.append("\n=== System Services ===")
-        service_count = self.run_command("systemctl list-units --type=service --state=running | grep .service | wc -l")
+        service_count = self.run_command("systemctl list-units --type=service --state=running | grep .service | wc -l", shell=True)
         info.append(f"Running Services: {service_count}")
         
         return "\n".join(info)
@@ -204,7 +174,7 @@ class SystemInformationModule:
         
         # DNS information
         info.append("\n=== DNS Configuration ===")
-        dns_info = self.run_command("cat /etc/resolv.conf | grep nameserver")
+        dns_info = self.run_command("cat /etc/resolv.conf | grep nameserver", shell=True)
         info.append(dns_info)
         
         return "\n".join(info)
@@ -280,6 +250,26 @@ class SystemInformationModule:
         
         return "\n".join(info)
 
+    def get_sections(self) -> List:
+        """Return (section name, collector) pairs in display order"""
+        return [
+            ('Overview', self.get_system_overview),
+            ('Hardware', self.get_hardware_info),
+            ('Operating System', self.get_os_info),
+            ('Network', self.get_network_info),
+            ('Storage', self.get_storage_info),
+            ('Performance', self.get_performance_info)
+        ]
+
+    def scan(self, token=None) -> Dict:
+        """Every information section as text"""
+        info = {}
+        for name, collect in self.get_sections():
+            if token is not None and token.cancelled:
+                break
+            info[name] = collect()
+        return info
+
     def bytes_to_human(self, bytes_: int) -> str:
         """Convert bytes to human readable format"""
         for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
@@ -288,33 +278,78 @@ class SystemInformationModule:
             bytes_ /= 1024
         return f"{bytes_:.2f} PB"
 
+class SystemInformationModule(SystemInformationScanner):
+    def __init__(self, parent_notebook):
+        # Create System Information tab
+        self.sysinfo_frame = ttk.Frame(parent_notebook)
+        parent_notebook.add(self.sysinfo_frame, text='System Information')
+        
+        self.jobs = get_job_runner()
+        self.refresh_job = None
+        
+        # Create interface
+        self.create_interface()
+        
+        # Initial info gathering
+        self.refresh_info()
+
+    def create_interface(self):
+        # Create main container
+        main_container = ttk.Frame(self.sysinfo_frame)
+        main_container.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        # Create top button panel
+        button_panel = ttk.Frame(main_container)
+        button_panel.pack(fill='x', padx=5, pady=5)
+        
+        # Add refresh button
+        ttk.Button(button_panel, text="Refresh Information",
+                  command=self.refresh_info).pack(side='left', padx=5)
+        
+        # Add export button
+        ttk.Button(button_panel, text="Export Information",
+                  command=self.export_info).pack(side='left', padx=5)
+        
+        # Create notebook for categorized information
+        self.notebook = ttk.Notebook(main_container)
+        self.notebook.pack(fill='both', expand=True, padx=5, pady=5)
+        
+        # Create tabs for different categories
+        self.tabs = {
+            'Overview': scrolledtext.ScrolledText(self.notebook),
+            'Hardware': scrolledtext.ScrolledText(self.notebook),
+            'Operating System': scrolledtext.ScrolledText(self.notebook),
+            'Network': scrolledtext.ScrolledText(self.notebook),
+            'Storage': scrolledtext.ScrolledText(self.notebook),
+            'Performance': scrolledtext.ScrolledText(self.notebook)
+        }
+        
+        # Add tabs to notebook
+        for name, text_widget in self.tabs.items():
+            self.notebook.add(text_widget, text=name)
+
     def refresh_info(self):
-        """Refresh all system information"""
-        try:
-            # Clear all tabs
-            for text_widget in self.tabs.values():
-                text_widget.delete('1.0', tk.END)
-            
-            # Update Overview tab
-            self.tabs['Overview'].insert(tk.END, self.get_system_overview())
-            
-            # Update Hardware tab
-            self.tabs['Hardware'].insert(tk.END, self.get_hardware_info())
-            
-            # Update Operating System tab
-            self.tabs['Operating System'].insert(tk.END, self.get_os_info())
-            
-            # Update Network tab
-            self.tabs['Network'].insert(tk.END, self.get_network_info())
-            
-            # Update Storage tab
-            self.tabs['Storage'].insert(tk.END, self.get_storage_info())
-            
-            # Update Performance tab
-            self.tabs['Performance'].insert(tk.END, self.get_performance_info())
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to refresh information: {str(e)}")
+        """Refresh all system information in the background"""
+        if self.refresh_job and self.refresh_job.active:
+            return
+        
+        # Clear all tabs
+        for text_widget in self.tabs.values():
+            text_widget.delete('1.0', tk.END)
+        
+        self.refresh_job = self.jobs.submit(
+            "Refresh system information", self._refresh_info, owner=self,
+            on_error=lambda e: messagebox.showerror(
+                "Error", f"Failed to refresh information: {str(e)}"))
+
+    def _refresh_info(self, job):
+        """Gather each section and show it as soon as it is ready"""
+        sections = self.get_sections()
+        
+        for i, (name, collect) in enumerate(sections):
+            job.check_cancelled()
+            job.set_progress(i / len(sections) * 100, f"Collecting {name}")
+            job.ui(self.tabs[name].insert, tk.END, collect())
 
     def export_info(self):
         """Export system information to a file"""
@@ -8,8 +8,8 @@ from pathlib import Path
 from datetime import datetime, timedelta
 import gzip
 import json
-import threading
 from collections import defaultdict
+from JobRunner import get_job_runner
 
 class SystemLogsModule:
     def __init__(self, parent_notebook):
@@ -657,37 +657,50 @@ class SystemLogsModule:
         monitor_text = scrolledtext.ScrolledText(monitor_window, wrap=tk.WORD)
         monitor_text.pack(fill='both', expand=True, padx=5, pady=5)
         
-        # Create stop button
-        stop_var = tk.BooleanVar(value=False)
-        ttk.Button(monitor_window, text="Stop Monitoring",
-                  command=lambda: stop_var.set(True)).pack(pady=5)
+        def show_content(content):
+            if monitor_text.winfo_exists():
+                monitor_text.insert(tk.END, content)
+                monitor_text.see(tk.END)
         
-        def monitor_thread():
+        def monitor_job(job):
             try:
                 # Get initial file size
                 size = os.path.getsize(path)
                 
-                while not stop_var.get():
+                while not job.cancelled:
                     new_size = os.path.getsize(path)
                     
+                    if new_size < size:
+                        # Log was rotated or truncated
+                        size = 0
+                    
                     if new_size > size:
                         # Read new content
-                        with open(path, 'r') as f:
+                        with open(path, 'r', errors='replace') as f:
                             f.seek(size)
                             new_content = f.read()
-                            
-                            # Update display
-                            monitor_text.insert(tk.END, new_content)
-                            monitor_text.see(tk.END)
+                        
+                        # Update display
+                        job.ui(show_content, new_content)
                         
                         size = new_size
                     
                     # Wait before next check
-                    time.sleep(1)
+                    job.token.wait(1)
                     
             except Exception as e:
-                messagebox.showerror("Error", 
-                                   f"Failed to monitor log: {str(e)}")
+                job.ui(messagebox.showerror, "Error", 
+                       f"Failed to monitor log: {str(e)}")
         
-        # Start monitoring thread
-        threading.Thread(target=monitor_thread, daemon=True).start()
\ No newline at end of file
+        # Start monitoring job
+        job = get_job_runner().submit(f"Monitor {os.path.basename(path)}",
+                                      monitor_job, owner=self, dedicated=True)
+        
+        def close_monitor():
+            job.cancel()
+            monitor_window.destroy()
+        
+        # Create stop button
+        ttk.Button(monitor_window, text="Stop Monitoring",
+                  command=job.cancel).pack(pady=5)
+        monitor_window.protocol("WM_DELETE_WINDOW", close_monitor)
\ No newline at end of file
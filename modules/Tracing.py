@@ -0,0 +1,134 @@
+# Part 29: Operation Tracing
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger("KaliFixAll.Tracing")
+
+# Number of finished spans kept; the oldest are dropped first
+MAX_SPANS = 200000
+
+
+class Span:
+    """A timed operation; extra details can be added to args while it runs"""
+
+    __slots__ = ('name', 'category', 'start', 'duration', 'tid', 'args')
+
+    def __init__(self, name: str, category: str, args: dict):
+        self.name = name
+        self.category = category
+        self.start = time.perf_counter_ns()
+        self.duration = 0
+        self.tid = threading.get_ident()
+        self.args = args
+
+    def set(self, **args):
+        self.args.update(args)
+
+
+class Tracer:
+    """Collects spans for module actions and commands.
+
+    Spans are exported in the Chrome trace event format, which
+    ui.perfetto.dev and chrome://tracing open directly. Spans on the same
+    thread nest by time, so commands show up under the action that ran them.
+    """
+
+    def __init__(self, max_spans: int = MAX_SPANS, enabled: bool = True):
+        self.enabled = enabled
+        self.origin = time.perf_counter_ns()
+        self.spans = collections.deque(maxlen=max_spans)
+        self.threads = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = 'action', **args):
+        """Time the enclosed block as one span"""
+        if not self.enabled:
+            yield Span(name, category, args)
+            return
+        span = Span(name, category, args)
+        try:
+            yield span
+        except BaseException as e:
+            span.args['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration = time.perf_counter_ns() - span.start
+            self.record(span)
+
+    def record(self, span: Span):
+        with self._lock:
+            if span.tid not in self.threads:
+                self.threads[span.tid] = threading.current_thread().name
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def events(self):
+        """Return the spans as Chrome trace events"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+            threads = dict(self.threads)
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                   'args': {'name': 'Kali Linux Fix All'}}]
+        for tid, name in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                           'args': {'name': name}})
+        for span in spans:
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start - self.origin) / 1000,
+                'dur': span.duration / 1000,
+                'pid': pid,
+                'tid': span.tid,
+                'args': span.args
+            })
+        return events
+
+    def export_chrome_trace(self, path: str) -> int:
+        """Write a Chrome trace JSON file and return the number of spans in it"""
+        events = self.events()
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+        count = sum(1 for event in events if event['ph'] == 'X')
+        logger.info(f"Exported {count} spans to {path}")
+        return count
+
+    def summary(self, limit: int = 20) -> str:
+        """Slowest spans as a table"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.duration, reverse=True)[:limit]
+        lines = [f"{'Span':<50} {'Category':<10} {'Time (ms)':>10}"]
+        lines.append("-" * 72)
+        for span in spans:
+            lines.append(f"{span.name[:50]:<50} {span.category:<10} {span.duration / 1e6:10.1f}")
+        return "\n".join(lines)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the tracer shared by all modules"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def span(name: str, category: str = 'action', **args):
+    """Trace a block on the shared tracer"""
+    return get_tracer().span(name, category, **args)
@@ -1,15 +1,17 @@
 # Part 20: Tweaks Module
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, scrolledtext
-import subprocess
 import os
 import pwd
 import grp
 import shutil
 import re
+import shlex
 from pathlib import Path
 from datetime import datetime
+from typing import List, Union
 import json
+from CommandExecutor import execute
 
 class TweaksModule:
     def __init__(self, parent_notebook):
@@ -217,19 +219,12 @@ class TweaksModule:
                   text="Configure Fonts",
                   command=self.configure_fonts).pack(pady=5)
 
-    def run_command(self, command: str, shell: bool = False) -> tuple:
+    def run_command(self, command: Union[str, List[str]], shell: bool = False,
+                    timeout: float = None, on_output=None, token=None) -> tuple:
         """Run system command and return output and error"""
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE,
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output.strip(), error.strip(), process.returncode
-        except Exception as e:
-            return "", str(e), 1
+        result = execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                         token=token)
+        return result.stdout.strip(), result.stderr.strip(), result.returncode
 
     def configure_sudo(self):
         """Configure sudo without password for current user"""
@@ -250,7 +245,8 @@ class TweaksModule:
                     return
             
             # Add configuration
-            command = f'echo "{self.current_user} ALL=(ALL) NOPASSWD: ALL" | sudo EDITOR="tee -a" visudo'
+            entry = f"{self.current_user} ALL=(ALL) NOPASSWD: ALL"
+            command = f'echo {shlex.quote(entry)} | sudo EDITOR="tee -a" visudo'
             _, error, code = self.run_command(command, shell=True)
             
             if code == 0:
@@ -361,8 +357,10 @@ export PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\0
             }
             
             for name, key in shortcuts.items():
-                command = f"gsettings set org.gnome.settings-daemon.plugins.media-keys.custom-keybinding:/org/gnome/settings-daemon/plugins/media-keys/custom-keybindings/{name}/ binding '{key}'"
-                self.run_command(command, shell=True)
+                command = ["gsettings", "set",
+                           f"org.gnome.settings-daemon.plugins.media-keys.custom-keybinding:/org/gnome/settings-daemon/plugins/media-keys/custom-keybindings/{name}/",
+                           "binding", key]
+                self.run_command(command)
             
             messagebox.showinfo("Success", "Custom shortcuts configured successfully")
             
@@ -491,8 +489,8 @@ export PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\0
                     # Try to install missing module
                     module = re.search(r'module [\'"](.+?)[\'"]', message)
                     if module:
-                        cmd = f"sudo apt-get install -y {module.group(1)}*"
-                        _, error, code = self.run_command(cmd, shell=True)
+                        cmd = ["sudo", "apt-get", "install", "-y", f"{module.group(1)}*"]
+                        _, error, code = self.run_command(cmd)
                         if code == 0:
                             fixed.append(f"Installed module {module.group(1)}")
                         else:
@@ -502,8 +500,8 @@ export PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\0
                     # Try to restart failed service
                     service = re.search(r'failed to start (.+?)\.', message)
                     if service:
-                        cmd = f"sudo systemctl restart {service.group(1)}"
-                        _, error, code = self.run_command(cmd, shell=True)
+                        cmd = ["sudo", "systemctl", "restart", service.group(1)]
+                        _, error, code = self.run_command(cmd)
                         if code == 0:
                             fixed.append(f"Restarted service {service.group(1)}")
                         else:
@@ -513,8 +511,8 @@ export PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\0
                     # Try to fix permissions
                     path = re.search(r'permission denied.*[\'"](.+?)[\'"]', message)
                     if path:
-                        cmd = f"sudo chmod -R 644 {path.group(1)}"
-                        _, error, code = self.run_command(cmd, shell=True)
+                        cmd = ["sudo", "chmod", "-R", "644", path.group(1)]
+                        _, error, code = self.run_command(cmd)
                         if code == 0:
                             fixed.append(f"Fixed permissions for {path.group(1)}")
                         else:
@@ -547,8 +545,9 @@ export PS1='\\[\\033[01;32m\\]\\u@\\h\\[\\033[00m\\]:\\[\\033[01;34m\\]\\w\\[\\0
             )
             
             if file_path:
-                cmd = f"gsettings set org.gnome.desktop.background picture-uri 'file://{file_path}'"
-                _, error, code = self.run_command(cmd, shell=True)
+                cmd = ["gsettings", "set", "org.gnome.desktop.background", "picture-uri",
+                       f"file://{file_path}"]
+                _, error, code = self.run_command(cmd)
                 
                 if code == 0:
                     messagebox.showinfo("Success", "Wallpaper changed successfully")
@@ -1,7 +1,6 @@
 # Part 3: User Management Module
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
-import subprocess
 import os
 import pwd
 import grp
@@ -9,8 +8,61 @@ import spwd
 import crypt
 from pathlib import Path
 import re
+from CommandExecutor import execute
+from JobRunner import get_job_runner
 
-class UserManagementModule:
+class UserManagementScanner:
+    """Account checks and scans with no widget code (used by the GUI and CLI)"""
+
+    def run_command(self, command, shell=False, timeout=None, on_output=None, token=None):
+        return execute(command, shell=shell, timeout=timeout, on_output=on_output,
+                       token=token).as_tuple()
+
+    def check_status(self, token=None):
+        """Return a list of account issues"""
+        issues = []
+        
+        # Accounts other than root with UID 0
+        for user in pwd.getpwall():
+            if user.pw_uid == 0 and user.pw_name != 'root':
+                issues.append(f"Account {user.pw_name} has UID 0")
+        
+        # Accounts that can log in without a password
+        try:
+            for entry in spwd.getspall():
+                if entry.sp_pwdp == '':
+                    issues.append(f"Account {entry.sp_namp} has an empty password")
+        except PermissionError:
+            issues.append("Unable to read /etc/shadow (root privileges required)")
+        
+        return issues
+
+    def get_users(self):
+        """Return {username: details} for regular user accounts"""
+        users = {}
+        for user in pwd.getpwall():
+            if 1000 <= user.pw_uid < 60000:  # Regular users
+                users[user.pw_name] = {
+                    'uid': user.pw_uid,
+                    'gid': user.pw_gid,
+                    'home': user.pw_dir,
+                    'shell': user.pw_shell,
+                    'groups': self.get_user_groups(user.pw_name)
+                }
+        return users
+
+    def get_user_groups(self, username):
+        groups = []
+        for group in grp.getgrall():
+            if username in group.gr_mem:
+                groups.append(group.gr_name)
+        return groups
+
+    def scan(self, token=None):
+        """Regular user accounts as plain data"""
+        return {'users': self.get_users()}
+
+class UserManagementModule(UserManagementScanner):
     def __init__(self, parent_notebook):
         # Create user management tab
         self.user_frame = ttk.Frame(parent_notebook)
@@ -22,6 +74,7 @@ class UserManagementModule:
         # Initialize user data
         self.users_data = {}
         self.groups_data = {}
+        self.jobs = get_job_runner()
         
         # Create control panels
         self.create_control_panel()
@@ -78,48 +131,19 @@ class UserManagementModule:
         ttk.Button(perm_ops_frame, text="Fix Home Permissions", 
                   command=self.fix_home_permissions).pack(side='left', padx=5)
 
-    def run_command(self, command, shell=False):
-        try:
-            if shell:
-                process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE, text=True)
-            else:
-                process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, 
-                                         stderr=subprocess.PIPE, text=True)
-            output, error = process.communicate()
-            return output, error, process.returncode
-        except Exception as e:
-            return "", str(e), 1
-
     def scan_users(self):
         # Clear existing data
         self.user_tree.delete(*self.user_tree.get_children())
         self.users_data.clear()
         
         try:
-            # Get all users
-            for user in pwd.getpwall():
-                if 1000 <= user.pw_uid < 60000:  # Regular users
-                    self.users_data[user.pw_name] = {
-                        'uid': user.pw_uid,
-                        'gid': user.pw_gid,
-                        'home': user.pw_dir,
-                        'shell': user.pw_shell,
-                        'groups': self.get_user_groups(user.pw_name)
-                    }
-                    
-                    self.user_tree.insert('', 'end', text=user.pw_name, 
-                                        values=(user.pw_uid, user.pw_gid, user.pw_dir))
+            self.users_data.update(self.get_users())
+            for username, user in self.users_data.items():
+                self.user_tree.insert('', 'end', text=username, 
+                                    values=(user['uid'], user['gid'], user['home']))
         except Exception as e:
             messagebox.showerror("Error", f"Failed to scan users: {str(e)}")
 
-    def get_user_groups(self, username):
-        groups = []
-        for group in grp.getgrall():
-            if username in group.gr_mem:
-                groups.append(group.gr_name)
-        return groups
-
     def on_user_select(self, event):
         selection = self.user_tree.selection()
         if not selection:
@@ -193,17 +217,16 @@ class UserManagementModule:
             try:
                 # Create user
                 output, error, code = self.run_command(
-                    f"useradd -m -s /bin/bash {username}")
+                    ["useradd", "-m", "-s", "/bin/bash", username])
                 if code != 0:
                     raise Exception(error)
                 
                 # Set password
-                proc = subprocess.Popen(['chpasswd'], stdin=subprocess.PIPE)
-                proc.communicate(f"{username}:{password}".encode())
+                execute(['chpasswd'], input=f"{username}:{password}\n")
                 
                 if make_admin_var.get():
                     output, error, code = self.run_command(
-                        f"usermod -aG sudo {username}")
+                        ["usermod", "-aG", "sudo", username])
                     if code != 0:
                         raise Exception(error)
                 
@@ -235,7 +258,7 @@ class UserManagementModule:
             
         if messagebox.askyesno("Confirm", f"Delete user {username}?"):
             try:
-                output, error, code = self.run_command(f"userdel -r {username}")
+                output, error, code = self.run_command(["userdel", "-r", username])
                 if code != 0:
                     raise Exception(error)
                     
@@ -280,8 +303,7 @@ class UserManagementModule:
                 return
                 
             try:
-                proc = subprocess.Popen(['chpasswd'], stdin=subprocess.PIPE)
-                proc.communicate(f"{username}:{password}".encode())
+                execute(['chpasswd'], input=f"{username}:{password}\n")
                 
                 messagebox.showinfo("Success", "Password reset successfully")
                 dialog.destroy()
@@ -304,7 +326,7 @@ class UserManagementModule:
         username = self.user_tree.item(selection[0])['text']
         
         try:
-            output, error, code = self.run_command(f"usermod -aG sudo {username}")
+            output, error, code = self.run_command(["usermod", "-aG", "sudo", username])
             if code != 0:
                 raise Exception(error)
                 
@@ -331,7 +353,7 @@ class UserManagementModule:
             return
             
         try:
-            output, error, code = self.run_command(f"gpasswd -d {username} sudo")
+            output, error, code = self.run_command(["gpasswd", "-d", username, "sudo"])
             if code != 0:
                 raise Exception(error)
                 
@@ -357,29 +379,35 @@ class UserManagementModule:
         if not user_data:
             return
             
-        try:
-            home_path = Path(user_data['home'])
-            if not home_path.exists():
-                output, error, code = self.run_command(f"mkdir -p {home_path}")
-                if code != 0:
-                    raise Exception(error)
-            
-            # Set ownership
-            output, error, code = self.run_command(
-                f"chown -R {username}:{user_data['gid']} {home_path}")
-            if code != 0:
-                raise Exception(error)
-                
-            # Set permissions
-            output, error, code = self.run_command(f"chmod 750 {home_path}")
+        # chown -R walks the whole home directory, so it runs in a job
+        self.jobs.submit(f"Fix home permissions for {username}", self._fix_home_permissions,
+                         username, user_data, owner=self,
+                         on_done=self.home_permissions_fixed,
+                         on_error=lambda e: messagebox.showerror(
+                             "Error", f"Failed to fix permissions: {str(e)}"))
+
+    def _fix_home_permissions(self, job, username, user_data):
+        home_path = Path(user_data['home'])
+        if not home_path.exists():
+            output, error, code = self.run_command(["mkdir", "-p", home_path], token=job.token)
             if code != 0:
                 raise Exception(error)
-                
-            messagebox.showinfo("Success", "Home directory permissions fixed")
-            self.scan_users()
+        
+        # Set ownership
+        output, error, code = self.run_command(
+            ["chown", "-R", f"{username}:{user_data['gid']}", home_path], token=job.token)
+        job.check_cancelled()
+        if code != 0:
+            raise Exception(error)
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to fix permissions: {str(e)}")
+        # Set permissions
+        output, error, code = self.run_command(["chmod", "750", home_path], token=job.token)
+        if code != 0:
+            raise Exception(error)
+
+    def home_permissions_fixed(self, _):
+        messagebox.showinfo("Success", "Home directory permissions fixed")
+        self.scan_users()
 
     def check_password_expiry(self, username):
         try:
@@ -400,7 +428,7 @@ class UserManagementModule:
 
     def check_account_status(self, username):
         try:
-            output, error, code = self.run_command(f"passwd -S {username}")
+            output, error, code = self.run_command(["passwd", "-S", username])
             if code == 0:
                 status = output.split()[1]
                 return {
@@ -425,7 +453,7 @@ class UserManagementModule:
         username = self.user_tree.item(selection[0])['text']
         
         try:
-            output, error, code = self.run_command(f"passwd -l {username}")
+            output, error, code = self.run_command(["passwd", "-l", username])
             if code != 0:
                 raise Exception(error)
                 
@@ -448,7 +476,7 @@ class UserManagementModule:
         username = self.user_tree.item(selection[0])['text']
         
         try:
-            output, error, code = self.run_command(f"passwd -u {username}")
+            output, error, code = self.run_command(["passwd", "-u", username])
             if code != 0:
                 raise Exception(error)
                 
@@ -484,7 +512,7 @@ class UserManagementModule:
                 if days < 0:
                     raise ValueError("Days must be non-negative")
                     
-                output, error, code = self.run_command(f"chage -M {days} {username}")
+                output, error, code = self.run_command(["chage", "-M", str(days), username])
                 if code != 0:
                     raise Exception(error)
                     
@@ -5,8 +5,8 @@ from langchain.chains import LLMChain
 from langchain.memory import ConversationBufferMemory
 import tkinter as tk
 from tkinter import ttk, messagebox
-import subprocess
 import os
+from CommandExecutor import check_output
 
 # Initialize LLM
 llm = ChatOpenAI(temperature=0)
@@ -56,7 +56,7 @@ class NetworkModule(RepairModule):
         results = []
         for cmd in commands:
             try:
-                output = subprocess.check_output(cmd.split()).decode()
+                output = check_output(cmd)
                 results.append(scan_chain.run(command_output=output))
             except Exception as e:
                 results.append(f"Error running {cmd}: {str(e)}")
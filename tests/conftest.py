@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The modules import each other by bare name, as KaliLinuxFixall.py arranges
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'modules'))
@@ -0,0 +1,97 @@
+import glob
+import hashlib
+import os
+import shutil
+
+import pytest
+
+from AptLists import AptListUpdater
+
+pytestmark = pytest.mark.skipif(not shutil.which('apt-get'), reason="needs apt-get")
+
+
+def make_repo(path):
+    """A flat file: repository with an empty Packages index"""
+    path.mkdir()
+    (path / 'Packages').write_bytes(b'')
+    digest = hashlib.sha256(b'').hexdigest()
+    (path / 'Release').write_text("Origin: test\nSuite: stable\nCodename: stable\n"
+                                  f"SHA256:\n {digest} 0 Packages\n")
+
+
+def make_updater(tmp_path, repo):
+    lists = tmp_path / 'lists'
+    (lists / 'partial').mkdir(parents=True)
+    parts = tmp_path / 'sources.list.d'
+    parts.mkdir()
+    sources = tmp_path / 'sources.list'
+    sources.write_text(f"deb [trusted=yes] file:{repo} ./\n")
+    return AptListUpdater(max_age=3600, lists_dir=str(lists), sources=str(sources),
+                          source_parts=str(parts))
+
+
+def age_lists(updater, seconds):
+    """Backdate the lists and the stamp as if the update ran seconds ago"""
+    paths = glob.glob(os.path.join(updater.lists_dir, '*Release')) + [updater.stamp]
+    paths += [updater.sources, updater.source_parts]
+    for path in paths:
+        stat = os.stat(path)
+        os.utime(path, (stat.st_atime - seconds, stat.st_mtime - seconds))
+
+
+@pytest.fixture
+def updater(tmp_path):
+    repo = tmp_path / 'repo'
+    make_repo(repo)
+    return make_updater(tmp_path, repo)
+
+
+def test_update_command_uses_the_configured_paths(updater):
+    command = updater.update_command()
+    assert f"Dir::State::Lists={updater.lists_dir}" in command
+    assert f"Dir::Etc::SourceList={updater.sources}" in command
+    assert updater.stamp.startswith(updater.lists_dir)
+
+
+def test_never_updated_lists_are_refreshed_once(updater):
+    assert updater.freshness()['stale']
+    outcome = updater.ensure_fresh()
+    assert outcome['updated'], outcome['error']
+    assert not outcome['stale']
+    assert glob.glob(os.path.join(updater.lists_dir, '*Release'))
+
+    outcome = updater.ensure_fresh()
+    assert not outcome['updated']
+    assert outcome['message'].startswith("Not updating")
+    assert updater.update_count == 1
+
+
+def test_old_lists_are_refreshed(updater):
+    assert updater.ensure_fresh()['updated']
+    age_lists(updater, 2 * updater.max_age)
+    assert updater.freshness()['stale']
+
+    outcome = updater.ensure_fresh()
+    assert outcome['updated'], outcome['error']
+    assert updater.update_count == 2
+
+
+def test_changed_sources_make_lists_stale(updater):
+    assert updater.ensure_fresh()['updated']
+    age_lists(updater, 60)
+    os.utime(updater.sources)
+    status = updater.freshness()
+    assert status['stale']
+    assert status['reason'] == "apt sources changed since the last update"
+
+
+def test_failed_update_is_not_retried_at_once(tmp_path):
+    updater = make_updater(tmp_path, tmp_path / 'missing')
+    outcome = updater.ensure_fresh()
+    assert not outcome['updated']
+    assert outcome['error']
+
+    outcome = updater.ensure_fresh()
+    assert outcome['error'] is None
+    assert "not retrying yet" in outcome['reason']
+    assert updater.ensure_fresh(force=True)['error']
@@ -0,0 +1,26 @@
+import pytest
+
+from CommandCache import PACKAGES, SERVICES, mutation_tags
+
+
+@pytest.mark.parametrize('command', [
+    "apt-get check",
+    "apt-get -s install tlp",
+    "apt-get --simulate dist-upgrade",
+    "apt-get install --just-print tlp",
+    "apt show bash",
+    "dpkg --audit",
+    "systemctl status ssh",
+])
+def test_read_only_commands_keep_the_cache(command):
+    assert mutation_tags(command) == frozenset()
+
+
+@pytest.mark.parametrize('command, tag', [
+    ("apt-get install -y tlp", PACKAGES),
+    ("sudo apt remove tlp", PACKAGES),
+    ("dpkg --configure -a", PACKAGES),
+    ("systemctl restart ssh", SERVICES),
+])
+def test_mutations_invalidate(command, tag):
+    assert tag in mutation_tags(command)
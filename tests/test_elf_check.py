@@ -0,0 +1,39 @@
+import shutil
+import subprocess
+
+import pytest
+
+from ElfCheck import ElfFile, ElfValidator, PT_INTERP
+
+BINARY = shutil.which('ls')
+
+
+def check(path):
+    with open(path, 'rb') as f:
+        return ElfValidator().check(f)
+
+
+@pytest.mark.skipif(not BINARY, reason="needs an ELF binary")
+def test_sound_binary():
+    assert check(BINARY) is None
+
+
+@pytest.mark.skipif(not BINARY or not shutil.which('objcopy'), reason="needs objcopy")
+def test_separate_debug_file(tmp_path):
+    debug = tmp_path / 'ls.debug'
+    subprocess.run(['objcopy', '--only-keep-debug', BINARY, str(debug)], check=True)
+    assert check(debug) is None
+
+
+@pytest.mark.skipif(not BINARY, reason="needs an ELF binary")
+def test_unterminated_interpreter(tmp_path):
+    data = bytearray(open(BINARY, 'rb').read())
+    interp = [(offset, filesz) for p_type, offset, filesz, _
+              in ElfFile(data, len(data)).program_headers() if p_type == PT_INTERP]
+    if not interp:
+        pytest.skip("binary has no interpreter")
+    offset, filesz = interp[0]
+    data[offset + filesz - 1] = ord('x')
+    broken = tmp_path / 'ls'
+    broken.write_bytes(data)
+    assert check(broken) == "interpreter path is not terminated"
@@ -0,0 +1,30 @@
+import pytest
+
+from PackageQueue import is_package_mutation
+
+
+@pytest.mark.parametrize('command', [
+    "dpkg -l",
+    "dpkg --audit",
+    "dpkg -C",
+    "dpkg --print-architecture",
+    "dpkg --print-foreign-architectures",
+    ["dpkg", "--compare-versions", "1.0", "lt", "2.0"],
+    "dpkg-query -W -f='${Status}' bash",
+    "apt-get check",
+    "apt-get -s install tlp",
+    "apt-get install --dry-run tlp",
+    "apt-cache policy bash",
+])
+def test_queries(command):
+    assert not is_package_mutation(command)
+
+
+@pytest.mark.parametrize('command', [
+    "dpkg -i package.deb",
+    "dpkg --configure -a",
+    "dpkg --add-architecture i386",
+    "sudo apt-get install -y tlp",
+])
+def test_mutations(command):
+    assert is_package_mutation(command)